@@ -0,0 +1,552 @@
+"""Entrega de acesso VIP: outbox transacional no MySQL e ponte thread -> event loop.
+
+A aprovação de um pagamento grava uma linha em access_delivery_outbox na mesma
+transação que cria a assinatura (`enqueue_access_delivery`), então o evento
+sobrevive a uma queda do processo. Cada réplica roda um AccessDeliveryRelay que
+reserva lotes de linhas pendentes com SELECT ... FOR UPDATE SKIP LOCKED (e um
+lease em available_at), entrega em paralelo e marca as linhas como entregues;
+falhas voltam a ficar disponíveis com backoff exponencial. A entrega é "pelo
+menos uma vez": se o processo cair depois de entregar e antes de marcar, a
+linha é entregue de novo quando o lease vencer.
+
+Um plano pode liberar vários grupos. O resultado de cada grupo fica em
+access_delivery_groups (filha do outbox): uma nova tentativa só gera links
+para os grupos que ainda não foram enviados ao usuário, e os admins são
+avisados uma vez quando um grupo passa a falhar, não a cada tentativa.
+
+O webhook de pagamentos (webhook_cnpay) aprova o pagamento na própria
+transação; para ter a mesma garantia ele deve chamar `enqueue_access_delivery`
+com o cursor dessa transação. Enquanto só chamar `put(evento)`, o evento fica
+em memória até virar linha no outbox e se perde se o processo cair nesse
+intervalo: `backfill_access_deliveries` (varredura da réplica líder) cobre
+esse caso criando as linhas que faltam para assinaturas aprovadas recentes.
+
+O webhook roda na thread do Flask e chama `put(evento)` em
+AccessDeliveryBridge (interface de queue.Queue). O evento entra numa
+asyncio.Queue pelo `loop.call_soon_threadsafe`; o consumidor garante a linha
+no outbox e acorda o relay, que de outra forma só consulta a tabela a cada
+ACCESS_DELIVERY_POLL_INTERVAL segundos. Handoffs que falham (ex.: banco fora)
+voltam para a fila com backoff. Eventos recebidos antes de `start()` (ou
+depois de `stop()`) ficam guardados e entram na fila quando o bot (re)inicia.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+from database import Database
+from metrics import registry, Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+ACCESS_DELIVERY_WORKERS = 8
+ACCESS_DELIVERY_MAX_ATTEMPTS = 8
+ACCESS_DELIVERY_BASE_DELAY = 2.0  # segundos; dobra a cada tentativa
+ACCESS_DELIVERY_MAX_DELAY = 5 * 60  # segundos
+ACCESS_DELIVERY_BATCH_SIZE = 32
+ACCESS_DELIVERY_LEASE = 2 * 60  # segundos que uma réplica tem para entregar um lote reservado
+ACCESS_DELIVERY_POLL_INTERVAL = 10  # segundos sem aviso do webhook antes de consultar a tabela
+ACCESS_DELIVERY_RETENTION_DAYS = 7  # linhas entregues mantidas para auditoria
+ACCESS_DELIVERY_DEDUP_WINDOW = 60 * 60  # segundos; eventos sem payment_id vindos do webhook
+ACCESS_DELIVERY_BACKFILL_WINDOW = 24 * 60 * 60  # segundos; assinaturas mais antigas não são recuperadas
+ACCESS_DELIVERY_BACKFILL_GRACE = 60  # segundos para o handoff normal do webhook gravar a linha
+# Marcador em bot_schema_markers gravado quando o outbox passa a valer (ensure_schema no bot.py)
+ACCESS_DELIVERY_MARKER = 'access_delivery_outbox'
+
+DELIVERIES = Counter(registry, 'bot_access_deliveries_total', 'Tentativas de entrega de acesso VIP por resultado', ['result'])
+DELIVERY_LAG = Histogram(
+    registry, 'bot_access_delivery_lag_seconds', 'Tempo entre a aprovação (linha no outbox) e a entrega do acesso',
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+)
+OUTBOX_PENDING = Gauge(registry, 'bot_access_outbox_pending', 'Linhas pendentes em access_delivery_outbox')
+OUTBOX_OLDEST_AGE = Gauge(registry, 'bot_access_outbox_oldest_pending_seconds', 'Idade da linha pendente mais antiga do outbox')
+HANDOFFS = Counter(registry, 'bot_access_delivery_handoffs_total', 'Eventos do webhook passados ao outbox por resultado', ['result'])
+QUEUE_DEPTH = Gauge(registry, 'bot_access_delivery_queue_depth', 'Eventos do webhook aguardando registro no outbox')
+RETRY_PENDING = Gauge(registry, 'bot_access_delivery_retry_pending', 'Eventos do webhook aguardando o backoff para nova tentativa')
+
+
+def backoff_delay(attempt, base_delay=ACCESS_DELIVERY_BASE_DELAY, max_delay=ACCESS_DELIVERY_MAX_DELAY):
+    """Espera antes da tentativa seguinte à `attempt`: exponencial com jitter de até 50%"""
+    delay = min(base_delay * 2 ** (attempt - 1), max_delay)
+    return delay * (1 + random.random() / 2)
+
+
+# ----- outbox (MySQL) -----
+
+def enqueue_access_delivery(cursor, user_id, plan_id, payment_id):
+    """Grava a entrega no outbox usando o cursor da transação de aprovação"""
+    cursor.execute(
+        """INSERT INTO access_delivery_outbox (user_id, plan_id, payment_id)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE id = id""",
+        (user_id, plan_id, payment_id)
+    )
+
+
+def record_access_delivery_event(event):
+    """Garante a linha no outbox para um evento recebido fora da transação de aprovação.
+
+    Com payment_id a chave única evita duplicatas. Sem ele, a linha só é criada
+    se o usuário não tiver entrega do mesmo plano registrada na última hora
+    (normalmente gravada pela própria aprovação).
+    """
+    db = Database()
+    try:
+        db.connect()
+        if not db.connection:
+            raise RuntimeError("sem conexão com o banco de dados")
+        with db.transaction() as cursor:
+            if event.get('payment_id'):
+                enqueue_access_delivery(cursor, event['user_id'], event['plan_id'], str(event['payment_id']))
+            else:
+                cursor.execute(
+                    """INSERT INTO access_delivery_outbox (user_id, plan_id)
+                    SELECT %s, %s FROM DUAL
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM access_delivery_outbox
+                        WHERE user_id = %s AND plan_id = %s
+                        AND created_at > NOW(3) - INTERVAL %s SECOND
+                    )""",
+                    (event['user_id'], event['plan_id'], event['user_id'], event['plan_id'], ACCESS_DELIVERY_DEDUP_WINDOW)
+                )
+    finally:
+        db.close()
+
+
+def backfill_access_deliveries(window=ACCESS_DELIVERY_BACKFILL_WINDOW, grace=ACCESS_DELIVERY_BACKFILL_GRACE):
+    """Cria linhas no outbox para assinaturas aprovadas que não têm entrega registrada; retorna quantas.
+
+    Cobre aprovações gravadas fora de `apply_approved_payment` (webhook_cnpay)
+    cujo evento se perdeu antes de chegar ao outbox. Só considera assinaturas
+    dos últimos `window` segundos e posteriores ao marcador ACCESS_DELIVERY_MARKER
+    (sem ele, nenhuma), para não reenviar links de compras antigas, e ignora as
+    dos últimos `grace` segundos.
+    Uma linha sem payment_id do mesmo usuário e plano (evento do webhook) também
+    conta como entrega registrada.
+    """
+    db = Database()
+    try:
+        db.connect()
+        if not db.connection:
+            return 0
+        with db.transaction() as cursor:
+            cursor.execute(
+                """INSERT INTO access_delivery_outbox (user_id, plan_id, payment_id)
+                SELECT s.user_id, s.plan_id, s.payment_id
+                FROM subscriptions s
+                LEFT JOIN access_delivery_outbox o ON o.payment_id = s.payment_id
+                WHERE o.id IS NULL
+                AND s.payment_status = 'approved'
+                AND s.payment_id IS NOT NULL
+                AND s.start_date > NOW() - INTERVAL %s SECOND
+                AND s.start_date <= NOW() - INTERVAL %s SECOND
+                AND s.start_date >= (
+                    SELECT created_at FROM bot_schema_markers WHERE name = %s
+                )
+                AND NOT EXISTS (
+                    SELECT 1 FROM access_delivery_outbox w
+                    WHERE w.payment_id IS NULL AND w.user_id = s.user_id AND w.plan_id = s.plan_id
+                    AND w.created_at >= s.start_date - INTERVAL %s SECOND
+                )
+                ON DUPLICATE KEY UPDATE access_delivery_outbox.id = access_delivery_outbox.id""",
+                (window, grace, ACCESS_DELIVERY_MARKER, grace)
+            )
+            return cursor.rowcount
+    finally:
+        db.close()
+
+
+def claim_access_deliveries(limit=ACCESS_DELIVERY_BATCH_SIZE, lease=ACCESS_DELIVERY_LEASE):
+    """Reserva até `limit` entregas pendentes; outras réplicas pulam as linhas travadas.
+
+    A reserva é um lease: available_at vai para o futuro e a transação termina
+    antes da entrega, sem segurar locks durante as chamadas ao Telegram.
+    """
+    db = Database()
+    try:
+        db.connect()
+        if not db.connection:
+            raise RuntimeError("sem conexão com o banco de dados")
+        with db.transaction() as cursor:
+            cursor.execute(
+                """SELECT id, user_id, plan_id, payment_id, attempts + 1 AS attempts,
+                    TIMESTAMPDIFF(MICROSECOND, created_at, NOW(3)) / 1000000 AS age
+                FROM access_delivery_outbox
+                WHERE status = 'pending' AND available_at <= NOW(3)
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED""",
+                (limit,)
+            )
+            rows = cursor.fetchall()
+            if rows:
+                placeholders = ', '.join(['%s'] * len(rows))
+                cursor.execute(
+                    f"""UPDATE access_delivery_outbox
+                    SET attempts = attempts + 1, available_at = NOW(3) + INTERVAL %s SECOND
+                    WHERE id IN ({placeholders})""",
+                    (lease, *(row['id'] for row in rows))
+                )
+            return rows
+    finally:
+        db.close()
+
+
+def complete_access_deliveries(done, retry, failed):
+    """Fecha um lote: `done` = [id]; `retry` = [(id, atraso em s, erro)]; `failed` = [(id, erro)]"""
+    db = Database()
+    try:
+        db.connect()
+        if not db.connection:
+            raise RuntimeError("sem conexão com o banco de dados")
+        with db.transaction() as cursor:
+            if done:
+                placeholders = ', '.join(['%s'] * len(done))
+                cursor.execute(
+                    f"""UPDATE access_delivery_outbox
+                    SET status = 'done', delivered_at = NOW(3), last_error = NULL
+                    WHERE id IN ({placeholders})""",
+                    tuple(done)
+                )
+            if retry:
+                cursor.executemany(
+                    """UPDATE access_delivery_outbox
+                    SET available_at = NOW(3) + INTERVAL %s SECOND, last_error = %s
+                    WHERE id = %s""",
+                    [(delay, error, row_id) for row_id, delay, error in retry]
+                )
+            if failed:
+                cursor.executemany(
+                    "UPDATE access_delivery_outbox SET status = 'failed', last_error = %s WHERE id = %s",
+                    [(error, row_id) for row_id, error in failed]
+                )
+    finally:
+        db.close()
+
+
+GROUP_DONE = 'done'
+GROUP_FAILED = 'failed'
+
+
+def access_delivery_group_status(db, delivery_id):
+    """Retorna {group_id: status} dos grupos já registrados para a entrega `delivery_id`"""
+    with db.transaction() as cursor:
+        cursor.execute(
+            "SELECT group_id, status FROM access_delivery_groups WHERE delivery_id = %s",
+            (delivery_id,)
+        )
+        return {row['group_id']: row['status'] for row in cursor.fetchall()}
+
+
+def record_access_delivery_groups(db, delivery_id, outcomes):
+    """Registra o resultado de cada grupo: `outcomes` = [(group_id, GROUP_DONE ou GROUP_FAILED, erro)]"""
+    if not outcomes:
+        return
+    with db.transaction() as cursor:
+        cursor.executemany(
+            """INSERT INTO access_delivery_groups (delivery_id, group_id, status, last_error)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE status = VALUES(status), last_error = VALUES(last_error)""",
+            [(delivery_id, group_id, status, str(error)[:500] if error else None) for group_id, status, error in outcomes]
+        )
+
+
+def access_delivery_backlog():
+    """Retorna (pendentes, idade em segundos da mais antiga)"""
+    db = Database()
+    try:
+        db.connect()
+        if not db.connection:
+            raise RuntimeError("sem conexão com o banco de dados")
+        row = db.execute_fetch_one(
+            """SELECT COUNT(*) AS pending,
+                COALESCE(TIMESTAMPDIFF(MICROSECOND, MIN(created_at), NOW(3)) / 1000000, 0) AS oldest
+            FROM access_delivery_outbox
+            WHERE status = 'pending'"""
+        )
+        return int(row['pending']), float(row['oldest'])
+    finally:
+        db.close()
+
+
+def prune_access_deliveries(retention_days=ACCESS_DELIVERY_RETENTION_DAYS):
+    """Remove linhas entregues há mais de `retention_days` dias; retorna quantas"""
+    db = Database()
+    try:
+        db.connect()
+        if not db.connection:
+            return 0
+        with db.transaction() as cursor:
+            cursor.execute(
+                """DELETE FROM access_delivery_outbox
+                WHERE status = 'done' AND delivered_at < NOW() - INTERVAL %s DAY""",
+                (retention_days,)
+            )
+            return cursor.rowcount
+    finally:
+        db.close()
+
+
+class AccessDeliveryRelay:
+    """Consome o outbox: reserva lotes, entrega em paralelo e registra o resultado"""
+
+    def __init__(self, batch_size=ACCESS_DELIVERY_BATCH_SIZE, concurrency=ACCESS_DELIVERY_WORKERS,
+                 lease=ACCESS_DELIVERY_LEASE, poll_interval=ACCESS_DELIVERY_POLL_INTERVAL,
+                 max_attempts=ACCESS_DELIVERY_MAX_ATTEMPTS):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._deliver = None
+        self._wake = None
+        self._task = None
+        self._stats_at = 0.0
+
+    async def start(self, deliver):
+        """`deliver(evento)` é uma corrotina que retorna True se entregou"""
+        self._deliver = deliver
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="access-delivery-relay")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self):
+        """Pede uma consulta imediata ao outbox (chamar no event loop)"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def accept(self, event):
+        """Consumidor da AccessDeliveryBridge: registra o evento no outbox e acorda o relay"""
+        await asyncio.to_thread(record_access_delivery_event, event)
+        self.wake()
+        return True
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                batch = await asyncio.to_thread(claim_access_deliveries, self.batch_size, self.lease)
+            except Exception as e:
+                logger.error(f"❌ Erro ao reservar entregas de acesso no outbox: {e}")
+                batch = []
+            if batch:
+                await self._deliver_batch(batch)
+            await self._update_stats()
+            if len(batch) < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _deliver_batch(self, batch):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(row):
+            started = time.monotonic()
+            async with semaphore:
+                try:
+                    delivered, error = await self._deliver(row), None
+                except Exception as e:
+                    delivered, error = False, e
+            return delivered, error, time.monotonic() - started
+
+        outcomes = await asyncio.gather(*(deliver(row) for row in batch))
+        done, retry, failed = [], [], []
+        for row, (delivered, error, elapsed) in zip(batch, outcomes):
+            reason = str(error)[:500] if error else "entrega não concluída"
+            if delivered:
+                done.append(row['id'])
+                DELIVERIES.inc(result='delivered')
+                DELIVERY_LAG.observe(float(row['age']) + elapsed)
+            elif row['attempts'] < self.max_attempts:
+                delay = backoff_delay(row['attempts'])
+                retry.append((row['id'], round(delay, 3), reason))
+                DELIVERIES.inc(result='retried')
+                logger.warning(
+                    f"⚠️ Entrega de acesso para usuário {row['user_id']} falhou "
+                    f"(tentativa {row['attempts']}/{self.max_attempts}: {reason}); nova tentativa em {delay:.0f}s"
+                )
+            else:
+                failed.append((row['id'], reason))
+                DELIVERIES.inc(result='failed')
+                logger.error(
+                    f"❌ Entrega de acesso para usuário {row['user_id']} (plano {row['plan_id']}) "
+                    f"desistida após {row['attempts']} tentativas",
+                    exc_info=error
+                )
+        try:
+            await asyncio.to_thread(complete_access_deliveries, done, retry, failed)
+        except Exception as e:
+            # As linhas voltam a ficar disponíveis quando o lease vencer
+            logger.error(f"❌ Erro ao registrar resultado de {len(batch)} entrega(s) no outbox: {e}")
+            return
+        if retry:
+            # Não esperar o próximo poll para a primeira nova tentativa
+            asyncio.get_running_loop().call_later(min(delay for _, delay, _ in retry), self.wake)
+
+    async def _update_stats(self):
+        """Atualiza os gauges de pendentes e lag, no máximo uma vez por poll_interval"""
+        now = time.monotonic()
+        if now - self._stats_at < self.poll_interval:
+            return
+        self._stats_at = now
+        try:
+            pending, oldest = await asyncio.to_thread(access_delivery_backlog)
+        except Exception as e:
+            logger.debug(f"Não foi possível medir o backlog do outbox: {e}")
+            return
+        OUTBOX_PENDING.set(pending)
+        OUTBOX_OLDEST_AGE.set(oldest)
+
+
+class _Delivery:
+    __slots__ = ('event', 'attempt')
+
+    def __init__(self, event):
+        self.event = event
+        self.attempt = 1
+
+
+class AccessDeliveryBridge:
+    """Fila thread-safe de eventos de entrega consumida por tarefas do event loop.
+
+    No bot o consumidor é AccessDeliveryRelay.accept: a ponte só leva o evento
+    ao outbox e acorda o relay; quem entrega o acesso é o relay.
+    """
+
+    def __init__(self, workers=ACCESS_DELIVERY_WORKERS, max_attempts=ACCESS_DELIVERY_MAX_ATTEMPTS,
+                 base_delay=ACCESS_DELIVERY_BASE_DELAY, max_delay=ACCESS_DELIVERY_MAX_DELAY):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._loop = None
+        self._queue = None
+        self._deliver = None
+        self._tasks = []
+        self._retries = {}  # TimerHandle -> _Delivery
+        self._backlog = deque()  # eventos recebidos sem event loop ativo
+        registry.add_collector(self._collect)
+
+    # ----- lado das threads (webhook) -----
+
+    def put(self, event, block=True, timeout=None):
+        """Enfileira um evento {'user_id', 'plan_id', ...}; seguro em qualquer thread"""
+        delivery = _Delivery(event)
+        with self._lock:
+            loop = self._loop
+            if loop is None:
+                self._backlog.append(delivery)
+                return
+        try:
+            loop.call_soon_threadsafe(self._enqueue, delivery)
+        except RuntimeError:
+            # Loop fechado entre a leitura e a chamada: fica para o próximo start()
+            with self._lock:
+                self._backlog.append(delivery)
+
+    put_nowait = put
+
+    def qsize(self):
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return queued + len(self._backlog) + len(self._retries)
+
+    def empty(self):
+        return self.qsize() == 0
+
+    # ----- lado do event loop -----
+
+    async def start(self, deliver):
+        """Inicia os consumidores; `deliver(evento)` é uma corrotina que retorna True se aceitou o evento"""
+        self._deliver = deliver
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"access-delivery-{index}")
+            for index in range(self.workers)
+        ]
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            backlog, self._backlog = self._backlog, deque()
+        for delivery in backlog:
+            self._enqueue(delivery)
+        if backlog:
+            logger.info(f"📬 {len(backlog)} entrega(s) de acesso recebidas antes do início enfileiradas")
+
+    async def stop(self):
+        """Para os consumidores; o que não foi entregue volta para o backlog"""
+        with self._lock:
+            self._loop = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        leftover = list(self._retries.values())
+        for handle in self._retries:
+            handle.cancel()
+        self._retries = {}
+        while self._queue is not None and not self._queue.empty():
+            leftover.append(self._queue.get_nowait())
+        with self._lock:
+            self._backlog.extend(leftover)
+        if leftover:
+            logger.warning(f"⚠️ {len(leftover)} entrega(s) de acesso pendentes ao parar")
+
+    def _enqueue(self, delivery):
+        self._queue.put_nowait(delivery)
+
+    def _retry(self, delivery):
+        """Reagenda com backoff exponencial e jitter"""
+        delay = backoff_delay(delivery.attempt, self.base_delay, self.max_delay)
+        delivery.attempt += 1
+        loop = asyncio.get_running_loop()
+        handle = None
+
+        def fire():
+            self._retries.pop(handle, None)
+            self._enqueue(delivery)
+
+        handle = loop.call_later(delay, fire)
+        self._retries[handle] = delivery
+        return delay
+
+    async def _worker(self):
+        while True:
+            delivery = await self._queue.get()
+            event = delivery.event
+            try:
+                delivered = await self._deliver(event)
+                error = None
+            except Exception as e:
+                delivered, error = False, e
+
+            if delivered:
+                HANDOFFS.inc(result='accepted')
+            elif delivery.attempt < self.max_attempts:
+                HANDOFFS.inc(result='retried')
+                delay = self._retry(delivery)
+                logger.warning(
+                    f"⚠️ Evento de acesso do usuário {event.get('user_id')} não registrado "
+                    f"(tentativa {delivery.attempt - 1}/{self.max_attempts}{f': {error}' if error else ''}); "
+                    f"nova tentativa em {delay:.0f}s"
+                )
+            else:
+                HANDOFFS.inc(result='failed')
+                logger.error(
+                    f"❌ Evento de acesso do usuário {event.get('user_id')} (plano {event.get('plan_id')}) "
+                    f"descartado após {delivery.attempt} tentativas",
+                    exc_info=error
+                )
+
+    def _collect(self):
+        QUEUE_DEPTH.set(self._queue.qsize() if self._queue is not None else len(self._backlog))
+        RETRY_PENDING.set(len(self._retries))
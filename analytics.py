@@ -0,0 +1,210 @@
+"""Métricas de receita e retenção dos assinantes VIP.
+
+O histórico de assinaturas fica em um DataFrame em memória; a cada atualização
+só as linhas novas (id maior que o último carregado) são lidas do banco, e as
+métricas são recalculadas de forma vetorizada sobre o frame inteiro.
+
+O histórico (início/fim) de uma assinatura não muda depois de gravado, mas
+`is_active` sim (desativação pelo admin ou na expiração). Por isso, a cada
+atualização, os ids das assinaturas ainda vigentes pelas datas e com
+is_active = TRUE também são relidos (uma consulta do tamanho da base ativa),
+e só elas contam como ativas agora.
+
+numpy e pandas são importados no primeiro cálculo, que já roda fora do event
+loop (asyncio.to_thread), e não na inicialização do bot.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from database import Database
+from exports import iter_frames
+
+logger = logging.getLogger(__name__)
+
+HISTORY_QUERY = """SELECT
+    s.id,
+    s.user_id,
+    s.plan_id,
+    vp.name as plan_name,
+    vp.price,
+    vp.duration_days,
+    s.is_permanent,
+    s.start_date,
+    s.end_date
+FROM subscriptions s
+JOIN vip_plans vp ON s.plan_id = vp.id
+WHERE s.id > %s
+ORDER BY s.id"""
+
+# Assinaturas já carregadas que continuam ativas (is_active pode mudar depois do carregamento)
+ACTIVE_IDS_QUERY = """SELECT id FROM subscriptions
+WHERE id <= %s
+AND is_active = TRUE
+AND (is_permanent = TRUE OR end_date > NOW())"""
+
+ANALYTICS_WINDOW_DAYS = 30  # Janela de churn e renovação
+RENEWAL_GRACE_DAYS = 7  # Renovação aceita até N dias após o vencimento
+COHORT_DAYS = 7  # Quantos cohorts diários mostrar
+ANALYTICS_CACHE_TTL = 60  # segundos
+ANALYTICS_BATCH_SIZE = 50000
+
+
+def empty_metrics():
+    return {
+        'active_users': 0,
+        'mrr': 0.0,
+        'churn_rate': 0.0,
+        'churned_users': 0,
+        'renewal_rate': 0.0,
+        'ended_subscriptions': 0,
+        'ltv_by_plan': [],
+        'cohorts': []
+    }
+
+
+def compute_metrics(df, now, window_days=ANALYTICS_WINDOW_DAYS, grace_days=RENEWAL_GRACE_DAYS, cohort_days=COHORT_DAYS):
+    """Calcula MRR, churn, taxa de renovação, LTV por plano e cohorts diários.
+
+    `df` tem as colunas de HISTORY_QUERY e, opcionalmente, `is_active` (sem ela,
+    toda assinatura vigente pelas datas conta como ativa). Função pura: não
+    acessa o banco.
+    """
+    if df is None or df.empty:
+        return empty_metrics()
+
+    import numpy as np
+    import pandas as pd
+
+    now = pd.Timestamp(now)
+    window_start = now - timedelta(days=window_days)
+    start = df['start_date']
+    end = df['end_date']
+    permanent = df['is_permanent'].fillna(0).astype(bool)
+    duration = df['duration_days'].fillna(0)
+    price = df['price'].fillna(0.0)
+
+    # === Assinantes ativos e MRR ===
+    # Cada usuário conta uma vez, pela assinatura ativa mais recente
+    active = (start <= now) & (permanent | (end > now))
+    if 'is_active' in df:
+        active &= df['is_active'].fillna(True).astype(bool)
+    monthly_price = pd.Series(
+        np.where(permanent | (duration <= 0), 0.0, price / duration.where(duration > 0, 1) * 30),
+        index=df.index
+    )
+    active_latest = (
+        df.loc[active, ['user_id', 'start_date', 'id']]
+        .assign(monthly_price=monthly_price[active])
+        .sort_values(['start_date', 'id'])
+        .drop_duplicates('user_id', keep='last')
+    )
+    active_user_ids = active_latest['user_id'].to_numpy()
+
+    # === Churn: ativos no início da janela que não estão ativos agora ===
+    was_active = (start <= window_start) & (permanent | (end > window_start))
+    users_at_start = df.loc[was_active, 'user_id'].unique()
+    churned = np.setdiff1d(users_at_start, active_user_ids)
+
+    # === Renovação: assinaturas vencidas na janela seguidas de outra do mesmo usuário ===
+    ordered = df.sort_values(['user_id', 'start_date', 'id'])
+    next_start = ordered.groupby('user_id')['start_date'].shift(-1)
+    ended = ~permanent[ordered.index] & (ordered['end_date'] > window_start) & (ordered['end_date'] <= now)
+    renewed = next_start.notna() & (next_start <= ordered['end_date'] + timedelta(days=grace_days))
+
+    # === LTV por plano de entrada e cohorts diários ===
+    first = ordered.groupby('user_id').first()
+    revenue = ordered.groupby('user_id')['price'].sum()
+    ltv = (
+        pd.DataFrame({'plan_name': first['plan_name'], 'revenue': revenue})
+        .groupby('plan_name')['revenue']
+        .agg(['mean', 'size'])
+        .sort_values('mean', ascending=False)
+    )
+
+    first_day = first['start_date'].dt.normalize()
+    cohort_start = now.normalize() - timedelta(days=cohort_days - 1)
+    recent = first_day >= cohort_start
+    cohorts = (
+        pd.DataFrame({'day': first_day[recent], 'active': first.index[recent].isin(active_user_ids)})
+        .groupby('day')['active']
+        .agg(['size', 'sum'])
+        .sort_index(ascending=False)
+    )
+
+    return {
+        'active_users': int(len(active_latest)),
+        'mrr': float(active_latest['monthly_price'].sum()),
+        'churn_rate': float(len(churned) / len(users_at_start)) if len(users_at_start) else 0.0,
+        'churned_users': int(len(churned)),
+        'renewal_rate': float(renewed[ended].mean()) if ended.any() else 0.0,
+        'ended_subscriptions': int(ended.sum()),
+        'ltv_by_plan': [
+            {'plan_name': plan_name, 'ltv': float(row['mean']), 'users': int(row['size'])}
+            for plan_name, row in ltv.iterrows()
+        ],
+        'cohorts': [
+            {'day': day.to_pydatetime(), 'users': int(row['size']), 'active': int(row['sum'])}
+            for day, row in cohorts.iterrows()
+        ]
+    }
+
+
+class SubscriptionAnalytics:
+    """Mantém o histórico de assinaturas em memória e as métricas em cache"""
+
+    def __init__(self, ttl=ANALYTICS_CACHE_TTL):
+        self.ttl = ttl
+        self.frame = None
+        self.last_id = 0
+        self._metrics = None
+        self._computed_at = 0
+        self._lock = threading.Lock()
+
+    def _load_new_rows(self):
+        """Carrega do banco as assinaturas com id maior que o último carregado e atualiza is_active"""
+        import pandas as pd
+
+        db = Database()
+        try:
+            db.connect()
+            if not db.connection:
+                logger.error("Erro ao conectar ao banco de dados para analytics")
+                return 0
+
+            frames = list(iter_frames(db.iter_batches(HISTORY_QUERY, (self.last_id,), batch_size=ANALYTICS_BATCH_SIZE)))
+            new_rows = (pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]) if frames else None
+            if self.frame is None:
+                self.frame = new_rows
+            elif new_rows is not None and not new_rows.empty:
+                self.frame = pd.concat([self.frame, new_rows], ignore_index=True)
+            if new_rows is not None and not new_rows.empty:
+                self.last_id = int(new_rows['id'].max())
+
+            if self.frame is not None:
+                active_ids = [row['id'] for row in db.iter_fetch(ACTIVE_IDS_QUERY, (self.last_id,))]
+                self.frame['is_active'] = self.frame['id'].isin(active_ids)
+            return 0 if new_rows is None else len(new_rows)
+        finally:
+            db.close()
+
+    def summary(self):
+        """Retorna as métricas, recalculando no máximo uma vez por `ttl` segundos.
+
+        Bloqueante: no bot, chamar com asyncio.to_thread.
+        """
+        with self._lock:
+            if self._metrics is not None and time.monotonic() - self._computed_at < self.ttl:
+                return self._metrics
+
+            new_rows = self._load_new_rows()
+            if new_rows:
+                logger.info(f"Analytics: {new_rows} nova(s) assinatura(s) carregada(s)")
+            self._metrics = compute_metrics(self.frame, datetime.now())
+            self._computed_at = time.monotonic()
+            return self._metrics
+
+
+subscription_analytics = SubscriptionAnalytics()
@@ -0,0 +1,76 @@
+"""Custo de importação do bot.py (tempo até o processo poder iniciar o polling).
+
+Roda `python -X importtime -c "import bot"` em processos novos, mostra o menor
+tempo total e os módulos mais caros da execução mais rápida, e falha (código 1)
+se o total passar do orçamento ou se algum módulo pesado que deve ser
+carregado sob demanda (exportações, MercadoPago, QR code, Flask) aparecer na
+importação.
+
+Exemplos:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 10 --top 25 --budget 0.8
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+# Carregados só no primeiro uso (exportação, MercadoPago habilitado, checkout, thread do Flask)
+LAZY_MODULES = ('pandas', 'numpy', 'openpyxl', 'mercadopago', 'qrcode', 'PIL', 'flask')
+DEFAULT_BUDGET = 1.0  # segundos
+
+
+def import_profile(module):
+    """Executa a importação em um processo novo; retorna [(módulo, cumulativo em s)]"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=REPO_ROOT, capture_output=True, text=True, env=dict(os.environ, PYTHONDONTWRITEBYTECODE='1'),
+    )
+    if result.returncode != 0:
+        sys.exit(f'Falha ao importar {module}:\n{result.stderr}')
+    profile = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|', 2)
+        if cumulative.strip().isdigit():
+            profile.append((name.strip(), int(cumulative) / 1e6))
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Custo de importação do bot.py')
+    parser.add_argument('--module', default='bot')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='módulos mais caros a listar')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET, help='tempo máximo aceito, em segundos')
+    args = parser.parse_args()
+
+    # A primeira execução também aquece o cache de bytecode
+    import_profile(args.module)
+    runs = [import_profile(args.module) for _ in range(args.runs)]
+    fastest = min(runs, key=lambda profile: profile[-1][1])
+    total = fastest[-1][1]
+
+    print(f'import {args.module}: {total * 1000:.0f} ms (menor de {args.runs} execuções)')
+    for name, cumulative in sorted(fastest, key=lambda item: item[1], reverse=True)[1:args.top + 1]:
+        print(f'  {cumulative * 1000:8.1f} ms  {name}')
+
+    loaded = {name.split('.')[0] for name, _ in fastest}
+    eager = [module for module in LAZY_MODULES if module in loaded]
+    failures = []
+    if eager:
+        failures.append(f'módulos que deveriam ser carregados sob demanda: {", ".join(eager)}')
+    if total > args.budget:
+        failures.append(f'{total:.2f}s acima do orçamento de {args.budget:.2f}s')
+    if failures:
+        print('⚠️ ' + '; '.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Gateway CNPay falso: recebe cobranças PIX e gera os callbacks de aprovação.
+
+A resposta da cobrança segue o formato lido por CNPayProvider._process_success_response.
+O corpo do callback (`approval_payload`) segue o webhook do CNPay; ajuste aqui
+se o endpoint do webhook_cnpay esperar outro formato.
+"""
+
+import base64
+import io
+import itertools
+import threading
+import time
+from datetime import datetime
+
+import qrcode
+from flask import Flask, jsonify, request
+
+CHARGE_PATH = '/api/v1/gateway/pix/receive'
+PIX_CODE = '00020101021226800014br.gov.bcb.pix2558loadtest.invalid/qr/v2/cob/loadtest520400005303986540519.905802BR5908LOADTEST6009SAO PAULO62070503***6304ABCD'
+
+
+def _qr_base64(code):
+    buffer = io.BytesIO()
+    qrcode.make(code).save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+class FakeCNPay:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.charges = {}  # user_id -> dados da última cobrança
+        self.charge_count = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # Gerado uma vez: o custo do QR fica fora da medição
+        self._qr_base64 = _qr_base64(PIX_CODE)
+
+        self.app = Flask(__name__)
+        self.app.add_url_rule(CHARGE_PATH, 'charge', self.charge, methods=['POST'])
+
+    def charge(self):
+        if self.latency:
+            time.sleep(self.latency)
+        payload = request.get_json(force=True, silent=True) or {}
+        transaction_id = f'lt_{next(self._ids)}'
+        metadata = payload.get('metadata') or {}
+        with self._lock:
+            self.charge_count += 1
+            self.charges[int(metadata.get('user_id') or 0)] = {
+                'transaction_id': transaction_id,
+                'identifier': payload.get('identifier'),
+                'amount': payload.get('amount'),
+                'callback_url': payload.get('callbackUrl'),
+                'metadata': metadata,
+            }
+        return jsonify({
+            'transactionId': transaction_id,
+            'status': 'OK',
+            'pix': {'code': PIX_CODE, 'base64': self._qr_base64, 'image': None},
+            'order': {'id': transaction_id, 'url': None},
+        }), 201
+
+    def charge_for(self, user_id):
+        with self._lock:
+            return self.charges.get(user_id)
+
+
+def approval_payload(charge):
+    return {
+        'event': 'TRANSACTION_PAID',
+        'transaction': {
+            'id': charge['transaction_id'],
+            'identifier': charge['identifier'],
+            'status': 'COMPLETED',
+            'paymentMethod': 'PIX',
+            'amount': charge['amount'],
+            'payedAt': datetime.now().isoformat(),
+            'metadata': charge['metadata'],
+        },
+    }
@@ -0,0 +1,195 @@
+"""Servidor falso da Bot API do Telegram para o teste de carga.
+
+Responde aos métodos usados pelo bot.py com objetos mínimos válidos para o
+PTB, entrega updates por getUpdates (long polling) e registra cada chamada.
+Quem dirige o teste registra expectativas por chat (`expect`) e recebe a
+chamada correspondente num Future do seu event loop.
+"""
+
+import itertools
+import json
+import queue
+import threading
+import time
+
+from flask import Flask, jsonify, request
+
+BOT_ID = 900000001
+
+MESSAGE_METHODS = frozenset({
+    'sendMessage', 'sendPhoto', 'sendVideo', 'sendVideoNote', 'sendDocument', 'sendAnimation',
+    'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup',
+})
+
+
+def _json_param(params, name):
+    value = params.get(name)
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def callback_buttons(call):
+    """callback_data dos botões inline de uma chamada registrada"""
+    markup = call.get('reply_markup') or {}
+    return [
+        button['callback_data']
+        for row in markup.get('inline_keyboard', [])
+        for button in row
+        if button.get('callback_data')
+    ]
+
+
+class FakeTelegram:
+    def __init__(self, token, latency=0.0):
+        self.token = token
+        self.latency = latency
+        self.updates = queue.Queue()
+        self.method_counts = {}
+        self.bot_user = {
+            'id': BOT_ID, 'is_bot': True, 'first_name': 'LoadTest', 'username': 'loadtest_bot',
+            'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': False,
+        }
+        self.ready = threading.Event()  # primeiro getUpdates/setWebhook: o bot está de pé
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._invite_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._waiters = {}  # chat_id -> [(predicado, future, loop)]
+
+        self.app = Flask(__name__)
+        self.app.add_url_rule('/bot<token>/<method>', 'bot_api', self.view, methods=['GET', 'POST'])
+
+    # ----- lado do driver -----
+
+    def push_update(self, update):
+        update['update_id'] = next(self._update_ids)
+        self.updates.put(update)
+        return update
+
+    def next_update_id(self):
+        return next(self._update_ids)
+
+    def expect(self, chat_id, predicate, loop):
+        """Future resolvido com a primeira chamada ao chat que satisfizer o predicado"""
+        future = loop.create_future()
+        with self._lock:
+            self._waiters.setdefault(chat_id, []).append((predicate, future, loop))
+        return future
+
+    def forget(self, chat_id):
+        with self._lock:
+            self._waiters.pop(chat_id, None)
+
+    # ----- lado do bot -----
+
+    def _record(self, call):
+        matched = []
+        with self._lock:
+            self.method_counts[call['method']] = self.method_counts.get(call['method'], 0) + 1
+            waiters = self._waiters.get(call['chat_id'])
+            if waiters:
+                for waiter in list(waiters):
+                    if waiter[0](call):
+                        waiters.remove(waiter)
+                        matched.append(waiter)
+        for _, future, loop in matched:
+            loop.call_soon_threadsafe(_resolve, future, call)
+
+    def _message(self, chat_id, params, method):
+        message = {
+            'message_id': int(params.get('message_id') or next(self._message_ids)),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'supergroup'},
+            'from': self.bot_user,
+        }
+        text = params.get('text')
+        if text is not None:
+            message['text'] = text
+        if params.get('caption') is not None:
+            message['caption'] = params['caption']
+        if method == 'sendPhoto':
+            message['photo'] = [{'file_id': 'photo', 'file_unique_id': 'photo', 'width': 1, 'height': 1}]
+        markup = _json_param(params, 'reply_markup')
+        if isinstance(markup, dict) and 'inline_keyboard' in markup:
+            message['reply_markup'] = markup
+        return message
+
+    def _get_updates(self, params):
+        timeout = float(params.get('timeout') or 0)
+        limit = int(params.get('limit') or 100)
+        self.ready.set()
+        try:
+            batch = [self.updates.get(timeout=timeout) if timeout else self.updates.get_nowait()]
+        except queue.Empty:
+            return []
+        while len(batch) < limit:
+            try:
+                batch.append(self.updates.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _result(self, method, params, chat_id):
+        if method == 'getUpdates':
+            return self._get_updates(params)
+        if method == 'getMe':
+            return self.bot_user
+        if method in ('setWebhook', 'deleteWebhook'):
+            if method == 'setWebhook':
+                self.ready.set()
+            return True
+        if method in MESSAGE_METHODS:
+            return self._message(chat_id, params, method)
+        if method == 'getChat':
+            return {'id': chat_id, 'type': 'private' if chat_id > 0 else 'supergroup', 'title': f'Chat {chat_id}'}
+        if method == 'getChatMember':
+            return {
+                'status': 'administrator', 'user': self.bot_user, 'can_be_edited': False, 'is_anonymous': False,
+                'can_manage_chat': True, 'can_delete_messages': True, 'can_manage_video_chats': True,
+                'can_restrict_members': True, 'can_promote_members': False, 'can_change_info': True,
+                'can_invite_users': True,
+            }
+        if method == 'getChatMemberCount':
+            return 1
+        if method == 'createChatInviteLink':
+            link = {
+                'invite_link': f'https://t.me/+loadtest{next(self._invite_ids)}', 'creator': self.bot_user,
+                'creates_join_request': False, 'is_primary': False, 'is_revoked': False,
+            }
+            if params.get('expire_date'):
+                link['expire_date'] = int(params['expire_date'])
+            if params.get('member_limit'):
+                link['member_limit'] = int(params['member_limit'])
+            return link
+        return True
+
+    def view(self, token, method):
+        if token != self.token:
+            return jsonify({'ok': False, 'error_code': 401, 'description': 'Unauthorized'}), 401
+        params = request.get_json(silent=True) or request.values.to_dict()
+        try:
+            chat_id = int(params.get('chat_id') or 0)
+        except ValueError:
+            chat_id = 0
+        if self.latency and method != 'getUpdates':
+            time.sleep(self.latency)
+        result = self._result(method, params, chat_id)
+        if method != 'getUpdates':
+            self._record({
+                'ts': time.perf_counter(),
+                'method': method,
+                'chat_id': chat_id,
+                'text': params.get('text') or params.get('caption') or '',
+                'reply_markup': _json_param(params, 'reply_markup') or {},
+                'result': result,
+            })
+        return jsonify({'ok': True, 'result': result})
+
+
+def _resolve(future, call):
+    if not future.done():
+        future.set_result(call)
@@ -0,0 +1,205 @@
+"""Jornadas de usuário do teste de carga e agregação das latências.
+
+Cada usuário virtual percorre start -> plano -> pix -> aprovação (webhook) -> vip.
+A latência de um passo vai do envio do update (ou do callback do CNPay) até a
+chamada da Bot API que o conclui, registrada pelo FakeTelegram.
+"""
+
+import asyncio
+import itertools
+import time
+
+import httpx
+
+from callback_codec import decode_callback
+from fake_cnpay import approval_payload
+from fake_telegram import callback_buttons
+
+STEPS = ('start', 'plan', 'pix', 'approve', 'vip')
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class StepStats:
+    def __init__(self):
+        self.latencies = {step: [] for step in STEPS}
+        self.timeouts = {step: 0 for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+        self.completed = 0
+        self.started = 0
+
+    def summary(self, elapsed):
+        rows = []
+        for step in STEPS:
+            latencies = self.latencies[step]
+            rows.append({
+                'step': step,
+                'ok': len(latencies),
+                'timeouts': self.timeouts[step],
+                'errors': self.errors[step],
+                'per_second': len(latencies) / elapsed if elapsed else 0.0,
+                'p50_ms': _ms(percentile(latencies, 0.50)),
+                'p95_ms': _ms(percentile(latencies, 0.95)),
+                'p99_ms': _ms(percentile(latencies, 0.99)),
+                'max_ms': _ms(max(latencies) if latencies else None),
+            })
+        return rows
+
+
+def _ms(value):
+    return None if value is None else round(value * 1000, 1)
+
+
+class StepFailed(Exception):
+    pass
+
+
+def _first_action(call, *actions):
+    for data in callback_buttons(call):
+        decoded = decode_callback(data)
+        if decoded and decoded.action in actions:
+            return data
+    return None
+
+
+def _is_failure(call):
+    return call['method'] == 'sendMessage' and call['text'].lstrip().startswith(('❌', '⌛', '🛠️', 'Erro', 'Ocorreu um erro', 'Plano não encontrado'))
+
+
+class LoadDriver:
+    """Gera os updates (por getUpdates ou pelo webhook do bot) e mede cada passo"""
+
+    def __init__(self, telegram, cnpay, step_timeout, webhook_url=None, webhook_secret=None):
+        self.telegram = telegram
+        self.cnpay = cnpay
+        self.step_timeout = step_timeout
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.stats = StepStats()
+        self._callback_ids = itertools.count(1)
+        self._client = None
+
+    async def _send_update(self, update):
+        if self.webhook_url is None:
+            self.telegram.push_update(update)
+            return
+        update['update_id'] = self.telegram.next_update_id()
+        response = await self._client.post(
+            self.webhook_url, json=update,
+            headers={'X-Telegram-Bot-Api-Secret-Token': self.webhook_secret or ''}
+        )
+        response.raise_for_status()
+
+    async def _step(self, name, chat_id, predicate, send, extra=None):
+        """Executa `send` e espera a chamada que conclui o passo; `extra` = passos seguintes já registrados"""
+        loop = asyncio.get_running_loop()
+        future = self.telegram.expect(chat_id, lambda call: predicate(call) or _is_failure(call), loop)
+        sent = time.perf_counter()
+        try:
+            await send()
+            call = await asyncio.wait_for(future, self.step_timeout)
+        except asyncio.TimeoutError:
+            self.stats.timeouts[name] += 1
+            raise StepFailed(name)
+        except Exception:
+            self.stats.errors[name] += 1
+            raise StepFailed(name)
+        if not predicate(call):
+            self.stats.errors[name] += 1
+            raise StepFailed(name)
+        self.stats.latencies[name].append(call['ts'] - sent)
+        return call, sent
+
+    def _user(self, user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': f'Load{user_id % 100000}', 'username': f'load{user_id}'}
+
+    def _command(self, user, text):
+        return {'message': {
+            'message_id': 1, 'date': int(time.time()), 'from': user, 'text': text,
+            'chat': {'id': user['id'], 'type': 'private', 'first_name': user['first_name']},
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}],
+        }}
+
+    def _callback(self, user, message, data):
+        return {'callback_query': {
+            'id': str(next(self._callback_ids)), 'from': user, 'chat_instance': str(user['id']),
+            'message': message, 'data': data,
+        }}
+
+    async def journey(self, user_id):
+        user = self._user(user_id)
+        self.stats.started += 1
+        try:
+            call, _ = await self._step(
+                'start', user_id,
+                lambda c: c['method'] == 'sendMessage' and _first_action(c, 'plan') is not None,
+                lambda: self._send_update(self._command(user, '/start'))
+            )
+            plan_data = _first_action(call, 'plan')
+
+            call, _ = await self._step(
+                'plan', user_id,
+                lambda c: c['method'] == 'editMessageText' and _first_action(c, 'pix_auto') is not None,
+                lambda: self._send_update(self._callback(user, call['result'], plan_data))
+            )
+            pix_data = _first_action(call, 'pix_auto')
+
+            await self._step(
+                'pix', user_id,
+                lambda c: c['method'] == 'sendPhoto',
+                lambda: self._send_update(self._callback(user, call['result'], pix_data))
+            )
+
+            charge = self.cnpay.charge_for(user_id)
+            if not charge or not charge['callback_url']:
+                self.stats.errors['approve'] += 1
+                raise StepFailed('approve')
+
+            # O acesso VIP é medido a partir do mesmo callback de aprovação
+            loop = asyncio.get_running_loop()
+            vip_future = self.telegram.expect(
+                user_id, lambda c: c['method'] == 'sendMessage' and 't.me/+' in c['text'], loop
+            )
+
+            async def approve():
+                response = await self._client.post(charge['callback_url'], json=approval_payload(charge))
+                response.raise_for_status()
+
+            _, approved_at = await self._step(
+                'approve', user_id,
+                lambda c: c['method'] in ('editMessageText', 'editMessageCaption') and 'Aprovado' in c['text'],
+                approve
+            )
+            remaining = max(self.step_timeout - (time.perf_counter() - approved_at), 0.001)
+            try:
+                call = await asyncio.wait_for(vip_future, remaining)
+            except asyncio.TimeoutError:
+                self.stats.timeouts['vip'] += 1
+                raise StepFailed('vip')
+            self.stats.latencies['vip'].append(call['ts'] - approved_at)
+            self.stats.completed += 1
+        except StepFailed:
+            pass
+        finally:
+            self.telegram.forget(user_id)
+
+    async def run(self, first_user_id, users, rate):
+        """Inicia `users` jornadas a `rate` por segundo e espera todas terminarem"""
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+        async with httpx.AsyncClient(timeout=self.step_timeout, limits=limits) as client:
+            self._client = client
+            interval = 1.0 / rate
+            start = time.perf_counter()
+            tasks = []
+            for i in range(users):
+                delay = start + i * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(self.journey(first_user_id + i)))
+            await asyncio.gather(*tasks)
+            return time.perf_counter() - start
@@ -0,0 +1,241 @@
+"""Teste de carga ponta a ponta do bot.py.
+
+Sobe uma Bot API falsa e um CNPay falso neste processo, prepara um banco MySQL
+local de teste e executa o bot.py de verdade (Application, jobs, webhook
+Flask) como subprocesso apontado para eles via TELEGRAM_API_BASE_URL e
+CNPAY_API_URL. Depois dispara jornadas start -> plano -> pix -> aprovação ->
+vip na taxa pedida e imprime vazão e p50/p95/p99 por passo.
+
+Requisitos: MySQL local com o schema do bot num banco dedicado (o nome precisa
+conter "loadtest"; bot_config, vip_plans, vip_groups e plan_groups são
+sobrescritos/semeados) e o ambiente completo do bot.py (db_config,
+webhook_cnpay). O MercadoPago fica desligado: o SDK não permite trocar a URL
+da API, então os pagamentos passam pelo CNPay falso.
+
+Exemplo:
+    python benchmarks/loadtest/run.py --users 500 --rate 25 --mysql-database bot_loadtest
+    python benchmarks/loadtest/run.py --mode webhook --users 2000 --rate 100 --api-latency-ms 40
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+import mysql.connector
+from werkzeug.serving import make_server
+
+HERE = Path(__file__).resolve().parent
+REPO_ROOT = HERE.parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from fake_cnpay import FakeCNPay, CHARGE_PATH  # noqa: E402
+from fake_telegram import FakeTelegram  # noqa: E402
+from journeys import LoadDriver  # noqa: E402
+
+BOT_TOKEN = '900000001:LoadTestTokenLoadTestTokenLoadTest00'
+WEBHOOK_SECRET = 'loadtest-secret'
+PLAN_NAME = 'Loadtest VIP'
+VIP_GROUP_ID = -1009990000001
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Teste de carga ponta a ponta do bot.py')
+    parser.add_argument('--users', type=int, default=200, help='jornadas a executar')
+    parser.add_argument('--rate', type=float, default=20.0, help='novas jornadas por segundo')
+    parser.add_argument('--mode', choices=('polling', 'webhook'), default='polling')
+    parser.add_argument('--step-timeout', type=float, default=30.0, help='segundos de espera por passo')
+    parser.add_argument('--api-latency-ms', type=float, default=0.0, help='latência simulada da Bot API')
+    parser.add_argument('--cnpay-latency-ms', type=float, default=0.0, help='latência simulada do CNPay')
+    parser.add_argument('--max-concurrent-updates', type=int, default=None)
+    parser.add_argument('--cnpay-webhook-path', default='/webhook/cnpay', help='rota do webhook do CNPay no bot')
+    parser.add_argument('--bot-port', type=int, default=18080)
+    parser.add_argument('--mysql-host', default='127.0.0.1')
+    parser.add_argument('--mysql-port', type=int, default=3306)
+    parser.add_argument('--mysql-user', default='root')
+    parser.add_argument('--mysql-password', default='')
+    parser.add_argument('--mysql-database', default='bot_loadtest')
+    parser.add_argument('--json-out', help='grava o relatório em JSON neste arquivo')
+    parser.add_argument('--metrics-out', help='grava o /metrics do bot ao final neste arquivo')
+    parser.add_argument('--keep-workdir', action='store_true', help='mantém o diretório com o log do bot')
+    return parser.parse_args()
+
+
+def serve(app, name):
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name=name, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def seed_database(db_cfg, settings):
+    """Configuração do bot, um plano e um grupo VIP ligados entre si"""
+    connection = mysql.connector.connect(**db_cfg)
+    cursor = connection.cursor()
+    try:
+        for key, (value, config_type) in settings.items():
+            cursor.execute(
+                """INSERT INTO bot_config (config_key, config_value, config_type) VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE config_value = VALUES(config_value), config_type = VALUES(config_type)""",
+                (key, value, config_type)
+            )
+        cursor.execute("SELECT id FROM vip_plans WHERE name = %s", (PLAN_NAME,))
+        row = cursor.fetchone()
+        if row:
+            plan_id = row[0]
+        else:
+            cursor.execute(
+                "INSERT INTO vip_plans (name, price, duration_days, description, is_active) VALUES (%s, %s, %s, %s, 1)",
+                (PLAN_NAME, 19.90, 30, 'Plano do teste de carga')
+            )
+            plan_id = cursor.lastrowid
+        cursor.execute("SELECT id FROM vip_groups WHERE group_id = %s", (VIP_GROUP_ID,))
+        row = cursor.fetchone()
+        if row:
+            group_row_id = row[0]
+        else:
+            cursor.execute(
+                "INSERT INTO vip_groups (group_id, group_name, is_active) VALUES (%s, %s, TRUE)",
+                (VIP_GROUP_ID, 'Loadtest Group')
+            )
+            group_row_id = cursor.lastrowid
+        cursor.execute("SELECT 1 FROM plan_groups WHERE plan_id = %s AND group_id = %s", (plan_id, group_row_id))
+        if not cursor.fetchone():
+            cursor.execute("INSERT INTO plan_groups (plan_id, group_id) VALUES (%s, %s)", (plan_id, group_row_id))
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def bot_settings(cnpay_url, bot_url, args):
+    payment_methods = {
+        'pix_automatico': {'enabled': True},
+        'pix_manual': {'enabled': False, 'chave_pix': '', 'nome_titular': ''},
+    }
+    return {
+        'bot_token': (BOT_TOKEN, 'string'),
+        'admin_user': ('loadtest_admin', 'string'),
+        'admin_settings': (json.dumps({'maintenance_mode': False}), 'json'),
+        'payment_methods': (json.dumps(payment_methods), 'json'),
+        'mercadopago_enabled': ('false', 'boolean'),
+        'cnpay_enabled': ('true', 'boolean'),
+        'pix_provider': ('cnpay', 'string'),
+        'cnpay_api_key': ('pk_loadtest', 'string'),
+        'cnpay_api_secret': ('sk_loadtest', 'string'),
+        'cnpay_environment': ('sandbox', 'string'),
+        'cnpay_api_url': (cnpay_url + CHARGE_PATH, 'string'),
+        'cnpay_webhook_url': (bot_url + args.cnpay_webhook_path, 'string'),
+    }
+
+
+def start_bot(args, workdir, db_cfg, telegram_url, bot_url):
+    (workdir / 'config_demo.json').write_text(json.dumps({'database': db_cfg}), encoding='utf-8')
+    env = dict(
+        os.environ,
+        TELEGRAM_API_BASE_URL=telegram_url,
+        PORT=str(args.bot_port),
+        LOG_FORMAT='json',
+        PYTHONUNBUFFERED='1',
+    )
+    if args.max_concurrent_updates:
+        env['MAX_CONCURRENT_UPDATES'] = str(args.max_concurrent_updates)
+    if args.mode == 'webhook':
+        env['TELEGRAM_WEBHOOK_URL'] = bot_url
+        env['TELEGRAM_WEBHOOK_SECRET'] = WEBHOOK_SECRET
+    else:
+        env.pop('TELEGRAM_WEBHOOK_URL', None)
+    log = open(workdir / 'bot.log', 'wb')
+    # cwd = workdir: o Database lê config_demo.json do diretório atual
+    return subprocess.Popen([sys.executable, str(REPO_ROOT / 'bot.py')], cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def stop_bot(process):
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def print_report(report):
+    print()
+    print(f"Modo {report['mode']}: {report['completed']}/{report['users']} jornadas completas "
+          f"em {report['elapsed_s']:.1f}s ({report['journeys_per_second']:.1f} jornadas/s, taxa pedida {report['rate']}/s)")
+    print(f"{'passo':<8} {'ok':>7} {'timeout':>8} {'erro':>6} {'por s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for row in report['steps']:
+        cells = [row[key] if row[key] is not None else '-' for key in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms')]
+        print(f"{row['step']:<8} {row['ok']:>7} {row['timeouts']:>8} {row['errors']:>6} {row['per_second']:>8.1f} "
+              + ' '.join(f'{cell:>9}' for cell in cells))
+    print(f"Chamadas à Bot API: {json.dumps(report['api_calls'], sort_keys=True)}")
+    print(f"Cobranças no CNPay falso: {report['cnpay_charges']}")
+
+
+def main():
+    args = parse_args()
+    if 'loadtest' not in args.mysql_database:
+        sys.exit('O banco do teste de carga precisa ter "loadtest" no nome (ele é sobrescrito).')
+
+    telegram = FakeTelegram(BOT_TOKEN, latency=args.api_latency_ms / 1000)
+    cnpay = FakeCNPay(latency=args.cnpay_latency_ms / 1000)
+    telegram_server, telegram_url = serve(telegram.app, 'fake-telegram')
+    cnpay_server, cnpay_url = serve(cnpay.app, 'fake-cnpay')
+    bot_url = f'http://127.0.0.1:{args.bot_port}'
+
+    db_cfg = {
+        'host': args.mysql_host, 'port': args.mysql_port, 'user': args.mysql_user,
+        'password': args.mysql_password, 'database': args.mysql_database,
+    }
+    seed_database(db_cfg, bot_settings(cnpay_url, bot_url, args))
+
+    workdir = Path(tempfile.mkdtemp(prefix='bot-loadtest-'))
+    process = start_bot(args, workdir, db_cfg, telegram_url, bot_url)
+    try:
+        if not telegram.ready.wait(90) or process.poll() is not None:
+            args.keep_workdir = True
+            sys.exit(f'O bot não ficou pronto; veja {workdir / "bot.log"}')
+        print(f'Bot pronto ({args.mode}); log em {workdir / "bot.log"}')
+
+        webhook_url = bot_url + '/telegram/webhook' if args.mode == 'webhook' else None
+        driver = LoadDriver(telegram, cnpay, args.step_timeout, webhook_url, WEBHOOK_SECRET)
+        # IDs novos a cada execução: usuários de execuções anteriores já seriam VIP
+        first_user_id = int(time.time()) * 100000
+        elapsed = asyncio.run(driver.run(first_user_id, args.users, args.rate))
+
+        report = {
+            'mode': args.mode,
+            'users': args.users,
+            'rate': args.rate,
+            'completed': driver.stats.completed,
+            'elapsed_s': elapsed,
+            'journeys_per_second': driver.stats.completed / elapsed if elapsed else 0.0,
+            'steps': driver.stats.summary(elapsed),
+            'api_calls': dict(telegram.method_counts),
+            'cnpay_charges': cnpay.charge_count,
+        }
+        if args.metrics_out:
+            with urllib.request.urlopen(bot_url + '/metrics', timeout=10) as response:
+                Path(args.metrics_out).write_bytes(response.read())
+        print_report(report)
+        if args.json_out:
+            Path(args.json_out).write_text(json.dumps(report, indent=2), encoding='utf-8')
+    finally:
+        stop_bot(process)
+        telegram_server.shutdown()
+        cnpay_server.shutdown()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
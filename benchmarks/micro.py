@@ -0,0 +1,241 @@
+"""Microbenchmarks dos trechos quentes do bot, com baseline em JSON.
+
+Cada benchmark roda com timeit (número de execuções calibrado por autorange,
+REPEAT repetições) e registra o tempo por chamada. Sem --save, compara o
+menor tempo (o menos afetado por ruído da máquina) com
+benchmarks/baselines/micro.json e sai com código 1 se algum benchmark ficar
+mais lento que baseline * (1 + tolerância).
+
+A baseline depende da máquina: gere-a (--save) no mesmo ambiente em que a
+comparação roda antes do deploy.
+
+Exemplos:
+    python benchmarks/micro.py                 # compara com a baseline
+    python benchmarks/micro.py --save          # grava uma nova baseline
+    python benchmarks/micro.py -k qr -k phone  # só os benchmarks que contêm "qr" ou "phone"
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+import bot  # noqa: E402
+import bot_demo  # noqa: E402
+from exports import write_full_report, write_expiring_report  # noqa: E402
+
+BASELINE_FILE = Path(__file__).resolve().parent / 'baselines' / 'micro.json'
+REPEAT = 7
+DEFAULT_TOLERANCE = 0.5
+
+PIX_CODE = (
+    '00020101021226810014br.gov.bcb.pix2559qr.woovi.com/qr/v2/cob/2365b640-748a-4ba0-8e81-b3bb70abe4bd'
+    '520400005303986540549.905802BR5911CN_PAY_LTDA6009Sao_Paulo6229052595bf9c63034f4a75b7985d62663046AE6'
+)
+
+# ----- dados sintéticos -----
+
+def config_rows():
+    rows = [
+        {'config_key': 'bot_token', 'config_value': '900000001:' + 'x' * 35, 'config_type': 'string'},
+        {'config_key': 'cnpay_enabled', 'config_value': 'true', 'config_type': 'boolean'},
+        {'config_key': 'mercadopago_enabled', 'config_value': 'false', 'config_type': 'boolean'},
+        {'config_key': 'max_concurrent_updates', 'config_value': '64', 'config_type': 'integer'},
+        {'config_key': 'payment_methods', 'config_type': 'json', 'config_value': json.dumps({
+            'pix_automatico': {'enabled': True},
+            'pix_manual': {'enabled': False, 'chave_pix': 'chave@pix.com', 'nome_titular': 'Titular'},
+        })},
+        {'config_key': 'admin_settings', 'config_type': 'json', 'config_value': json.dumps({'maintenance_mode': False})},
+        {'config_key': 'welcome_file', 'config_type': 'json', 'config_value': json.dumps({'enabled': False, 'file_id': None})},
+    ]
+    rows += [{'config_key': f'setting_{i}', 'config_value': f'valor {i}', 'config_type': 'string'} for i in range(30)]
+    return rows
+
+
+def subscription_rows(count):
+    now = datetime.now()
+    return [{
+        'subscription_id': i, 'user_id': 10_000 + i, 'plan_id': 1, 'payment_id': f'pay_{i}',
+        'payment_method': 'pix_automatico', 'payment_status': 'approved',
+        'start_date': now - timedelta(days=10), 'end_date': now + timedelta(days=i % 30),
+        'is_permanent': False, 'is_active': True, 'created_at': now - timedelta(days=10),
+        'plan_name': 'VIP Mensal', 'price': 19.90, 'duration_days': 30,
+        'username': f'user{i}', 'first_name': 'Nome', 'last_name': 'Sobrenome', 'joined_date': now,
+        'days_remaining': i % 30, 'days_paid': 30, 'total_days': 30, 'expiration_status': 'Ativa',
+    } for i in range(count)]
+
+
+def user_rows(count):
+    now = datetime.now()
+    return [{
+        'id': 10_000 + i, 'username': f'user{i}', 'first_name': 'Nome', 'last_name': None,
+        'joined_date': now, 'is_vip': i % 3 == 0,
+    } for i in range(count)]
+
+
+PHONES = ['(11) 98765-4321', '11987654321', '+55 21 3456-7890', '123', '09 99999-9999'] * 20
+EMAILS = ['cliente@example.com', 'nome.sobrenome+tag@empresa.com.br', 'invalido@', 'sem-arroba.com', 'a@b.co'] * 20
+
+
+class StubBot:
+    """Bot que só conta as chamadas (mede o custo do laço, não da rede)"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def send_message(self, **kwargs):
+        self.calls += 1
+
+    async def send_video(self, **kwargs):
+        self.calls += 1
+
+    async def send_video_note(self, **kwargs):
+        self.calls += 1
+
+
+# ----- benchmarks -----
+
+def bench_generate_pix_qr_code():
+    return lambda: bot.generate_pix_qr_code(PIX_CODE)
+
+
+def bench_cnpay_generate_qr_code():
+    provider = bot.CNPayProvider({'cnpay_environment': 'sandbox'})
+    return lambda: provider._generate_qr_code(PIX_CODE)
+
+
+def bench_coerce_config_rows():
+    rows = config_rows()
+    return lambda: bot.coerce_config_rows(rows)
+
+
+def bench_write_full_report():
+    subscriptions = subscription_rows(500)
+    expiring = subscriptions[:100]
+    users = user_rows(2000)
+    plan_stats = [{'plan_name': 'VIP Mensal', 'count': 500, 'revenue': 9950.0}]
+    stats = {'total_users': 2000, 'vip_users': 500}
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    return lambda: write_full_report(path, stats, plan_stats, len(expiring), subscriptions, expiring, users)
+
+
+def bench_write_expiring_report():
+    expiring = subscription_rows(500)
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    return lambda: write_expiring_report(path, len(expiring), expiring)
+
+
+def bench_validate_phone():
+    return lambda: [bot_demo.validate_phone(phone) for phone in PHONES]
+
+
+def bench_format_phone():
+    return lambda: [bot_demo.format_phone(phone) for phone in PHONES]
+
+
+def bench_validate_email():
+    return lambda: [bot_demo.validate_email(email) for email in EMAILS]
+
+
+def bench_broadcast_loop():
+    loop = asyncio.new_event_loop()
+    stub = StubBot()
+    recipients = list(range(1000))
+    send = bot.build_broadcast_sender('Mensagem de broadcast', 'Abrir', 'https://example.com')
+
+    async def on_progress(success_count, error_count):
+        pass
+
+    return lambda: loop.run_until_complete(bot.run_broadcast(stub, recipients, send, on_progress))
+
+
+BENCHMARKS = {
+    'generate_pix_qr_code': bench_generate_pix_qr_code,
+    'cnpay_generate_qr_code': bench_cnpay_generate_qr_code,
+    'coerce_config_rows[37]': bench_coerce_config_rows,
+    'write_full_report[500 subs, 2000 users]': bench_write_full_report,
+    'write_expiring_report[500]': bench_write_expiring_report,
+    'demo.validate_phone[x100]': bench_validate_phone,
+    'demo.format_phone[x100]': bench_format_phone,
+    'demo.validate_email[x100]': bench_validate_email,
+    'broadcast_loop[1000 stub sends]': bench_broadcast_loop,
+}
+
+
+def measure(func):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [t / number for t in timer.repeat(repeat=REPEAT, number=number)]
+    return {'median_s': statistics.median(times), 'min_s': min(times), 'number': number}
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'platform': platform.platform(terse=True),
+        'date': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def _fmt(seconds):
+    if seconds >= 1:
+        return f'{seconds:.2f} s'
+    if seconds >= 1e-3:
+        return f'{seconds * 1e3:.2f} ms'
+    return f'{seconds * 1e6:.1f} µs'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks dos trechos quentes do bot')
+    parser.add_argument('--save', action='store_true', help='grava os resultados como nova baseline')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_FILE)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='regressão aceita (0.5 = 50%%)')
+    parser.add_argument('-k', dest='filters', action='append', default=[], help='roda só benchmarks cujo nome contém o texto')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8')).get('results', {})
+
+    results = {}
+    regressions = []
+    for name, factory in BENCHMARKS.items():
+        if args.filters and not any(f in name for f in args.filters):
+            continue
+        result = results[name] = measure(factory())
+        line = f'{name:<42} {_fmt(result["min_s"]):>12}  (mediana {_fmt(result["median_s"])}, n={result["number"]})'
+        previous = baseline.get(name)
+        if previous and not args.save:
+            ratio = result['min_s'] / previous['min_s']
+            line += f'  {ratio:5.2f}x baseline'
+            if ratio > 1 + args.tolerance:
+                regressions.append(name)
+                line += '  ⚠️ REGRESSÃO'
+        print(line, flush=True)
+
+    if args.save:
+        saved = json.loads(args.baseline.read_text(encoding='utf-8')).get('results', {}) if args.baseline.exists() else {}
+        saved.update(results)
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({'environment': environment(), 'results': saved}, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+        print(f'Baseline gravada em {args.baseline}')
+    elif regressions:
+        print(f'{len(regressions)} benchmark(s) acima da tolerância de {args.tolerance:.0%}: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
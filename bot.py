@@ -1,32 +1,39 @@
 import json
 import logging
 import os
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Bot
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters, JobQueue
-import qrcode
-from PIL import Image
+from telegram.error import TelegramError
 from urllib.parse import urlparse
 import io
-import mercadopago
 import asyncio
 import threading
 import time
 from threading import Thread
-from database import Database
-import requests
+from database import Database, query_profiler
 import hashlib
+import sys
 import hmac
-import queue
 import tempfile
 import shutil
-from flask import Flask, jsonify
 import re
-import openpyxl
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Font, PatternFill
-from io import BytesIO
-import sqlite3
+from exports import export_full_report, export_expiring_report, export_raw_data, parquet_available
+from analytics import subscription_analytics, ANALYTICS_WINDOW_DAYS
+from callback_codec import encode_callback, decode_callback, callback_pattern, callback_tokens
+from persistence import MySQLPersistence
+from leader import LeaderElection, leader_only, LEADER_REFRESH_INTERVAL
+from update_ingestion import KeyedUpdateProcessor, telegram_webhook_bridge, serve_webhook, stop_update_processing, DEFAULT_MAX_CONCURRENT_UPDATES
+from metrics import instrument_handlers, InstrumentedJobQueue, track_handler, metrics_view, register_query_profiler
+from instrumented_bot import InstrumentedBot, telegram_call_budget, LOCAL_THROTTLE_SECONDS
+from logging_setup import setup_logging, register_secret
+from readiness import CheckGraph, CheckFailed, readiness_state
+from access_delivery import (
+    AccessDeliveryBridge, AccessDeliveryRelay, enqueue_access_delivery, prune_access_deliveries, backfill_access_deliveries,
+    access_delivery_group_status, record_access_delivery_groups, GROUP_DONE, GROUP_FAILED, ACCESS_DELIVERY_MARKER
+)
 
 # Importações para processamento de vídeo
 # Importar funções de processamento de vídeo
@@ -37,14 +44,13 @@ except ImportError:
     VIDEO_PROCESSOR_AVAILABLE = False
     logging.warning("Módulo de processamento de vídeo não disponível.")
 
-# Fila global para eventos de entrega de acesso VIP
-access_delivery_queue = queue.Queue()
+# Entregas de acesso VIP: gravadas no outbox junto com a aprovação e entregues pelo relay.
+# put() na fila (seguro a partir da thread do webhook) registra o evento e acorda o relay.
+access_delivery_queue = AccessDeliveryBridge()
+access_delivery_relay = AccessDeliveryRelay()
 
-# Configuração de logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Configuração de logging (fila + listener em thread; LOG_FORMAT=json|text, LOG_LEVEL)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Variável global para a instância do bot
@@ -95,40 +101,48 @@ def create_bot_context():
         return context
     return None
 
-def is_admin(user_id):
-    """Verifica se um user_id está na tabela de admins"""
+# Conjunto de admins em memória, para não consultar o banco a cada clique
+ADMIN_CACHE_TTL = 60  # segundos
+_admin_cache = {'ids': None, 'loaded_at': 0.0}
+_admin_cache_lock = threading.Lock()
+
+def get_admin_id_set():
+    """Retorna os admin_ids (int), recarregando do banco no máximo a cada ADMIN_CACHE_TTL segundos"""
+    with _admin_cache_lock:
+        if _admin_cache['ids'] is not None and time.monotonic() - _admin_cache['loaded_at'] < ADMIN_CACHE_TTL:
+            return _admin_cache['ids']
+    
     db = Database()
     try:
-        # Conecta ao banco
-        conn = db.connect()
-        if conn is None:
+        if db.connect() is None:
             logger.error("[ADMIN CHECK] Falha ao conectar ao banco de dados!")
-            return False
-
-        # Log detalhado
-        logger.info(f"[ADMIN CHECK] Verificando admin_id={user_id} (type={type(user_id)})")
-        
-        # Executa a query - garantindo que comparamos os mesmos tipos
-        result = db.execute_fetch_one(
-            "SELECT 1 FROM admins WHERE admin_id = %s", 
-            (int(user_id),)  # Garante que comparamos como inteiro
-        )
-        
-        logger.info(f"[ADMIN CHECK] Resultado: {result}")
-        return result is not None
-        
+            return _admin_cache['ids'] or set()
+        admins = db.execute_fetch_all("SELECT admin_id FROM admins")
+        ids = {int(a['admin_id']) for a in admins if a['admin_id'] and str(a['admin_id']).lstrip('-').isdigit()}
     except Exception as e:
-        logger.error(f"[ADMIN CHECK] Erro ao verificar admin: {str(e)}")
-        return False
+        logger.error(f"[ADMIN CHECK] Erro ao carregar admins: {str(e)}")
+        return _admin_cache['ids'] or set()
     finally:
         db.close()
+    
+    with _admin_cache_lock:
+        _admin_cache['ids'] = ids
+        _admin_cache['loaded_at'] = time.monotonic()
+    return ids
+
+def invalidate_admin_cache():
+    with _admin_cache_lock:
+        _admin_cache['ids'] = None
+
+def is_admin(user_id):
+    """Verifica se um user_id está na tabela de admins (via cache)"""
+    try:
+        return int(user_id) in get_admin_id_set()
+    except (TypeError, ValueError):
+        return False
 
 def get_all_admin_ids():
-    db = Database()
-    db.connect()
-    admins = db.execute_fetch_all("SELECT admin_id FROM admins")
-    db.close()
-    return [a['admin_id'] for a in admins if a['admin_id']]
+    return sorted(get_admin_id_set())
 
 def add_admin(user_id, added_by, username=None):
     db = Database()
@@ -143,6 +157,7 @@ def add_admin(user_id, added_by, username=None):
         )
     finally:
         db.close()
+        invalidate_admin_cache()
 
 def remove_admin(user_id):
     db = Database()
@@ -157,6 +172,7 @@ def remove_admin(user_id):
         )
     finally:
         db.close()
+        invalidate_admin_cache()
 
 class SharedBotContext:
     """Classe para gerenciar contexto compartilhado entre threads"""
@@ -213,6 +229,243 @@ def set_shared_context(bot, application, context):
     """Define o contexto compartilhado global"""
     _shared_context.set_context(bot, application, context)
 
+# =====================================================
+# MIGRAÇÕES DE ESQUEMA
+# =====================================================
+
+# Cada entrada é (descrição, SQL). Erros de "já existe" são ignorados para que
+# ensure_schema possa rodar em toda inicialização.
+SCHEMA_MIGRATIONS = [
+    (
+        "chave única em subscriptions.payment_id",
+        "ALTER TABLE subscriptions ADD UNIQUE KEY uq_subscriptions_payment_id (payment_id)"
+    ),
+    (
+        "chave única em payments.payment_id",
+        "ALTER TABLE payments ADD UNIQUE KEY uq_payments_payment_id (payment_id)"
+    ),
+    (
+        "tabela vip_invite_link_pool",
+        """CREATE TABLE vip_invite_link_pool (
+            id bigint NOT NULL AUTO_INCREMENT,
+            group_id bigint NOT NULL,
+            invite_link varchar(255) NOT NULL,
+            expire_date datetime NOT NULL,
+            created_at datetime DEFAULT CURRENT_TIMESTAMP,
+            leased_to bigint DEFAULT NULL,
+            leased_at datetime DEFAULT NULL,
+            PRIMARY KEY (id),
+            KEY idx_invite_link_pool_available (group_id, leased_to, expire_date)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"""
+    ),
+    (
+        "tabela bot_counters",
+        """CREATE TABLE bot_counters (
+            name varchar(50) NOT NULL,
+            value bigint NOT NULL DEFAULT 0,
+            updated_at datetime DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (name)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"""
+    ),
+    (
+        "tabela access_delivery_outbox",
+        """CREATE TABLE access_delivery_outbox (
+            id bigint NOT NULL AUTO_INCREMENT,
+            user_id bigint NOT NULL,
+            plan_id int NOT NULL,
+            payment_id varchar(255) DEFAULT NULL,
+            status enum('pending','done','failed') NOT NULL DEFAULT 'pending',
+            attempts int NOT NULL DEFAULT 0,
+            available_at datetime(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+            last_error varchar(500) DEFAULT NULL,
+            created_at datetime(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+            delivered_at datetime(3) DEFAULT NULL,
+            PRIMARY KEY (id),
+            UNIQUE KEY uq_access_delivery_outbox_payment_id (payment_id),
+            KEY idx_access_delivery_outbox_pending (status, available_at),
+            KEY idx_access_delivery_outbox_user (user_id, plan_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"""
+    ),
+    (
+        "tabela access_delivery_groups",
+        """CREATE TABLE access_delivery_groups (
+            delivery_id bigint NOT NULL,
+            group_id bigint NOT NULL,
+            status enum('done','failed') NOT NULL,
+            last_error varchar(500) DEFAULT NULL,
+            updated_at datetime(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3),
+            PRIMARY KEY (delivery_id, group_id),
+            CONSTRAINT fk_access_delivery_groups_delivery FOREIGN KEY (delivery_id)
+                REFERENCES access_delivery_outbox (id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"""
+    ),
+    (
+        "tabela bot_schema_markers",
+        """CREATE TABLE bot_schema_markers (
+            name varchar(64) NOT NULL,
+            created_at datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (name)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"""
+    ),
+]
+
+# Marcadores gravados uma única vez, pelo primeiro ensure_schema que não os
+# encontra: registram quando um recurso passou a valer (ex.: o backfill do
+# outbox não recupera assinaturas anteriores ao marcador)
+SCHEMA_MARKERS = [
+    (ACCESS_DELIVERY_MARKER, "início do outbox de entregas de acesso"),
+]
+
+# Tabela, coluna ou índice já existente
+_IGNORED_SCHEMA_ERRNOS = {1050, 1060, 1061}
+# Entrada duplicada: a chave única não pode ser criada sobre os dados atuais
+_DUPLICATE_ENTRY_ERRNO = 1062
+
+# Tabela de cada chave única em payment_id, para relatar os duplicados que impedem a migração
+SCHEMA_DUPLICATE_KEY_TABLES = {
+    "chave única em subscriptions.payment_id": 'subscriptions',
+    "chave única em payments.payment_id": 'payments',
+}
+DUPLICATE_REPORT_LIMIT = 20
+
+def report_duplicate_payment_ids(cursor, table):
+    """Texto com os payment_id repetidos em `table` e os ids de cada um (até DUPLICATE_REPORT_LIMIT)"""
+    cursor.execute(
+        f"""SELECT payment_id, GROUP_CONCAT(id ORDER BY id) AS ids
+        FROM {table}
+        WHERE payment_id IS NOT NULL
+        GROUP BY payment_id HAVING COUNT(*) > 1
+        ORDER BY MIN(id)
+        LIMIT %s""",
+        (DUPLICATE_REPORT_LIMIT,)
+    )
+    return "; ".join(f"payment_id {payment_id}: ids {ids}" for payment_id, ids in cursor.fetchall())
+
+def ensure_schema():
+    """Aplica as migrações de SCHEMA_MIGRATIONS que ainda não existem no banco e grava os SCHEMA_MARKERS ausentes.
+
+    Dados nunca são alterados aqui: se uma chave única esbarrar em duplicados, a
+    migração falha com a lista dos registros para correção manual. Retorna False
+    se alguma migração continuar pendente: sem as chaves únicas, a aplicação de
+    pagamentos deixa de ser idempotente.
+    """
+    db = Database()
+    try:
+        db.connect()
+        if not db.connection:
+            logger.error("❌ Falha na conexão com banco de dados em ensure_schema")
+            return False
+        failed = []
+        for description, statement in SCHEMA_MIGRATIONS:
+            cursor = db.connection.cursor()
+            try:
+                cursor.execute(statement)
+                db.connection.commit()
+                logger.info(f"✅ Migração aplicada: {description}")
+            except Exception as e:
+                errno = getattr(e, 'errno', None)
+                if errno not in _IGNORED_SCHEMA_ERRNOS:
+                    logger.error(f"❌ Migração não aplicada ({description}): {e}")
+                    failed.append(description)
+                    table = SCHEMA_DUPLICATE_KEY_TABLES.get(description)
+                    if errno == _DUPLICATE_ENTRY_ERRNO and table:
+                        try:
+                            logger.error(f"❌ Duplicados em {table} (corrigir manualmente): {report_duplicate_payment_ids(cursor, table)}")
+                        except Exception as report_error:
+                            logger.error(f"Erro ao listar duplicados em {table}: {report_error}")
+            finally:
+                cursor.close()
+        for name, description in SCHEMA_MARKERS:
+            try:
+                with db.transaction() as cursor:
+                    cursor.execute("INSERT IGNORE INTO bot_schema_markers (name) VALUES (%s)", (name,))
+                    created = cursor.rowcount == 1
+                if created:
+                    logger.info(f"✅ Marcador gravado: {description}")
+            except Exception as e:
+                logger.error(f"❌ Marcador não gravado ({description}): {e}")
+                failed.append(description)
+        if failed:
+            logger.error(
+                f"❌ Esquema incompleto ({'; '.join(failed)}): pagamentos aprovados "
+                f"podem gerar assinaturas duplicadas até a migração ser corrigida"
+            )
+            return False
+        return True
+    finally:
+        db.close()
+
+# =====================================================
+# CONTADORES MATERIALIZADOS
+# =====================================================
+
+# Totais mantidos em bot_counters para que o painel não precise de COUNT(*) em users
+COUNTER_TOTAL_USERS = 'total_users'
+COUNTER_VIP_USERS = 'vip_users'
+
+# Consultas de referência usadas na reconciliação
+_COUNTER_SOURCES = {
+    COUNTER_TOTAL_USERS: "SELECT COUNT(*) as total FROM users",
+    COUNTER_VIP_USERS: "SELECT COUNT(*) as total FROM users WHERE is_vip = TRUE"
+}
+
+def bump_counter(cursor, name, delta):
+    """Soma `delta` ao contador, na mesma transação do cursor informado"""
+    cursor.execute(
+        "UPDATE bot_counters SET value = value + %s WHERE name = %s",
+        (delta, name)
+    )
+
+def get_user_counters(db):
+    """Lê total de usuários e de VIPs; usa COUNT(*) só se os contadores ainda não existirem"""
+    rows = db.execute_fetch_all(
+        "SELECT name, value FROM bot_counters WHERE name IN (%s, %s)",
+        (COUNTER_TOTAL_USERS, COUNTER_VIP_USERS)
+    )
+    counters = {row['name']: int(row['value']) for row in rows or []}
+    for name, query in _COUNTER_SOURCES.items():
+        if name not in counters:
+            result = db.execute_fetch_one(query)
+            counters[name] = result['total'] if result else 0
+    return counters
+
+def reconcile_counters():
+    """Recalcula os contadores a partir de users e retorna {nome: (antes, depois)} dos que divergiam"""
+    db = Database()
+    try:
+        db.connect()
+        if not db.connection:
+            return {}
+        drift = {}
+        for name, query in _COUNTER_SOURCES.items():
+            with db.transaction() as cursor:
+                # Travar o contador antes de contar: incrementos concorrentes ainda não
+                # confirmados esperam o fim desta transação e não são perdidos
+                cursor.execute("SELECT value FROM bot_counters WHERE name = %s FOR UPDATE", (name,))
+                row = cursor.fetchone()
+                cursor.execute(query)
+                total = cursor.fetchone()['total']
+                cursor.execute(
+                    """INSERT INTO bot_counters (name, value) VALUES (%s, %s)
+                    ON DUPLICATE KEY UPDATE value = %s""",
+                    (name, total, total)
+                )
+            before = row['value'] if row else None
+            if before != total:
+                drift[name] = (before, total)
+        return drift
+    finally:
+        db.close()
+
+async def reconcile_bot_counters(context: ContextTypes.DEFAULT_TYPE):
+    """Job periódico: corrige desvios dos contadores (ex.: escritas feitas por outros processos)"""
+    try:
+        drift = reconcile_counters()
+        for name, (before, after) in drift.items():
+            logger.info(f"🔢 Contador {name} reconciliado: {before} -> {after}")
+    except Exception as e:
+        logger.error(f"Erro ao reconciliar contadores: {e}")
+
 # =====================================================
 # FUNÇÕES AUXILIARES PARA BANCO DE DADOS
 # =====================================================
@@ -265,7 +518,7 @@ def get_active_subscription(user_id):
         db.close()
 
 def check_payment_processed(payment_id):
-    """Verifica se um pagamento já foi processado"""
+    """Verifica se um pagamento já foi processado (somente leitura; para aplicar use apply_approved_payment)"""
     db = Database()
     try:
         db.connect()
@@ -282,94 +535,93 @@ def check_payment_processed(payment_id):
     finally:
         db.close()
 
-def get_all_active_subscriptions():
-    """Obtém todas as assinaturas ativas"""
+def _upsert_approved_payment(cursor, user_id, plan_id, payment_id, payment_method):
+    """Marca o pagamento como aprovado, criando o registro em payments se ele não existir"""
+    cursor.execute(
+        """INSERT INTO payments
+        (payment_id, user_id, plan_id, amount, currency, payment_method, status)
+        SELECT %s, %s, vp.id, vp.price, 'BRL', %s, 'approved'
+        FROM vip_plans vp WHERE vp.id = %s
+        ON DUPLICATE KEY UPDATE status = 'approved'""",
+        (payment_id, user_id, payment_method, plan_id)
+    )
+
+def apply_approved_payment(user_id, plan_id, payment_id, payment_method='mercadopago'):
+    """Aplica um pagamento aprovado em uma única transação (payments, subscriptions e users).
+
+    É idempotente: a chave única em subscriptions.payment_id faz com que aprovações
+    concorrentes do mesmo pagamento (poller, webhook e "Já Paguei") criem uma só assinatura.
+    Retorna a assinatura criada, False se o pagamento já tinha sido aplicado, ou None em caso
+    de erro (inclusive plano inexistente, caso em que nada é gravado).
+    """
     db = Database()
     try:
         db.connect()
         if not db.connection:
-            return []
-        subscriptions = db.execute_fetch_all(
-            """SELECT s.*, vp.name as plan_name, vp.price, vp.duration_days, u.username, u.first_name, u.last_name
-            FROM subscriptions s
-            JOIN vip_plans vp ON s.plan_id = vp.id
-            JOIN users u ON s.user_id = u.id
-            WHERE s.is_active = TRUE
-            AND (s.is_permanent = TRUE OR s.end_date > NOW())
-            ORDER BY s.end_date ASC"""
-        )
-        return subscriptions
+            return None
+        with db.transaction() as cursor:
+            cursor.execute("SELECT id FROM vip_plans WHERE id = %s", (plan_id,))
+            if cursor.fetchone() is None:
+                logger.error(f"Pagamento aprovado {payment_id} para plano inexistente {plan_id} (usuário {user_id})")
+                return None
+            _upsert_approved_payment(cursor, user_id, plan_id, payment_id, payment_method)
+            cursor.execute(
+                """INSERT INTO subscriptions
+                (user_id, plan_id, payment_id, payment_method, payment_status,
+                 start_date, end_date, is_permanent, is_active)
+                SELECT %s, vp.id, %s, %s, 'approved', NOW(),
+                    CASE WHEN vp.duration_days = -1 THEN '2099-12-31 00:00:00'
+                         ELSE NOW() + INTERVAL vp.duration_days DAY END,
+                    vp.duration_days = -1, TRUE
+                FROM vip_plans vp WHERE vp.id = %s
+                ON DUPLICATE KEY UPDATE subscriptions.id = subscriptions.id""",
+                (user_id, payment_id, payment_method, plan_id)
+            )
+            if cursor.rowcount != 1:
+                # Pagamento já aplicado por outro caminho
+                return False
+            subscription_id = cursor.lastrowid
+            # Entrega do acesso gravada na mesma transação: sobrevive a uma queda do processo
+            enqueue_access_delivery(cursor, user_id, plan_id, payment_id)
+            cursor.execute(
+                "UPDATE users SET is_vip = TRUE WHERE id = %s AND COALESCE(is_vip, FALSE) = FALSE",
+                (user_id,)
+            )
+            if cursor.rowcount == 1:
+                bump_counter(cursor, COUNTER_VIP_USERS, 1)
+            cursor.execute(
+                """SELECT s.*, vp.name as plan_name, vp.price, vp.duration_days
+                FROM subscriptions s
+                JOIN vip_plans vp ON s.plan_id = vp.id
+                WHERE s.id = %s""",
+                (subscription_id,)
+            )
+            return cursor.fetchone()
     except Exception as e:
-        logger.error(f"Erro ao obter assinaturas ativas: {e}")
-        return []
+        logger.error(f"Erro ao aplicar pagamento aprovado {payment_id}: {e}")
+        return None
     finally:
         db.close()
 
-def get_subscriptions_for_export():
-    """Obtém assinaturas com informações detalhadas para exportação"""
+def get_all_active_subscriptions():
+    """Obtém todas as assinaturas ativas"""
     db = Database()
     try:
         db.connect()
         if not db.connection:
             return []
-        
-        # Query mais detalhada para exportação
         subscriptions = db.execute_fetch_all(
-            """SELECT 
-                s.id as subscription_id,
-                s.user_id,
-                s.plan_id,
-                s.payment_id,
-                s.payment_method,
-                s.payment_status,
-                s.start_date,
-                s.end_date,
-                s.is_permanent,
-                s.is_active,
-                s.created_at,
-                vp.name as plan_name,
-                vp.price,
-                vp.duration_days,
-                u.username,
-                u.first_name,
-                u.last_name,
-                u.joined_date,
-                -- Calcular dias restantes
-                CASE 
-                    WHEN s.is_permanent = TRUE THEN 999999
-                    WHEN s.end_date > NOW() THEN DATEDIFF(s.end_date, NOW())
-                    ELSE 0
-                END as days_remaining,
-                -- Calcular dias já pagos
-                CASE 
-                    WHEN s.is_permanent = TRUE THEN 999999
-                    WHEN s.start_date <= NOW() AND s.end_date > NOW() THEN DATEDIFF(NOW(), s.start_date)
-                    WHEN s.end_date <= NOW() THEN DATEDIFF(s.end_date, s.start_date)
-                    ELSE 0
-                END as days_paid,
-                -- Calcular total de dias do plano
-                CASE 
-                    WHEN s.is_permanent = TRUE THEN 999999
-                    WHEN vp.duration_days > 0 THEN vp.duration_days
-                    ELSE DATEDIFF(s.end_date, s.start_date)
-                END as total_days,
-                -- Status de expiração
-                CASE 
-                    WHEN s.is_permanent = TRUE THEN 'Permanente'
-                    WHEN s.end_date <= NOW() THEN 'Expirada'
-                    WHEN DATEDIFF(s.end_date, NOW()) <= 3 THEN 'Expirando em breve'
-                    WHEN DATEDIFF(s.end_date, NOW()) <= 7 THEN 'Expira em 1 semana'
-                    ELSE 'Ativa'
-                END as expiration_status
+            """SELECT s.*, vp.name as plan_name, vp.price, vp.duration_days, u.username, u.first_name, u.last_name
             FROM subscriptions s
             JOIN vip_plans vp ON s.plan_id = vp.id
             JOIN users u ON s.user_id = u.id
             WHERE s.is_active = TRUE
+            AND (s.is_permanent = TRUE OR s.end_date > NOW())
             ORDER BY s.end_date ASC"""
         )
         return subscriptions
     except Exception as e:
-        logger.error(f"Erro ao obter assinaturas para exportação: {e}")
+        logger.error(f"Erro ao obter assinaturas ativas: {e}")
         return []
     finally:
         db.close()
@@ -673,13 +925,10 @@ def get_user_stats():
         if not db.connection:
             return {'total_users': 0, 'vip_users': 0, 'recent_users': []}
         
-        # Total de usuários
-        total_result = db.execute_fetch_one("SELECT COUNT(*) as total FROM users")
-        total_users = total_result['total'] if total_result else 0
-        
-        # Usuários VIP
-        vip_result = db.execute_fetch_one("SELECT COUNT(*) as total FROM users WHERE is_vip = TRUE")
-        vip_users = vip_result['total'] if vip_result else 0
+        # Totais de usuários e VIPs (contadores materializados)
+        counters = get_user_counters(db)
+        total_users = counters[COUNTER_TOTAL_USERS]
+        vip_users = counters[COUNTER_VIP_USERS]
         
         # Últimos usuários
         recent_users = db.execute_fetch_all(
@@ -709,15 +958,11 @@ def get_all_users():
             logger.error("❌ Falha na conexão com banco de dados em get_all_users")
             return []
         
-        logger.info("🔍 Executando consulta get_all_users...")
+        logger.debug("🔍 Executando consulta get_all_users...")
         users = db.execute_fetch_all(
             "SELECT id, username, first_name, last_name, joined_date, is_vip FROM users"
         )
-        logger.info(f"✅ get_all_users retornou {len(users)} usuários")
-        
-        # Log dos primeiros 3 usuários para debug
-        for i, user in enumerate(users[:3]):
-            logger.info(f"   Usuário {i+1}: ID={user['id']}, Nome={user['first_name']}, VIP={user['is_vip']}")
+        logger.debug(f"✅ get_all_users retornou {len(users)} usuários")
         
         return users
     except Exception as e:
@@ -735,7 +980,7 @@ def get_vip_users():
             logger.error("❌ Falha na conexão com banco de dados em get_vip_users")
             return []
         
-        logger.info("🔍 Executando consulta get_vip_users...")
+        logger.debug("🔍 Executando consulta get_vip_users...")
         users = db.execute_fetch_all(
             """SELECT DISTINCT u.id, u.username, u.first_name, u.last_name, u.joined_date
             FROM users u
@@ -743,11 +988,7 @@ def get_vip_users():
             WHERE s.is_active = TRUE
             AND (s.is_permanent = TRUE OR s.end_date > NOW())"""
         )
-        logger.info(f"✅ get_vip_users retornou {len(users)} usuários VIP")
-        
-        # Log dos primeiros 3 usuários VIP para debug
-        for i, user in enumerate(users[:3]):
-            logger.info(f"   VIP {i+1}: ID={user['id']}, Nome={user['first_name']}")
+        logger.debug(f"✅ get_vip_users retornou {len(users)} usuários VIP")
         
         return users
     except Exception as e:
@@ -827,6 +1068,24 @@ def save_message_to_db(message_key, message_value):
 # =====================================================
 
 # Carregar configurações
+def coerce_config_rows(rows):
+    """Converte as linhas de bot_config (config_key, config_value, config_type) no dicionário de configuração"""
+    config = {}
+    for row in rows:
+        key = row['config_key']
+        value = row['config_value']
+        config_type = row['config_type']
+        # Conversão de tipo
+        if config_type == 'boolean':
+            config[key] = value.lower() == 'true'
+        elif config_type == 'integer':
+            config[key] = int(value)
+        elif config_type == 'json':
+            config[key] = json.loads(value)
+        else:
+            config[key] = value
+    return config
+
 def load_config():
     db = Database()
     try:
@@ -837,22 +1096,7 @@ def load_config():
             
         # Usar o novo método que fecha o cursor automaticamente
         rows = db.execute_fetch_all("SELECT config_key, config_value, config_type FROM bot_config")
-        
-        config = {}
-        for row in rows:
-            key = row['config_key']
-            value = row['config_value']
-            config_type = row['config_type']
-            # Conversão de tipo
-            if config_type == 'boolean':
-                config[key] = value.lower() == 'true'
-            elif config_type == 'integer':
-                config[key] = int(value)
-            elif config_type == 'json':
-                config[key] = json.loads(value)
-            else:
-                config[key] = value
-        return config
+        return coerce_config_rows(rows)
     except Exception as e:
         logger.error(f"Erro ao carregar configuração: {e}")
         return None
@@ -954,199 +1198,513 @@ async def check_payment_async(payment_id, provider=None):
         return None
 
 # Registrar assinatura VIP
-async def register_vip_subscription(user_id, plan_id, payment_id, context):
+async def register_vip_subscription(user_id, plan_id, payment_id, context, payment_method='mercadopago'):
+    """Registra a assinatura de um pagamento aprovado.
+
+    Retorna True apenas para quem efetivamente aplicou o pagamento, para que a entrega
+    de acesso aconteça uma única vez mesmo com aprovações concorrentes.
+    """
+    subscription = apply_approved_payment(user_id, plan_id, payment_id, payment_method)
+    if subscription is None:
+        return False
+    if subscription is False:
+        logger.info(f"Pagamento {payment_id} já processado - assinatura não duplicada")
+        return False
+    
+    # Notificar admins
+    try:
+        is_permanent = bool(subscription['is_permanent'])
+        admin_message = (
+            f"🎉 Nova Assinatura VIP!\n\n"
+            f"👤 Usuário: {user_id}\n"
+            f"💎 Plano: {subscription['plan_name']}\n"
+            f"💰 Valor: R${subscription['price']:.2f}\n"
+            f"⏱️ Duração: {'Permanente' if is_permanent else str(subscription['duration_days']) + ' dias'}\n"
+            f"📅 Expira em: {subscription['end_date'].strftime('%d/%m/%Y %H:%M')}\n"
+            f"💳 ID do Pagamento: {payment_id}"
+        )
+        for admin_id in get_all_admin_ids():
+            await context.bot.send_message(chat_id=admin_id, text=admin_message)
+    except Exception as e:
+        logger.error(f"Erro ao notificar admin sobre nova assinatura: {e}")
+    
+    return True
+
+async def renew_vip_subscription(user_id, plan_id, payment_id, context, payment_method='mercadopago'):
+    """Renova a assinatura ativa somando os dias do plano à expiração atual.
+
+    A assinatura atual fica travada (SELECT ... FOR UPDATE) durante a transação e a nova
+    data de expiração é calculada no próprio SQL, então renovações concorrentes são
+    serializadas sem perder dias. Retorna a nova assinatura ou False.
+
+    Nenhum fluxo chama esta função hoje: o botão de renovação gera um PIX comum,
+    aplicado por register_vip_subscription/apply_approved_payment.
+    """
     db = Database()
     try:
         db.connect()
         if not db.connection:
             return False
         
-        # Obter informações do plano
-        plan = db.execute_fetch_one(
-            "SELECT * FROM vip_plans WHERE id = %s",
-            (plan_id,)
-        )
-        
-        if not plan:
-            return False
-        
-        # Calcular data de expiração
-        if plan['duration_days'] == -1:
-            end_date = datetime(2099, 12, 31)
-            is_permanent = True
-        else:
-            end_date = datetime.now() + timedelta(days=plan['duration_days'])
-            is_permanent = False
-        
-        # Inserir assinatura
-        db.execute_query(
-            """INSERT INTO subscriptions 
-            (user_id, plan_id, payment_id, payment_method, payment_status, 
-             start_date, end_date, is_permanent, is_active) 
-            VALUES (%s, %s, %s, 'mercadopago', 'approved', NOW(), %s, %s, TRUE)""",
-            (user_id, plan_id, payment_id, end_date, is_permanent),
-            commit=True
-        )
-        
-        # Atualizar status VIP do usuário
-        db.execute_query(
-            "UPDATE users SET is_vip = TRUE WHERE id = %s",
-            (user_id,),
-            commit=True
-        )
+        with db.transaction() as cursor:
+            # Travar a assinatura atual ativa
+            cursor.execute(
+                """SELECT id, end_date FROM subscriptions 
+                WHERE user_id = %s 
+                AND is_active = TRUE
+                AND (is_permanent = TRUE OR end_date > NOW())
+                ORDER BY end_date DESC
+                LIMIT 1
+                FOR UPDATE""",
+                (user_id,)
+            )
+            current_subscription = cursor.fetchone()
+            
+            if not current_subscription:
+                logger.error(f"Tentativa de renovação sem assinatura ativa: usuário {user_id}")
+                return False
+            
+            _upsert_approved_payment(cursor, user_id, plan_id, payment_id, payment_method)
+            
+            # Inserir nova assinatura somando os dias à expiração atual
+            cursor.execute(
+                """INSERT INTO subscriptions 
+                (user_id, plan_id, payment_id, payment_method, payment_status, 
+                 start_date, end_date, is_permanent, is_active,
+                 notified_1, notified_2, notified_3, renewal_notified) 
+                SELECT s.user_id, vp.id, %s, %s, 'approved', NOW(),
+                    CASE WHEN vp.duration_days = -1 THEN '2099-12-31 00:00:00'
+                         ELSE GREATEST(s.end_date, NOW()) + INTERVAL vp.duration_days DAY END,
+                    vp.duration_days = -1, TRUE, FALSE, FALSE, FALSE, FALSE
+                FROM subscriptions s, vip_plans vp
+                WHERE s.id = %s AND vp.id = %s
+                ON DUPLICATE KEY UPDATE subscriptions.id = subscriptions.id""",
+                (payment_id, payment_method, current_subscription['id'], plan_id)
+            )
+            if cursor.rowcount != 1:
+                logger.info(f"Renovação ignorada: plano {plan_id} inexistente ou pagamento {payment_id} já processado")
+                return False
+            new_subscription_id = cursor.lastrowid
+            enqueue_access_delivery(cursor, user_id, plan_id, payment_id)
+            
+            # Desativar assinatura atual
+            cursor.execute(
+                "UPDATE subscriptions SET is_active = FALSE WHERE id = %s",
+                (current_subscription['id'],)
+            )
+            
+            cursor.execute(
+                """SELECT s.*, vp.name as plan_name, vp.price, vp.duration_days
+                FROM subscriptions s
+                JOIN vip_plans vp ON s.plan_id = vp.id
+                WHERE s.id = %s""",
+                (new_subscription_id,)
+            )
+            new_subscription = cursor.fetchone()
         
-        # Notificar admin
-        config = load_config()
-        if config is None:
-            logger.error("Falha ao carregar as configurações.")
-            return  # ou lidar de forma apropriada
+        logger.info(f"Renovação registrada: usuário {user_id}, plano {plan_id}")
+        logger.info(f"Nova data de expiração: {new_subscription['end_date']} (anterior: {current_subscription['end_date']})")
 
-        if config and 'admin_id' in config:
-            if not is_admin(int(update.effective_user.id)):
-                return
+        # Notificar admins
+        try:
             admin_message = (
-                f"🎉 Nova Assinatura VIP!\n\n"
+                f"🔄 Renovação de Assinatura VIP!\n\n"
                 f"👤 Usuário: {user_id}\n"
-                f"💎 Plano: {plan['name']}\n"
-                f"💰 Valor: R${plan['price']:.2f}\n"
-                f"⏱️ Duração: {'Permanente' if is_permanent else str(plan['duration_days']) + ' dias'}\n"
-                f"📅 Expira em: {end_date.strftime('%d/%m/%Y %H:%M')}\n"
+                f"💎 Plano: {new_subscription['plan_name']}\n"
+                f"💰 Valor: R${new_subscription['price']:.2f}\n"
+                f"⏱️ Duração: {'Permanente' if new_subscription['duration_days'] == -1 else str(new_subscription['duration_days']) + ' dias'}\n"
+                f"📅 Nova expiração: {new_subscription['end_date'].strftime('%d/%m/%Y %H:%M')}\n"
                 f"💳 ID do Pagamento: {payment_id}"
             )
-            await context.bot.send_message(chat_id=admin_id, text=admin_message)
-        
-        return True
+            for admin_id in get_all_admin_ids():
+                await context.bot.send_message(chat_id=admin_id, text=admin_message)
+        except Exception as e:
+            logger.error(f"Erro ao notificar admin sobre renovação: {e}")
+
+        return new_subscription
         
     except Exception as e:
-        logger.error(f"Erro ao registrar assinatura: {e}")
+        logger.error(f"Erro ao renovar assinatura: {e}")
         return False
     finally:
         db.close()
 
-async def renew_vip_subscription(user_id, plan_id, payment_id, context):
+# =====================================================
+# CHAMADAS CONCORRENTES À API DO TELEGRAM
+# =====================================================
+
+# O Telegram aceita ~30 chamadas/s por bot; mantemos uma folga
+TELEGRAM_CALLS_PER_SECOND = 25
+# Máximo de grupos processados ao mesmo tempo para um único usuário
+VIP_GROUP_CONCURRENCY = 5
+
+class TelegramRateLimiter:
+    """Token bucket compartilhado por todas as chamadas de grupo à API do Telegram"""
+    
+    def __init__(self, rate=TELEGRAM_CALLS_PER_SECOND, burst=TELEGRAM_CALLS_PER_SECOND):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Aguarda até haver um token disponível"""
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    # Espera causada por nós, não pelo Telegram (ver /metrics)
+                    LOCAL_THROTTLE_SECONDS.inc(now - start)
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+telegram_rate_limiter = TelegramRateLimiter()
+
+async def gather_limited(coroutines, limit=VIP_GROUP_CONCURRENCY):
+    """Executa as corrotinas com no máximo `limit` simultâneas; exceções são retornadas na posição do resultado"""
+    semaphore = asyncio.Semaphore(limit)
+    
+    async def _run(coro):
+        async with semaphore:
+            return await coro
+    
+    return await asyncio.gather(*(_run(c) for c in coroutines), return_exceptions=True)
+
+async def notify_admins(bot, text):
+    """Envia a mesma mensagem a todos os administradores"""
+    admin_ids = get_all_admin_ids()
+    
+    async def _send(admin_id):
+        await telegram_rate_limiter.acquire()
+        await bot.send_message(chat_id=int(admin_id), text=text)
+    
+    results = await gather_limited([_send(admin_id) for admin_id in admin_ids])
+    for admin_id, result in zip(admin_ids, results):
+        if isinstance(result, Exception):
+            logger.error(f"Erro ao notificar admin {admin_id}: {result}")
+
+# =====================================================
+# CACHE DE METADADOS DOS GRUPOS VIP
+# =====================================================
+
+VALID_VIP_CHAT_TYPES = ('group', 'supergroup', 'channel')
+VIP_GROUP_CACHE_TTL = 30 * 60  # segundos
+VIP_GROUP_CACHE_REFRESH_INTERVAL = 15 * 60  # segundos
+
+class VipGroupChatCache:
+    """Cache do tipo, título e permissões do bot em cada grupo VIP"""
+    
+    def __init__(self, ttl=VIP_GROUP_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        # Problemas já avisados aos admins, para não repetir a cada atualização
+        self.reported_problems = set()
+    
+    async def _fetch(self, bot, group_id):
+        await telegram_rate_limiter.acquire()
+        chat = await bot.get_chat(group_id)
+        await telegram_rate_limiter.acquire()
+        member = await bot.get_chat_member(group_id, bot.id)
+        
+        is_owner = member.status == 'creator'
+        info = {
+            'type': chat.type,
+            'title': chat.title,
+            'is_admin': is_owner or member.status == 'administrator',
+            'can_invite_users': is_owner or bool(getattr(member, 'can_invite_users', False)),
+            'can_restrict_members': is_owner or bool(getattr(member, 'can_restrict_members', False)),
+            'checked_at': time.monotonic()
+        }
+        self._entries[str(group_id)] = info
+        return info
+    
+    async def get(self, bot, group_id):
+        """Retorna os metadados do grupo, consultando o Telegram só se o cache estiver vencido"""
+        info = self._entries.get(str(group_id))
+        if info and time.monotonic() - info['checked_at'] < self.ttl:
+            return info
+        return await self._fetch(bot, group_id)
+    
+    def peek(self, group_id):
+        """Retorna os metadados em cache (mesmo vencidos) sem chamar o Telegram"""
+        return self._entries.get(str(group_id))
+    
+    def invalidate(self, group_id):
+        self._entries.pop(str(group_id), None)
+    
+    async def refresh(self, bot, group_ids):
+        """Recarrega todos os grupos e retorna {group_id: problema} dos que não estão prontos para uso"""
+        results = await gather_limited([self._fetch(bot, group_id) for group_id in group_ids])
+        
+        problems = {}
+        for group_id, result in zip(group_ids, results):
+            if isinstance(result, Exception):
+                self.invalidate(group_id)
+                problems[str(group_id)] = f"Erro ao acessar grupo: {result}"
+                continue
+            problem = describe_vip_group_problem(result)
+            if problem:
+                problems[str(group_id)] = problem
+        
+        # Descartar grupos que não estão mais ativos
+        active = {str(group_id) for group_id in group_ids}
+        for group_id in list(self._entries):
+            if group_id not in active:
+                del self._entries[group_id]
+        
+        return problems
+
+vip_group_cache = VipGroupChatCache()
+
+def describe_vip_group_problem(info):
+    """Descreve o que impede o bot de operar no grupo, ou None se estiver tudo certo"""
+    if info['type'] not in VALID_VIP_CHAT_TYPES:
+        return f"Não é um grupo ou supergrupo válido (tipo: {info['type']})"
+    if not info['is_admin']:
+        return "Bot não é administrador do grupo"
+    if not info['can_invite_users']:
+        return "Bot sem permissão para convidar usuários"
+    if not info['can_restrict_members']:
+        return "Bot sem permissão para banir usuários"
+    return None
+
+def get_active_vip_group_ids():
     db = Database()
     try:
         db.connect()
         if not db.connection:
-            return False
-        
-        # Obter informações do plano
-        plan = db.execute_fetch_one(
-            "SELECT * FROM vip_plans WHERE id = %s",
-            (plan_id,)
-        )
-        
-        if not plan:
-            return False
-        
-        # Encontrar assinatura atual ativa
-        current_subscription = db.execute_fetch_one(
-            """SELECT * FROM subscriptions 
-            WHERE user_id = %s 
-            AND is_active = TRUE
-            AND (is_permanent = TRUE OR end_date > NOW())
-            ORDER BY end_date DESC
-            LIMIT 1""",
-            (user_id,)
-        )
-        
-        if not current_subscription:
-            logger.error(f"Tentativa de renovação sem assinatura ativa: usuário {user_id}")
-            return False
-        
-        # Calcular nova data de expiração
-        if plan['duration_days'] == -1:
-            # Plano permanente
-            end_date = datetime(2099, 12, 31)
-            is_permanent = True
-        else:
-            # Renovação - soma os dias à data atual de expiração
-            current_end_date = current_subscription['end_date']
-            if isinstance(current_end_date, str):
-                current_end_date = datetime.strptime(current_end_date, "%Y-%m-%d %H:%M:%S")
-            end_date = current_end_date + timedelta(days=plan['duration_days'])
-            is_permanent = False
-            
-            days_left = (current_end_date - datetime.now()).days
-            logger.info(f"Renovação detectada. Dias restantes: {days_left}, Novos dias: {plan['duration_days']}, Total: {days_left + plan['duration_days']}")
-        
-        # Desativar assinatura atual
-        db.execute_query(
-            "UPDATE subscriptions SET is_active = FALSE WHERE id = %s",
-            (current_subscription['id'],),
-            commit=True
-        )
-        
-        # Inserir nova assinatura
-        db.execute_query(
-            """INSERT INTO subscriptions 
-            (user_id, plan_id, payment_id, payment_method, payment_status, 
-             start_date, end_date, is_permanent, is_active,
-             notified_1, notified_2, notified_3, renewal_notified) 
-            VALUES (%s, %s, %s, 'mercadopago', 'approved', NOW(), %s, %s, TRUE, FALSE, FALSE, FALSE, FALSE)""",
-            (user_id, plan_id, payment_id, end_date, is_permanent),
-            commit=True
-        )
-        
-        logger.info(f"Renovação registrada: usuário {user_id}, plano {plan_id}")
-        logger.info(f"Nova data de expiração: {end_date}")
-        logger.info(f"Notificações de expiração limpas para o usuário {user_id}")
+            return []
+        groups = db.execute_fetch_all("SELECT DISTINCT group_id FROM vip_groups WHERE is_active = TRUE")
+        return [g['group_id'] for g in groups or []]
+    finally:
+        db.close()
+
+async def get_vip_group_info(bot, group_id, permission=None):
+    """Retorna os metadados do grupo validando tipo e, opcionalmente, uma permissão do bot"""
+    info = await vip_group_cache.get(bot, group_id)
+    if info['type'] not in VALID_VIP_CHAT_TYPES:
+        raise ValueError(f"Grupo {group_id} não é um grupo ou supergrupo válido. Tipo: {info['type']}")
+    if permission and not info[permission]:
+        raise PermissionError(f"Bot sem permissão {permission} no grupo {group_id}")
+    return info
+
+async def refresh_vip_group_cache(context: ContextTypes.DEFAULT_TYPE):
+    """Atualiza o cache dos grupos VIP e avisa os admins sobre problemas novos"""
+    try:
+        problems = await vip_group_cache.refresh(context.bot, get_active_vip_group_ids())
+        new_problems = {gid: p for gid, p in problems.items() if gid not in vip_group_cache.reported_problems}
+        vip_group_cache.reported_problems = set(problems)
+        
+        if new_problems:
+            await notify_admins(
+                context.bot,
+                "⚠️ Problemas nos grupos VIP\n\n"
+                + "\n".join(f"📱 {gid}: {p}" for gid, p in new_problems.items())
+            )
+    except Exception as e:
+        logger.error(f"Erro ao atualizar cache dos grupos VIP: {e}")
 
-        # Notificar admin
+async def create_group_invite_link(bot, group_id, user_id, name, expire_days):
+    """Valida o grupo e retorna um link de convite (pool, link novo ou link existente do grupo)"""
+    await get_vip_group_info(bot, group_id, 'can_invite_users')
+    try:
         try:
-            config = load_config()
-            if config is None:
-                logger.error("Falha ao carregar as configurações.")
-            return  # ou lidar de forma apropriada
-            if config and 'admin_id' in config:
-                if not is_admin(int(update.effective_user.id)):
-                    return
-                admin_message = (
-                    f"🔄 Renovação de Assinatura VIP!\n\n"
-                    f"👤 Usuário: {user_id}\n"
-                    f"💎 Plano: {plan['name']}\n"
-                    f"💰 Valor: R${plan['price']:.2f}\n"
-                    f"⏱️ Duração: {'Permanente' if plan['duration_days'] == -1 else str(plan['duration_days']) + ' dias'}\n"
-                    f"📅 Nova expiração: {end_date.strftime('%d/%m/%Y %H:%M')}\n"
-                    f"💳 ID do Pagamento: {payment_id}"
-                )
-                await context.bot.send_message(chat_id=admin_id, text=admin_message)
+            return await get_invite_link_for_user(bot, group_id, user_id, name=name, expire_days=expire_days)
         except Exception as e:
-            logger.error(f"Erro ao notificar admin sobre renovação: {e}")
+            logger.error(f"Erro ao criar link de convite para grupo {group_id}: {e}")
+            # Se falhar, tenta obter link existente
+            await telegram_rate_limiter.acquire()
+            return await bot.export_chat_invite_link(chat_id=group_id)
+    except TelegramError:
+        # Permissões ou o próprio grupo podem ter mudado
+        vip_group_cache.invalidate(group_id)
+        raise
 
-        return True
-        
+# =====================================================
+# POOL DE LINKS DE CONVITE
+# =====================================================
+
+# Links de uso único pré-criados por grupo, para que a entrega não dependa de
+# chamadas ao Telegram no momento da compra. Cada link é criado com a validade
+# do plano mais longo do grupo mais INVITE_LINK_POOL_TTL_DAYS, então continua
+# servindo esse plano por até INVITE_LINK_POOL_TTL_DAYS dias.
+INVITE_LINK_POOL_SIZE = 5
+INVITE_LINK_POOL_TTL_DAYS = 7
+# Planos permanentes recebem links de 30 dias (renováveis)
+PERMANENT_PLAN_LINK_DAYS = 30
+# Novas tentativas de entrega (e pedidos repetidos de links) reaproveitam o
+# link já reservado para o usuário nesse intervalo, sem consumir o pool
+INVITE_LINK_REUSE_HOURS = 1
+
+def invite_link_days(duration_days):
+    """Validade, em dias, do link de convite de um plano"""
+    return PERMANENT_PLAN_LINK_DAYS if duration_days == -1 else duration_days
+
+def lease_invite_link(group_id, user_id, expire_days):
+    """Reserva um link livre do pool válido por pelo menos `expire_days` dias e retorna a URL, ou None.
+
+    Se o usuário já reservou um link desse grupo nas últimas INVITE_LINK_REUSE_HOURS
+    horas (ex.: entrega repetida pelo relay), o mesmo link é devolvido.
+    """
+    db = Database()
+    try:
+        db.connect()
+        if not db.connection:
+            return None
+        with db.transaction() as cursor:
+            cursor.execute(
+                """SELECT invite_link FROM vip_invite_link_pool
+                WHERE group_id = %s
+                AND leased_to = %s
+                AND leased_at > NOW() - INTERVAL %s HOUR
+                AND expire_date >= NOW() + INTERVAL %s DAY
+                ORDER BY leased_at DESC
+                LIMIT 1""",
+                (group_id, user_id, INVITE_LINK_REUSE_HOURS, expire_days)
+            )
+            row = cursor.fetchone()
+            if row:
+                return row['invite_link']
+            cursor.execute(
+                """SELECT id, invite_link FROM vip_invite_link_pool
+                WHERE group_id = %s
+                AND leased_to IS NULL
+                AND expire_date >= NOW() + INTERVAL %s DAY
+                ORDER BY expire_date ASC
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED""",
+                (group_id, expire_days)
+            )
+            row = cursor.fetchone()
+            if not row:
+                return None
+            cursor.execute(
+                "UPDATE vip_invite_link_pool SET leased_to = %s, leased_at = NOW() WHERE id = %s",
+                (user_id, row['id'])
+            )
+            return row['invite_link']
     except Exception as e:
-        logger.error(f"Erro ao renovar assinatura: {e}")
-        return False
+        logger.error(f"Erro ao reservar link do pool para grupo {group_id}: {e}")
+        return None
     finally:
         db.close()
 
-# Adicionar usuário aos grupos VIP
-async def add_user_to_vip_groups(bot, user_id, plan_id):
-    config = load_config()
-    if config is None:
-        logger.error("Falha ao carregar as configurações.")
-        return  # ou lidar de forma apropriada
-    
-    # Buscar o plano no banco de dados
+async def get_invite_link_for_user(bot, group_id, user_id, name, expire_days):
+    """Entrega um link de uso único: usa o pool e, se não houver link com a validade pedida, cria o link na hora"""
+    invite_link = lease_invite_link(group_id, user_id, expire_days)
+    if invite_link:
+        return invite_link
+    
+    logger.info(f"Pool sem link de {expire_days} dias para grupo {group_id} - criando link sob demanda")
+    await telegram_rate_limiter.acquire()
+    created = await bot.create_chat_invite_link(
+        chat_id=group_id,
+        name=name,
+        expire_date=datetime.now() + timedelta(days=expire_days),
+        member_limit=1,
+        creates_join_request=False
+    )
+    return created.invite_link
+
+async def refill_invite_link_pool(context: ContextTypes.DEFAULT_TYPE):
+    """Completa o pool de links de cada grupo VIP ativo e descarta links expirados (reservados ou não)"""
     db = Database()
     try:
         db.connect()
         if not db.connection:
-            logger.error("Erro ao conectar ao banco de dados")
-            return False
+            return
         
-        # Buscar o plano
-        plan = db.execute_fetch_one(
-            "SELECT * FROM vip_plans WHERE id = %s",
-            (plan_id,)
+        db.execute_query(
+            """DELETE FROM vip_invite_link_pool
+            WHERE expire_date <= NOW()
+            OR (leased_to IS NULL AND expire_date <= NOW() + INTERVAL 1 HOUR)""",
+            commit=True
         )
         
-        if not plan:
-            logger.error(f"Plano {plan_id} não encontrado no banco de dados")
-            return False
-        
+        # Links livres que ainda servem o plano mais longo de cada grupo
+        groups = db.execute_fetch_all(
+            """SELECT g.group_id, g.link_days, COUNT(p.id) as available
+            FROM (
+                SELECT vg.group_id,
+                    MAX(CASE WHEN vp.duration_days = -1 THEN %s ELSE vp.duration_days END) as link_days
+                FROM vip_groups vg
+                JOIN plan_groups pg ON vg.id = pg.group_id
+                JOIN vip_plans vp ON vp.id = pg.plan_id
+                WHERE vg.is_active = TRUE
+                GROUP BY vg.group_id
+            ) g
+            LEFT JOIN vip_invite_link_pool p
+                ON p.group_id = g.group_id
+                AND p.leased_to IS NULL
+                AND p.expire_date >= NOW() + INTERVAL g.link_days DAY
+            GROUP BY g.group_id, g.link_days""",
+            (PERMANENT_PLAN_LINK_DAYS,)
+        )
+        
+        for group in groups:
+            group_id = group['group_id']
+            info = vip_group_cache.peek(group_id)
+            if info and not info['can_invite_users']:
+                continue  # Problema já reportado pelo cache dos grupos
+            missing = INVITE_LINK_POOL_SIZE - group['available']
+            for _ in range(missing):
+                try:
+                    expire_date = datetime.now() + timedelta(days=group['link_days'] + INVITE_LINK_POOL_TTL_DAYS)
+                    await telegram_rate_limiter.acquire()
+                    invite_link = await context.bot.create_chat_invite_link(
+                        chat_id=group_id,
+                        name="VIP pool",
+                        expire_date=expire_date,
+                        member_limit=1,
+                        creates_join_request=False
+                    )
+                    db.execute_query(
+                        """INSERT INTO vip_invite_link_pool (group_id, invite_link, expire_date)
+                        VALUES (%s, %s, %s)""",
+                        (group_id, invite_link.invite_link, expire_date),
+                        commit=True
+                    )
+                except Exception as e:
+                    logger.error(f"Erro ao completar pool de links do grupo {group_id}: {e}")
+                    break
+            if missing > 0:
+                logger.info(f"Pool de links do grupo {group_id}: {missing} link(s) criado(s)")
+    except Exception as e:
+        logger.error(f"Erro ao completar pool de links de convite: {e}")
+    finally:
+        db.close()
+
+# Adicionar usuário aos grupos VIP
+async def add_user_to_vip_groups(bot, user_id, plan_id, delivery_id=None):
+    """Envia ao usuário os links dos grupos do plano; False se algum grupo falhou (a entrega deve ser repetida).
+
+    Com `delivery_id` (linha do outbox), o resultado de cada grupo fica em
+    access_delivery_groups: numa nova tentativa, os grupos já enviados são
+    pulados e os admins só são avisados de grupos que ainda não tinham falhado.
+    """
+    # Buscar o plano no banco de dados
+    db = Database()
+    try:
+        db.connect()
+        if not db.connection:
+            logger.error("Erro ao conectar ao banco de dados")
+            return False
+        
+        # Buscar o plano
+        plan = db.execute_fetch_one(
+            "SELECT * FROM vip_plans WHERE id = %s",
+            (plan_id,)
+        )
+        
+        if not plan:
+            logger.error(f"Plano {plan_id} não encontrado no banco de dados")
+            return False
+        
         # Buscar grupos associados ao plano
         groups = db.execute_fetch_all(
             """SELECT vg.group_id, vg.group_name
@@ -1160,95 +1718,76 @@ async def add_user_to_vip_groups(bot, user_id, plan_id):
             logger.info(f"Nenhum grupo encontrado para o plano {plan_id}")
             return True  # Retorna True mesmo sem grupos
         
+        # Grupos já resolvidos em tentativas anteriores desta entrega
+        settled = access_delivery_group_status(db, delivery_id) if delivery_id is not None else {}
+        groups = [group for group in groups if settled.get(group['group_id']) != GROUP_DONE]
+        if not groups:
+            return True
+        
         # Calcular duração do link baseada no plano
+        link_duration = invite_link_days(plan['duration_days'])
         if plan['duration_days'] == -1:
-            # Plano permanente - link de 30 dias (renovável)
-            link_duration = 30
-            link_message = "O link expira em 30 dias e pode ser renovado."
+            # Plano permanente - link renovável
+            link_message = f"O link expira em {link_duration} dias e pode ser renovado."
         else:
             # Plano temporário - link com duração igual ao plano
-            link_duration = plan['duration_days']
             link_message = f"O link expira em {link_duration} dias (duração do seu plano)."
         
-        # Adicionar usuário aos grupos
-        for group in groups:
-            group_id = group['group_id']
-            group_name = group['group_name']
-            
-            try:
-                # Verificar se o grupo é um supergrupo
-                chat = await bot.get_chat(group_id)
-                if chat.type in ['group', 'supergroup', 'channel']:
-                    try:
-                        # Criar link de convite com duração baseada no plano
-                        invite_link = await bot.create_chat_invite_link(
-                            chat_id=group_id,
-                            name=f"VIP {user_id} - {plan['name']}",
-                            expire_date=datetime.now() + timedelta(days=link_duration),
-                            member_limit=1,
-                            creates_join_request=False
-                        )
-                        
-                        # Enviar link para o usuário
-                        await bot.send_message(
-                            chat_id=user_id,
-                            text=f"⬇ ESTOU PELADINHA TE ESPERANDO 🙈\n\n"
-                                 f"😈 Clique em \" VER CANAL \" pra gente começar a brincar 🔥\n\n"
-                                 f"💎 VIP DA EDUARDA 🍑🔥\n\n"
-                                 f"📝 O link expira em {plan['duration_days']} dias (duração do seu plano).\n\n"
-                                 f"⚠ Este link é único e só pode ser usado uma vez.\n\n"
-                                 f"**Link:** {invite_link.invite_link}"
-                        )
-                        logger.info(f"Link de convite enviado para usuário {user_id} - grupo {group_id} (duração: {link_duration} dias)")
-                        
-                    except Exception as e:
-                        logger.error(f"Erro ao criar link de convite para grupo {group_id}: {e}")
-                        # Se falhar, tenta obter link existente
-                        try:
-                            invite_link = await bot.export_chat_invite_link(chat_id=group_id)
-                            await bot.send_message(
-                                chat_id=user_id,
-                                text=f"⬇ ESTOU PELADINHA TE ESPERANDO 🙈\n\n"
-                                     f"😈 Clique em \" VER CANAL \" pra gente começar a brincar 🔥\n\n"
-                                     f"💎 VIP DA EDUARDA 🍑🔥\n\n"
-                                     f"📝 O link expira em {plan['duration_days']} dias (duração do seu plano).\n\n"
-                                     f"⚠ Este link é único e só pode ser usado uma vez.\n\n"
-                                     f"**Link:** {invite_link}"
-                            )
-                            logger.info(f"Link existente enviado para usuário {user_id} - grupo {group_id}")
-                        except Exception as e2:
-                            logger.error(f"Erro ao obter link existente: {e2}")
-                            # Se tudo falhar, notifica o admin
-                            if config and 'admin_id' in config:
-                                if not is_admin(int(update.effective_user.id)):
-                                    return
-                                await bot.send_message(
-                                    chat_id=admin_id,
-                                    text=f"⚠️ Erro ao gerar link para usuário {user_id} no grupo {group_id}.\n"
-                                         f"Erro: {e}\nErro do link: {e2}\n\n"
-                                         f"Verifique se o bot tem permissões de administrador no grupo."
-                                )
-                else:
-                    logger.error(f"Grupo {group_id} não é um grupo ou supergrupo válido")
-                    # Notifica o admin
-                    if config and 'admin_id' in config:
-                        if not is_admin(int(update.effective_user.id)):
-                            return
-                        await bot.send_message(
-                            chat_id=admin_id,
-                            text=f"⚠️ Grupo {group_id} não é um grupo ou supergrupo válido.\nTipo: {chat.type}"
-                        )
-                        
-            except Exception as e:
-                logger.error(f"Erro ao processar grupo {group_id} para usuário {user_id}: {e}")
-                # Notifica o admin
-                if config and 'admin_id' in config:
-                    if not is_admin(int(update.effective_user.id)):
-                        return
-                    await bot.send_message(
-                        chat_id=admin_id,
-                        text=f"⚠️ Erro ao processar grupo {group_id} para usuário {user_id}.\nErro: {e}"
-                    )
+        # Gerar os links de todos os grupos em paralelo
+        results = await gather_limited([
+            create_group_invite_link(
+                bot,
+                group['group_id'],
+                user_id,
+                name=f"VIP {user_id} - {plan['name']}",
+                expire_days=link_duration
+            )
+            for group in groups
+        ])
+        
+        links = []
+        delivered = []
+        failures = []
+        new_failures = []
+        for group, result in zip(groups, results):
+            if isinstance(result, Exception):
+                logger.error(f"Erro ao processar grupo {group['group_id']} para usuário {user_id}: {result}")
+                failures.append((group['group_id'], GROUP_FAILED, result))
+                if settled.get(group['group_id']) != GROUP_FAILED:
+                    new_failures.append(f"📱 {group['group_name']} ({group['group_id']}): {result}")
+            else:
+                links.append(f"📱 {group['group_name']}:\n{result}")
+                delivered.append((group['group_id'], GROUP_DONE, None))
+        
+        # Enviar todos os links em uma única mensagem
+        if links:
+            await telegram_rate_limiter.acquire()
+            await bot.send_message(
+                chat_id=user_id,
+                text=f"⬇ ESTOU PELADINHA TE ESPERANDO 🙈\n\n"
+                     f"😈 Clique em \" VER CANAL \" pra gente começar a brincar 🔥\n\n"
+                     f"💎 VIP DA EDUARDA 🍑🔥\n\n"
+                     f"📝 {link_message}\n\n"
+                     f"⚠ Cada link é único e só pode ser usado uma vez.\n\n"
+                     + "\n\n".join(links)
+            )
+            logger.info(f"{len(links)} link(s) de convite enviados para usuário {user_id} (duração: {link_duration} dias)")
+            if delivery_id is not None:
+                record_access_delivery_groups(db, delivery_id, delivered)
+        
+        # Notificar os admins sobre os grupos que passaram a falhar
+        if failures:
+            if new_failures:
+                await notify_admins(
+                    bot,
+                    f"⚠️ Erro ao gerar link para usuário {user_id}\n\n"
+                    + "\n".join(new_failures)
+                    + "\n\nVerifique se o bot tem permissões de administrador no grupo."
+                )
+            if delivery_id is not None:
+                record_access_delivery_groups(db, delivery_id, failures)
+            # Entrega incompleta: quem chamou (relay do outbox) tenta de novo com backoff
+            return False
         
         return True
         
@@ -1266,7 +1805,7 @@ def generate_mercadopago_pix(amount, description, external_reference):
 
 # Nova função unificada para gerar PIX automático
 async def generate_pix_automatico(amount, description, external_reference):
-    logger.info(f"[DEBUG] generate_pix_automatico chamado: amount={amount}, description={description}, external_reference={external_reference}")
+    logger.debug(f"generate_pix_automatico chamado: amount={amount}, description={description}, external_reference={external_reference}")
     """Gera PIX usando o sistema de provedores com fallback"""
     try:
         provider_manager = get_pix_provider_manager()
@@ -1285,6 +1824,8 @@ async def generate_pix_automatico(amount, description, external_reference):
 
 # Gerar QR Code PIX
 def generate_pix_qr_code(payment_data):
+    import qrcode
+
     qr = qrcode.QRCode(version=1, box_size=10, border=5)
     qr.add_data(payment_data)
     qr.make(fit=True)
@@ -1305,41 +1846,30 @@ async def add_user_to_stats(user, bot):
             logger.error("❌ Falha na conexão com banco de dados em add_user_to_stats")
             return
         
-        logger.info(f"🔍 Verificando usuário {user.id} em add_user_to_stats...")
-        
-        # Verificar se usuário já existe
-        existing_user = db.execute_fetch_one(
-            "SELECT id FROM users WHERE id = %s",
-            (user.id,)
-        )
-        
-        if not existing_user:
-            logger.info(f"➕ Adicionando novo usuário {user.id} ao banco de dados...")
-            db.execute_query(
-                """INSERT INTO users 
+        # Inserir apenas se ainda não existir, contando o novo usuário na mesma transação
+        with db.transaction() as cursor:
+            cursor.execute(
+                """INSERT IGNORE INTO users 
                 (id, username, first_name, last_name, joined_date) 
                 VALUES (%s, %s, %s, %s, NOW())""",
-                (user.id, user.username, user.first_name, user.last_name),
-                commit=True
+                (user.id, user.username, user.first_name, user.last_name)
             )
+            is_new_user = cursor.rowcount == 1
+            if is_new_user:
+                bump_counter(cursor, COUNTER_TOTAL_USERS, 1)
+        
+        if is_new_user:
             logger.info(f"✅ Usuário {user.id} adicionado com sucesso")
             
-            # Notificar admin
-            config = load_config()
-            if config is None:
-                logger.error("Falha ao carregar as configurações.")
-                return  # ou lidar de forma apropriada
-            if config and 'admin_id' in config:
-                if not is_admin(int(update.effective_user.id)):
-                    return
-                msg = (
-                    f"👤 Novo usuário acessou o bot!\n\n"
-                    f"ID: {user.id}\n"
-                    f"Nome: {user.first_name or ''} {user.last_name or ''}\n"
-                    f"Username: @{user.username if user.username else '-'}\n"
-                    f"Data de entrada: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-                )
-                await bot.send_message(chat_id=admin_id, text=msg)
+            # Notificar admins
+            await notify_admins(
+                bot,
+                f"👤 Novo usuário acessou o bot!\n\n"
+                f"ID: {user.id}\n"
+                f"Nome: {user.first_name or ''} {user.last_name or ''}\n"
+                f"Username: @{user.username if user.username else '-'}\n"
+                f"Data de entrada: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
+            )
         else:
             logger.info(f"ℹ️ Usuário {user.id} já existe no banco de dados")
             
@@ -1356,12 +1886,14 @@ async def update_user_vip_status(user_id, is_vip=True):
         if not db.connection:
             return False
         
-        # Atualizar status VIP do usuário
-        db.execute_query(
-            "UPDATE users SET is_vip = %s WHERE id = %s",
-            (is_vip, user_id),
-            commit=True
-        )
+        # Atualizar status VIP do usuário e o contador, só se o status mudou
+        with db.transaction() as cursor:
+            cursor.execute(
+                "UPDATE users SET is_vip = %s WHERE id = %s AND COALESCE(is_vip, FALSE) <> %s",
+                (is_vip, user_id, is_vip)
+            )
+            if cursor.rowcount == 1:
+                bump_counter(cursor, COUNTER_VIP_USERS, 1 if is_vip else -1)
         
         logger.info(f"Status VIP atualizado para usuário {user_id}: {is_vip}")
         return True
@@ -1448,7 +1980,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if days_left <= 3 and not current_sub['is_permanent']:
                 keyboard.append([InlineKeyboardButton(
                     "🔄 Renovar Plano Atual",
-                    callback_data=f"renew_{current_sub['plan_id']}"
+                    callback_data=encode_callback('renew', current_sub['plan_id'])
                 )])
             
             # Adicionar outros planos disponíveis
@@ -1460,7 +1992,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             for plan in other_plans:
                 keyboard.append([InlineKeyboardButton(
                     f"{plan['name']} - R${plan['price']:.2f}",
-                    callback_data=f"plan_{plan['id']}"
+                    callback_data=encode_callback('plan', plan['id'])
                 )])
             
             reply_markup = InlineKeyboardMarkup(keyboard)
@@ -1481,7 +2013,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         for plan in plans:
             keyboard.append([InlineKeyboardButton(
                 f"{plan['name']} - R${plan['price']:.2f}",
-                callback_data=f"plan_{plan['id']}"
+                callback_data=encode_callback('plan', plan['id'])
             )])
 
         messages = load_messages_from_db()
@@ -1560,7 +2092,7 @@ async def handle_show_plans(update: Update, context: ContextTypes.DEFAULT_TYPE):
         for plan in plans:
             keyboard.append([InlineKeyboardButton(
                 f"{plan['name']} - R${plan['price']:.2f}",
-                callback_data=f"plan_{plan['id']}"
+                callback_data=encode_callback('plan', plan['id'])
             )])
     finally:
         db.close()
@@ -1586,7 +2118,11 @@ async def handle_plan_selection(update: Update, context: ContextTypes.DEFAULT_TY
         return
     
     # Extrair ID do plano do callback
-    plan_id = int(query.data.split('_')[1])
+    callback = decode_callback(query.data)
+    if callback is None:
+        await query.message.reply_text("⌛ Este botão expirou. Use /start para ver os planos novamente.")
+        return
+    plan_id = callback.args[0]
     
     # Carregar mensagens do banco de dados
     messages = load_messages_from_db()
@@ -1604,11 +2140,11 @@ async def handle_plan_selection(update: Update, context: ContextTypes.DEFAULT_TY
     # Criar teclado com métodos de pagamento
     keyboard = []
     if config['payment_methods']['pix_automatico']['enabled']:
-        keyboard.append([InlineKeyboardButton("💳 PIX Automático", callback_data=f"pix_auto_{plan_id}")])
+        keyboard.append([InlineKeyboardButton("💳 PIX Automático", callback_data=encode_callback('pix_auto', plan_id))])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     # Criar mensagem baseada no tipo (renovação ou novo plano)
-    if query.data.startswith("renew_"):
+    if callback.action == 'renew':
         message = f"🔄 Renovação do Plano: {plan['name']}\n"
         message += f"💰 Valor: R${plan['price']:.2f}\n"
         message += f"⏱️ Duração: {'Permanente' if plan['duration_days'] == -1 else str(plan['duration_days']) + ' dias'}\n\n"
@@ -1624,7 +2160,11 @@ async def handle_plan_selection(update: Update, context: ContextTypes.DEFAULT_TY
 async def handle_renewal_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    if query.data == "cancel_renew":
+    callback = decode_callback(query.data)
+    if callback is None:
+        await query.message.reply_text("⌛ Este botão expirou. Use /start para ver os planos novamente.")
+        return
+    if callback.action == 'cancel_renew':
         keyboard = []
         db = Database()
         try:
@@ -1633,7 +2173,7 @@ async def handle_renewal_confirmation(update: Update, context: ContextTypes.DEFA
             for plan in plans:
                 keyboard.append([InlineKeyboardButton(
                     f"{plan['name']} - R${plan['price']:.2f}",
-                    callback_data=f"plan_{plan['id']}"
+                    callback_data=encode_callback('plan', plan['id'])
                 )])
         finally:
             db.close()
@@ -1643,7 +2183,7 @@ async def handle_renewal_confirmation(update: Update, context: ContextTypes.DEFA
             reply_markup=reply_markup
         )
         return
-    plan_id = int(query.data.split('_')[2])
+    plan_id = callback.args[0]
     config = load_config()
     if config is None:
         logger.error("Falha ao carregar as configurações.")
@@ -1654,7 +2194,7 @@ async def handle_renewal_confirmation(update: Update, context: ContextTypes.DEFA
         return
     keyboard = []
     if config['payment_methods']['pix_automatico']['enabled']:
-        keyboard.append([InlineKeyboardButton("💳 PIX Automático", callback_data=f"pix_auto_{plan_id}")])
+        keyboard.append([InlineKeyboardButton("💳 PIX Automático", callback_data=encode_callback('pix_auto', plan_id))])
     reply_markup = InlineKeyboardMarkup(keyboard)
     messages = load_messages_from_db()
     message = f"🔄 Renovação Confirmada!\n\n"
@@ -1667,7 +2207,7 @@ async def handle_renewal_confirmation(update: Update, context: ContextTypes.DEFA
 async def handle_payment_method(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     # LOG DETALHADO DE ENTRADA
-    logger.info(f"[DEBUG] handle_payment_method chamado: user_id={update.effective_user.id}, data={query.data}, chat_id={query.message.chat_id}, message_id={query.message.message_id}")
+    logger.debug(f"handle_payment_method chamado: user_id={update.effective_user.id}, data={query.data}, chat_id={query.message.chat_id}, message_id={query.message.message_id}")
     await query.answer()
     
     config = load_config()
@@ -1680,10 +2220,12 @@ async def handle_payment_method(update: Update, context: ContextTypes.DEFAULT_TY
         await query.message.reply_text("🛠️ O bot está em manutenção. Tente novamente mais tarde.")
         return
     
-    # Corrigindo o split do callback_data
-    parts = query.data.split('_')
-    method = parts[1]  # pix_auto
-    plan_id = parts[2]  # ID do plano
+    callback = decode_callback(query.data)
+    if callback is None:
+        await query.message.reply_text("⌛ Este botão expirou. Use /start para ver os planos novamente.")
+        return
+    method = callback.action.split('_')[1]  # pix_auto -> auto
+    plan_id = callback.args[0]
     
     # Carregar mensagens do banco de dados
     messages = load_messages_from_db()
@@ -1720,8 +2262,8 @@ async def handle_payment_method(update: Update, context: ContextTypes.DEFAULT_TY
             
             # Criar botões "Já Paguei" e "Copiar Código PIX"
             keyboard = [
-                [InlineKeyboardButton("✅ Já Paguei", callback_data=f"check_{pix_data['payment_id']}")],
-                [InlineKeyboardButton("📋 Copiar Código PIX", callback_data=f"copy_pix_{pix_data['payment_id']}")]
+                [InlineKeyboardButton("✅ Já Paguei", callback_data=encode_callback('check', pix_data['payment_id']))],
+                [InlineKeyboardButton("📋 Copiar Código PIX", callback_data=encode_callback('copy_pix', pix_data['payment_id']))]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
@@ -1751,20 +2293,15 @@ async def handle_payment_method(update: Update, context: ContextTypes.DEFAULT_TY
             # Iniciar verificação automática (se job_queue estiver disponível)
             if hasattr(context, 'job_queue') and context.job_queue is not None:
                 try:
-                    context.job_queue.run_repeating(
-                        check_payment_auto,
-                        interval=5,
-                        first=5,
-                        data={
-                            'message_id': message.message_id,
-                            'chat_id': message.chat_id,
-                            'payment_id': pix_data['payment_id'],
-                            'user_id': update.effective_user.id,
-                            'plan_id': plan_id,
-                            'plan': plan,
-                            'provider': pix_data['provider']  # Adicionar provedor usado
-                        }
-                    )
+                    schedule_payment_check(context.job_queue, context.bot_data, {
+                        'message_id': message.message_id,
+                        'chat_id': message.chat_id,
+                        'payment_id': pix_data['payment_id'],
+                        'user_id': update.effective_user.id,
+                        'plan_id': plan_id,
+                        'plan': plan,
+                        'provider': pix_data['provider']  # Adicionar provedor usado
+                    })
                     logger.info("✅ Verificação automática de pagamento iniciada")
                 except Exception as e:
                     logger.warning(f"⚠️ Erro ao iniciar verificação automática: {e}")
@@ -1809,6 +2346,51 @@ async def handle_payment_method(update: Update, context: ContextTypes.DEFAULT_TY
             parse_mode='Markdown'
         )
 
+# Verificações automáticas pendentes ficam em bot_data (persistido por
+# MySQLPersistence) e são reagendadas em post_init após um reinício
+PENDING_PAYMENT_CHECKS = 'pending_payment_checks'
+PAYMENT_CHECK_INTERVAL = 5  # segundos
+PAYMENT_CHECK_MAX_AGE = timedelta(hours=24)
+
+def payment_check_job_name(payment_id):
+    return f"payment_check_{payment_id}"
+
+def schedule_payment_check(job_queue, bot_data, data):
+    """Agenda check_payment_auto para um pagamento e o registra em bot_data"""
+    data.setdefault('created_at', datetime.now())
+    bot_data.setdefault(PENDING_PAYMENT_CHECKS, {})[data['payment_id']] = data
+    job_queue.run_repeating(
+        check_payment_auto,
+        interval=PAYMENT_CHECK_INTERVAL,
+        first=PAYMENT_CHECK_INTERVAL,
+        data=data,
+        name=payment_check_job_name(data['payment_id'])
+    )
+
+def stop_payment_check(context, payment_id):
+    """Cancela a verificação automática do pagamento e remove o registro pendente"""
+    if context.job_queue:
+        for job in context.job_queue.get_jobs_by_name(payment_check_job_name(payment_id)):
+            job.schedule_removal()
+    context.bot_data.get(PENDING_PAYMENT_CHECKS, {}).pop(payment_id, None)
+
+async def restore_payment_checks(application):
+    """post_init: reagenda as verificações que estavam pendentes antes do reinício"""
+    pending = application.bot_data.get(PENDING_PAYMENT_CHECKS, {})
+    if not pending or application.job_queue is None:
+        return
+    
+    now = datetime.now()
+    restored = 0
+    for payment_id, data in list(pending.items()):
+        if now - data.get('created_at', now) > PAYMENT_CHECK_MAX_AGE:
+            pending.pop(payment_id, None)
+            continue
+        pending.pop(payment_id)
+        schedule_payment_check(application.job_queue, application.bot_data, data)
+        restored += 1
+    logger.info(f"🔁 {restored} verificação(ões) de pagamento reagendada(s) após reinício")
+
 async def check_payment_auto(context: ContextTypes.DEFAULT_TYPE):
     """Verifica pagamento automaticamente e atualiza status"""
     job = context.job
@@ -1839,7 +2421,7 @@ async def check_payment_auto(context: ContextTypes.DEFAULT_TYPE):
                         logger.info(f"✅ Pagamento CNPay {payment_id} já foi processado via webhook!")
                         
                         # Parar verificação automática
-                        job.schedule_removal()
+                        stop_payment_check(context, payment_id)
                         
                         # Atualizar mensagem
                         try:
@@ -1862,7 +2444,7 @@ async def check_payment_auto(context: ContextTypes.DEFAULT_TYPE):
                         logger.info(f"❌ Pagamento CNPay {payment_id} foi rejeitado/cancelado")
                         
                         # Parar verificação automática
-                        job.schedule_removal()
+                        stop_payment_check(context, payment_id)
                         
                         # Atualizar mensagem
                         try:
@@ -1898,7 +2480,7 @@ async def check_payment_auto(context: ContextTypes.DEFAULT_TYPE):
             logger.info(f"✅ Pagamento {payment_id} aprovado!")
             
             # Parar verificação automática
-            job.schedule_removal()
+            stop_payment_check(context, payment_id)
             
             # Registrar assinatura
             success = await register_vip_subscription(user_id, plan_id, payment_id, context)
@@ -1920,17 +2502,17 @@ async def check_payment_auto(context: ContextTypes.DEFAULT_TYPE):
                 except Exception as e:
                     logger.error(f"Erro ao atualizar mensagem: {e}")
                     
-                # Adicionar usuário aos grupos VIP
-                await add_user_to_vip_groups(context.bot, user_id, plan_id)
+                # Acesso aos grupos VIP: a entrega já está no outbox, só acordar o relay
+                access_delivery_relay.wake()
                 
             else:
-                logger.error(f"Erro ao registrar assinatura para usuário {user_id}")
+                logger.info(f"Assinatura não registrada para usuário {user_id} (pagamento já processado ou erro)")
                 
         elif payment_info and payment_info.get('status') in ['rejected', 'cancelled']:
             logger.info(f"❌ Pagamento {payment_id} rejeitado/cancelado")
             
             # Parar verificação automática
-            job.schedule_removal()
+            stop_payment_check(context, payment_id)
             
             # Atualizar mensagem
             try:
@@ -1952,9 +2534,14 @@ async def check_payment_manual(update: Update, context: ContextTypes.DEFAULT_TYP
     query = update.callback_query
     await query.answer()
     
+    callback = decode_callback(query.data)
+    if callback is None:
+        await query.message.reply_text("⌛ Este botão expirou. Use /start para ver os planos novamente.")
+        return
+    payment_id = callback.args[0]
+    
     # Verificar se é callback de copiar PIX
-    if query.data.startswith('copy_pix_'):
-        payment_id = query.data.split('_')[2]
+    if callback.action == 'copy_pix':
         
         # Buscar dados do pagamento no banco
         db = Database()
@@ -1997,7 +2584,6 @@ async def check_payment_manual(update: Update, context: ContextTypes.DEFAULT_TYP
             db.close()
         return
     
-    payment_id = query.data.split('_')[1]
     user_id = update.effective_user.id
     
     # Primeiro, verificar se o usuário já tem uma assinatura ativa
@@ -2046,8 +2632,8 @@ async def check_payment_manual(update: Update, context: ContextTypes.DEFAULT_TYP
             
             # Registrar assinatura
             if await register_vip_subscription(int(user_id), int(plan_id), payment_id, context):
-                # Adicionar usuário aos grupos VIP
-                await add_user_to_vip_groups(context.bot, int(user_id), int(plan_id))
+                # Acesso aos grupos VIP: a entrega já está no outbox, só acordar o relay
+                access_delivery_relay.wake()
                 
                 try:
                     # Atualizar mensagem com confirmação
@@ -2062,10 +2648,7 @@ async def check_payment_manual(update: Update, context: ContextTypes.DEFAULT_TYP
                     await query.message.reply_text(success_message)
                 
                 # Parar verificação automática se existir
-                if hasattr(context, 'job_queue') and context.job_queue:
-                    for job in context.job_queue.jobs():
-                        if job.data.get('payment_id') == payment_id:
-                            job.schedule_removal()
+                stop_payment_check(context, payment_id)
     else:
         # Se não tem assinatura ativa e pagamento não foi aprovado
         if error_message:
@@ -2080,7 +2663,7 @@ async def check_payment_manual(update: Update, context: ContextTypes.DEFAULT_TYP
 
 # Comandos do admin
 async def admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    print(f"[DEBUG] update.effective_user.id = {update.effective_user.id} (type={type(update.effective_user.id)})")
+    logger.debug(f"update.effective_user.id = {update.effective_user.id} (type={type(update.effective_user.id)})")
     if not is_admin(int(update.effective_user.id)):
         logger.info(f"Usuário {update.effective_user.id} tentou acessar sem permissão.")
         await update.message.reply_text("Acesso negado.")
@@ -2121,125 +2704,218 @@ async def admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=reply_markup
     )
 
+# =====================================================
+# ROTEAMENTO DOS CALLBACKS DO PAINEL ADMIN
+# =====================================================
+
+# callback_data exato -> (handler, responder_callback)
+ADMIN_CALLBACK_ROUTES = {}
+# (prefixo, handler, responder_callback), do prefixo mais longo para o mais curto
+ADMIN_CALLBACK_PREFIX_ROUTES = []
+
+def admin_callback(*keys, prefix=None, answer=True):
+    """Registra o handler para callbacks admin exatos e/ou por prefixo.
+
+    Com answer=False o próprio handler responde o callback (query.answer).
+    """
+    def register(func):
+        for key in keys:
+            ADMIN_CALLBACK_ROUTES[key] = (func, answer)
+        if prefix:
+            ADMIN_CALLBACK_PREFIX_ROUTES.append((prefix, func, answer))
+            ADMIN_CALLBACK_PREFIX_ROUTES.sort(key=lambda route: len(route[0]), reverse=True)
+        return func
+    return register
+
+def resolve_admin_callback(data):
+    """Retorna (handler, responder_callback) para o callback_data, ou None"""
+    route = ADMIN_CALLBACK_ROUTES.get(data)
+    if route:
+        return route
+    for prefix, func, answer in ADMIN_CALLBACK_PREFIX_ROUTES:
+        if data.startswith(prefix):
+            return func, answer
+    return None
+
 async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    logger.info("[DEBUG] Entrou em handle_admin_callback")
+    """Ponto de entrada único dos callbacks admin_*: verifica o admin uma vez e despacha pela tabela de rotas"""
     query = update.callback_query
-    await query.answer()
+    if query is None:
+        # Chamado a partir de um fluxo de texto: não há callback para despachar
+        return
     
-    logger.info(f"Callback recebido: {query.data}")
-    logger.info(f"[DEBUG] update.effective_user.id = {update.effective_user.id} (type={type(update.effective_user.id)})")
+    route = resolve_admin_callback(query.data)
+    if route is None:
+        await query.answer()
+        logger.warning(f"Callback admin sem rota: {query.data}")
+        return
+    handler, answer = route
     
     if not is_admin(int(update.effective_user.id)):
+        await query.answer()
         logger.info(f"Usuário {update.effective_user.id} tentou acessar sem permissão.")
         await query.message.reply_text("Acesso negado.")
         return
     
-    config = load_config()
-    if config is None:
-        await query.answer("❌ Erro ao carregar configurações", show_alert=True)
+    if answer:
+        await query.answer()
+    # Métrica por rota, além da de handle_admin_callback como um todo
+    with track_handler(handler.__name__):
+        await handler(update, context)
+
+
+# TRATAMENTO ESPECÍFICO PARA GERENCIAR GRUPOS DO PLANO
+@admin_callback(prefix="admin_manage_plan_groups_")
+async def admin_cb_manage_plan_groups(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    plan_id = int(query.data.split('_')[-1])
+    plan = await get_plan_by_id(plan_id)
+    if not plan:
+        await query.answer("❌ Plano não encontrado!")
         return
-    
-    # Carregar mensagens do banco de dados
-    messages = load_messages_from_db()
-    
-    # TRATAMENTO ESPECÍFICO PARA GERENCIAR GRUPOS DO PLANO
-    if query.data.startswith("admin_manage_plan_groups_"):
-        plan_id = int(query.data.split('_')[-1])
-        plan = await get_plan_by_id(plan_id)
-        if not plan:
-            await query.answer("❌ Plano não encontrado!")
-            return
-        
-        # Buscar grupos associados ao plano
-        db = Database()
-        try:
-            db.connect()
-            plan_groups = db.execute_fetch_all(
-                """SELECT vg.id, vg.group_name, vg.group_id 
-                FROM vip_groups vg 
-                JOIN plan_groups pg ON vg.id = pg.group_id 
-                WHERE pg.plan_id = %s AND vg.is_active = TRUE""",
-                (plan_id,)
-            )
-            
-            # Buscar todos os grupos disponíveis
-            all_groups = db.execute_fetch_all(
-                "SELECT id, group_name, group_id FROM vip_groups WHERE is_active = TRUE"
+
+    # Buscar grupos associados ao plano
+    db = Database()
+    try:
+        db.connect()
+        plan_groups = db.execute_fetch_all(
+            """SELECT vg.id, vg.group_name, vg.group_id 
+            FROM vip_groups vg 
+            JOIN plan_groups pg ON vg.id = pg.group_id 
+            WHERE pg.plan_id = %s AND vg.is_active = TRUE""",
+            (plan_id,)
+        )
+
+        # Buscar todos os grupos disponíveis
+        all_groups = db.execute_fetch_all(
+            "SELECT id, group_name, group_id FROM vip_groups WHERE is_active = TRUE"
+        )
+    finally:
+        db.close()
+
+    # Criar lista de grupos associados
+    associated_group_ids = [group['id'] for group in plan_groups]
+
+    keyboard = []
+    for group in all_groups:
+        is_associated = group['id'] in associated_group_ids
+        status_icon = "✅" if is_associated else "❌"
+        keyboard.append([
+            InlineKeyboardButton(
+                f"{status_icon} {group['group_name']}", 
+                callback_data=f"admin_toggle_plan_group_{plan_id}_{group['id']}"
             )
-        finally:
-            db.close()
-        
-        # Criar lista de grupos associados
-        associated_group_ids = [group['id'] for group in plan_groups]
-        
-        keyboard = []
-        for group in all_groups:
-            is_associated = group['id'] in associated_group_ids
-            status_icon = "✅" if is_associated else "❌"
+        ])
+
+    keyboard.append([InlineKeyboardButton("➕ Adicionar Novo Grupo/Canal", callback_data=f"admin_add_new_group_{plan_id}")])
+    keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data=f"admin_edit_plan_{plan_id}")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    groups_text = ""
+    if plan_groups:
+        groups_text = "\n📱 Grupos associados:\n"
+        for group in plan_groups:
+            groups_text += f"• {group['group_name']}\n"
+    else:
+        groups_text = "\n📱 Nenhum grupo associado"
+
+    await query.message.edit_text(
+        f"📱 Gerenciar Grupos do Plano: {plan['name']}\n\n"
+        f"Clique nos grupos para associar/desassociar:"
+        f"{groups_text}\n\n"
+        f"✅ = Associado | ❌ = Não associado",
+        reply_markup=reply_markup
+    )
+    return
+
+# TRATAMENTO ESPECÍFICO PARA ADICIONAR NOVO GRUPO AO PLANO
+@admin_callback(prefix="admin_add_new_group_")
+async def admin_cb_add_new_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    plan_id = int(query.data.split('_')[-1])
+    plan = await get_plan_by_id(plan_id)
+    if not plan:
+        await query.answer("❌ Plano não encontrado!")
+        return
+
+    # Configurar estado para adicionar novo grupo
+    context.user_data['adding_group'] = {
+        'plan_id': plan_id,
+        'plan_name': plan['name'],
+        'step': 'group_name'
+    }
+
+    keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data=f"admin_manage_plan_groups_{plan_id}")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    await query.message.edit_text(
+        f"➕ Adicionar Novo Grupo/Canal ao Plano: {plan['name']}\n\n"
+        f"Digite o nome do novo grupo/canal:",
+        reply_markup=reply_markup
+    )
+    return
+
+# Handler for "Gerenciar Admins"
+@admin_callback("admin_manage_admins")
+async def admin_cb_manage_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    db = Database()
+    try:
+        db.connect()
+        admins = db.execute_fetch_all("SELECT admin_id FROM admins")
+    finally:
+        db.close()
+    admin_ids = [a['admin_id'] for a in admins] if admins else []
+    keyboard = []
+    for admin_id in admin_ids:
+        label = f"👤 {admin_id}"
+        if str(admin_id) != str(update.effective_user.id):
             keyboard.append([
                 InlineKeyboardButton(
-                    f"{status_icon} {group['group_name']}", 
-                    callback_data=f"admin_toggle_plan_group_{plan_id}_{group['id']}"
+                    f"Remover {admin_id}",
+                    callback_data=f"admin_remove_admin_{admin_id}"
                 )
             ])
-        
-        keyboard.append([InlineKeyboardButton("➕ Adicionar Novo Grupo/Canal", callback_data=f"admin_add_new_group_{plan_id}")])
-        keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data=f"admin_edit_plan_{plan_id}")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        groups_text = ""
-        if plan_groups:
-            groups_text = "\n📱 Grupos associados:\n"
-            for group in plan_groups:
-                groups_text += f"• {group['group_name']}\n"
         else:
-            groups_text = "\n📱 Nenhum grupo associado"
-        
-        await query.message.edit_text(
-            f"📱 Gerenciar Grupos do Plano: {plan['name']}\n\n"
-            f"Clique nos grupos para associar/desassociar:"
-            f"{groups_text}\n\n"
-            f"✅ = Associado | ❌ = Não associado",
-            reply_markup=reply_markup
-        )
-        return
-    
-    # TRATAMENTO ESPECÍFICO PARA ADICIONAR NOVO GRUPO AO PLANO
-    if query.data.startswith("admin_add_new_group_"):
-        plan_id = int(query.data.split('_')[-1])
-        plan = await get_plan_by_id(plan_id)
-        if not plan:
-            await query.answer("❌ Plano não encontrado!")
-            return
-        
-        # Configurar estado para adicionar novo grupo
-        context.user_data['adding_group'] = {
-            'plan_id': plan_id,
-            'plan_name': plan['name'],
-            'step': 'group_name'
-        }
-        
-        keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data=f"admin_manage_plan_groups_{plan_id}")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.message.edit_text(
-            f"➕ Adicionar Novo Grupo/Canal ao Plano: {plan['name']}\n\n"
-            f"Digite o nome do novo grupo/canal:",
-            reply_markup=reply_markup
-        )
-        return
+            keyboard.append([
+                InlineKeyboardButton(
+                    f"Você ({admin_id})",
+                    callback_data="noop"
+                )
+            ])
+    keyboard.append([InlineKeyboardButton("➕ Adicionar Admin", callback_data="admin_add_admin")])
+    keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "👤 Gerenciar administradores\n\nSelecione uma opção:",
+        reply_markup=reply_markup
+    )
+    return
 
-    if query.data == "admin_toggle_maintenance":
-        await handle_maintenance_toggle(update, context)
+# Handler for removing an admin
+@admin_callback(prefix="admin_remove_admin_")
+async def admin_cb_remove_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    admin_id_to_remove = query.data.replace("admin_remove_admin_", "")
+    if str(admin_id_to_remove) == str(update.effective_user.id):
+        await query.answer("Você não pode remover a si mesmo!", show_alert=True)
         return
-    # Handler for "Gerenciar Admins"
-    if query.data == "admin_manage_admins":
+    db = Database()
+    try:
+        db.connect()
+        db.execute_query("DELETE FROM admins WHERE admin_id = %s", (admin_id_to_remove,), commit=True)
+    finally:
+        db.close()
+        await query.answer("Admin removido com sucesso!")
+
+        # Recarrega a lista de admins corretamente, sem recursão
         db = Database()
         try:
             db.connect()
             admins = db.execute_fetch_all("SELECT admin_id FROM admins")
         finally:
             db.close()
+
         admin_ids = [a['admin_id'] for a in admins] if admins else []
         keyboard = []
         for admin_id in admin_ids:
@@ -2259,706 +2935,701 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
                     )
                 ])
         keyboard.append([InlineKeyboardButton("➕ Adicionar Admin", callback_data="admin_add_admin")])
-        keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")])
+        keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="admin")])
         reply_markup = InlineKeyboardMarkup(keyboard)
+
         await query.message.edit_text(
             "👤 Gerenciar administradores\n\nSelecione uma opção:",
             reply_markup=reply_markup
         )
-        return
-
-    # Handler for removing an admin
-    if query.data.startswith("admin_remove_admin_"):
-        admin_id_to_remove = query.data.replace("admin_remove_admin_", "")
-        if str(admin_id_to_remove) == str(update.effective_user.id):
-            await query.answer("Você não pode remover a si mesmo!", show_alert=True)
-            return
-        db = Database()
-        try:
-            db.connect()
-            db.execute_query("DELETE FROM admins WHERE admin_id = %s", (admin_id_to_remove,), commit=True)
-        finally:
-            db.close()
-            await query.answer("Admin removido com sucesso!")
 
-            # Recarrega a lista de admins corretamente, sem recursão
-            db = Database()
-            try:
-                db.connect()
-                admins = db.execute_fetch_all("SELECT admin_id FROM admins")
-            finally:
-                db.close()
+    return
 
-            admin_ids = [a['admin_id'] for a in admins] if admins else []
-            keyboard = []
-            for admin_id in admin_ids:
-                label = f"👤 {admin_id}"
-                if str(admin_id) != str(update.effective_user.id):
-                    keyboard.append([
-                        InlineKeyboardButton(
-                            f"Remover {admin_id}",
-                            callback_data=f"admin_remove_admin_{admin_id}"
-                        )
-                    ])
-                else:
-                    keyboard.append([
-                        InlineKeyboardButton(
-                            f"Você ({admin_id})",
-                            callback_data="noop"
-                        )
-                    ])
-            keyboard.append([InlineKeyboardButton("➕ Adicionar Admin", callback_data="admin_add_admin")])
-            keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="admin")])
-            reply_markup = InlineKeyboardMarkup(keyboard)
+# Handler to start the add admin process
+@admin_callback("admin_add_admin")
+async def admin_cb_add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    context.user_data['waiting_for_admin_id'] = True
+    await query.message.edit_text(
+        "Envie o ID do novo admin:",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_manage_admins")]
+        ])
+    )
+    return
 
-            await query.message.edit_text(
-                "👤 Gerenciar administradores\n\nSelecione uma opção:",
-                reply_markup=reply_markup
-            )
+# TRATAMENTO ESPECÍFICO PARA ALTERNAR ASSOCIAÇÃO DE GRUPO AO PLANO
+@admin_callback(prefix="admin_toggle_plan_group_")
+async def admin_cb_toggle_plan_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    parts = query.data.split('_')
+    plan_id = int(parts[-2])
+    group_id = int(parts[-1])
 
+    plan = await get_plan_by_id(plan_id)
+    if not plan:
+        await query.answer("❌ Plano não encontrado!")
         return
 
-    # Handler to start the add admin process
-    if query.data == "admin_add_admin":
-        context.user_data['waiting_for_admin_id'] = True
-        await query.message.edit_text(
-            "Envie o ID do novo admin:",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_manage_admins")]
-            ])
+    db = Database()
+    try:
+        db.connect()
+
+        # Verificar se o grupo está associado
+        existing = db.execute_fetch_one(
+            "SELECT * FROM plan_groups WHERE plan_id = %s AND group_id = %s",
+            (plan_id, group_id)
         )
-        return
-        
-    # TRATAMENTO ESPECÍFICO PARA ALTERNAR ASSOCIAÇÃO DE GRUPO AO PLANO
-    if query.data.startswith("admin_toggle_plan_group_"):
-        parts = query.data.split('_')
-        plan_id = int(parts[-2])
-        group_id = int(parts[-1])
-        
-        plan = await get_plan_by_id(plan_id)
-        if not plan:
-            await query.answer("❌ Plano não encontrado!")
-            return
-        
-        db = Database()
-        try:
-            db.connect()
-            
-            # Verificar se o grupo está associado
-            existing = db.execute_fetch_one(
-                "SELECT * FROM plan_groups WHERE plan_id = %s AND group_id = %s",
-                (plan_id, group_id)
-            )
-            
-            if existing:
-                # Desassociar grupo
-                db.execute_query(
-                    "DELETE FROM plan_groups WHERE plan_id = %s AND group_id = %s",
-                    (plan_id, group_id),
-                    commit=True
-                )
-                await query.answer("❌ Grupo desassociado!")
-            else:
-                # Associar grupo
-                db.execute_query(
-                    "INSERT INTO plan_groups (plan_id, group_id) VALUES (%s, %s)",
-                    (plan_id, group_id),
-                    commit=True
-                )
-                await query.answer("✅ Grupo associado!")
-                
-        finally:
-            db.close()
-        
-        # Recarregar o menu de gerenciamento de grupos
-        await handle_admin_callback(update, context)
-        return
-    
-    # TRATAMENTO ESPECÍFICO PARA CONFIRMAÇÃO DE REMOÇÃO DE PLANO (DEVE VIR PRIMEIRO)
-    if query.data.startswith("admin_confirm_remove_plan_"):
-        logger.info(f"[DEBUG] Processando confirmação de remoção do plano {query.data}")
-        plan_id = int(query.data.split('_')[-1])
-        logger.info(f"[DEBUG] Plan ID extraído: {plan_id}")
-        
-        plan = await get_plan_by_id(plan_id)
-        if not plan:
-            logger.error(f"[DEBUG] Plano {plan_id} não encontrado!")
-            await query.answer("❌ Plano não encontrado!")
-            return
-        
-        logger.info(f"[DEBUG] Plano encontrado: {plan['name']}")
 
-        config = load_config()
-        if config is None:
-            await query.answer("❌ Erro ao carregar configurações", show_alert=True)
-            return
-        
-        db = Database()
-        try:
-            db.connect()
-            logger.info(f"[DEBUG] Conectado ao banco de dados")
-            # Deletar o plano permanentemente
+        if existing:
+            # Desassociar grupo
             db.execute_query(
-                "DELETE FROM vip_plans WHERE id = %s",
-                (plan_id,),
+                "DELETE FROM plan_groups WHERE plan_id = %s AND group_id = %s",
+                (plan_id, group_id),
                 commit=True
             )
-            logger.info(f"[DEBUG] Plano {plan_id} deletado permanentemente do banco")
-        finally:
-            db.close()
-            logger.info(f"[DEBUG] Conexão com banco fechada")
-        
-        logger.info(f"[DEBUG] Buscando planos ativos para atualizar menu")
-        # Voltar para o menu de planos (sem chamada recursiva)
+            await query.answer("❌ Grupo desassociado!")
+        else:
+            # Associar grupo
+            db.execute_query(
+                "INSERT INTO plan_groups (plan_id, group_id) VALUES (%s, %s)",
+                (plan_id, group_id),
+                commit=True
+            )
+            await query.answer("✅ Grupo associado!")
+
+    finally:
+        db.close()
+
+    # Recarregar o menu de gerenciamento de grupos
+    await handle_admin_callback(update, context)
+    return
+
+# TRATAMENTO ESPECÍFICO PARA CONFIRMAÇÃO DE REMOÇÃO DE PLANO (DEVE VIR PRIMEIRO)
+@admin_callback(prefix="admin_confirm_remove_plan_")
+async def admin_cb_confirm_remove_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    logger.debug(f"Processando confirmação de remoção do plano {query.data}")
+    plan_id = int(query.data.split('_')[-1])
+    logger.debug(f"Plan ID extraído: {plan_id}")
+
+    plan = await get_plan_by_id(plan_id)
+    if not plan:
+        logger.error(f"[DEBUG] Plano {plan_id} não encontrado!")
+        await query.answer("❌ Plano não encontrado!")
+        return
+
+    logger.debug(f"Plano encontrado: {plan['name']}")
+
+    config = load_config()
+    if config is None:
+        await query.answer("❌ Erro ao carregar configurações", show_alert=True)
+        return
+
+    db = Database()
+    try:
+        db.connect()
+        logger.debug(f"Conectado ao banco de dados")
+        # Deletar o plano permanentemente
+        db.execute_query(
+            "DELETE FROM vip_plans WHERE id = %s",
+            (plan_id,),
+            commit=True
+        )
+        logger.debug(f"Plano {plan_id} deletado permanentemente do banco")
+    finally:
+        db.close()
+        logger.debug(f"Conexão com banco fechada")
+
+    logger.debug(f"Buscando planos ativos para atualizar menu")
+    # Voltar para o menu de planos (sem chamada recursiva)
+    db = Database()
+    try:
+        db.connect()
+        plans = db.execute_fetch_all("SELECT * FROM vip_plans")
+    finally:
+        db.close()
+
+    keyboard = []
+    for plan_item in plans:
+        keyboard.append([
+            InlineKeyboardButton(f"✏️ {plan_item['name']} (R${plan_item['price']:.2f})", callback_data=f"admin_edit_plan_{plan_item['id']}"),
+            InlineKeyboardButton("🗑️", callback_data=f"admin_remove_plan_{plan_item['id']}")
+        ])
+    keyboard.append([InlineKeyboardButton("➕ Adicionar Novo Plano", callback_data="admin_add_plan")])
+    keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    logger.debug(f"Editando mensagem com confirmação")
+    await query.message.edit_text(
+        f"✅ **Plano '{plan['name']}' removido com sucesso!**\n\n"
+        f"💎 Gerenciar Planos VIP\n\n"
+        f"Selecione um plano para editar ou remova/adicione novos planos:",
+        reply_markup=reply_markup
+    )
+    logger.debug(f"Mensagem editada com sucesso")
+    return
+
+@admin_callback("admin_upload_welcome_file")
+async def admin_cb_upload_welcome_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_welcome_file")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "📎 Enviar Novo Arquivo de Boas-vindas\n\n"
+        "Envie uma foto ou vídeo que será usado como arquivo de boas-vindas.\n\n"
+        "⚠️ O arquivo deve ser menor que 50MB.",
+        reply_markup=reply_markup
+    )
+    context.user_data['waiting_for_welcome_file'] = True
+    return
+
+@admin_callback("admin_remove_welcome_file")
+async def admin_cb_remove_welcome_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    keyboard = [
+        [InlineKeyboardButton("✅ Confirmar", callback_data="admin_confirm_remove_welcome_file")],
+        [InlineKeyboardButton("❌ Cancelar", callback_data="admin_welcome_file")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "🗑️ Remover Arquivo de Boas-vindas\n\n"
+        "Tem certeza que deseja remover o arquivo de boas-vindas?\n"
+        "Esta ação não pode ser desfeita.",
+        reply_markup=reply_markup
+    )
+    return
+
+# Verificar se é um callback de broadcast trancado
+@admin_callback("admin_broadcast_locked")
+async def admin_cb_broadcast_locked(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Apagar a mensagem atual
+    await query.message.delete()
+
+    # Enviar nova mensagem com informações sobre liberação de recursos
+    keyboard = [
+        [InlineKeyboardButton("💎 Quero ser Premium", callback_data="admin_upgrade_vip")],
+        [InlineKeyboardButton("⬅️ Voltar ao Menu", callback_data="admin_back")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    await query.message.reply_text(
+        "🔒 **Função Exclusiva para Administradores VIP**\n\n"
+        "Para liberar todos os recursos do bot e ter acesso completo a todas as funcionalidades, "
+        "torne-se um administrador VIP!\n\n"
+        "**Recursos VIP incluem:**\n"
+        "• 📢 Broadcast para todos os usuários\n"
+        "• 📹 Envio de vídeos em massa\n"
+        "• ⭕ Vídeos circulares\n"
+        "• 📊 Relatórios avançados\n"
+        "• ⚙️ Configurações exclusivas\n"
+        "• 🎯 Ferramentas de marketing\n\n"
+        "**Valor:** R$ 50,00/mês\n\n"
+        "💬 Entre em contato com o suporte para mais informações:",
+        reply_markup=reply_markup,
+        parse_mode='Markdown'
+    )
+    return
+
+# Verificar se é um callback de upgrade para VIP
+@admin_callback("admin_upgrade_vip")
+async def admin_cb_upgrade_vip(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Responder imediatamente para evitar timeout
+    await query.answer("🔄 Gerando QR Code de pagamento...", show_alert=True)
+
+    # Gerar QR Code para pagamento do VIP do admin
+    admin_id = update.effective_user.id
+    amount = 50.00  # Valor do VIP mensal
+    description = f"Upgrade VIP Admin - {admin_id}"
+    external_reference = f"admin_vip_{admin_id}_{int(datetime.now().timestamp())}"
+
+    # Gerar PIX
+    pix_result = await generate_pix_automatico(amount, description, external_reference)
+
+    # Debug: verificar o resultado
+    logger.info(f"🔍 Resultado do PIX: {pix_result}")
+
+    if pix_result and pix_result.get('qr_code'):
+        # Salvar dados do pagamento
         db = Database()
         try:
             db.connect()
-            plans = db.execute_fetch_all("SELECT * FROM vip_plans")
+            if db.connection:
+                db.execute_query(
+                    """INSERT INTO admin_vip_payments 
+                    (admin_id, amount, description, external_reference, pix_code, created_at, status) 
+                    VALUES (%s, %s, %s, %s, %s, NOW(), 'pending')""",
+                    (admin_id, amount, description, external_reference, pix_result['pix_code']),
+                    commit=True
+                )
+        except Exception as e:
+            logger.error(f"Erro ao salvar pagamento VIP admin: {e}")
         finally:
             db.close()
-        
-        keyboard = []
-        for plan_item in plans:
-            keyboard.append([
-                InlineKeyboardButton(f"✏️ {plan_item['name']} (R${plan_item['price']:.2f})", callback_data=f"admin_edit_plan_{plan_item['id']}"),
-                InlineKeyboardButton("🗑️", callback_data=f"admin_remove_plan_{plan_item['id']}")
-            ])
-        keyboard.append([InlineKeyboardButton("➕ Adicionar Novo Plano", callback_data="admin_add_plan")])
-        keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        logger.info(f"[DEBUG] Editando mensagem com confirmação")
-        await query.message.edit_text(
-            f"✅ **Plano '{plan['name']}' removido com sucesso!**\n\n"
-            f"💎 Gerenciar Planos VIP\n\n"
-            f"Selecione um plano para editar ou remova/adicione novos planos:",
-            reply_markup=reply_markup
-        )
-        logger.info(f"[DEBUG] Mensagem editada com sucesso")
-        return
-    
-    # Verificar se é um callback de edição de configurações
-    if query.data == "admin_edit_bot_token":
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_settings")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "🔑 Editar Token do Bot\n\n"
-            f"Token atual: {config['bot_token']}\n\n"
-            "Envie o novo token do bot:",
-            reply_markup=reply_markup
-        )
-        context.user_data['editing'] = 'bot_token'
-        return
-    elif query.data == "admin_edit_mp_token":
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_settings")]]
+
+        # Enviar QR Code
+        keyboard = [
+            [InlineKeyboardButton("🔄 Verificar Pagamento", callback_data="admin_check_vip_payment")],
+            [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]
+        ]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "💳 Editar Token do MercadoPago\n\n"
-            f"Token atual: {config['mercadopago']['access_token']}\n\n"
-            "Envie o novo token do MercadoPago:",
-            reply_markup=reply_markup
+
+        # Converter base64 para bytes
+        import base64
+        qr_image_bytes = base64.b64decode(pix_result['qr_code_base64'])
+
+        await query.message.reply_photo(
+            photo=qr_image_bytes,
+            caption=f"💎 **Upgrade para Admin VIP**\n\n"
+                   f"**Valor:** R$ {amount:.2f}\n"
+                   f"**Descrição:** {description}\n"
+                   f"**Referência:** `{external_reference}`\n\n"
+                   f"📱 **Escaneie o QR Code acima para pagar via PIX**\n\n"
+                   f"⏰ O pagamento será processado automaticamente em alguns minutos.\n"
+                   f"🔄 Clique em 'Verificar Pagamento' após realizar o pagamento.",
+            reply_markup=reply_markup,
+            parse_mode='Markdown'
         )
-        context.user_data['editing'] = 'mp_token'
-        return
-    elif query.data == "admin_edit_pix_key":
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_settings")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "📱 Editar Chave PIX\n\n"
-            f"Chave atual: {config['payment_methods']['pix_manual']['chave_pix']}\n\n"
-            "Envie a nova chave PIX:",
-            reply_markup=reply_markup
+    else:
+        error_msg = "❌ Erro ao gerar QR Code de pagamento."
+        if pix_result:
+            error_msg += f"\n\nDetalhes: {pix_result.get('error', 'Erro desconhecido')}"
+        else:
+            error_msg += "\n\nNenhum resultado retornado pela função de geração de PIX."
+
+        await query.message.reply_text(
+            error_msg,
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]])
         )
-        context.user_data['editing'] = 'pix_key'
-        return
-    elif query.data == "admin_edit_pix_name":
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_settings")]]
+    return
+
+# Verificar se é um callback de verificação de pagamento VIP
+@admin_callback("admin_check_vip_payment")
+async def admin_cb_check_vip_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    admin_id = update.effective_user.id
+
+    # Verificar se há pagamento pendente
+    db = Database()
+    try:
+        db.connect()
+        if db.connection:
+            payment = db.execute_fetch_one(
+                """SELECT * FROM admin_vip_payments 
+                WHERE admin_id = %s AND status = 'pending' 
+                ORDER BY created_at DESC LIMIT 1""",
+                (admin_id,)
+            )
+
+            if payment:
+                # Verificar status do pagamento (simulação - você pode integrar com seu sistema de pagamento)
+                # Por enquanto, vamos simular que o pagamento foi aprovado
+                await query.answer("🔄 Verificando pagamento...", show_alert=True)
+
+                # Simular aprovação do pagamento
+                db.execute_query(
+                    """UPDATE admin_vip_payments 
+                    SET status = 'approved', approved_at = NOW() 
+                    WHERE id = %s""",
+                    (payment['id'],),
+                    commit=True
+                )
+
+                # Atualizar admin para VIP
+                db.execute_query(
+                    """UPDATE admins 
+                    SET is_vip = 1 
+                    WHERE admin_id = %s""",
+                    (admin_id,),
+                    commit=True
+                )
+
+                await query.message.reply_text(
+                    "🎉 **Parabéns! Você agora é um Admin VIP!**\n\n"
+                    "✅ Seu pagamento foi aprovado\n"
+                    "🔓 Todos os recursos foram liberados\n"
+                    "📢 Agora você pode usar o Broadcast e outras funções exclusivas\n\n"
+                    "🔄 Recarregue o menu para ver as novas funcionalidades!",
+                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Voltar ao Menu", callback_data="admin_back")]]),
+                    parse_mode='Markdown'
+                )
+            else:
+                await query.answer("❌ Nenhum pagamento pendente encontrado", show_alert=True)
+    except Exception as e:
+        logger.error(f"Erro ao verificar pagamento VIP: {e}")
+        await query.answer("❌ Erro ao verificar pagamento", show_alert=True)
+    finally:
+        db.close()
+    return
+
+# Verificar se é um callback de agendamento de mensagens
+@admin_callback("admin_schedule_messages")
+async def admin_cb_schedule_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Menu de agendamento de mensagens
+    keyboard = [
+        [InlineKeyboardButton("➕ Nova Mensagem", callback_data="admin_schedule_new")],
+        [InlineKeyboardButton("📋 Mensagens Pendentes", callback_data="admin_schedule_pending")],
+        [InlineKeyboardButton("📊 Histórico", callback_data="admin_schedule_history")],
+        [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "⏰ Agendamento de Mensagens\n\n"
+        "Gerencie mensagens agendadas para envio automático:\n\n"
+        "➕ Nova Mensagem: Criar nova mensagem agendada\n"
+        "📋 Pendentes: Ver mensagens agendadas pendentes\n"
+        "📊 Histórico: Ver histórico de mensagens enviadas",
+        reply_markup=reply_markup
+    )
+    return
+
+@admin_callback("admin_schedule_new")
+async def admin_cb_schedule_new(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Iniciar criação de nova mensagem agendada
+    context.user_data['scheduling_step'] = 'message_text'
+    keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data="admin_schedule_messages")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "➕ Nova Mensagem Agendada\n\n"
+        "Digite o texto da mensagem que deseja agendar:",
+        reply_markup=reply_markup
+    )
+    return
+
+@admin_callback("admin_schedule_pending")
+async def admin_cb_schedule_pending(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Mostrar mensagens pendentes
+    pending_messages = get_scheduled_messages(status='pending', limit=10)
+
+    if not pending_messages:
+        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_schedule_messages")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.message.edit_text(
-            "👤 Editar Nome do Titular PIX\n\n"
-            f"Nome atual: {config['payment_methods']['pix_manual']['nome_titular']}\n\n"
-            "Envie o novo nome do titular:",
+            "📋 Mensagens Pendentes\n\n"
+            "Nenhuma mensagem agendada pendente.",
             reply_markup=reply_markup
         )
-        context.user_data['editing'] = 'pix_name'
         return
-    
-    
-    elif query.data == "admin_upload_welcome_file":
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_welcome_file")]]
+
+    text = "📋 Mensagens Pendentes\n\n"
+    keyboard = []
+
+    for msg in pending_messages:
+        scheduled_time = msg['scheduled_date'].strftime('%d/%m/%Y %H:%M')
+        target_text = {
+            'all_users': 'Todos os usuários',
+            'vip_users': 'Usuários VIP',
+            'specific_users': 'Usuários específicos'
+        }.get(msg['target_type'], msg['target_type'])
+
+        text += f"🆔 ID: {msg['id']}\n"
+        text += f"📅 Agendada para: {scheduled_time}\n"
+        text += f"👥 Destinatários: {target_text}\n"
+        text += f"📝 Mensagem: {msg['message_text'][:50]}{'...' if len(msg['message_text']) > 50 else ''}\n\n"
+
+        keyboard.append([
+            InlineKeyboardButton(f"❌ Cancelar {msg['id']}", callback_data=f"admin_schedule_cancel_{msg['id']}"),
+            InlineKeyboardButton(f"👁️ Ver {msg['id']}", callback_data=f"admin_schedule_view_{msg['id']}")
+        ])
+
+    keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="admin_schedule_messages")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(text, reply_markup=reply_markup)
+    return
+
+@admin_callback("admin_schedule_history")
+async def admin_cb_schedule_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Mostrar histórico de mensagens
+    sent_messages = get_scheduled_messages(status='sent', limit=10)
+
+    if not sent_messages:
+        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_schedule_messages")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.message.edit_text(
-            "📎 Enviar Novo Arquivo de Boas-vindas\n\n"
-            "Envie uma foto ou vídeo que será usado como arquivo de boas-vindas.\n\n"
-            "⚠️ O arquivo deve ser menor que 50MB.",
+            "📊 Histórico de Mensagens\n\n"
+            "Nenhuma mensagem enviada ainda.",
             reply_markup=reply_markup
         )
-        context.user_data['waiting_for_welcome_file'] = True
         return
-    
-    elif query.data == "admin_remove_welcome_file":
-        keyboard = [
-            [InlineKeyboardButton("✅ Confirmar", callback_data="admin_confirm_remove_welcome_file")],
-            [InlineKeyboardButton("❌ Cancelar", callback_data="admin_welcome_file")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+
+    text = "📊 Histórico de Mensagens\n\n"
+    keyboard = []
+
+    for msg in sent_messages:
+        sent_time = msg['sent_at'].strftime('%d/%m/%Y %H:%M') if msg['sent_at'] else 'N/A'
+        target_text = {
+            'all_users': 'Todos os usuários',
+            'vip_users': 'Usuários VIP',
+            'specific_users': 'Usuários específicos'
+        }.get(msg['target_type'], msg['target_type'])
+
+        text += f"🆔 ID: {msg['id']}\n"
+        text += f"📅 Enviada em: {sent_time}\n"
+        text += f"👥 Destinatários: {target_text}\n"
+        text += f"✅ Enviadas: {msg['successful_sends']}\n"
+        text += f"❌ Falhas: {msg['failed_sends']}\n"
+        text += f"📝 Mensagem: {msg['message_text'][:50]}{'...' if len(msg['message_text']) > 50 else ''}\n\n"
+
+    keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="admin_schedule_messages")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(text, reply_markup=reply_markup)
+    return
+
+@admin_callback(prefix="admin_schedule_cancel_")
+async def admin_cb_schedule_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Cancelar mensagem agendada
+    message_id = int(query.data.split('_')[-1])
+    if cancel_scheduled_message(message_id):
+        await query.answer("✅ Mensagem cancelada com sucesso!")
+        # Atualizar a lista
         await query.message.edit_text(
-            "🗑️ Remover Arquivo de Boas-vindas\n\n"
-            "Tem certeza que deseja remover o arquivo de boas-vindas?\n"
-            "Esta ação não pode ser desfeita.",
-            reply_markup=reply_markup
+            "📋 Mensagens Pendentes\n\n"
+            "Mensagem cancelada com sucesso!",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_schedule_pending")]])
         )
-        return
-    
+    else:
+        await query.answer("❌ Erro ao cancelar mensagem!")
+    return
 
-    # Verificar se é um callback de broadcast trancado
-    if query.data == "admin_broadcast_locked":
-        # Apagar a mensagem atual
-        await query.message.delete()
-        
-        # Enviar nova mensagem com informações sobre liberação de recursos
-        keyboard = [
-            [InlineKeyboardButton("💎 Quero ser Premium", callback_data="admin_upgrade_vip")],
-            [InlineKeyboardButton("⬅️ Voltar ao Menu", callback_data="admin_back")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.message.reply_text(
-            "🔒 **Função Exclusiva para Administradores VIP**\n\n"
-            "Para liberar todos os recursos do bot e ter acesso completo a todas as funcionalidades, "
-            "torne-se um administrador VIP!\n\n"
-            "**Recursos VIP incluem:**\n"
-            "• 📢 Broadcast para todos os usuários\n"
-            "• 📹 Envio de vídeos em massa\n"
-            "• ⭕ Vídeos circulares\n"
-            "• 📊 Relatórios avançados\n"
-            "• ⚙️ Configurações exclusivas\n"
-            "• 🎯 Ferramentas de marketing\n\n"
-            "**Valor:** R$ 50,00/mês\n\n"
-            "💬 Entre em contato com o suporte para mais informações:",
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
-        return
-    
-    # Verificar se é um callback de upgrade para VIP
-    if query.data == "admin_upgrade_vip":
-        # Responder imediatamente para evitar timeout
-        await query.answer("🔄 Gerando QR Code de pagamento...", show_alert=True)
-        
-        # Gerar QR Code para pagamento do VIP do admin
-        admin_id = update.effective_user.id
-        amount = 50.00  # Valor do VIP mensal
-        description = f"Upgrade VIP Admin - {admin_id}"
-        external_reference = f"admin_vip_{admin_id}_{int(datetime.now().timestamp())}"
-        
-        # Gerar PIX
-        pix_result = await generate_pix_automatico(amount, description, external_reference)
-        
-        # Debug: verificar o resultado
-        logger.info(f"🔍 Resultado do PIX: {pix_result}")
-        
-        if pix_result and pix_result.get('qr_code'):
-            # Salvar dados do pagamento
-            db = Database()
-            try:
-                db.connect()
-                if db.connection:
-                    db.execute_query(
-                        """INSERT INTO admin_vip_payments 
-                        (admin_id, amount, description, external_reference, pix_code, created_at, status) 
-                        VALUES (%s, %s, %s, %s, %s, NOW(), 'pending')""",
-                        (admin_id, amount, description, external_reference, pix_result['pix_code']),
-                        commit=True
-                    )
-            except Exception as e:
-                logger.error(f"Erro ao salvar pagamento VIP admin: {e}")
-            finally:
-                db.close()
-            
-            # Enviar QR Code
-            keyboard = [
-                [InlineKeyboardButton("🔄 Verificar Pagamento", callback_data="admin_check_vip_payment")],
-                [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            # Converter base64 para bytes
-            import base64
-            qr_image_bytes = base64.b64decode(pix_result['qr_code_base64'])
-            
-            await query.message.reply_photo(
-                photo=qr_image_bytes,
-                caption=f"💎 **Upgrade para Admin VIP**\n\n"
-                       f"**Valor:** R$ {amount:.2f}\n"
-                       f"**Descrição:** {description}\n"
-                       f"**Referência:** `{external_reference}`\n\n"
-                       f"📱 **Escaneie o QR Code acima para pagar via PIX**\n\n"
-                       f"⏰ O pagamento será processado automaticamente em alguns minutos.\n"
-                       f"🔄 Clique em 'Verificar Pagamento' após realizar o pagamento.",
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
-        else:
-            error_msg = "❌ Erro ao gerar QR Code de pagamento."
-            if pix_result:
-                error_msg += f"\n\nDetalhes: {pix_result.get('error', 'Erro desconhecido')}"
-            else:
-                error_msg += "\n\nNenhum resultado retornado pela função de geração de PIX."
-            
-            await query.message.reply_text(
-                error_msg,
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]])
-            )
-        return
-    
-    # Verificar se é um callback de verificação de pagamento VIP
-    if query.data == "admin_check_vip_payment":
-        admin_id = update.effective_user.id
-        
-        # Verificar se há pagamento pendente
-        db = Database()
-        try:
-            db.connect()
-            if db.connection:
-                payment = db.execute_fetch_one(
-                    """SELECT * FROM admin_vip_payments 
-                    WHERE admin_id = %s AND status = 'pending' 
-                    ORDER BY created_at DESC LIMIT 1""",
-                    (admin_id,)
-                )
-                
-                if payment:
-                    # Verificar status do pagamento (simulação - você pode integrar com seu sistema de pagamento)
-                    # Por enquanto, vamos simular que o pagamento foi aprovado
-                    await query.answer("🔄 Verificando pagamento...", show_alert=True)
-                    
-                    # Simular aprovação do pagamento
-                    db.execute_query(
-                        """UPDATE admin_vip_payments 
-                        SET status = 'approved', approved_at = NOW() 
-                        WHERE id = %s""",
-                        (payment['id'],),
-                        commit=True
-                    )
-                    
-                    # Atualizar admin para VIP
-                    db.execute_query(
-                        """UPDATE admins 
-                        SET is_vip = 1 
-                        WHERE admin_id = %s""",
-                        (admin_id,),
-                        commit=True
-                    )
-                    
-                    await query.message.reply_text(
-                        "🎉 **Parabéns! Você agora é um Admin VIP!**\n\n"
-                        "✅ Seu pagamento foi aprovado\n"
-                        "🔓 Todos os recursos foram liberados\n"
-                        "📢 Agora você pode usar o Broadcast e outras funções exclusivas\n\n"
-                        "🔄 Recarregue o menu para ver as novas funcionalidades!",
-                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Voltar ao Menu", callback_data="admin_back")]]),
-                        parse_mode='Markdown'
-                    )
-                else:
-                    await query.answer("❌ Nenhum pagamento pendente encontrado", show_alert=True)
-        except Exception as e:
-            logger.error(f"Erro ao verificar pagamento VIP: {e}")
-            await query.answer("❌ Erro ao verificar pagamento", show_alert=True)
-        finally:
-            db.close()
-        return
-    
-    # Verificar se é um callback de agendamento de mensagens
-    if query.data == "admin_schedule_messages":
-        # Menu de agendamento de mensagens
-        keyboard = [
-            [InlineKeyboardButton("➕ Nova Mensagem", callback_data="admin_schedule_new")],
-            [InlineKeyboardButton("📋 Mensagens Pendentes", callback_data="admin_schedule_pending")],
-            [InlineKeyboardButton("📊 Histórico", callback_data="admin_schedule_history")],
-            [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "⏰ Agendamento de Mensagens\n\n"
-            "Gerencie mensagens agendadas para envio automático:\n\n"
-            "➕ Nova Mensagem: Criar nova mensagem agendada\n"
-            "📋 Pendentes: Ver mensagens agendadas pendentes\n"
-            "📊 Histórico: Ver histórico de mensagens enviadas",
-            reply_markup=reply_markup
-        )
-        return
-    
-    elif query.data == "admin_schedule_new":
-        # Iniciar criação de nova mensagem agendada
-        context.user_data['scheduling_step'] = 'message_text'
-        keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data="admin_schedule_messages")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "➕ Nova Mensagem Agendada\n\n"
-            "Digite o texto da mensagem que deseja agendar:",
-            reply_markup=reply_markup
-        )
-        return
-    
-    elif query.data == "admin_schedule_pending":
-        # Mostrar mensagens pendentes
-        pending_messages = get_scheduled_messages(status='pending', limit=10)
-        
-        if not pending_messages:
-            keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_schedule_messages")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.message.edit_text(
-                "📋 Mensagens Pendentes\n\n"
-                "Nenhuma mensagem agendada pendente.",
-                reply_markup=reply_markup
-            )
-            return
-        
-        text = "📋 Mensagens Pendentes\n\n"
-        keyboard = []
-        
-        for msg in pending_messages:
-            scheduled_time = msg['scheduled_date'].strftime('%d/%m/%Y %H:%M')
-            target_text = {
-                'all_users': 'Todos os usuários',
-                'vip_users': 'Usuários VIP',
-                'specific_users': 'Usuários específicos'
-            }.get(msg['target_type'], msg['target_type'])
-            
-            text += f"🆔 ID: {msg['id']}\n"
-            text += f"📅 Agendada para: {scheduled_time}\n"
-            text += f"👥 Destinatários: {target_text}\n"
-            text += f"📝 Mensagem: {msg['message_text'][:50]}{'...' if len(msg['message_text']) > 50 else ''}\n\n"
-            
-            keyboard.append([
-                InlineKeyboardButton(f"❌ Cancelar {msg['id']}", callback_data=f"admin_schedule_cancel_{msg['id']}"),
-                InlineKeyboardButton(f"👁️ Ver {msg['id']}", callback_data=f"admin_schedule_view_{msg['id']}")
-            ])
-        
-        keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="admin_schedule_messages")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(text, reply_markup=reply_markup)
-        return
-    
-    elif query.data == "admin_schedule_history":
-        # Mostrar histórico de mensagens
-        sent_messages = get_scheduled_messages(status='sent', limit=10)
-        
-        if not sent_messages:
-            keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_schedule_messages")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.message.edit_text(
-                "📊 Histórico de Mensagens\n\n"
-                "Nenhuma mensagem enviada ainda.",
-                reply_markup=reply_markup
-            )
-            return
-        
-        text = "📊 Histórico de Mensagens\n\n"
-        keyboard = []
-        
-        for msg in sent_messages:
-            sent_time = msg['sent_at'].strftime('%d/%m/%Y %H:%M') if msg['sent_at'] else 'N/A'
-            target_text = {
-                'all_users': 'Todos os usuários',
-                'vip_users': 'Usuários VIP',
-                'specific_users': 'Usuários específicos'
-            }.get(msg['target_type'], msg['target_type'])
-            
-            text += f"🆔 ID: {msg['id']}\n"
-            text += f"📅 Enviada em: {sent_time}\n"
-            text += f"👥 Destinatários: {target_text}\n"
-            text += f"✅ Enviadas: {msg['successful_sends']}\n"
-            text += f"❌ Falhas: {msg['failed_sends']}\n"
-            text += f"📝 Mensagem: {msg['message_text'][:50]}{'...' if len(msg['message_text']) > 50 else ''}\n\n"
-        
-        keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="admin_schedule_messages")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(text, reply_markup=reply_markup)
-        return
-    
-    elif query.data.startswith("admin_schedule_cancel_"):
-        # Cancelar mensagem agendada
-        message_id = int(query.data.split('_')[-1])
-        if cancel_scheduled_message(message_id):
-            await query.answer("✅ Mensagem cancelada com sucesso!")
-            # Atualizar a lista
-            await query.message.edit_text(
-                "📋 Mensagens Pendentes\n\n"
-                "Mensagem cancelada com sucesso!",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_schedule_pending")]])
-            )
-        else:
-            await query.answer("❌ Erro ao cancelar mensagem!")
-        return
-    
-    elif query.data.startswith("admin_schedule_view_"):
-        # Ver detalhes da mensagem
-        message_id = int(query.data.split('_')[-1])
-        messages = get_scheduled_messages()
-        message = next((m for m in messages if m['id'] == message_id), None)
-        
-        if not message:
-            await query.answer("❌ Mensagem não encontrada!")
-            return
-        
-        scheduled_time = message['scheduled_date'].strftime('%d/%m/%Y %H:%M')
-        target_text = {
-            'all_users': 'Todos os usuários',
-            'vip_users': 'Usuários VIP',
-            'specific_users': 'Usuários específicos'
-        }.get(message['target_type'], message['target_type'])
-        
-        text = f"👁️ Detalhes da Mensagem #{message['id']}\n\n"
-        text += f"📅 Agendada para: {scheduled_time}\n"
-        text += f"👥 Destinatários: {target_text}\n"
-        text += f"📊 Status: {message['status'].upper()}\n"
-        if message['successful_sends']:
-            text += f"✅ Enviadas: {message['successful_sends']}\n"
-        if message['failed_sends']:
-            text += f"❌ Falhas: {message['failed_sends']}\n"
-        text += f"\n📝 Mensagem:\n{message['message_text']}"
-        
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_schedule_pending")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(text, reply_markup=reply_markup)
-        return
-    
-    elif query.data == "admin_schedule_target_all":
-        # Selecionar todos os usuários
-        context.user_data['scheduled_target_type'] = 'all_users'
-        context.user_data['scheduling_step'] = 'scheduled_date'
-        
-        # Gerar exemplo com data atual
-        example_time = datetime.now()
-        example_str = example_time.strftime("%d/%m/%Y %H:%M")
-        
-        await query.message.edit_text(
-            "✅ Destinatários: Todos os usuários\n\n"
-            "Agora digite a data e hora para envio da mensagem:\n\n"
-            "Formato: DD/MM/AAAA HH:MM\n"
-            f"Exemplo: {example_str}"
-        )
-        return
-    
-    elif query.data == "admin_schedule_target_vip":
-        # Selecionar usuários VIP
-        context.user_data['scheduled_target_type'] = 'vip_users'
-        context.user_data['scheduling_step'] = 'scheduled_date'
-        
-        # Gerar exemplo com data atual
-        example_time = datetime.now()
-        example_str = example_time.strftime("%d/%m/%Y %H:%M")
-        
-        await query.message.edit_text(
-            "✅ Destinatários: Usuários VIP\n\n"
-            "Agora digite a data e hora para envio da mensagem:\n\n"
-            "Formato: DD/MM/AAAA HH:MM\n"
-            f"Exemplo: {example_str}"
-        )
-        return
-    
-    elif query.data == "admin_schedule_target_specific":
-        # Selecionar usuários específicos
-        context.user_data['scheduled_target_type'] = 'specific_users'
-        context.user_data['scheduling_step'] = 'specific_users'
-        
-        await query.message.edit_text(
-            "✅ Destinatários: Usuários Específicos\n\n"
-            "Digite os IDs dos usuários separados por vírgula ou espaço:\n\n"
-            "Exemplo: 123456789, 987654321, 555666777"
-        )
+@admin_callback(prefix="admin_schedule_view_")
+async def admin_cb_schedule_view(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Ver detalhes da mensagem
+    message_id = int(query.data.split('_')[-1])
+    messages = get_scheduled_messages()
+    message = next((m for m in messages if m['id'] == message_id), None)
+
+    if not message:
+        await query.answer("❌ Mensagem não encontrada!")
         return
 
-    # Verificar se é um callback de broadcast
-    if query.data == "admin_broadcast":
-        # Menu de broadcast
-        keyboard = [
-            [InlineKeyboardButton("📢 Enviar para Todos", callback_data="admin_broadcast_all")],
-            [InlineKeyboardButton("👥 Enviar para VIPs", callback_data="admin_broadcast_vip")],
-            [InlineKeyboardButton("📹 Enviar Vídeo para Todos", callback_data="admin_broadcast_video_all")],
-            [InlineKeyboardButton("📹 Enviar Vídeo para VIPs", callback_data="admin_broadcast_video_vip")],
-            [InlineKeyboardButton("⭕ Enviar Vídeo Circular para Todos", callback_data="admin_broadcast_videonote_all")],
-            [InlineKeyboardButton("⭕ Enviar Vídeo Circular para VIPs", callback_data="admin_broadcast_videonote_vip")],
-            [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "📢 Broadcast\n\nEscolha o tipo de broadcast:\n\n"
-            "📹 Vídeo Normal: Formato retangular tradicional\n"
-            "⭕ Vídeo Circular: Formato circular (video_note)",
-            reply_markup=reply_markup
-        )
-        return
-    
-    elif query.data == "admin_broadcast_videonote_all":
-        # Preparar para enviar vídeo circular para todos
-        context.user_data['broadcast_type'] = 'videonote_all'
-        keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data="admin_broadcast")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "⭕ Enviar vídeo circular para todos os usuários\n\n"
-            "📋 Requisitos do vídeo circular:\n"
-            "• Formato quadrado (ex: 240x240)\n"
-            "• Duração máxima: 60 segundos\n"
-            "• Será exibido como círculo no app\n\n"
-            "Envie o vídeo que deseja compartilhar:",
-            reply_markup=reply_markup
-        )
-        return
-    
-    elif query.data == "admin_broadcast_videonote_vip":
-        # Preparar para enviar vídeo circular para VIPs
-        context.user_data['broadcast_type'] = 'videonote_vip'
-        keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data="admin_broadcast")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "⭕ Enviar vídeo circular para usuários VIP\n\n"
-            "📋 Requisitos do vídeo circular:\n"
-            "• Formato quadrado (ex: 240x240)\n"
-            "• Duração máxima: 60 segundos\n"
-            "• Será exibido como círculo no app\n\n"
-            "Envie o vídeo que deseja compartilhar:",
-            reply_markup=reply_markup
-        )
-        return
-    
-    elif query.data == "admin_broadcast_video_all":
-        # Preparar para enviar vídeo para todos
-        context.user_data['broadcast_type'] = 'video_all'
-        keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data="admin_broadcast")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "📹 Enviar vídeo para todos os usuários\n\n"
-            "Primeiro, envie o vídeo que deseja compartilhar:",
-            reply_markup=reply_markup
-        )
-        return
-    
-    elif query.data == "admin_broadcast_video_vip":
-        # Preparar para enviar vídeo para VIPs
-        context.user_data['broadcast_type'] = 'video_vip'
-        keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data="admin_broadcast")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "📹 Enviar vídeo para usuários VIP\n\n"
-            "Primeiro, envie o vídeo que deseja compartilhar:",
-            reply_markup=reply_markup
-        )
-        return
-    
-    # Verificar se é um callback de configuração de provedores PIX
-    elif query.data == "admin_pix_providers":
-        # Menu de configuração de provedores PIX
+    scheduled_time = message['scheduled_date'].strftime('%d/%m/%Y %H:%M')
+    target_text = {
+        'all_users': 'Todos os usuários',
+        'vip_users': 'Usuários VIP',
+        'specific_users': 'Usuários específicos'
+    }.get(message['target_type'], message['target_type'])
+
+    text = f"👁️ Detalhes da Mensagem #{message['id']}\n\n"
+    text += f"📅 Agendada para: {scheduled_time}\n"
+    text += f"👥 Destinatários: {target_text}\n"
+    text += f"📊 Status: {message['status'].upper()}\n"
+    if message['successful_sends']:
+        text += f"✅ Enviadas: {message['successful_sends']}\n"
+    if message['failed_sends']:
+        text += f"❌ Falhas: {message['failed_sends']}\n"
+    text += f"\n📝 Mensagem:\n{message['message_text']}"
+
+    keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_schedule_pending")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(text, reply_markup=reply_markup)
+    return
+
+@admin_callback("admin_schedule_target_all")
+async def admin_cb_schedule_target_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Selecionar todos os usuários
+    context.user_data['scheduled_target_type'] = 'all_users'
+    context.user_data['scheduling_step'] = 'scheduled_date'
+
+    # Gerar exemplo com data atual
+    example_time = datetime.now()
+    example_str = example_time.strftime("%d/%m/%Y %H:%M")
+
+    await query.message.edit_text(
+        "✅ Destinatários: Todos os usuários\n\n"
+        "Agora digite a data e hora para envio da mensagem:\n\n"
+        "Formato: DD/MM/AAAA HH:MM\n"
+        f"Exemplo: {example_str}"
+    )
+    return
+
+@admin_callback("admin_schedule_target_vip")
+async def admin_cb_schedule_target_vip(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Selecionar usuários VIP
+    context.user_data['scheduled_target_type'] = 'vip_users'
+    context.user_data['scheduling_step'] = 'scheduled_date'
+
+    # Gerar exemplo com data atual
+    example_time = datetime.now()
+    example_str = example_time.strftime("%d/%m/%Y %H:%M")
+
+    await query.message.edit_text(
+        "✅ Destinatários: Usuários VIP\n\n"
+        "Agora digite a data e hora para envio da mensagem:\n\n"
+        "Formato: DD/MM/AAAA HH:MM\n"
+        f"Exemplo: {example_str}"
+    )
+    return
+
+@admin_callback("admin_schedule_target_specific")
+async def admin_cb_schedule_target_specific(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Selecionar usuários específicos
+    context.user_data['scheduled_target_type'] = 'specific_users'
+    context.user_data['scheduling_step'] = 'specific_users'
+
+    await query.message.edit_text(
+        "✅ Destinatários: Usuários Específicos\n\n"
+        "Digite os IDs dos usuários separados por vírgula ou espaço:\n\n"
+        "Exemplo: 123456789, 987654321, 555666777"
+    )
+    return
+
+# Verificar se é um callback de broadcast
+@admin_callback("admin_broadcast")
+async def admin_cb_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Menu de broadcast
+    keyboard = [
+        [InlineKeyboardButton("📢 Enviar para Todos", callback_data="admin_broadcast_all")],
+        [InlineKeyboardButton("👥 Enviar para VIPs", callback_data="admin_broadcast_vip")],
+        [InlineKeyboardButton("📹 Enviar Vídeo para Todos", callback_data="admin_broadcast_video_all")],
+        [InlineKeyboardButton("📹 Enviar Vídeo para VIPs", callback_data="admin_broadcast_video_vip")],
+        [InlineKeyboardButton("⭕ Enviar Vídeo Circular para Todos", callback_data="admin_broadcast_videonote_all")],
+        [InlineKeyboardButton("⭕ Enviar Vídeo Circular para VIPs", callback_data="admin_broadcast_videonote_vip")],
+        [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "📢 Broadcast\n\nEscolha o tipo de broadcast:\n\n"
+        "📹 Vídeo Normal: Formato retangular tradicional\n"
+        "⭕ Vídeo Circular: Formato circular (video_note)",
+        reply_markup=reply_markup
+    )
+    return
+
+@admin_callback("admin_broadcast_videonote_all")
+async def admin_cb_broadcast_videonote_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Preparar para enviar vídeo circular para todos
+    context.user_data['broadcast_type'] = 'videonote_all'
+    keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data="admin_broadcast")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "⭕ Enviar vídeo circular para todos os usuários\n\n"
+        "📋 Requisitos do vídeo circular:\n"
+        "• Formato quadrado (ex: 240x240)\n"
+        "• Duração máxima: 60 segundos\n"
+        "• Será exibido como círculo no app\n\n"
+        "Envie o vídeo que deseja compartilhar:",
+        reply_markup=reply_markup
+    )
+    return
+
+@admin_callback("admin_broadcast_videonote_vip")
+async def admin_cb_broadcast_videonote_vip(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Preparar para enviar vídeo circular para VIPs
+    context.user_data['broadcast_type'] = 'videonote_vip'
+    keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data="admin_broadcast")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "⭕ Enviar vídeo circular para usuários VIP\n\n"
+        "📋 Requisitos do vídeo circular:\n"
+        "• Formato quadrado (ex: 240x240)\n"
+        "• Duração máxima: 60 segundos\n"
+        "• Será exibido como círculo no app\n\n"
+        "Envie o vídeo que deseja compartilhar:",
+        reply_markup=reply_markup
+    )
+    return
+
+@admin_callback("admin_broadcast_video_all")
+async def admin_cb_broadcast_video_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Preparar para enviar vídeo para todos
+    context.user_data['broadcast_type'] = 'video_all'
+    keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data="admin_broadcast")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "📹 Enviar vídeo para todos os usuários\n\n"
+        "Primeiro, envie o vídeo que deseja compartilhar:",
+        reply_markup=reply_markup
+    )
+    return
+
+@admin_callback("admin_broadcast_video_vip")
+async def admin_cb_broadcast_video_vip(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Preparar para enviar vídeo para VIPs
+    context.user_data['broadcast_type'] = 'video_vip'
+    keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data="admin_broadcast")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "📹 Enviar vídeo para usuários VIP\n\n"
+        "Primeiro, envie o vídeo que deseja compartilhar:",
+        reply_markup=reply_markup
+    )
+    return
+
+# Verificar se é um callback de configuração de provedores PIX
+@admin_callback("admin_pix_providers")
+async def admin_cb_pix_providers(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    config = load_config()
+    # Menu de configuração de provedores PIX
+    provider_manager = get_pix_provider_manager()
+    available_providers = provider_manager.get_available_providers()
+    default_provider = config.get('pix_provider', 'mercadopago')
+
+    # Status dos provedores
+    mercadopago_enabled = config.get('mercadopago_enabled', False)
+    cnpay_enabled = config.get('cnpay_enabled', False)
+
+    keyboard = [
+        [InlineKeyboardButton(
+            f"{'🟢' if cnpay_enabled else '🔴'} CNPay",
+            callback_data="admin_toggle_cnpay"
+        )],
+        [InlineKeyboardButton("🔧 Configurar CNPay", callback_data="admin_config_cnpay")],
+        [InlineKeyboardButton("🎯 Definir Provedor Padrão", callback_data="admin_set_default_provider")],
+        [InlineKeyboardButton("🧪 Testar Conexões", callback_data="admin_test_providers")],
+        [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_settings")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    status_text = "🔧 CONFIGURAÇÃO DE PROVEDORES PIX\n\n"
+    status_text += f"📱 Provedores Disponíveis:\n"
+    status_text += f"   🏦 CNPay: {'✅ Ativo' if cnpay_enabled else '❌ Inativo'}\n\n"
+    status_text += f"🎯 Provedor Padrão: {default_provider.title()}\n"
+    status_text += f"📊 Provedores Configurados: {len(available_providers)}\n\n"
+    status_text += "Escolha uma opção:"
+
+    await query.message.edit_text(status_text, reply_markup=reply_markup)
+    return
+
+@admin_callback("admin_toggle_cnpay")
+async def admin_cb_toggle_cnpay(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    config = load_config()
+    # Alternar status do CNPay
+    current_cnpay_status = config.get('cnpay_enabled', False)
+    config['cnpay_enabled'] = not current_cnpay_status
+    new_status_message = "ativado" if not current_cnpay_status else "desativado"
+    status_message = f"✅ CNPay {new_status_message}!"
+
+    # Se estamos ativando o CNPay, podemos defini-lo como padrão
+    if config['cnpay_enabled']:
+        config['pix_provider'] = 'cnpay'
+
+    if save_config(config):
+        await query.answer(status_message)
+
+        # Recarregar menu
         provider_manager = get_pix_provider_manager()
         available_providers = provider_manager.get_available_providers()
         default_provider = config.get('pix_provider', 'mercadopago')
-        
-        # Status dos provedores
-        mercadopago_enabled = config.get('mercadopago_enabled', False)
         cnpay_enabled = config.get('cnpay_enabled', False)
-        
+
         keyboard = [
             [InlineKeyboardButton(
                 f"{'🟢' if cnpay_enabled else '🔴'} CNPay",
@@ -2970,862 +3641,576 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
             [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_settings")]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        
+
         status_text = "🔧 CONFIGURAÇÃO DE PROVEDORES PIX\n\n"
         status_text += f"📱 Provedores Disponíveis:\n"
         status_text += f"   🏦 CNPay: {'✅ Ativo' if cnpay_enabled else '❌ Inativo'}\n\n"
         status_text += f"🎯 Provedor Padrão: {default_provider.title()}\n"
         status_text += f"📊 Provedores Configurados: {len(available_providers)}\n\n"
         status_text += "Escolha uma opção:"
-        
+
         await query.message.edit_text(status_text, reply_markup=reply_markup)
-        return
-    
-    elif query.data == "admin_toggle_cnpay":
-        # Alternar status do CNPay
-        current_cnpay_status = config.get('cnpay_enabled', False)
-        config['cnpay_enabled'] = not current_cnpay_status
-        new_status_message = "ativado" if not current_cnpay_status else "desativado"
-        status_message = f"✅ CNPay {new_status_message}!"
+    else:
+        await query.answer("❌ Erro ao salvar configuração")
+    return
 
-        # Se estamos ativando o CNPay, podemos defini-lo como padrão
-        if config['cnpay_enabled']:
-            config['pix_provider'] = 'cnpay'
-        
-        if save_config(config):
-            await query.answer(status_message)
-            
-            # Recarregar menu
-            provider_manager = get_pix_provider_manager()
-            available_providers = provider_manager.get_available_providers()
-            default_provider = config.get('pix_provider', 'mercadopago')
-            cnpay_enabled = config.get('cnpay_enabled', False)
-            
-            keyboard = [
-                [InlineKeyboardButton(
-                    f"{'🟢' if cnpay_enabled else '🔴'} CNPay",
-                    callback_data="admin_toggle_cnpay"
-                )],
-                [InlineKeyboardButton("🔧 Configurar CNPay", callback_data="admin_config_cnpay")],
-                [InlineKeyboardButton("🎯 Definir Provedor Padrão", callback_data="admin_set_default_provider")],
-                [InlineKeyboardButton("🧪 Testar Conexões", callback_data="admin_test_providers")],
-                [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_settings")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            status_text = "🔧 CONFIGURAÇÃO DE PROVEDORES PIX\n\n"
-            status_text += f"📱 Provedores Disponíveis:\n"
-            status_text += f"   🏦 CNPay: {'✅ Ativo' if cnpay_enabled else '❌ Inativo'}\n\n"
-            status_text += f"🎯 Provedor Padrão: {default_provider.title()}\n"
-            status_text += f"📊 Provedores Configurados: {len(available_providers)}\n\n"
-            status_text += "Escolha uma opção:"
-            
-            await query.message.edit_text(status_text, reply_markup=reply_markup)
-        else:
-            await query.answer("❌ Erro ao salvar configuração")
-        return
-    
-    elif query.data == "admin_config_mercadopago":
-        # Configurar MercadoPago
-        keyboard = [
-            [InlineKeyboardButton("🔑 Token de Acesso", callback_data="admin_edit_mp_token")],
-            [InlineKeyboardButton("🌍 Ambiente", callback_data="admin_edit_mp_environment")],
-            [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_pix_providers")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        current_token = config.get('mercadopago_access_token', 'Não configurado')
-        current_env = config.get('mercadopago_environment', 'production')
-        
-        config_text = "🔧 CONFIGURAÇÃO MERCADOPAGO\n\n"
-        config_text += f"🔑 Token: {'********' if current_token != 'Não configurado' else 'Não configurado'}\n"
-        config_text += f"🌍 Ambiente: {current_env}\n\n"
-        config_text += "Escolha o que deseja configurar:"
-        
-        await query.message.edit_text(config_text, reply_markup=reply_markup)
-        return
-    
-    elif query.data == "admin_config_cnpay":
-        # Configurar CNPay
-        keyboard = [
-            [InlineKeyboardButton("🔑 API Key", callback_data="admin_edit_cnpay_key")],
-            [InlineKeyboardButton("🔐 API Secret", callback_data="admin_edit_cnpay_secret")],
-            [InlineKeyboardButton("🌍 Ambiente", callback_data="admin_edit_cnpay_environment")],
-            [InlineKeyboardButton("🌐 Webhook URL", callback_data="admin_edit_cnpay_webhook")],
-            [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_pix_providers")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        current_key = config.get('cnpay_api_key', 'Não configurado')
-        current_env = config.get('cnpay_environment', 'sandbox')
-        current_webhook = config.get('cnpay_webhook_url', 'Não configurado')
-        
-        config_text = "🔧 CONFIGURAÇÃO CNPAY\n\n"
-        config_text += f"🔑 API Key: {'********' if current_key != 'Não configurado' else 'Não configurado'}\n"
-        config_text += f"🔐 API Secret: {'********' if config.get('cnpay_api_secret') else 'Não configurado'}\n"
-        config_text += f"🌍 Ambiente: {current_env}\n"
-        config_text += f"🌐 Webhook: {current_webhook}\n\n"
-        config_text += "Escolha o que deseja configurar:"
-        
-        await query.message.edit_text(config_text, reply_markup=reply_markup)
-        return
-    
-    elif query.data == "admin_set_default_provider":
-        # Definir provedor padrão
-        current_default = config.get('pix_provider', 'mercadopago')
-        mercadopago_enabled = config.get('mercadopago_enabled', False)
-        cnpay_enabled = config.get('cnpay_enabled', False)
-        
-        keyboard = []
-        if cnpay_enabled:
-            keyboard.append([InlineKeyboardButton(
-                f"{'✅ ' if current_default == 'cnpay' else ''}CNPay",
-                callback_data="admin_set_provider_cnpay"
-            )])
-        
-        keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="admin_pix_providers")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        text = "🎯 DEFINIR PROVEDOR PADRÃO\n\n"
-        text += f"Provedor atual: {current_default.title()}\n\n"
-        text += "Escolha o novo provedor padrão:"
-        
-        await query.message.edit_text(text, reply_markup=reply_markup)
-        return
-    
-    elif query.data.startswith("admin_set_provider_"):
-        # Definir provedor específico como padrão
-        provider = query.data.split('_')[-1]
-        config['pix_provider'] = provider
-        
-        if save_config(config):
-            await query.answer(f"✅ {provider.title()} definido como padrão!")
-            # Recarregar o menu
-            await handle_admin_callback(update, context)
-        else:
-            await query.answer("❌ Erro ao salvar configuração")
-        return
-    
-    elif query.data == "admin_test_providers":
-        # Testar conexões dos provedores
-        await query.answer("🧪 Testando conexões...")
-        
-        test_results = []
-        provider_manager = get_pix_provider_manager()
-        
-        for provider_name, provider in provider_manager.providers.items():
-            try:
-                # Teste simples de conexão
-                if provider_name == 'mercadopago':
-                    if provider.config.get('mercadopago_access_token'):
-                        test_results.append(f"✅ MercadoPago: Configurado")
-                    else:
-                        test_results.append(f"❌ MercadoPago: Token não configurado")
-                elif provider_name == 'cnpay':
-                    if provider.api_key and provider.api_secret:
-                        test_results.append(f"✅ CNPay: Configurado")
-                    else:
-                        test_results.append(f"❌ CNPay: Credenciais não configuradas")
-            except Exception as e:
-                test_results.append(f"❌ {provider_name.title()}: Erro - {str(e)}")
-        
-        if not test_results:
-            test_results.append("❌ Nenhum provedor configurado")
-        
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_pix_providers")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        test_text = "🧪 TESTE DE CONEXÕES\n\n"
-        test_text += "\n".join(test_results)
-        
-        await query.message.edit_text(test_text, reply_markup=reply_markup)
-        return
-    elif query.data == "admin_settings":
-        # Menu de configurações
-        keyboard = [
-            [InlineKeyboardButton("🔑 Token do Bot", callback_data="admin_edit_bot_token")],
-            [InlineKeyboardButton("🔧 Provedores PIX", callback_data="admin_pix_providers")],
-            [InlineKeyboardButton("📎 Arquivo de Boas-vindas", callback_data="admin_welcome_file")],
-            [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "⚙️ Configurações\n\nEscolha uma opção para editar:",
-            reply_markup=reply_markup
-        )
-        return
-    if query.data == "admin_messages":
-        # Limpa o estado de edição se existir
-        if 'editing' in context.user_data:
-            del context.user_data['editing']
-        keyboard = [
-            [InlineKeyboardButton("🏁 Mensagem de Início", callback_data="admin_edit_start_message")],
-            [InlineKeyboardButton("👋 Mensagem de Boas-vindas", callback_data="admin_edit_welcome_message")],
-            [InlineKeyboardButton("💎 Mensagem de Pagamento", callback_data="admin_edit_payment_message")],
-            [InlineKeyboardButton("✅ Mensagem de Sucesso", callback_data="admin_edit_success_message")],
-            [InlineKeyboardButton("❌ Mensagem de Erro", callback_data="admin_edit_error_message")],
-            [InlineKeyboardButton("📝 Instruções PIX", callback_data="admin_edit_pix_instructions")],
-            [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        text = "📝 Mensagens do Bot\n\nMensagens atuais:\n\n"
-        text += f"🏁 Início: {messages.get('start_message', 'Não definida')[:50]}...\n\n"
-        text += f"👋 Boas-vindas: {messages.get('welcome_message', 'Não definida')[:50]}...\n\n"
-        text += f"💎 Pagamento: {messages.get('payment_instructions', 'Não definida')[:50]}...\n\n"
-        text += f"✅ Sucesso: {messages.get('payment_success', 'Não definida')[:50]}...\n\n"
-        text += f"❌ Erro: {messages.get('payment_error', 'Não definida')[:50]}...\n\n"
-        text += f"📝 PIX: {messages.get('pix_automatico_instructions', 'Não definida')[:50]}...\n\n"
-        text += "Escolha uma mensagem para editar:"
+@admin_callback("admin_config_mercadopago")
+async def admin_cb_config_mercadopago(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    config = load_config()
+    # Configurar MercadoPago
+    keyboard = [
+        [InlineKeyboardButton("🔑 Token de Acesso", callback_data="admin_edit_mp_token")],
+        [InlineKeyboardButton("🌍 Ambiente", callback_data="admin_edit_mp_environment")],
+        [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_pix_providers")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
 
-        await query.message.edit_text(text, reply_markup=reply_markup)
+    current_token = config.get('mercadopago_access_token', 'Não configurado')
+    current_env = config.get('mercadopago_environment', 'production')
 
-        return
-    elif query.data == "admin_edit_start_message":
-        logger.info("[DEBUG] Entrou no bloco admin_edit_start_message (handle_admin_edit)")
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_messages")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        try:
-            # Apagar a mensagem anterior
-            try:
-                await query.message.delete()
-                logger.info("[DEBUG] Mensagem anterior apagada com sucesso")
-            except Exception as e:
-                logger.warning(f"[DEBUG] Não foi possível apagar a mensagem anterior: {e}")
-            logger.info("[DEBUG] Tentando enviar mensagem de edição de início para o admin")
-            msg = await context.bot.send_message(
-                chat_id=update.effective_user.id,
-                text="🏁 Editar Mensagem de Início\n\n"
-                     f"Mensagem atual:\n{messages.get('start_message', 'Não definida')}\n\n"
-                     "Envie a nova mensagem de início:",
-                reply_markup=reply_markup
-            )
-            context.user_data['editing_message_id'] = msg.message_id
-            logger.info("[DEBUG] Mensagem de edição de início enviada com sucesso")
-        except Exception as e:
-            logger.error(f"[DEBUG] Erro ao enviar mensagem de edição de início: {e}")
-        context.user_data['editing'] = 'start_message'
-        return
-    elif query.data == "admin_edit_welcome_message":
-        logger.info("[DEBUG] Entrou no bloco admin_edit_welcome_message (handle_admin_edit)")
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_messages")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        try:
-            # Apagar a mensagem anterior
-            try:
-                await query.message.delete()
-                logger.info("[DEBUG] Mensagem anterior apagada com sucesso")
-            except Exception as e:
-                logger.warning(f"[DEBUG] Não foi possível apagar a mensagem anterior: {e}")
-            logger.info("[DEBUG] Tentando enviar mensagem de edição de boas-vindas para o admin")
-            msg = await context.bot.send_message(
-                chat_id=update.effective_user.id,
-                text="👋 Editar Mensagem de Boas-vindas\n\n"
-                     f"Mensagem atual:\n{messages.get('welcome_message', 'Não definida')}\n\n"
-                     "Envie a nova mensagem de boas-vindas:",
-                reply_markup=reply_markup
-            )
-            context.user_data['editing_message_id'] = msg.message_id
-            logger.info("[DEBUG] Mensagem de edição de boas-vindas enviada com sucesso")
-        except Exception as e:
-            logger.error(f"[DEBUG] Erro ao enviar mensagem de edição de boas-vindas: {e}")
-        context.user_data['editing'] = 'welcome_message'
-        return
-    elif query.data == "admin_edit_payment_message":
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_messages")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        try:
-            try:
-                await query.message.delete()
-                logger.info("[DEBUG] Mensagem anterior apagada com sucesso")
-            except Exception as e:
-                logger.warning(f"[DEBUG] Não foi possível apagar a mensagem anterior: {e}")
-            logger.info("[DEBUG] Tentando enviar mensagem de edição de pagamento para o admin")
-            msg = await context.bot.send_message(
-                chat_id=update.effective_user.id,
-                text="💎 Editar Mensagem de Pagamento\n\n"
-                     f"Mensagem atual:\n{messages.get('payment_instructions', 'Não definida')}\n\n"
-                     "Envie a nova mensagem de pagamento:",
-                reply_markup=reply_markup
-            )
-            context.user_data['editing_message_id'] = msg.message_id
-            logger.info("[DEBUG] Mensagem de edição de pagamento enviada com sucesso")
-        except Exception as e:
-            logger.error(f"[DEBUG] Erro ao enviar mensagem de edição de pagamento: {e}")
-        context.user_data['editing'] = 'payment_instructions'
-        return
-    elif query.data == "admin_edit_success_message":
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_messages")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        try:
-            try:
-                await query.message.delete()
-                logger.info("[DEBUG] Mensagem anterior apagada com sucesso")
-            except Exception as e:
-                logger.warning(f"[DEBUG] Não foi possível apagar a mensagem anterior: {e}")
-            logger.info("[DEBUG] Tentando enviar mensagem de edição de sucesso para o admin")
-            msg = await context.bot.send_message(
-                chat_id=update.effective_user.id,
-                text="✅ Editar Mensagem de Sucesso\n\n"
-                     f"Mensagem atual:\n{messages.get('payment_success', 'Não definida')}\n\n"
-                     "Envie a nova mensagem de sucesso:",
-                reply_markup=reply_markup
-            )
-            context.user_data['editing_message_id'] = msg.message_id
-            logger.info("[DEBUG] Mensagem de edição de sucesso enviada com sucesso")
-        except Exception as e:
-            logger.error(f"[DEBUG] Erro ao enviar mensagem de edição de sucesso: {e}")
-        context.user_data['editing'] = 'payment_success'
-        return
-    elif query.data == "admin_edit_error_message":
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_messages")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        try:
-            try:
-                await query.message.delete()
-                logger.info("[DEBUG] Mensagem anterior apagada com sucesso")
-            except Exception as e:
-                logger.warning(f"[DEBUG] Não foi possível apagar a mensagem anterior: {e}")
-            logger.info("[DEBUG] Tentando enviar mensagem de edição de erro para o admin")
-            msg = await context.bot.send_message(
-                chat_id=update.effective_user.id,
-                text="❌ Editar Mensagem de Erro\n\n"
-                     f"Mensagem atual:\n{messages.get('payment_error', 'Não definida')}\n\n"
-                     "Envie a nova mensagem de erro:",
-                reply_markup=reply_markup
-            )
-            context.user_data['editing_message_id'] = msg.message_id
-            logger.info("[DEBUG] Mensagem de edição de erro enviada com sucesso")
-        except Exception as e:
-            logger.error(f"[DEBUG] Erro ao enviar mensagem de edição de erro: {e}")
-        context.user_data['editing'] = 'payment_error'
-        return
-    elif query.data == "admin_edit_pix_instructions":
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_messages")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    config_text = "🔧 CONFIGURAÇÃO MERCADOPAGO\n\n"
+    config_text += f"🔑 Token: {'********' if current_token != 'Não configurado' else 'Não configurado'}\n"
+    config_text += f"🌍 Ambiente: {current_env}\n\n"
+    config_text += "Escolha o que deseja configurar:"
+
+    await query.message.edit_text(config_text, reply_markup=reply_markup)
+    return
+
+@admin_callback("admin_config_cnpay")
+async def admin_cb_config_cnpay(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    config = load_config()
+    # Configurar CNPay
+    keyboard = [
+        [InlineKeyboardButton("🔑 API Key", callback_data="admin_edit_cnpay_key")],
+        [InlineKeyboardButton("🔐 API Secret", callback_data="admin_edit_cnpay_secret")],
+        [InlineKeyboardButton("🌍 Ambiente", callback_data="admin_edit_cnpay_environment")],
+        [InlineKeyboardButton("🌐 Webhook URL", callback_data="admin_edit_cnpay_webhook")],
+        [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_pix_providers")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    current_key = config.get('cnpay_api_key', 'Não configurado')
+    current_env = config.get('cnpay_environment', 'sandbox')
+    current_webhook = config.get('cnpay_webhook_url', 'Não configurado')
+
+    config_text = "🔧 CONFIGURAÇÃO CNPAY\n\n"
+    config_text += f"🔑 API Key: {'********' if current_key != 'Não configurado' else 'Não configurado'}\n"
+    config_text += f"🔐 API Secret: {'********' if config.get('cnpay_api_secret') else 'Não configurado'}\n"
+    config_text += f"🌍 Ambiente: {current_env}\n"
+    config_text += f"🌐 Webhook: {current_webhook}\n\n"
+    config_text += "Escolha o que deseja configurar:"
+
+    await query.message.edit_text(config_text, reply_markup=reply_markup)
+    return
+
+@admin_callback("admin_set_default_provider")
+async def admin_cb_set_default_provider(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    config = load_config()
+    # Definir provedor padrão
+    current_default = config.get('pix_provider', 'mercadopago')
+    mercadopago_enabled = config.get('mercadopago_enabled', False)
+    cnpay_enabled = config.get('cnpay_enabled', False)
+
+    keyboard = []
+    if cnpay_enabled:
+        keyboard.append([InlineKeyboardButton(
+            f"{'✅ ' if current_default == 'cnpay' else ''}CNPay",
+            callback_data="admin_set_provider_cnpay"
+        )])
+
+    keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="admin_pix_providers")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    text = "🎯 DEFINIR PROVEDOR PADRÃO\n\n"
+    text += f"Provedor atual: {current_default.title()}\n\n"
+    text += "Escolha o novo provedor padrão:"
+
+    await query.message.edit_text(text, reply_markup=reply_markup)
+    return
+
+@admin_callback(prefix="admin_set_provider_")
+async def admin_cb_set_provider(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    config = load_config()
+    # Definir provedor específico como padrão
+    provider = query.data.split('_')[-1]
+    config['pix_provider'] = provider
+
+    if save_config(config):
+        await query.answer(f"✅ {provider.title()} definido como padrão!")
+        # Recarregar o menu
+        await handle_admin_callback(update, context)
+    else:
+        await query.answer("❌ Erro ao salvar configuração")
+    return
+
+@admin_callback("admin_test_providers")
+async def admin_cb_test_providers(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Testar conexões dos provedores
+    await query.answer("🧪 Testando conexões...")
+
+    test_results = []
+    provider_manager = get_pix_provider_manager()
+
+    for provider_name, provider in provider_manager.providers.items():
         try:
-            try:
-                await query.message.delete()
-                logger.info("[DEBUG] Mensagem anterior apagada com sucesso")
-            except Exception as e:
-                logger.warning(f"[DEBUG] Não foi possível apagar a mensagem anterior: {e}")
-            logger.info("[DEBUG] Tentando enviar mensagem de edição de instruções PIX para o admin")
-            msg = await context.bot.send_message(
-                chat_id=update.effective_user.id,
-                text="📝 Editar Instruções PIX\n\n"
-                     f"Mensagem atual:\n{messages.get('pix_automatico_instructions', 'Não definida')}\n\n"
-                     "Envie a nova mensagem de instruções PIX:",
-                reply_markup=reply_markup
-            )
-            context.user_data['editing_message_id'] = msg.message_id
-            logger.info("[DEBUG] Mensagem de edição de instruções PIX enviada com sucesso")
+            # Teste simples de conexão
+            if provider_name == 'mercadopago':
+                if provider.config.get('mercadopago_access_token'):
+                    test_results.append(f"✅ MercadoPago: Configurado")
+                else:
+                    test_results.append(f"❌ MercadoPago: Token não configurado")
+            elif provider_name == 'cnpay':
+                if provider.api_key and provider.api_secret:
+                    test_results.append(f"✅ CNPay: Configurado")
+                else:
+                    test_results.append(f"❌ CNPay: Credenciais não configuradas")
         except Exception as e:
-            logger.error(f"[DEBUG] Erro ao enviar mensagem de edição de instruções PIX: {e}")
-        context.user_data['editing'] = 'pix_automatico_instructions'
-        return
-    elif query.data == "admin_broadcast_all":
-        # Preparar para enviar para todos
-        context.user_data['broadcast_type'] = 'all'
-        keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data="admin_broadcast")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "📢 Enviar mensagem para todos os usuários\n\n"
-            "Digite a mensagem que deseja enviar:",
-            reply_markup=reply_markup
-        )
-        return
-    elif query.data == "admin_broadcast_vip":
-        # Preparar para enviar para VIPs
-        context.user_data['broadcast_type'] = 'vip'
-        keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data="admin_broadcast")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "📢 Enviar mensagem para usuários VIP\n\n"
-            "Digite a mensagem que deseja enviar:",
-            reply_markup=reply_markup
-        )
+            test_results.append(f"❌ {provider_name.title()}: Erro - {str(e)}")
+
+    if not test_results:
+        test_results.append("❌ Nenhum provedor configurado")
+
+    keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_pix_providers")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    test_text = "🧪 TESTE DE CONEXÕES\n\n"
+    test_text += "\n".join(test_results)
+
+    await query.message.edit_text(test_text, reply_markup=reply_markup)
+    return
+
+@admin_callback("admin_settings")
+async def admin_cb_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Menu de configurações
+    keyboard = [
+        [InlineKeyboardButton("🔑 Token do Bot", callback_data="admin_edit_bot_token")],
+        [InlineKeyboardButton("🔧 Provedores PIX", callback_data="admin_pix_providers")],
+        [InlineKeyboardButton("📎 Arquivo de Boas-vindas", callback_data="admin_welcome_file")],
+        [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "⚙️ Configurações\n\nEscolha uma opção para editar:",
+        reply_markup=reply_markup
+    )
+    return
+
+@admin_callback("admin_messages")
+async def admin_cb_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    messages = load_messages_from_db()
+    # Limpa o estado de edição se existir
+    if 'editing' in context.user_data:
+        del context.user_data['editing']
+    keyboard = [
+        [InlineKeyboardButton("🏁 Mensagem de Início", callback_data="admin_edit_start_message")],
+        [InlineKeyboardButton("👋 Mensagem de Boas-vindas", callback_data="admin_edit_welcome_message")],
+        [InlineKeyboardButton("💎 Mensagem de Pagamento", callback_data="admin_edit_payment_message")],
+        [InlineKeyboardButton("✅ Mensagem de Sucesso", callback_data="admin_edit_success_message")],
+        [InlineKeyboardButton("❌ Mensagem de Erro", callback_data="admin_edit_error_message")],
+        [InlineKeyboardButton("📝 Instruções PIX", callback_data="admin_edit_pix_instructions")],
+        [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    text = "📝 Mensagens do Bot\n\nMensagens atuais:\n\n"
+    text += f"🏁 Início: {messages.get('start_message', 'Não definida')[:50]}...\n\n"
+    text += f"👋 Boas-vindas: {messages.get('welcome_message', 'Não definida')[:50]}...\n\n"
+    text += f"💎 Pagamento: {messages.get('payment_instructions', 'Não definida')[:50]}...\n\n"
+    text += f"✅ Sucesso: {messages.get('payment_success', 'Não definida')[:50]}...\n\n"
+    text += f"❌ Erro: {messages.get('payment_error', 'Não definida')[:50]}...\n\n"
+    text += f"📝 PIX: {messages.get('pix_automatico_instructions', 'Não definida')[:50]}...\n\n"
+    text += "Escolha uma mensagem para editar:"
+
+    await query.message.edit_text(text, reply_markup=reply_markup)
+
+    return
+
+@admin_callback("admin_broadcast_all")
+async def admin_cb_broadcast_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Preparar para enviar para todos
+    context.user_data['broadcast_type'] = 'all'
+    keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data="admin_broadcast")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "📢 Enviar mensagem para todos os usuários\n\n"
+        "Digite a mensagem que deseja enviar:",
+        reply_markup=reply_markup
+    )
+    return
+
+@admin_callback("admin_broadcast_vip")
+async def admin_cb_broadcast_vip(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Preparar para enviar para VIPs
+    context.user_data['broadcast_type'] = 'vip'
+    keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data="admin_broadcast")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "📢 Enviar mensagem para usuários VIP\n\n"
+        "Digite a mensagem que deseja enviar:",
+        reply_markup=reply_markup
+    )
+    return
+
+@admin_callback("admin_stats")
+async def admin_cb_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Mostrar estatísticas
+    stats = get_user_stats()
+
+    text = "📊 Estatísticas do Bot\n\n"
+    text += f"Total de Usuários: {stats['total_users']}\n"
+    text += f"Total de VIPs: {stats['vip_users']}\n"
+    text += f"Última Atualização: {datetime.now().strftime('%d/%m/%Y %H:%M')}\n\n"
+
+    # Métricas de receita e retenção (calculadas fora do event loop, com cache)
+    try:
+        metrics = await asyncio.to_thread(subscription_analytics.summary)
+        text += f"📈 Receita e Retenção ({ANALYTICS_WINDOW_DAYS} dias)\n"
+        text += f"Assinantes Ativos: {metrics['active_users']}\n"
+        text += f"MRR: R$ {metrics['mrr']:.2f}\n"
+        text += f"Churn: {metrics['churn_rate'] * 100:.1f}% ({metrics['churned_users']} usuários)\n"
+        text += f"Renovação: {metrics['renewal_rate'] * 100:.1f}% de {metrics['ended_subscriptions']} vencidas\n"
+        if metrics['ltv_by_plan']:
+            text += "\n💰 LTV por Plano de Entrada:\n"
+            for plan in metrics['ltv_by_plan']:
+                text += f"• {plan['plan_name']}: R$ {plan['ltv']:.2f} ({plan['users']} usuários)\n"
+        if metrics['cohorts']:
+            text += "\n📅 Cohorts Diários (novos / ainda ativos):\n"
+            for cohort in metrics['cohorts']:
+                text += f"• {cohort['day'].strftime('%d/%m')}: {cohort['users']} / {cohort['active']}\n"
+        text += "\n"
+    except Exception as e:
+        logger.error(f"Erro ao calcular métricas de analytics: {e}")
+
+    text += "👥 Últimos Usuários:\n"
+
+    # Mostrar os últimos 5 usuários
+    for user in stats['recent_users']:
+        text += f"\nID: {user['id']}"
+        if user['username']:
+            text += f"\nUsername: @{user['username']}"
+        text += f"\nNome: {user['first_name']}"
+        if user['last_name']:
+            text += f" {user['last_name']}"
+        text += f"\nData: {user['joined_date']}"
+        text += f"\nVIP: {'✅' if user.get('is_vip', False) else '❌'}\n"
+
+    keyboard = [
+        [InlineKeyboardButton("📊 Exportar Excel", callback_data="admin_export_excel")],
+        [InlineKeyboardButton("📦 Exportar Dados Brutos", callback_data="admin_export_raw")],
+        [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(text, reply_markup=reply_markup)
+
+@admin_callback("admin_vip_users")
+async def admin_cb_vip_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # Listar usuários VIP
+    active_subscriptions = get_all_active_subscriptions()
+
+    if active_subscriptions:
+        text = "👥 Usuários VIP Ativos:\n\n"
+        for sub in active_subscriptions:
+            text += f"ID: {sub['user_id']}\n"
+            text += f"Nome: {sub['first_name']} {sub['last_name'] or ''}\n"
+            text += f"Plano: {sub['plan_name']}\n"
+            text += f"Expira em: {sub['end_date']}\n\n"
+    else:
+        text = "Nenhum usuário VIP ativo."
+
+    keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(text, reply_markup=reply_markup)
+
+@admin_callback("admin_maintenance")
+async def admin_cb_maintenance(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    config = load_config()
+    # Modo manutenção
+    keyboard = [
+        [InlineKeyboardButton(
+            "🔴 Desativar Manutenção" if config.get('maintenance_mode', False) else "🟢 Ativar Manutenção",
+            callback_data="admin_toggle_maintenance"
+        )],
+        [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    status = "ativado" if config.get('maintenance_mode', False) else "desativado"
+    await query.message.edit_text(
+        f"🔄 Modo Manutenção\n\nStatus atual: {status}",
+        reply_markup=reply_markup
+    )
+
+@admin_callback("admin_back")
+async def admin_cb_back(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    config = load_config()
+    # Limpa o estado de edição se existir
+    if 'editing' in context.user_data:
+        del context.user_data['editing']
+    # Menu principal com layout melhorado
+    keyboard = [
+        [InlineKeyboardButton("📊 Estatísticas", callback_data="admin_stats")],
+        [
+            InlineKeyboardButton("⚙️ Configurações", callback_data="admin_settings"),
+            InlineKeyboardButton("👥 Usuários VIP", callback_data="admin_vip_users")
+        ],
+        [InlineKeyboardButton("💎 Planos VIP", callback_data="admin_vip_plans")],
+        [InlineKeyboardButton("📝 Mensagens", callback_data="admin_messages")],
+        [InlineKeyboardButton("⏰ Agendar Mensagens", callback_data="admin_schedule_messages")],
+        [InlineKeyboardButton("🔄 Manutenção", callback_data="admin_maintenance")],
+        [InlineKeyboardButton("👤 Gerenciar Admins", callback_data="admin_manage_admins")],
+        [InlineKeyboardButton("⚒️ Suporte", url=config.get('support_admin', 'https://t.me/suporte'))]  # Botão de suporte
+    ]
+
+    # Adicionar botão de broadcast (com emoji de cadeado para admins não-VIP)
+    if is_admin_vip(update.effective_user.id):
+        keyboard.insert(6, [InlineKeyboardButton("📢 Broadcast", callback_data="admin_broadcast")])
+    else:
+        keyboard.insert(6, [InlineKeyboardButton("📢🔒 Broadcast (VIP)", callback_data="admin_broadcast_locked")])
+
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "🔧 Painel Administrativo\n\nEscolha uma opção:",
+        reply_markup=reply_markup
+    )
+
+@admin_callback("admin_edit_cnpay_environment")
+async def admin_cb_edit_cnpay_environment(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    config = load_config()
+    keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_config_cnpay")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "🌍 Editar Ambiente do CNPay\n\n"
+        f"Ambiente atual: {config.get('cnpay_environment', 'sandbox')}\n\n"
+        "Envie o novo ambiente (sandbox ou production):",
+        reply_markup=reply_markup
+    )
+    context.user_data['editing'] = 'cnpay_environment'
+    return
+
+@admin_callback("admin_edit_cnpay_webhook")
+async def admin_cb_edit_cnpay_webhook(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    config = load_config()
+    keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_config_cnpay")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "🌐 Editar Webhook URL do CNPay\n\n"
+        f"Webhook atual: {config.get('cnpay_webhook_url', 'Não configurado')}\n\n"
+        "Envie a nova URL do webhook:",
+        reply_markup=reply_markup
+    )
+    context.user_data['editing'] = 'cnpay_webhook_url'
+    return
+
+@admin_callback("admin_welcome_file")
+async def admin_cb_welcome_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    config = load_config()
+    messages = load_messages_from_db()
+    # Menu de arquivo de boas-vindas
+    welcome_file_config = config.get('welcome_file', {})
+    is_enabled = welcome_file_config.get('enabled', False)
+    file_type = welcome_file_config.get('file_type', 'photo')
+    print(messages)
+    caption = messages.get('start_message', 'sem mensagem definida!')
+    print(caption)
+
+    keyboard = [
+        [InlineKeyboardButton(
+            f"{'🔴' if not is_enabled else '🟢'} {'Desativar' if is_enabled else 'Ativar'} Arquivo",
+            callback_data="admin_toggle_welcome_file"
+        )],
+        [InlineKeyboardButton("📎 Enviar Novo Arquivo", callback_data="admin_upload_welcome_file")],
+        [InlineKeyboardButton("📝 Editar Legenda", callback_data="admin_edit_welcome_caption")],
+        [InlineKeyboardButton("🗑️ Remover Arquivo", callback_data="admin_remove_welcome_file")],
+        [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_settings")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    status_text = "📎 Arquivo de Boas-vindas\n\n"
+    if is_enabled:
+        status_text += f"✅ Status: Ativado\n"
+        status_text += f"📁 Tipo: {file_type.title()}\n"
+        status_text += f"📝 Legenda: {caption}\n"
+    else:
+        status_text += f"❌ Status: Desativado\n"
+
+    status_text += "\nEscolha uma opção:"
+
+    await query.message.edit_text(
+        status_text,
+        reply_markup=reply_markup
+    )
+    return
+
+@admin_callback("admin_vip_plans")
+async def admin_cb_vip_plans(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    db = Database()
+    try:
+        db.connect()
+        plans = db.execute_fetch_all("SELECT * FROM vip_plans")
+    finally:
+        db.close()
+    keyboard = []
+    for plan in plans:
+        keyboard.append([
+            InlineKeyboardButton(f"✏️ {plan['name']} (R${plan['price']:.2f})", callback_data=f"admin_edit_plan_{plan['id']}"),
+            InlineKeyboardButton("🗑️", callback_data=f"admin_remove_plan_{plan['id']}")
+        ])
+    keyboard.append([InlineKeyboardButton("➕ Adicionar Novo Plano", callback_data="admin_add_plan")])
+    keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "💎 Gerenciar Planos VIP\n\nSelecione um plano para editar ou remova/adicione novos planos:",
+        reply_markup=reply_markup
+    )
+    return
+
+# Tratamento para remover plano
+@admin_callback(prefix="admin_remove_plan_")
+async def admin_cb_remove_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    plan_id = int(query.data.split('_')[-1])
+    plan = await get_plan_by_id(plan_id)
+    if not plan:
+        await query.answer("❌ Plano não encontrado!")
         return
-    
 
-    
-    # Se não for broadcast, continua com o código existente
-    action = '_'.join(query.data.split('_')[1:])
-    logger.info(f"Ação: {action}")
-    
-    if action == "stats":
-        # Mostrar estatísticas
-        stats = get_user_stats()
-        
-        text = "📊 Estatísticas do Bot\n\n"
-        text += f"Total de Usuários: {stats['total_users']}\n"
-        text += f"Total de VIPs: {stats['vip_users']}\n"
-        text += f"Última Atualização: {datetime.now().strftime('%d/%m/%Y %H:%M')}\n\n"
-        text += "👥 Últimos Usuários:\n"
-        
-        # Mostrar os últimos 5 usuários
-        for user in stats['recent_users']:
-            text += f"\nID: {user['id']}"
-            if user['username']:
-                text += f"\nUsername: @{user['username']}"
-            text += f"\nNome: {user['first_name']}"
-            if user['last_name']:
-                text += f" {user['last_name']}"
-            text += f"\nData: {user['joined_date']}"
-            text += f"\nVIP: {'✅' if user.get('is_vip', False) else '❌'}\n"
-        
-        keyboard = [
-            [InlineKeyboardButton("📊 Exportar Excel", callback_data="admin_export_excel")],
-            [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(text, reply_markup=reply_markup)
-        
-    elif action == "vip_users":
-        # Listar usuários VIP
-        active_subscriptions = get_all_active_subscriptions()
-        
-        if active_subscriptions:
-            text = "👥 Usuários VIP Ativos:\n\n"
-            for sub in active_subscriptions:
-                text += f"ID: {sub['user_id']}\n"
-                text += f"Nome: {sub['first_name']} {sub['last_name'] or ''}\n"
-                text += f"Plano: {sub['plan_name']}\n"
-                text += f"Expira em: {sub['end_date']}\n\n"
-        else:
-            text = "Nenhum usuário VIP ativo."
-        
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(text, reply_markup=reply_markup)
-        
-    elif action == "maintenance":
-        # Modo manutenção
-        keyboard = [
-            [InlineKeyboardButton(
-                "🔴 Desativar Manutenção" if config.get('maintenance_mode', False) else "🟢 Ativar Manutenção",
-                callback_data="admin_toggle_maintenance"
-            )],
-            [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        status = "ativado" if config.get('maintenance_mode', False) else "desativado"
-        await query.message.edit_text(
-            f"🔄 Modo Manutenção\n\nStatus atual: {status}",
-            reply_markup=reply_markup
+    # Verificar se há usuários ativos com este plano
+    db = Database()
+    try:
+        db.connect()
+        active_users = db.execute_fetch_all(
+            "SELECT COUNT(*) as count FROM subscriptions WHERE plan_id = %s AND is_active = TRUE",
+            (plan_id,)
         )
-        
-    elif action == "back":
-        # Limpa o estado de edição se existir
-        if 'editing' in context.user_data:
-            del context.user_data['editing']
-        # Menu principal com layout melhorado
-        keyboard = [
-            [InlineKeyboardButton("📊 Estatísticas", callback_data="admin_stats")],
-            [
-                InlineKeyboardButton("⚙️ Configurações", callback_data="admin_settings"),
-                InlineKeyboardButton("👥 Usuários VIP", callback_data="admin_vip_users")
-            ],
-            [InlineKeyboardButton("💎 Planos VIP", callback_data="admin_vip_plans")],
-            [InlineKeyboardButton("📝 Mensagens", callback_data="admin_messages")],
-            [InlineKeyboardButton("⏰ Agendar Mensagens", callback_data="admin_schedule_messages")],
-            [InlineKeyboardButton("🔄 Manutenção", callback_data="admin_maintenance")],
-            [InlineKeyboardButton("👤 Gerenciar Admins", callback_data="admin_manage_admins")],
-            [InlineKeyboardButton("⚒️ Suporte", url=config.get('support_admin', 'https://t.me/suporte'))]  # Botão de suporte
-        ]
-        
-        # Adicionar botão de broadcast (com emoji de cadeado para admins não-VIP)
-        if is_admin_vip(update.effective_user.id):
-            keyboard.insert(6, [InlineKeyboardButton("📢 Broadcast", callback_data="admin_broadcast")])
-        else:
-            keyboard.insert(6, [InlineKeyboardButton("📢🔒 Broadcast (VIP)", callback_data="admin_broadcast_locked")])
+        user_count = active_users[0]['count'] if active_users else 0
+    finally:
+        db.close()
+
+    keyboard = [
+        [InlineKeyboardButton("✅ Confirmar Remoção", callback_data=f"admin_confirm_remove_plan_{plan_id}")],
+        [InlineKeyboardButton("❌ Cancelar", callback_data="admin_vip_plans")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    warning_text = f"🗑️ Remover Plano: {plan['name']}\n\n"
+    warning_text += f"💰 Preço: R${plan['price']:.2f}\n"
+    warning_text += f"⏱️ Duração: {plan['duration_days']} dias\n"
+    warning_text += f"👥 Usuários ativos: {user_count}\n\n"
 
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "🔧 Painel Administrativo\n\nEscolha uma opção:",
-            reply_markup=reply_markup
-        )
+    if user_count > 0:
+        warning_text += "⚠️ ATENÇÃO: Este plano possui usuários ativos!\n"
+        warning_text += "A remoção pode afetar as assinaturas existentes.\n\n"
 
-    elif query.data == "admin_edit_cnpay_environment":
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_config_cnpay")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "🌍 Editar Ambiente do CNPay\n\n"
-            f"Ambiente atual: {config.get('cnpay_environment', 'sandbox')}\n\n"
-            "Envie o novo ambiente (sandbox ou production):",
-            reply_markup=reply_markup
-        )
-        context.user_data['editing'] = 'cnpay_environment'
-        return
+    warning_text += "Tem certeza que deseja remover este plano?\n"
+    warning_text += "Esta ação não pode ser desfeita."
+
+    await query.message.edit_text(warning_text, reply_markup=reply_markup)
+    return
+
+@admin_callback("admin_confirm_remove_welcome_file")
+async def admin_cb_confirm_remove_welcome_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    config = load_config()
+    messages = load_messages_from_db()
+    try:
+        logger.info("Iniciando remoção do arquivo de boas-vindas...")
+
+        # NÃO responder o callback aqui, pois já foi respondido em handle_admin_callback
+        # Load config and update in memory first
+        config = load_config()
+
+        if not config:
+            logger.error("Falha ao carregar as configurações.")
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text="❌ Erro ao carregar as configurações. Tente novamente."
+            )
+            return
 
-    elif query.data == "admin_edit_cnpay_webhook":
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_config_cnpay")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "🌐 Editar Webhook URL do CNPay\n\n"
-            f"Webhook atual: {config.get('cnpay_webhook_url', 'Não configurado')}\n\n"
-            "Envie a nova URL do webhook:",
-            reply_markup=reply_markup
-        )
-        context.user_data['editing'] = 'cnpay_webhook_url'
-        return
-   
-    elif query.data == "admin_welcome_file":
-        # Menu de arquivo de boas-vindas
-        welcome_file_config = config.get('welcome_file', {})
-        is_enabled = welcome_file_config.get('enabled', False)
-        file_type = welcome_file_config.get('file_type', 'photo')
-        print(messages)
         caption = messages.get('start_message', 'sem mensagem definida!')
-        print(caption)
-        
-        keyboard = [
-            [InlineKeyboardButton(
-                f"{'🔴' if not is_enabled else '🟢'} {'Desativar' if is_enabled else 'Ativar'} Arquivo",
-                callback_data="admin_toggle_welcome_file"
-            )],
-            [InlineKeyboardButton("📎 Enviar Novo Arquivo", callback_data="admin_upload_welcome_file")],
-            [InlineKeyboardButton("📝 Editar Legenda", callback_data="admin_edit_welcome_caption")],
-            [InlineKeyboardButton("🗑️ Remover Arquivo", callback_data="admin_remove_welcome_file")],
-            [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_settings")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        status_text = "📎 Arquivo de Boas-vindas\n\n"
-        if is_enabled:
-            status_text += f"✅ Status: Ativado\n"
-            status_text += f"📁 Tipo: {file_type.title()}\n"
-            status_text += f"📝 Legenda: {caption}\n"
+
+        # Update welcome file configuration
+        config['welcome_file'] = {
+            'enabled': False,
+            'file_id': '',
+            'file_type': 'photo',
+            'caption': caption
+        }
+
+        # Save config and handle result
+        if save_config(config):
+            logger.info("Arquivo de boas-vindas removido com sucesso")
+            keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_welcome_file")]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text="✅ Arquivo de boas-vindas removido com sucesso!",
+                reply_markup=reply_markup
+            )
         else:
-            status_text += f"❌ Status: Desativado\n"
-        
-        status_text += "\nEscolha uma opção:"
-        
-        await query.message.edit_text(
-            status_text,
-            reply_markup=reply_markup
-        )
-        return
+            logger.error("Falha ao salvar as configurações após remoção do arquivo")
+            keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_welcome_file")]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text="❌ Ocorreu um erro ao remover o arquivo. Tente novamente.",
+                reply_markup=reply_markup
+            )
 
-    # --- INÍCIO: Menu de gerenciamento de planos VIP ---
-    elif query.data == "admin_vip_plans":
-        db = Database()
-        try:
-            db.connect()
-            plans = db.execute_fetch_all("SELECT * FROM vip_plans")
-        finally:
-            db.close()
-        keyboard = []
-        for plan in plans:
-            keyboard.append([
-                InlineKeyboardButton(f"✏️ {plan['name']} (R${plan['price']:.2f})", callback_data=f"admin_edit_plan_{plan['id']}"),
-                InlineKeyboardButton("🗑️", callback_data=f"admin_remove_plan_{plan['id']}")
-            ])
-        keyboard.append([InlineKeyboardButton("➕ Adicionar Novo Plano", callback_data="admin_add_plan")])
-        keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="admin_back")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "💎 Gerenciar Planos VIP\n\nSelecione um plano para editar ou remova/adicione novos planos:",
-            reply_markup=reply_markup
-        )
-        return
-    
-    # Tratamento para remover plano
-    elif query.data.startswith("admin_remove_plan_"):
-        plan_id = int(query.data.split('_')[-1])
-        plan = await get_plan_by_id(plan_id)
-        if not plan:
-            await query.answer("❌ Plano não encontrado!")
-            return
-        
-        # Verificar se há usuários ativos com este plano
-        db = Database()
+
+    except Exception as e:
+        logger.error(f"Erro ao processar remoção do arquivo de boas-vindas: {e}")
         try:
-            db.connect()
-            active_users = db.execute_fetch_all(
-                "SELECT COUNT(*) as count FROM subscriptions WHERE plan_id = %s AND is_active = TRUE",
-                (plan_id,)
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text=f"❌ Ocorreu um erro ao processar: {str(e)}"
             )
-            user_count = active_users[0]['count'] if active_users else 0
-        finally:
-            db.close()
-        
-        keyboard = [
-            [InlineKeyboardButton("✅ Confirmar Remoção", callback_data=f"admin_confirm_remove_plan_{plan_id}")],
-            [InlineKeyboardButton("❌ Cancelar", callback_data="admin_vip_plans")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        warning_text = f"🗑️ Remover Plano: {plan['name']}\n\n"
-        warning_text += f"💰 Preço: R${plan['price']:.2f}\n"
-        warning_text += f"⏱️ Duração: {plan['duration_days']} dias\n"
-        warning_text += f"👥 Usuários ativos: {user_count}\n\n"
-        
-        if user_count > 0:
-            warning_text += "⚠️ ATENÇÃO: Este plano possui usuários ativos!\n"
-            warning_text += "A remoção pode afetar as assinaturas existentes.\n\n"
-        
-        warning_text += "Tem certeza que deseja remover este plano?\n"
-        warning_text += "Esta ação não pode ser desfeita."
-        
-        await query.message.edit_text(warning_text, reply_markup=reply_markup)
-        return
-    
-    elif query.data == "admin_upload_welcome_file":
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_welcome_file")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "📎 Enviar Novo Arquivo de Boas-vindas\n\n"
-            "Envie uma foto ou vídeo que será usado como arquivo de boas-vindas.\n\n"
-            "⚠️ O arquivo deve ser menor que 50MB.",
-            reply_markup=reply_markup
-        )
-        context.user_data['waiting_for_welcome_file'] = True
-        return
-    
-    
-    elif query.data == "admin_confirm_remove_welcome_file":
-        try:
-            logger.info("Iniciando remoção do arquivo de boas-vindas...")
-            
-            # NÃO responder o callback aqui, pois já foi respondido em handle_admin_callback
-            # Load config and update in memory first
-            config = load_config()
+        except Exception as e2:
+            logger.error(f"Erro ao enviar mensagem de erro: {e2}")
+    return
 
-            if not config:
-                logger.error("Falha ao carregar as configurações.")
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text="❌ Erro ao carregar as configurações. Tente novamente."
-                )
-                return
-                
-            caption = messages.get('start_message', 'sem mensagem definida!')
-
-            # Update welcome file configuration
-            config['welcome_file'] = {
-                'enabled': False,
-                'file_id': '',
-                'file_type': 'photo',
-                'caption': caption
-            }
-            
-            # Save config and handle result
-            if save_config(config):
-                logger.info("Arquivo de boas-vindas removido com sucesso")
-                keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_welcome_file")]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text="✅ Arquivo de boas-vindas removido com sucesso!",
-                    reply_markup=reply_markup
-                )
-            else:
-                logger.error("Falha ao salvar as configurações após remoção do arquivo")
-                keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_welcome_file")]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text="❌ Ocorreu um erro ao remover o arquivo. Tente novamente.",
-                    reply_markup=reply_markup
-                )
-            
-            
-        except Exception as e:
-            logger.error(f"Erro ao processar remoção do arquivo de boas-vindas: {e}")
-            try:
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text=f"❌ Ocorreu um erro ao processar: {str(e)}"
-                )
-            except Exception as e2:
-                logger.error(f"Erro ao enviar mensagem de erro: {e2}")
-        return
-    
-    
-    # Tratamento para adicionar novo plano
-    elif query.data == "admin_add_plan":
-        context.user_data['adding_plan'] = {'step': 'name'}
-        keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data="admin_vip_plans")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            "➕ Adicionar Novo Plano VIP\n\n"
-            "Digite o nome do novo plano:",
-            reply_markup=reply_markup
-        )
-        return
-    # --- FIM: Menu de gerenciamento de planos VIP ---
+# Tratamento para adicionar novo plano
+@admin_callback("admin_add_plan")
+async def admin_cb_add_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    context.user_data['adding_plan'] = {'step': 'name'}
+    keyboard = [[InlineKeyboardButton("❌ Cancelar", callback_data="admin_vip_plans")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.edit_text(
+        "➕ Adicionar Novo Plano VIP\n\n"
+        "Digite o nome do novo plano:",
+        reply_markup=reply_markup
+    )
+    return
 
-    if query.data == "admin_export_excel":
-        await query.message.edit_text("📊 Gerando relatório completo...")
-        
-        try:
-            # Obter dados
-            stats = get_user_stats()
-            all_users = get_all_users()
-            subscriptions = get_subscriptions_for_export()
-            expiring_subs = get_expiring_subscriptions()
-            
-            # Criar workbook
-            wb = openpyxl.Workbook()
-            
-            # Remover aba padrão
-            wb.remove(wb.active)
-            
-            # === ABA 1: RESUMO EXECUTIVO ===
-            ws_summary = wb.create_sheet("📊 Resumo Executivo")
-            
-            # Estatísticas gerais
-            ws_summary.append(["RELATÓRIO DE ASSINATURAS VIP", ""])
-            ws_summary.append(["Data da Exportação:", datetime.now().strftime('%d/%m/%Y %H:%M:%S')])
-            ws_summary.append([""])
-            ws_summary.append(["ESTATÍSTICAS GERAIS", ""])
-            ws_summary.append(["Total de Usuários:", stats['total_users']])
-            ws_summary.append(["Total de VIPs Ativos:", stats['vip_users']])
-            ws_summary.append(["Total de Assinaturas:", len(subscriptions)])
-            ws_summary.append(["Assinaturas Expirando (≤3 dias):", len(expiring_subs)])
-            ws_summary.append([""])
-            
-            # Estatísticas por plano
-            plan_stats = {}
-            for sub in subscriptions:
-                plan_name = sub['plan_name']
-                if plan_name not in plan_stats:
-                    plan_stats[plan_name] = {'count': 0, 'revenue': 0}
-                plan_stats[plan_name]['count'] += 1
-                plan_stats[plan_name]['revenue'] += float(sub['price'] or 0)
-            
-            ws_summary.append(["ESTATÍSTICAS POR PLANO", ""])
-            ws_summary.append(["Plano", "Quantidade", "Receita Total (R$)"])
-            total_revenue = 0
-            for plan_name, data in plan_stats.items():
-                ws_summary.append([plan_name, data['count'], f"R$ {data['revenue']:.2f}"])
-                total_revenue += data['revenue']
-            ws_summary.append(["", "", ""])
-            ws_summary.append(["RECEITA TOTAL:", f"R$ {total_revenue:.2f}"])
-            
-            # === ABA 2: ASSINATURAS DETALHADAS ===
-            ws_subs = wb.create_sheet("📋 Assinaturas Detalhadas")
-            
-            # Cabeçalho
-            headers = [
-                "ID Assinatura", "ID Usuário", "Username", "Nome Completo",
-                "Plano", "Preço (R$)", "Duração (dias)", "Método Pagamento",
-                "Status Pagamento", "Data Início", "Data Fim", "Dias Restantes",
-                "Dias Pagos", "Total Dias", "Status Expiração", "Permanente",
-                "Data Criação"
-            ]
-            ws_subs.append(headers)
-            
-            # Dados das assinaturas
-            for sub in subscriptions:
-                full_name = f"{sub['first_name'] or ''} {sub['last_name'] or ''}".strip()
-                
-                row = [
-                    sub['subscription_id'],
-                    sub['user_id'],
-                    sub['username'] or '',
-                    full_name,
-                    sub['plan_name'],
-                    f"R$ {float(sub['price'] or 0):.2f}",
-                    sub['duration_days'] if sub['duration_days'] != -1 else "Permanente",
-                    sub['payment_method'].replace('_', ' ').title(),
-                    sub['payment_status'].title(),
-                    sub['start_date'].strftime('%d/%m/%Y %H:%M') if sub['start_date'] else '',
-                    sub['end_date'].strftime('%d/%m/%Y %H:%M') if sub['end_date'] else 'Permanente',
-                    sub['days_remaining'] if sub['days_remaining'] != 999999 else "∞",
-                    sub['days_paid'] if sub['days_paid'] != 999999 else "∞",
-                    sub['total_days'] if sub['total_days'] != 999999 else "∞",
-                    sub['expiration_status'],
-                    "SIM" if sub['is_permanent'] else "NÃO",
-                    sub['created_at'].strftime('%d/%m/%Y %H:%M') if sub['created_at'] else ''
-                ]
-                ws_subs.append(row)
-            
-            # === ABA 3: EXPIRANDO EM BREVE ===
-            ws_expiring = wb.create_sheet("⚠️ Expirando em Breve")
-            
-            if expiring_subs:
-                ws_expiring.append([
-                    "ID Usuário", "Username", "Nome", "Plano", "Dias Restantes",
-                    "Data Expiração", "Status", "Valor (R$)"
-                ])
-                
-                for sub in expiring_subs:
-                    full_name = f"{sub['first_name'] or ''} {sub['last_name'] or ''}".strip()
-                    
-                    # Calcular dias restantes
-                    end_date = sub['end_date']
-                    if isinstance(end_date, str):
-                        end_date = datetime.strptime(end_date, "%Y-%m-%d %H:%M:%S")
-                    days_left = (end_date - datetime.now()).days
-                    
-                    ws_expiring.append([
-                        sub['user_id'],
-                        sub['username'] or '',
-                        full_name,
-                        sub['plan_name'],
-                        days_left,
-                        sub['end_date'].strftime('%d/%m/%Y %H:%M') if sub['end_date'] else '',
-                        "Expirando" if days_left <= 3 else "Próximo de expirar",
-                        f"R$ {float(sub['price'] or 0):.2f}"
-                    ])
-            else:
-                ws_expiring.append(["Nenhuma assinatura expirando em breve!"])
-            
-            # === ABA 4: TODOS OS USUÁRIOS ===
-            ws_users = wb.create_sheet("👥 Todos os Usuários")
-            
-            ws_users.append([
-                "ID", "Username", "Nome", "Sobrenome", "Data de Entrada", "É VIP"
-            ])
-            
-            for user in all_users:
-                ws_users.append([
-                    user['id'],
-                    user['username'] or '',
-                    user['first_name'] or '',
-                    user['last_name'] or '',
-                    user['joined_date'].strftime('%d/%m/%Y %H:%M') if user['joined_date'] else '',
-                    'SIM' if user.get('is_vip', False) else 'NÃO'
-                ])
-            
-            # Aplicar formatação e ajustar colunas
-            for ws in [ws_summary, ws_subs, ws_expiring, ws_users]:
-                # Ajustar largura das colunas
-                for col in ws.columns:
-                    max_length = 0
-                    col_letter = get_column_letter(col[0].column)
-                    for cell in col:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)  # Máximo de 50 caracteres
-                    ws.column_dimensions[col_letter].width = adjusted_width
-                
-                # Formatação do cabeçalho
-                if ws.max_row > 0:
-                    for cell in ws[1]:
-                        cell.font = Font(bold=True)
-                        cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-            
-            # Formatação especial para assinaturas expirando
-            if ws_expiring.max_row > 1:
-                for row in range(2, ws_expiring.max_row + 1):
-                    days_cell = ws_expiring[f'E{row}']  # Coluna dias restantes
-                    if days_cell.value and isinstance(days_cell.value, int):
-                        if days_cell.value <= 1:
-                            days_cell.fill = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
-                        elif days_cell.value <= 3:
-                            days_cell.fill = PatternFill(start_color="FFFFCC", end_color="FFFFCC", fill_type="solid")
-            
-            # Salvar em memória
-            file_stream = BytesIO()
-            wb.save(file_stream)
-            file_stream.seek(0)
-            
+@admin_callback("admin_export_excel")
+async def admin_cb_export_excel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.message.edit_text("📊 Gerando relatório completo...")
+
+    path = None
+    try:
+        # Gerar planilha fora do event loop, direto em arquivo temporário
+        stats = get_user_stats()
+        path = await asyncio.to_thread(export_full_report, stats)
+
+        with open(path, 'rb') as report:
             await query.message.reply_document(
-                document=file_stream,
+                document=report,
                 filename=f"relatorio_vip_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
                 caption="📊 Relatório completo de assinaturas VIP gerado com sucesso!\n\n"
                        "📋 Inclui:\n"
@@ -3834,141 +4219,124 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
                        "• Lista de assinaturas expirando em breve\n"
                        "• Todos os usuários do sistema"
             )
-            
-        except Exception as e:
-            logger.error(f"Erro ao gerar relatório Excel: {e}")
-            await query.message.edit_text(f"❌ Erro ao gerar relatório: {str(e)}")
-        
-        return
 
-    # Nova funcionalidade: Exportar apenas assinaturas expirando
-    if query.data == "admin_export_expiring":
-        await query.message.edit_text("⚠️ Gerando relatório de assinaturas expirando...")
-        
-        try:
-            expiring_subs = get_expiring_subscriptions()
-            
-            if not expiring_subs:
-                await query.message.edit_text("✅ Nenhuma assinatura expirando em breve!")
-                return
-            
-            # Criar workbook simples para assinaturas expirando
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Assinaturas Expirando"
-            
-            # Cabeçalho
-            ws.append(["RELATÓRIO DE ASSINATURAS EXPIRANDO"])
-            ws.append(["Data da Exportação:", datetime.now().strftime('%d/%m/%Y %H:%M:%S')])
-            ws.append(["Total de Assinaturas:", len(expiring_subs)])
-            ws.append([""])
-            
-            # Cabeçalhos das colunas
-            headers = [
-                "ID Usuário", "Username", "Nome Completo", "Plano", 
-                "Dias Restantes", "Data Expiração", "Valor (R$)", "Status"
-            ]
-            ws.append(headers)
-            
-            # Dados
-            for sub in expiring_subs:
-                full_name = f"{sub['first_name'] or ''} {sub['last_name'] or ''}".strip()
-                
-                # Calcular dias restantes
-                end_date = sub['end_date']
-                if isinstance(end_date, str):
-                    end_date = datetime.strptime(end_date, "%Y-%m-%d %H:%M:%S")
-                days_left = (end_date - datetime.now()).days
-                
-                # Determinar status
-                if days_left <= 0:
-                    status = "EXPIRADA"
-                elif days_left == 1:
-                    status = "EXPIRA HOJE"
-                elif days_left == 2:
-                    status = "EXPIRA AMANHÃ"
-                else:
-                    status = f"EXPIRA EM {days_left} DIAS"
-                
-                row = [
-                    sub['user_id'],
-                    sub['username'] or '',
-                    full_name,
-                    sub['plan_name'],
-                    days_left,
-                    sub['end_date'].strftime('%d/%m/%Y %H:%M') if sub['end_date'] else '',
-                    f"R$ {float(sub['price'] or 0):.2f}",
-                    status
-                ]
-                ws.append(row)
-            
-            # Formatação
-            for col in ws.columns:
-                max_length = 0
-                col_letter = get_column_letter(col[0].column)
-                for cell in col:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[col_letter].width = adjusted_width
-            
-            # Formatação do cabeçalho
-            if ws.max_row > 4:  # Mais que 4 linhas (título + data + total + vazio)
-                for cell in ws[5]:  # Linha dos cabeçalhos
-                    cell.font = Font(bold=True)
-                    cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-            
-            # Formatação condicional para urgência
-            for row in range(6, ws.max_row + 1):  # A partir da linha 6 (dados)
-                days_cell = ws[f'E{row}']  # Coluna dias restantes
-                status_cell = ws[f'H{row}']  # Coluna status
-                
-                if days_cell.value is not None:
-                    if days_cell.value <= 0:
-                        # Vermelho para expiradas
-                        days_cell.fill = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
-                        status_cell.fill = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
-                    elif days_cell.value == 1:
-                        # Amarelo escuro para expira hoje
-                        days_cell.fill = PatternFill(start_color="FFDD44", end_color="FFDD44", fill_type="solid")
-                        status_cell.fill = PatternFill(start_color="FFDD44", end_color="FFDD44", fill_type="solid")
-                    elif days_cell.value <= 3:
-                        # Amarelo claro para expira em breve
-                        days_cell.fill = PatternFill(start_color="FFFFCC", end_color="FFFFCC", fill_type="solid")
-                        status_cell.fill = PatternFill(start_color="FFFFCC", end_color="FFFFCC", fill_type="solid")
-            
-            # Salvar
-            file_stream = BytesIO()
-            wb.save(file_stream)
-            file_stream.seek(0)
-            
+    except Exception as e:
+        logger.error(f"Erro ao gerar relatório Excel: {e}")
+        await query.message.edit_text(f"❌ Erro ao gerar relatório: {str(e)}")
+    finally:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    return
+
+# Nova funcionalidade: Exportar apenas assinaturas expirando
+@admin_callback("admin_export_expiring")
+async def admin_cb_export_expiring(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.message.edit_text("⚠️ Gerando relatório de assinaturas expirando...")
+
+    path = None
+    try:
+        path, total = await asyncio.to_thread(export_expiring_report)
+
+        if not path:
+            await query.message.edit_text("✅ Nenhuma assinatura expirando em breve!")
+            return
+
+        with open(path, 'rb') as report:
             await query.message.reply_document(
-                document=file_stream,
+                document=report,
                 filename=f"assinaturas_expirando_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
                 caption=f"⚠️ Relatório de assinaturas expirando!\n\n"
-                       f"📊 Total: {len(expiring_subs)} assinaturas\n"
+                       f"📊 Total: {total} assinaturas\n"
                        f"🔴 Expirando em ≤3 dias\n\n"
                        f"💡 Use este relatório para:\n"
                        f"• Enviar lembretes aos usuários\n"
                        f"• Planejar campanhas de renovação\n"
                        f"• Acompanhar receita em risco"
             )
-            
-        except Exception as e:
-            logger.error(f"Erro ao gerar relatório de expiração: {e}")
-            await query.message.edit_text(f"❌ Erro ao gerar relatório: {str(e)}")
-        
-        return
 
+    except Exception as e:
+        logger.error(f"Erro ao gerar relatório de expiração: {e}")
+        await query.message.edit_text(f"❌ Erro ao gerar relatório: {str(e)}")
+    finally:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    return
+
+# Exportação bruta (CSV gzip / Parquet) para análise externa
+@admin_callback("admin_export_raw")
+async def admin_cb_export_raw(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    keyboard = [
+        [InlineKeyboardButton("🗜️ CSV (gzip)", callback_data="admin_export_raw_csv")],
+        [InlineKeyboardButton("📦 Parquet", callback_data="admin_export_raw_parquet")],
+        [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_stats")]
+    ]
+    parquet_note = "" if parquet_available() else "\n\n⚠️ pyarrow não instalado: Parquet será gerado como CSV."
+    await query.message.edit_text(
+        "📦 Exportar Dados Brutos\n\n"
+        "Exporta as tabelas de usuários, assinaturas e pagamentos para análise.\n"
+        "Escolha o formato:" + parquet_note,
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return
+
+# Tamanho máximo de arquivo enviado por bots
+TELEGRAM_UPLOAD_LIMIT = 50 * 1024 * 1024
+
+@admin_callback("admin_export_raw_csv", "admin_export_raw_parquet")
+async def admin_cb_export_raw_csv(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    requested = query.data.replace("admin_export_raw_", "")
+    await query.message.edit_text("📦 Gerando exportação bruta...")
+
+    directory = None
+    try:
+        directory, paths, fmt = await asyncio.to_thread(export_raw_data, requested)
+
+        # Tabelas grandes já vêm em partes; o limite do Telegram é conferido por segurança
+        too_large = []
+        for path in paths:
+            size = os.path.getsize(path)
+            if size > TELEGRAM_UPLOAD_LIMIT:
+                too_large.append(f"{os.path.basename(path)} ({size // (1024 * 1024)} MB)")
+                continue
+            with open(path, 'rb') as export_file:
+                await query.message.reply_document(
+                    document=export_file,
+                    filename=os.path.basename(path)
+                )
+
+        text = (
+            f"✅ Exportação bruta concluída ({'Parquet' if fmt == 'parquet' else 'CSV gzip'})\n\n"
+            f"📁 Arquivos: {len(paths) - len(too_large)}"
+        )
+        if too_large:
+            text += (
+                f"\n\n⚠️ Não enviados (limite de {TELEGRAM_UPLOAD_LIMIT // (1024 * 1024)} MB do Telegram):\n"
+                + "\n".join(too_large)
+            )
+        await query.message.edit_text(text)
+
+    except Exception as e:
+        logger.error(f"Erro ao gerar exportação bruta: {e}")
+        await query.message.edit_text(f"❌ Erro ao gerar exportação: {str(e)}")
+    finally:
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return
+
+
+@admin_callback(prefix="admin_edit_", answer=False)
 async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    logger.info("[DEBUG] Entrou em handle_admin_edit")
+    logger.debug("Entrou em handle_admin_edit")
     query = update.callback_query
     await query.answer()
     logger.info(f"Callback de edição recebido: {query.data}")
-    logger.info(f"[DEBUG] Valor exato do query.data: '{query.data}'")
+    logger.debug(f"Valor exato do query.data: '{query.data}'")
     
     # Carregar configurações iniciais
     config = load_config()
@@ -3977,7 +4345,7 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.message.reply_text("❌ Erro ao carregar as configurações. Tente novamente.")
         return
         
-    logger.info(f"[DEBUG] query.data.startswith('admin_edit_plan_name_input_'): {query.data.startswith('admin_edit_plan_name_input_')}")
+    logger.debug(f"query.data.startswith('admin_edit_plan_name_input_'): {query.data.startswith('admin_edit_plan_name_input_')}")
 
     if not is_admin(int(update.effective_user.id)):
         print("Usuário não é admin! Ignorando mensagem.")
@@ -3997,17 +4365,17 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Bloco de tratamento do callback admin_edit_welcome_message
     if query.data == "admin_edit_welcome_message":
-        logger.info("[DEBUG] Entrou no bloco admin_edit_welcome_message (handle_admin_edit)")
+        logger.debug("Entrou no bloco admin_edit_welcome_message (handle_admin_edit)")
         keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_messages")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         try:
             # Apagar a mensagem anterior
             try:
                 await query.message.delete()
-                logger.info("[DEBUG] Mensagem anterior apagada com sucesso")
+                logger.debug("Mensagem anterior apagada com sucesso")
             except Exception as e:
                 logger.warning(f"[DEBUG] Não foi possível apagar a mensagem anterior: {e}")
-            logger.info("[DEBUG] Tentando enviar mensagem de edição de boas-vindas para o admin")
+            logger.debug("Tentando enviar mensagem de edição de boas-vindas para o admin")
             msg = await context.bot.send_message(
                 chat_id=update.effective_user.id,
                 text="👋 Editar Mensagem de Boas-vindas\n\n"
@@ -4016,7 +4384,7 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=reply_markup
             )
             context.user_data['editing_message_id'] = msg.message_id
-            logger.info("[DEBUG] Mensagem de edição de boas-vindas enviada com sucesso")
+            logger.debug("Mensagem de edição de boas-vindas enviada com sucesso")
         except Exception as e:
             logger.error(f"[DEBUG] Erro ao enviar mensagem de edição de boas-vindas: {e}")
         context.user_data['editing'] = 'welcome_message'
@@ -4041,10 +4409,10 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             try:
                 await query.message.delete()
-                logger.info("[DEBUG] Mensagem anterior apagada com sucesso")
+                logger.debug("Mensagem anterior apagada com sucesso")
             except Exception as e:
                 logger.warning(f"[DEBUG] Não foi possível apagar a mensagem anterior: {e}")
-            logger.info("[DEBUG] Tentando enviar mensagem de edição de início para o admin")
+            logger.debug("Tentando enviar mensagem de edição de início para o admin")
             msg = await context.bot.send_message(
                 chat_id=update.effective_user.id,
                 text="🏁 Editar Mensagem de Início\n\n"
@@ -4055,7 +4423,7 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             context.user_data['editing_message_id'] = msg.message_id
             context.user_data['editing'] = 'start_message'
-            logger.info("[DEBUG] Mensagem de edição de início enviada com sucesso")
+            logger.debug("Mensagem de edição de início enviada com sucesso")
         except Exception as e:
             logger.error(f"[DEBUG] Erro ao enviar mensagem de edição de início: {e}")
         return
@@ -4065,10 +4433,10 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             try:
                 await query.message.delete()
-                logger.info("[DEBUG] Mensagem anterior apagada com sucesso")
+                logger.debug("Mensagem anterior apagada com sucesso")
             except Exception as e:
                 logger.warning(f"[DEBUG] Não foi possível apagar a mensagem anterior: {e}")
-            logger.info("[DEBUG] Tentando enviar mensagem de edição de pagamento para o admin")
+            logger.debug("Tentando enviar mensagem de edição de pagamento para o admin")
             msg = await context.bot.send_message(
                 chat_id=update.effective_user.id,
                 text="💎 Editar Mensagem de Pagamento\n\n"
@@ -4077,7 +4445,7 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=reply_markup
             )
             context.user_data['editing_message_id'] = msg.message_id
-            logger.info("[DEBUG] Mensagem de edição de pagamento enviada com sucesso")
+            logger.debug("Mensagem de edição de pagamento enviada com sucesso")
         except Exception as e:
             logger.error(f"[DEBUG] Erro ao enviar mensagem de edição de pagamento: {e}")
         context.user_data['editing'] = 'payment_instructions'
@@ -4088,10 +4456,10 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             try:
                 await query.message.delete()
-                logger.info("[DEBUG] Mensagem anterior apagada com sucesso")
+                logger.debug("Mensagem anterior apagada com sucesso")
             except Exception as e:
                 logger.warning(f"[DEBUG] Não foi possível apagar a mensagem anterior: {e}")
-            logger.info("[DEBUG] Tentando enviar mensagem de edição de sucesso para o admin")
+            logger.debug("Tentando enviar mensagem de edição de sucesso para o admin")
             msg = await context.bot.send_message(
                 chat_id=update.effective_user.id,
                 text="✅ Editar Mensagem de Sucesso\n\n"
@@ -4100,7 +4468,7 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=reply_markup
             )
             context.user_data['editing_message_id'] = msg.message_id
-            logger.info("[DEBUG] Mensagem de edição de sucesso enviada com sucesso")
+            logger.debug("Mensagem de edição de sucesso enviada com sucesso")
         except Exception as e:
             logger.error(f"[DEBUG] Erro ao enviar mensagem de edição de sucesso: {e}")
         context.user_data['editing'] = 'payment_success'
@@ -4111,10 +4479,10 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             try:
                 await query.message.delete()
-                logger.info("[DEBUG] Mensagem anterior apagada com sucesso")
+                logger.debug("Mensagem anterior apagada com sucesso")
             except Exception as e:
                 logger.warning(f"[DEBUG] Não foi possível apagar a mensagem anterior: {e}")
-            logger.info("[DEBUG] Tentando enviar mensagem de edição de erro para o admin")
+            logger.debug("Tentando enviar mensagem de edição de erro para o admin")
             msg = await context.bot.send_message(
                 chat_id=update.effective_user.id,
                 text="❌ Editar Mensagem de Erro\n\n"
@@ -4123,7 +4491,7 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=reply_markup
             )
             context.user_data['editing_message_id'] = msg.message_id
-            logger.info("[DEBUG] Mensagem de edição de erro enviada com sucesso")
+            logger.debug("Mensagem de edição de erro enviada com sucesso")
         except Exception as e:
             logger.error(f"[DEBUG] Erro ao enviar mensagem de edição de erro: {e}")
         context.user_data['editing'] = 'payment_error'
@@ -4134,10 +4502,10 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             try:
                 await query.message.delete()
-                logger.info("[DEBUG] Mensagem anterior apagada com sucesso")
+                logger.debug("Mensagem anterior apagada com sucesso")
             except Exception as e:
                 logger.warning(f"[DEBUG] Não foi possível apagar a mensagem anterior: {e}")
-            logger.info("[DEBUG] Tentando enviar mensagem de edição de instruções PIX para o admin")
+            logger.debug("Tentando enviar mensagem de edição de instruções PIX para o admin")
             msg = await context.bot.send_message(
                 chat_id=update.effective_user.id,
                 text="📝 Editar Instruções PIX\n\n"
@@ -4146,7 +4514,7 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=reply_markup
             )
             context.user_data['editing_message_id'] = msg.message_id
-            logger.info("[DEBUG] Mensagem de edição de instruções PIX enviada com sucesso")
+            logger.debug("Mensagem de edição de instruções PIX enviada com sucesso")
         except Exception as e:
             logger.error(f"[DEBUG] Erro ao enviar mensagem de edição de instruções PIX: {e}")
         context.user_data['editing'] = 'pix_automatico_instructions'
@@ -4254,710 +4622,778 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data['editing'] = 'cnpay_api_secret'
         return
 
-async def handle_admin_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    logger.info(f"[DEBUG] handle_admin_text chamado! Texto recebido: {getattr(update.message, 'text', None)} | context.user_data: {context.user_data}")
-    
-    # --- FLUXO DE AGENDAMENTO DE MENSAGENS ---
-    if context.user_data.get('scheduling_step') == 'message_text':
-        # Salvar texto da mensagem
-        context.user_data['scheduled_message_text'] = update.message.text
-        context.user_data['scheduling_step'] = 'target_type'
-        
-        keyboard = [
-            [InlineKeyboardButton("👥 Todos os Usuários", callback_data="admin_schedule_target_all")],
-            [InlineKeyboardButton("💎 Usuários VIP", callback_data="admin_schedule_target_vip")],
-            [InlineKeyboardButton("👤 Usuários Específicos", callback_data="admin_schedule_target_specific")],
-            [InlineKeyboardButton("❌ Cancelar", callback_data="admin_schedule_messages")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+# ============================================================================
+# ROTEAMENTO DOS TEXTOS DO PAINEL ADMIN
+# ============================================================================
+# Cada etapa de fluxo do admin é identificada por uma chave em context.user_data.
+# ADMIN_TEXT_ROUTES é avaliada em ordem; a primeira chave presente decide o handler.
+
+async def admin_text_schedule_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Agendamento: texto da mensagem"""
+    # Salvar texto da mensagem
+    context.user_data['scheduled_message_text'] = update.message.text
+    context.user_data['scheduling_step'] = 'target_type'
+
+    keyboard = [
+        [InlineKeyboardButton("👥 Todos os Usuários", callback_data="admin_schedule_target_all")],
+        [InlineKeyboardButton("💎 Usuários VIP", callback_data="admin_schedule_target_vip")],
+        [InlineKeyboardButton("👤 Usuários Específicos", callback_data="admin_schedule_target_specific")],
+        [InlineKeyboardButton("❌ Cancelar", callback_data="admin_schedule_messages")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await update.message.reply_text(
+        "✅ Mensagem salva!\n\n"
+        "Agora escolha o tipo de destinatários:",
+        reply_markup=reply_markup
+    )
+
+async def admin_text_schedule_specific_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Agendamento: lista de usuários específicos"""
+    # Processar lista de usuários específicos
+    user_text = update.message.text.strip()
+    try:
+        # Tentar interpretar como lista de IDs separados por vírgula ou espaço
+        user_ids = []
+        for part in user_text.replace(',', ' ').split():
+            if part.strip().isdigit():
+                user_ids.append(int(part.strip()))
+
+        if not user_ids:
+            await update.message.reply_text(
+                "❌ Nenhum ID válido encontrado. Digite os IDs dos usuários separados por vírgula ou espaço:\n\n"
+                "Exemplo: 123456789, 987654321, 555666777"
+            )
+            return
+
+        context.user_data['scheduled_target_users'] = user_ids
+        context.user_data['scheduling_step'] = 'scheduled_date'
+
+        # Gerar exemplo com data atual + 30 minutos
+        example_time = datetime.now() + timedelta(minutes=30)
+        example_str = example_time.strftime("%d/%m/%Y %H:%M")
+
         await update.message.reply_text(
-            "✅ Mensagem salva!\n\n"
-            "Agora escolha o tipo de destinatários:",
-            reply_markup=reply_markup
+            f"✅ {len(user_ids)} usuários selecionados!\n\n"
+            "Agora digite a data e hora para envio da mensagem:\n\n"
+            "Formato: DD/MM/AAAA HH:MM\n"
+            f"Exemplo: {example_str}"
         )
-        return
-    
-    elif context.user_data.get('scheduling_step') == 'specific_users':
-        # Processar lista de usuários específicos
-        user_text = update.message.text.strip()
-        try:
-            # Tentar interpretar como lista de IDs separados por vírgula ou espaço
-            user_ids = []
-            for part in user_text.replace(',', ' ').split():
-                if part.strip().isdigit():
-                    user_ids.append(int(part.strip()))
-            
-            if not user_ids:
-                await update.message.reply_text(
-                    "❌ Nenhum ID válido encontrado. Digite os IDs dos usuários separados por vírgula ou espaço:\n\n"
-                    "Exemplo: 123456789, 987654321, 555666777"
-                )
-                return
-            
-            context.user_data['scheduled_target_users'] = user_ids
-            context.user_data['scheduling_step'] = 'scheduled_date'
-            
+    except Exception as e:
+        await update.message.reply_text(
+            "❌ Erro ao processar IDs. Digite os IDs dos usuários separados por vírgula ou espaço:\n\n"
+            "Exemplo: 123456789, 987654321, 555666777"
+        )
+
+async def admin_text_schedule_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Agendamento: data e hora de envio"""
+    # Processar data e hora agendada
+    date_text = update.message.text.strip()
+    now = datetime.now()  # Definir no início para evitar erro no except
+    try:
+        # Tentar diferentes formatos de data
+        scheduled_date = None
+        for fmt in ['%d/%m/%Y %H:%M', '%d-%m-%Y %H:%M', '%d/%m/%Y %H:%M:%S']:
+            try:
+                scheduled_date = datetime.strptime(date_text, fmt)
+                break
+            except ValueError:
+                continue
+
+        if not scheduled_date:
             # Gerar exemplo com data atual + 30 minutos
             example_time = datetime.now() + timedelta(minutes=30)
             example_str = example_time.strftime("%d/%m/%Y %H:%M")
-            
+
             await update.message.reply_text(
-                f"✅ {len(user_ids)} usuários selecionados!\n\n"
-                "Agora digite a data e hora para envio da mensagem:\n\n"
-                "Formato: DD/MM/AAAA HH:MM\n"
+                "❌ Formato de data inválido. Use o formato:\n\n"
+                "DD/MM/AAAA HH:MM\n"
                 f"Exemplo: {example_str}"
             )
-        except Exception as e:
-            await update.message.reply_text(
-                "❌ Erro ao processar IDs. Digite os IDs dos usuários separados por vírgula ou espaço:\n\n"
-                "Exemplo: 123456789, 987654321, 555666777"
-            )
-        return
-    
-    elif context.user_data.get('scheduling_step') == 'scheduled_date':
-        # Processar data e hora agendada
-        date_text = update.message.text.strip()
-        now = datetime.now()  # Definir no início para evitar erro no except
-        try:
-            # Tentar diferentes formatos de data
-            scheduled_date = None
-            for fmt in ['%d/%m/%Y %H:%M', '%d-%m-%Y %H:%M', '%d/%m/%Y %H:%M:%S']:
-                try:
-                    scheduled_date = datetime.strptime(date_text, fmt)
-                    break
-                except ValueError:
-                    continue
-            
-            if not scheduled_date:
-                # Gerar exemplo com data atual + 30 minutos
-                example_time = datetime.now() + timedelta(minutes=30)
-                example_str = example_time.strftime("%d/%m/%Y %H:%M")
-                
-                await update.message.reply_text(
-                    "❌ Formato de data inválido. Use o formato:\n\n"
-                    "DD/MM/AAAA HH:MM\n"
-                    f"Exemplo: {example_str}"
-                )
-                return
-            
-            # Verificar se a data não é no passado
-            if scheduled_date < now:
-                # Gerar exemplo com data atual + 1 minuto
-                example_time = now + timedelta(minutes=1)
-                example_str = example_time.strftime("%d/%m/%Y %H:%M")
-                
-                await update.message.reply_text(
-                    "❌ A data deve ser no futuro.\n\n"
-                    "Digite uma data válida:\n\n"
-                    "DD/MM/AAAA HH:MM\n"
-                    f"Exemplo: {example_str}"
-                )
-                return
-            
-            # Verificar se já existe mensagem agendada para o mesmo tipo de destinatários
-            message_text = context.user_data['scheduled_message_text']
-            target_type = context.user_data.get('scheduled_target_type', 'all_users')
-            target_users = context.user_data.get('scheduled_target_users')
-            created_by = update.effective_user.id
-            
-            if check_duplicate_scheduled_message(target_type, target_users):
-                target_text = {
-                    'all_users': 'todos os usuários',
-                    'vip_users': 'usuários VIP',
-                    'specific_users': f"{len(target_users) if target_users else 0} usuários específicos"
-                }.get(target_type, target_type)
-                
-                await update.message.reply_text(
-                    f"⚠️ Já existe uma mensagem agendada pendente para {target_text}.\n\n"
-                    f"📋 Verifique as mensagens pendentes no menu de agendamento ou aguarde o envio da mensagem atual."
-                )
-                return
-            
-            # Criar a mensagem agendada
-            if create_scheduled_message(message_text, scheduled_date, target_type, target_users, created_by):
-                scheduled_time = scheduled_date.strftime('%d/%m/%Y %H:%M')
-                target_text = {
-                    'all_users': 'todos os usuários',
-                    'vip_users': 'usuários VIP',
-                    'specific_users': f"{len(target_users) if target_users else 0} usuários específicos"
-                }.get(target_type, target_type)
-                
-                await update.message.reply_text(
-                    f"✅ Mensagem agendada com sucesso!\n\n"
-                    f"📅 Data/Hora: {scheduled_time}\n"
-                    f"👥 Destinatários: {target_text}\n"
-                    f"📝 Mensagem: {message_text[:100]}{'...' if len(message_text) > 100 else ''}\n\n"
-                    f"A mensagem será enviada automaticamente no horário agendado."
-                )
-                
-                # Limpar dados do contexto
-                for key in ['scheduling_step', 'scheduled_message_text', 'scheduled_target_type', 'scheduled_target_users']:
-                    context.user_data.pop(key, None)
-            else:
-                await update.message.reply_text(
-                    "❌ Erro ao agendar mensagem. Tente novamente."
-                )
-        except Exception as e:
-            logger.error(f"Erro ao processar data agendada: {e}")
-            # Gerar exemplo com data atual
-            example_time = now
+            return
+
+        # Verificar se a data não é no passado
+        if scheduled_date < now:
+            # Gerar exemplo com data atual + 1 minuto
+            example_time = now + timedelta(minutes=1)
             example_str = example_time.strftime("%d/%m/%Y %H:%M")
-            
+
             await update.message.reply_text(
-                "❌ Erro ao processar data. Use o formato:\n\n"
+                "❌ A data deve ser no futuro.\n\n"
+                "Digite uma data válida:\n\n"
                 "DD/MM/AAAA HH:MM\n"
                 f"Exemplo: {example_str}"
             )
-        return
-    
-    # --- FLUXO DE ADIÇÃO DE ADMIN ---
-    if context.user_data.get("waiting_for_admin_id"):
-        logger.info(f"[DEBUG] Entrou no bloco waiting_for_admin_id. Texto: {getattr(update.message, 'text', None)}")
-        admin_id = update.message.text.strip()
-        if not admin_id.isdigit():
-            await update.message.reply_text("❌ O ID deve conter apenas números. Tente novamente:")
-            return
-        context.user_data["pending_admin_id"] = admin_id
-        context.user_data["waiting_for_admin_id"] = False
-        context.user_data["waiting_for_admin_username"] = True
-        await update.message.reply_text("Agora envie o username do novo admin (sem o @):")
-        return
-
-    if context.user_data.get("waiting_for_admin_username"):
-        logger.info(f"[DEBUG] Entrou no bloco waiting_for_admin_username. Texto: {getattr(update.message, 'text', None)}")
-        username = update.message.text.strip().lstrip("@")
-        admin_id = context.user_data.get("pending_admin_id")
-        if not username:
-            await update.message.reply_text("❌ O username não pode estar vazio. Tente novamente:")
-            return
-        # Salvar admin no banco
-        try:
-            add_admin(admin_id, update.effective_user.id, username=username)
-            await update.message.reply_text(f"✅ Novo admin adicionado com sucesso!\nID: {admin_id}\nUsername: @{username}")
-            logger.info(f"[DEBUG] Admin adicionado com sucesso: {admin_id} @{username}")
-        except Exception as e:
-            logger.error(f"[DEBUG] Erro ao adicionar admin: {e}")
-            await update.message.reply_text(f"❌ Erro ao adicionar admin: {e}")
-        # Limpar flags
-        context.user_data.pop("waiting_for_admin_username", None)
-        context.user_data.pop("pending_admin_id", None)
-        # Voltar para o menu de admins
-        await handle_admin_callback(update, context)
-        return
-
-    if (
-        'editing' not in context.user_data and 
-        'broadcast_type' not in context.user_data and 
-        'waiting_for_broadcast_text' not in context.user_data and
-        'adding_group' not in context.user_data and
-        'adding_plan' not in context.user_data and
-        'waiting_for_admin_id' not in context.user_data and
-        'waiting_for_admin_username' not in context.user_data
-    ):
-        return
-    logger.info(f"Texto recebido para edição: {update.message.text}")
-
-    if not is_admin(int(update.effective_user.id)):
-        logger.error("[handle_admin_text] Usuário não é admin! Ignorando mensagem.")
-        return
-
-    if context.user_data.get("adding_admin"):
-        # Solicita o ID do novo admin
-        await update.message.reply_text("Por favor, envie o ID do Telegram do novo admin (apenas números):")
-        context.user_data["adding_admin"] = False
-        context.user_data["waiting_for_admin_id"] = True
-        return
-    
-    # --- NOVO FLUXO AJUSTADO ---
-    # Se está esperando escolha do botão
-    if context.user_data.get('waiting_for_button_choice', False):
-        escolha = update.message.text.strip().lower()
-        if escolha in ['sim', 's', 'yes', 'y']:
-            context.user_data['waiting_for_button_choice'] = False
-            context.user_data['waiting_for_button_text'] = True
-            await update.message.reply_text('Digite o texto do botão:')
-            return
-        elif escolha in ['não', 'nao', 'n', 'no']:
-            context.user_data['waiting_for_button_choice'] = False
-            context.user_data['button_text'] = None
-            context.user_data['button_url'] = None
-            # Enviar broadcast usando a mensagem já salva
-            await enviar_broadcast(update, context)
             return
-        else:
-            await update.message.reply_text('Por favor, responda "Sim" ou "Não". Deseja adicionar um botão de redirecionamento?')
-            return
-    # Se está esperando texto do botão
-    if context.user_data.get('waiting_for_button_text', False):
-        context.user_data['button_text'] = update.message.text.strip()
-        context.user_data['waiting_for_button_text'] = False
-        context.user_data['waiting_for_button_url'] = True
-        await update.message.reply_text('Agora envie o link do botão (começando com https://):')
-        return
-    # Se está esperando link do botão
-    if context.user_data.get('waiting_for_button_url', False):
-        url = update.message.text.strip()
-        if not is_valid_url(url):
-            await update.message.reply_text('O link deve ser válido e começar com http:// ou https://. Tente novamente:')
-            return
-        context.user_data['button_url'] = url
-        context.user_data['waiting_for_button_url'] = False
-        # Enviar broadcast usando a mensagem já salva
-        await enviar_broadcast(update, context)
-        return
-    # --- FIM NOVO FLUXO ---
-
-    # Se for broadcast, salvar a mensagem inicial e perguntar sobre o botão
-    if 'broadcast_type' in context.user_data and not context.user_data.get('waiting_for_button_choice', False) and not context.user_data.get('waiting_for_button_text', False) and not context.user_data.get('waiting_for_button_url', False):
-        context.user_data['broadcast_message_text'] = update.message.text
-        context.user_data['waiting_for_button_choice'] = True
-        await update.message.reply_text('Deseja adicionar um botão de redirecionamento? (Sim/Não)')
-        return
 
-    # Fluxo antigo para edição de mensagens/configs
-    if 'editing' in context.user_data:
-        editing_type = context.user_data['editing']
-        
-        # Edição de preço de plano
-        if editing_type.startswith('plan_price_'):
-            try:
-                plan_id = int(editing_type.split('_')[-1])
-                new_price = float(update.message.text.replace(',', '.'))
-                
-                db = Database()
-                try:
-                    db.connect()
-                    db.execute_query(
-                        "UPDATE vip_plans SET price = %s WHERE id = %s",
-                        (new_price, plan_id),
-                        commit=True
-                    )
-                finally:
-                    db.close()
-                
-                await update.message.reply_text(f"✅ Preço do plano atualizado para R${new_price:.2f}!")
-                del context.user_data['editing']
-                
-                # Voltar para o menu de edição do plano
-                plan = await get_plan_by_id(plan_id)
-                if plan:
-                    keyboard = [
-                        [InlineKeyboardButton("📝 Nome", callback_data=f"admin_edit_plan_name_input_{plan_id}")],
-                        [InlineKeyboardButton("💰 Preço", callback_data=f"admin_edit_plan_price_input_{plan_id}")],
-                        [InlineKeyboardButton("⏱️ Duração (dias)", callback_data=f"admin_edit_plan_duration_input_{plan_id}")],
-                        [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_vip_plans")]
-                    ]
-                    reply_markup = InlineKeyboardMarkup(keyboard)
-                    await update.message.reply_text(
-                        f"💎 Editar Plano: {plan['name']}\n\n"
-                        f"Preço atual: R${plan['price']:.2f}\n"
-                        f"Duração atual: {plan['duration_days']} dias\n\n"
-                        "Escolha o que deseja editar:",
-                        reply_markup=reply_markup
-                    )
-                return
-            except ValueError:
-                await update.message.reply_text("❌ Preço inválido! Digite apenas números (ex: 49.90)")
-                return
-            except Exception as e:
-                logger.error(f"Erro ao atualizar preço do plano: {e}")
-                await update.message.reply_text("❌ Erro ao atualizar o preço do plano!")
-                del context.user_data['editing']
-                return
-        
-        # Edição de nome de plano
-        elif editing_type.startswith('plan_name_'):
-            try:
-                plan_id = int(editing_type.split('_')[-1])
-                new_name = update.message.text.strip()
-                
-                if not new_name:
-                    await update.message.reply_text("❌ Nome não pode estar vazio!")
-                    return
-                
-                db = Database()
-                try:
-                    db.connect()
-                    db.execute_query(
-                        "UPDATE vip_plans SET name = %s WHERE id = %s",
-                        (new_name, plan_id),
-                        commit=True
-                    )
-                finally:
-                    db.close()
-                
-                await update.message.reply_text(f"✅ Nome do plano atualizado para '{new_name}'!")
-                del context.user_data['editing']
-                
-                # Voltar para o menu de edição do plano
-                plan = await get_plan_by_id(plan_id)
-                if plan:
-                    keyboard = [
-                        [InlineKeyboardButton("📝 Nome", callback_data=f"admin_edit_plan_name_input_{plan_id}")],
-                        [InlineKeyboardButton("💰 Preço", callback_data=f"admin_edit_plan_price_input_{plan_id}")],
-                        [InlineKeyboardButton("⏱️ Duração (dias)", callback_data=f"admin_edit_plan_duration_input_{plan_id}")],
-                        [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_vip_plans")]
-                    ]
-                    reply_markup = InlineKeyboardMarkup(keyboard)
-                    await update.message.reply_text(
-                        f"💎 Editar Plano: {plan['name']}\n\n"
-                        f"Preço atual: R${plan['price']:.2f}\n"
-                        f"Duração atual: {plan['duration_days']} dias\n\n"
-                        "Escolha o que deseja editar:",
-                        reply_markup=reply_markup
-                    )
-                return
-            except Exception as e:
-                logger.error(f"Erro ao atualizar nome do plano: {e}")
-                await update.message.reply_text("❌ Erro ao atualizar o nome do plano!")
-                del context.user_data['editing']
-                return
-        
-        # Edição de duração de plano
-        elif editing_type.startswith('plan_duration_'):
-            try:
-                plan_id = int(editing_type.split('_')[-1])
-                new_duration = int(update.message.text.strip())
-                
-                db = Database()
-                try:
-                    db.connect()
-                    db.execute_query(
-                        "UPDATE vip_plans SET duration_days = %s WHERE id = %s",
-                        (new_duration, plan_id),
-                        commit=True
-                    )
-                finally:
-                    db.close()
-                
-                duration_text = "Permanente" if new_duration == -1 else f"{new_duration} dias"
-                await update.message.reply_text(f"✅ Duração do plano atualizada para {duration_text}!")
-                del context.user_data['editing']
-                
-                # Voltar para o menu de edição do plano
-                plan = await get_plan_by_id(plan_id)
-                if plan:
-                    keyboard = [
-                        [InlineKeyboardButton("📝 Nome", callback_data=f"admin_edit_plan_name_input_{plan_id}")],
-                        [InlineKeyboardButton("💰 Preço", callback_data=f"admin_edit_plan_price_input_{plan_id}")],
-                        [InlineKeyboardButton("⏱️ Duração (dias)", callback_data=f"admin_edit_plan_duration_input_{plan_id}")],
-                        [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_vip_plans")]
-                    ]
-                    reply_markup = InlineKeyboardMarkup(keyboard)
-                    await update.message.reply_text(
-                        f"💎 Editar Plano: {plan['name']}\n\n"
-                        f"Preço atual: R${plan['price']:.2f}\n"
-                        f"Duração atual: {plan['duration_days']} dias\n\n"
-                        "Escolha o que deseja editar:",
-                        reply_markup=reply_markup
-                    )
-                return
-            except ValueError:
-                await update.message.reply_text("❌ Duração inválida! Digite apenas números.")
-                return
-            except Exception as e:
-                logger.error(f"Erro ao atualizar duração do plano: {e}")
-                await update.message.reply_text("❌ Erro ao atualizar a duração do plano!")
-                del context.user_data['editing']
-                return
+        # Verificar se já existe mensagem agendada para o mesmo tipo de destinatários
+        message_text = context.user_data['scheduled_message_text']
+        target_type = context.user_data.get('scheduled_target_type', 'all_users')
+        target_users = context.user_data.get('scheduled_target_users')
+        created_by = update.effective_user.id
 
+        if check_duplicate_scheduled_message(target_type, target_users):
+            target_text = {
+                'all_users': 'todos os usuários',
+                'vip_users': 'usuários VIP',
+                'specific_users': f"{len(target_users) if target_users else 0} usuários específicos"
+            }.get(target_type, target_type)
 
-    # Adicionar fluxo de adicionar novo plano
-    if 'adding_plan' in context.user_data:
-        step = context.user_data['adding_plan']['step']
-        if step == 'name':
-            context.user_data['adding_plan']['name'] = update.message.text.strip()
-            context.user_data['adding_plan']['step'] = 'price'
-            await update.message.reply_text("Digite o preço do plano (apenas números, ex: 49.90):")
-            return
-        elif step == 'price':
-            try:
-                price = float(update.message.text.replace(',', '.'))
-                context.user_data['adding_plan']['price'] = price
-                context.user_data['adding_plan']['step'] = 'duration'
-                await update.message.reply_text("Digite a duração do plano em dias (ou -1 para permanente):")
-            except Exception:
-                await update.message.reply_text("Preço inválido. Digite apenas números, ex: 49.90")
-            return
-        elif step == 'duration':
-            try:
-                duration = int(update.message.text.strip())
-                context.user_data['adding_plan']['duration'] = duration
-                context.user_data['adding_plan']['step'] = 'description'
-                await update.message.reply_text("Digite a descrição do plano:")
-            except Exception:
-                await update.message.reply_text("Duração inválida. Digite apenas números.")
-            return
-        elif step == 'description':
-            description = update.message.text.strip()
-            context.user_data['adding_plan']['description'] = description
-            context.user_data['adding_plan']['step'] = 'create_group'
-            
-            await update.message.reply_text(
-                "Deseja criar um novo grupo VIP para este plano?\n\n"
-                "Digite 'sim' para criar um grupo ou 'não' para continuar sem grupo:"
-            )
-            return
-        elif step == 'create_group':
-            create_group = update.message.text.strip().lower()
-            if create_group in ['sim', 's', 'yes', 'y']:
-                context.user_data['adding_plan']['step'] = 'group_name'
-                await update.message.reply_text("Digite o nome do novo grupo VIP:")
-                return
-            elif create_group in ['não', 'nao', 'n', 'no']:
-                # Pular criação de grupo e ir direto para finalizar
-                data = context.user_data['adding_plan']
-                db = Database()
-                try:
-                    db.connect()
-                    db.execute_query(
-                        "INSERT INTO vip_plans (name, price, duration_days, description, is_active) VALUES (%s, %s, %s, %s, 1)",
-                        (data['name'], data['price'], data['duration'], data['description']),
-                        commit=True
-                    )
-                finally:
-                    db.close()
-                
-                await update.message.reply_text(f"Plano '{data['name']}' adicionado com sucesso!")
-                del context.user_data['adding_plan']
-                await handle_admin_callback(update, context)
-                return
-            else:
-                await update.message.reply_text("Resposta inválida. Digite 'sim' ou 'não':")
-                return
-        elif step == 'group_name':
-            group_name = update.message.text.strip()
-            context.user_data['adding_plan']['group_name'] = group_name
-            context.user_data['adding_plan']['step'] = 'group_id'
             await update.message.reply_text(
-                "Digite o ID do grupo no Telegram (número negativo, ex: -1001234567890):\n\n"
-                "Para obter o ID do grupo:\n"
-                "1. Adicione o bot ao grupo\n"
-                "2. Envie /id no grupo\n"
-                "3. Copie o ID que aparecer"
+                f"⚠️ Já existe uma mensagem agendada pendente para {target_text}.\n\n"
+                f"📋 Verifique as mensagens pendentes no menu de agendamento ou aguarde o envio da mensagem atual."
             )
             return
-        elif step == 'group_id':
-            try:
-                group_id = int(update.message.text.strip())
-                if group_id >= 0:
-                    await update.message.reply_text("ID do grupo deve ser negativo. Tente novamente:")
-                    return
-                
-                context.user_data['adding_plan']['group_id'] = group_id
-                data = context.user_data['adding_plan']
-                
-                # Inserir o plano e o grupo
-                db = Database()
-                try:
-                    db.connect()
-                    
-                    # Inserir o plano
-                    db.execute_query(
-                        "INSERT INTO vip_plans (name, price, duration_days, description, is_active) VALUES (%s, %s, %s, %s, 1)",
-                        (data['name'], data['price'], data['duration'], data['description']),
-                        commit=True
-                    )
-                    
-                    # Pegar o ID do plano inserido
-                    plan_result = db.execute_fetch_one("SELECT LAST_INSERT_ID() as plan_id")
-                    plan_id = plan_result['plan_id']
-                    
-                    # Inserir o grupo VIP
-                    db.execute_query(
-                        "INSERT INTO vip_groups (group_id, group_name, is_active) VALUES (%s, %s, TRUE)",
-                        (group_id, data['group_name']),
-                        commit=True
-                    )
-                    
-                    # Pegar o ID do grupo inserido
-                    group_result = db.execute_fetch_one("SELECT LAST_INSERT_ID() as group_id")
-                    vip_group_id = group_result['group_id']
-                    
-                    # Associar o plano ao grupo
-                    db.execute_query(
-                        "INSERT INTO plan_groups (plan_id, group_id) VALUES (%s, %s)",
-                        (plan_id, vip_group_id),
-                        commit=True
-                    )
-                    
-                finally:
-                    db.close()
-                
-                await update.message.reply_text(
-                    f"Plano '{data['name']}' e grupo '{data['group_name']}' criados com sucesso!\n\n"
-                    f"ID do grupo: {group_id}\n"
-                    f"Nome do grupo: {data['group_name']}"
-                )
-                del context.user_data['adding_plan']
-                await handle_admin_callback(update, context)
-                return
-                
-            except ValueError:
-                await update.message.reply_text("ID inválido. Digite apenas números (ex: -1001234567890):")
-                return
 
-    # Adicionar fluxo de edição de mensagem de boas-vindas
-    if 'editing' in context.user_data:
-        editing_type = context.user_data['editing']
-        novo_texto = update.message.text.strip()
-        logger.info(f"[DEBUG] Tipo de edição recebido: {editing_type}")
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_messages")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        # Apagar a mensagem de edição (se existir)
-        if 'editing_message_id' in context.user_data:
+        # Criar a mensagem agendada
+        if create_scheduled_message(message_text, scheduled_date, target_type, target_users, created_by):
+            scheduled_time = scheduled_date.strftime('%d/%m/%Y %H:%M')
+            target_text = {
+                'all_users': 'todos os usuários',
+                'vip_users': 'usuários VIP',
+                'specific_users': f"{len(target_users) if target_users else 0} usuários específicos"
+            }.get(target_type, target_type)
+
+            await update.message.reply_text(
+                f"✅ Mensagem agendada com sucesso!\n\n"
+                f"📅 Data/Hora: {scheduled_time}\n"
+                f"👥 Destinatários: {target_text}\n"
+                f"📝 Mensagem: {message_text[:100]}{'...' if len(message_text) > 100 else ''}\n\n"
+                f"A mensagem será enviada automaticamente no horário agendado."
+            )
+
+            # Limpar dados do contexto
+            for key in ['scheduling_step', 'scheduled_message_text', 'scheduled_target_type', 'scheduled_target_users']:
+                context.user_data.pop(key, None)
+        else:
+            await update.message.reply_text(
+                "❌ Erro ao agendar mensagem. Tente novamente."
+            )
+    except Exception as e:
+        logger.error(f"Erro ao processar data agendada: {e}")
+        # Gerar exemplo com data atual
+        example_time = now
+        example_str = example_time.strftime("%d/%m/%Y %H:%M")
+
+        await update.message.reply_text(
+            "❌ Erro ao processar data. Use o formato:\n\n"
+            "DD/MM/AAAA HH:MM\n"
+            f"Exemplo: {example_str}"
+        )
+
+async def admin_text_admin_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Adição de admin: ID do Telegram"""
+    logger.debug(f"Entrou no bloco waiting_for_admin_id. Texto: {getattr(update.message, 'text', None)}")
+    admin_id = update.message.text.strip()
+    if not admin_id.isdigit():
+        await update.message.reply_text("❌ O ID deve conter apenas números. Tente novamente:")
+        return
+    context.user_data["pending_admin_id"] = admin_id
+    context.user_data["waiting_for_admin_id"] = False
+    context.user_data["waiting_for_admin_username"] = True
+    await update.message.reply_text("Agora envie o username do novo admin (sem o @):")
+
+async def admin_text_admin_username(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Adição de admin: username"""
+    logger.debug(f"Entrou no bloco waiting_for_admin_username. Texto: {getattr(update.message, 'text', None)}")
+    username = update.message.text.strip().lstrip("@")
+    admin_id = context.user_data.get("pending_admin_id")
+    if not username:
+        await update.message.reply_text("❌ O username não pode estar vazio. Tente novamente:")
+        return
+    # Salvar admin no banco
+    try:
+        add_admin(admin_id, update.effective_user.id, username=username)
+        await update.message.reply_text(f"✅ Novo admin adicionado com sucesso!\nID: {admin_id}\nUsername: @{username}")
+        logger.debug(f"Admin adicionado com sucesso: {admin_id} @{username}")
+    except Exception as e:
+        logger.error(f"[DEBUG] Erro ao adicionar admin: {e}")
+        await update.message.reply_text(f"❌ Erro ao adicionar admin: {e}")
+    # Limpar flags
+    context.user_data.pop("waiting_for_admin_username", None)
+    context.user_data.pop("pending_admin_id", None)
+    # Voltar para o menu de admins
+    await handle_admin_callback(update, context)
+
+async def admin_text_adding_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Adição de admin: solicita o ID"""
+    # Solicita o ID do novo admin
+    await update.message.reply_text("Por favor, envie o ID do Telegram do novo admin (apenas números):")
+    context.user_data["adding_admin"] = False
+    context.user_data["waiting_for_admin_id"] = True
+
+async def admin_text_button_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Broadcast: pergunta se adiciona botão"""
+    escolha = update.message.text.strip().lower()
+    if escolha in ['sim', 's', 'yes', 'y']:
+        context.user_data['waiting_for_button_choice'] = False
+        context.user_data['waiting_for_button_text'] = True
+        await update.message.reply_text('Digite o texto do botão:')
+        return
+    elif escolha in ['não', 'nao', 'n', 'no']:
+        context.user_data['waiting_for_button_choice'] = False
+        context.user_data['button_text'] = None
+        context.user_data['button_url'] = None
+        # Enviar broadcast usando a mensagem já salva
+        await enviar_broadcast(update, context)
+        return
+    else:
+        await update.message.reply_text('Por favor, responda "Sim" ou "Não". Deseja adicionar um botão de redirecionamento?')
+        return
+
+async def admin_text_button_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Broadcast: texto do botão"""
+    context.user_data['button_text'] = update.message.text.strip()
+    context.user_data['waiting_for_button_text'] = False
+    context.user_data['waiting_for_button_url'] = True
+    await update.message.reply_text('Agora envie o link do botão (começando com https://):')
+
+async def admin_text_button_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Broadcast: link do botão"""
+    url = update.message.text.strip()
+    if not is_valid_url(url):
+        await update.message.reply_text('O link deve ser válido e começar com http:// ou https://. Tente novamente:')
+        return
+    context.user_data['button_url'] = url
+    context.user_data['waiting_for_button_url'] = False
+    # Enviar broadcast usando a mensagem já salva
+    await enviar_broadcast(update, context)
+
+async def admin_text_broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Broadcast: salva a mensagem inicial e pergunta sobre o botão"""
+    context.user_data['broadcast_message_text'] = update.message.text
+    context.user_data['waiting_for_button_choice'] = True
+    await update.message.reply_text('Deseja adicionar um botão de redirecionamento? (Sim/Não)')
+
+async def admin_text_edit_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Edição de nome, preço ou duração de um plano"""
+    editing_type = context.user_data['editing']
+
+    # Edição de preço de plano
+    if editing_type.startswith('plan_price_'):
+        try:
+            plan_id = int(editing_type.split('_')[-1])
+            new_price = float(update.message.text.replace(',', '.'))
+
+            db = Database()
             try:
-                await context.bot.delete_message(
-                    chat_id=update.effective_user.id,
-                    message_id=context.user_data['editing_message_id']
-                )
-                logger.info("[DEBUG] Mensagem de edição apagada com sucesso")
-            except Exception as e:
-                logger.warning(f"[DEBUG] Não foi possível apagar a mensagem de edição: {e}")
-            del context.user_data['editing_message_id']
-        
-        # Salvar e confirmar a edição
-        if editing_type == 'start_message':
-            if save_message_to_db('start_message', novo_texto):
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text="✅ Mensagem de boas-vindas atualizada com sucesso!",
-                    reply_markup=reply_markup
+                db.connect()
+                db.execute_query(
+                    "UPDATE vip_plans SET price = %s WHERE id = %s",
+                    (new_price, plan_id),
+                    commit=True
                 )
-            else:
-                await update.message.reply_text("❌ Erro ao salvar a mensagem de boas-vindas!")
+            finally:
+                db.close()
+
+            await update.message.reply_text(f"✅ Preço do plano atualizado para R${new_price:.2f}!")
             del context.user_data['editing']
-            return
-        elif editing_type == 'payment_instructions':
-            if save_message_to_db('payment_instructions', novo_texto):
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text="✅ Mensagem de pagamento atualizada com sucesso!",
+
+            # Voltar para o menu de edição do plano
+            plan = await get_plan_by_id(plan_id)
+            if plan:
+                keyboard = [
+                    [InlineKeyboardButton("📝 Nome", callback_data=f"admin_edit_plan_name_input_{plan_id}")],
+                    [InlineKeyboardButton("💰 Preço", callback_data=f"admin_edit_plan_price_input_{plan_id}")],
+                    [InlineKeyboardButton("⏱️ Duração (dias)", callback_data=f"admin_edit_plan_duration_input_{plan_id}")],
+                    [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_vip_plans")]
+                ]
+                reply_markup = InlineKeyboardMarkup(keyboard)
+                await update.message.reply_text(
+                    f"💎 Editar Plano: {plan['name']}\n\n"
+                    f"Preço atual: R${plan['price']:.2f}\n"
+                    f"Duração atual: {plan['duration_days']} dias\n\n"
+                    "Escolha o que deseja editar:",
                     reply_markup=reply_markup
                 )
-            else:
-                await update.message.reply_text("❌ Erro ao salvar a mensagem de pagamento!")
-            del context.user_data['editing']
             return
-        elif editing_type == 'payment_success':
-            if save_message_to_db('payment_success', novo_texto):
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text="✅ Mensagem de sucesso atualizada com sucesso!",
-                    reply_markup=reply_markup
-                )
-            else:
-                await update.message.reply_text("❌ Erro ao salvar a mensagem de sucesso!")
+        except ValueError:
+            await update.message.reply_text("❌ Preço inválido! Digite apenas números (ex: 49.90)")
+            return
+        except Exception as e:
+            logger.error(f"Erro ao atualizar preço do plano: {e}")
+            await update.message.reply_text("❌ Erro ao atualizar o preço do plano!")
             del context.user_data['editing']
             return
-        elif editing_type == 'payment_error':
-            if save_message_to_db('payment_error', novo_texto):
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text="✅ Mensagem de erro atualizada com sucesso!",
-                    reply_markup=reply_markup
+
+    # Edição de nome de plano
+    elif editing_type.startswith('plan_name_'):
+        try:
+            plan_id = int(editing_type.split('_')[-1])
+            new_name = update.message.text.strip()
+
+            if not new_name:
+                await update.message.reply_text("❌ Nome não pode estar vazio!")
+                return
+
+            db = Database()
+            try:
+                db.connect()
+                db.execute_query(
+                    "UPDATE vip_plans SET name = %s WHERE id = %s",
+                    (new_name, plan_id),
+                    commit=True
                 )
-            else:
-                await update.message.reply_text("❌ Erro ao salvar a mensagem de erro!")
+            finally:
+                db.close()
+
+            await update.message.reply_text(f"✅ Nome do plano atualizado para '{new_name}'!")
             del context.user_data['editing']
-            return
-        elif editing_type == 'pix_automatico_instructions':
-            if save_message_to_db('pix_automatico_instructions', novo_texto):
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text="✅ Instruções PIX atualizadas com sucesso!",
+
+            # Voltar para o menu de edição do plano
+            plan = await get_plan_by_id(plan_id)
+            if plan:
+                keyboard = [
+                    [InlineKeyboardButton("📝 Nome", callback_data=f"admin_edit_plan_name_input_{plan_id}")],
+                    [InlineKeyboardButton("💰 Preço", callback_data=f"admin_edit_plan_price_input_{plan_id}")],
+                    [InlineKeyboardButton("⏱️ Duração (dias)", callback_data=f"admin_edit_plan_duration_input_{plan_id}")],
+                    [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_vip_plans")]
+                ]
+                reply_markup = InlineKeyboardMarkup(keyboard)
+                await update.message.reply_text(
+                    f"💎 Editar Plano: {plan['name']}\n\n"
+                    f"Preço atual: R${plan['price']:.2f}\n"
+                    f"Duração atual: {plan['duration_days']} dias\n\n"
+                    "Escolha o que deseja editar:",
                     reply_markup=reply_markup
                 )
-            else:
-                await update.message.reply_text("❌ Erro ao salvar as instruções PIX!")
+            return
+        except Exception as e:
+            logger.error(f"Erro ao atualizar nome do plano: {e}")
+            await update.message.reply_text("❌ Erro ao atualizar o nome do plano!")
             del context.user_data['editing']
             return
 
-        elif editing_type == 'welcome_caption':
-            if save_message_to_db('welcome_message', novo_texto):
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text="✅ Legenda do arquivo de boas-vindas atualizada com sucesso!",
-                    reply_markup=reply_markup
+    # Edição de duração de plano
+    elif editing_type.startswith('plan_duration_'):
+        try:
+            plan_id = int(editing_type.split('_')[-1])
+            new_duration = int(update.message.text.strip())
+
+            db = Database()
+            try:
+                db.connect()
+                db.execute_query(
+                    "UPDATE vip_plans SET duration_days = %s WHERE id = %s",
+                    (new_duration, plan_id),
+                    commit=True
                 )
-            else:
-                await update.message.reply_text("❌ Erro ao salvar a legenda do arquivo de boas-vindas!")
+            finally:
+                db.close()
+
+            duration_text = "Permanente" if new_duration == -1 else f"{new_duration} dias"
+            await update.message.reply_text(f"✅ Duração do plano atualizada para {duration_text}!")
             del context.user_data['editing']
-            return
-        elif editing_type == 'welcome_message':
-            if save_message_to_db('welcome_message', novo_texto):
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text="✅ Mensagem de boas-vindas atualizada com sucesso!",
+
+            # Voltar para o menu de edição do plano
+            plan = await get_plan_by_id(plan_id)
+            if plan:
+                keyboard = [
+                    [InlineKeyboardButton("📝 Nome", callback_data=f"admin_edit_plan_name_input_{plan_id}")],
+                    [InlineKeyboardButton("💰 Preço", callback_data=f"admin_edit_plan_price_input_{plan_id}")],
+                    [InlineKeyboardButton("⏱️ Duração (dias)", callback_data=f"admin_edit_plan_duration_input_{plan_id}")],
+                    [InlineKeyboardButton("⬅️ Voltar", callback_data="admin_vip_plans")]
+                ]
+                reply_markup = InlineKeyboardMarkup(keyboard)
+                await update.message.reply_text(
+                    f"💎 Editar Plano: {plan['name']}\n\n"
+                    f"Preço atual: R${plan['price']:.2f}\n"
+                    f"Duração atual: {plan['duration_days']} dias\n\n"
+                    "Escolha o que deseja editar:",
                     reply_markup=reply_markup
                 )
-            else:
-                await update.message.reply_text("❌ Erro ao salvar a mensagem de boas-vindas!")
+            return
+        except ValueError:
+            await update.message.reply_text("❌ Duração inválida! Digite apenas números.")
+            return
+        except Exception as e:
+            logger.error(f"Erro ao atualizar duração do plano: {e}")
+            await update.message.reply_text("❌ Erro ao atualizar a duração do plano!")
             del context.user_data['editing']
             return
-        elif editing_type == "cnpay_api_key":
-            if save_config_to_db('cnpay_api_key', novo_texto):
-                success_message = "✅ API Key do CNPay atualizada com sucesso!"
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text=success_message,
-                    reply_markup=reply_markup
-                )
-            else:
-                error_message = "❌ Erro ao atualizar a API Key do CNPay!"
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text=error_message,
-                    reply_markup=reply_markup
-                )
-        elif editing_type == "cnpay_api_secret":
-            if save_config_to_db('cnpay_api_secret', novo_texto):
-                success_message = "✅ API Secret do CNPay atualizada com sucesso!"
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text=success_message,
-                    reply_markup=reply_markup
-                )
-            else:
-                error_message = "❌ Erro ao atualizar a API Secret do CNPay!"
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text=error_message,
-                    reply_markup=reply_markup
-                )
-        elif editing_type == "cnpay_environment":
-            if save_config_to_db('cnpay_environment', novo_texto):
-                success_message = "✅ Ambiente do CNPay atualizado com sucesso!"
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text=success_message,
-                    reply_markup=reply_markup
+
+async def admin_text_adding_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Criação de novo plano (nome, preço, duração, grupo)"""
+    step = context.user_data['adding_plan']['step']
+    if step == 'name':
+        context.user_data['adding_plan']['name'] = update.message.text.strip()
+        context.user_data['adding_plan']['step'] = 'price'
+        await update.message.reply_text("Digite o preço do plano (apenas números, ex: 49.90):")
+        return
+    elif step == 'price':
+        try:
+            price = float(update.message.text.replace(',', '.'))
+            context.user_data['adding_plan']['price'] = price
+            context.user_data['adding_plan']['step'] = 'duration'
+            await update.message.reply_text("Digite a duração do plano em dias (ou -1 para permanente):")
+        except Exception:
+            await update.message.reply_text("Preço inválido. Digite apenas números, ex: 49.90")
+        return
+    elif step == 'duration':
+        try:
+            duration = int(update.message.text.strip())
+            context.user_data['adding_plan']['duration'] = duration
+            context.user_data['adding_plan']['step'] = 'description'
+            await update.message.reply_text("Digite a descrição do plano:")
+        except Exception:
+            await update.message.reply_text("Duração inválida. Digite apenas números.")
+        return
+    elif step == 'description':
+        description = update.message.text.strip()
+        context.user_data['adding_plan']['description'] = description
+        context.user_data['adding_plan']['step'] = 'create_group'
+
+        await update.message.reply_text(
+            "Deseja criar um novo grupo VIP para este plano?\n\n"
+            "Digite 'sim' para criar um grupo ou 'não' para continuar sem grupo:"
+        )
+        return
+    elif step == 'create_group':
+        create_group = update.message.text.strip().lower()
+        if create_group in ['sim', 's', 'yes', 'y']:
+            context.user_data['adding_plan']['step'] = 'group_name'
+            await update.message.reply_text("Digite o nome do novo grupo VIP:")
+            return
+        elif create_group in ['não', 'nao', 'n', 'no']:
+            # Pular criação de grupo e ir direto para finalizar
+            data = context.user_data['adding_plan']
+            db = Database()
+            try:
+                db.connect()
+                db.execute_query(
+                    "INSERT INTO vip_plans (name, price, duration_days, description, is_active) VALUES (%s, %s, %s, %s, 1)",
+                    (data['name'], data['price'], data['duration'], data['description']),
+                    commit=True
                 )
-            else:
-                error_message = "❌ Erro ao atualizar o ambiente do CNPay!"
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text=error_message,
-                    reply_markup=reply_markup
+            finally:
+                db.close()
+
+            await update.message.reply_text(f"Plano '{data['name']}' adicionado com sucesso!")
+            del context.user_data['adding_plan']
+            await handle_admin_callback(update, context)
+            return
+        else:
+            await update.message.reply_text("Resposta inválida. Digite 'sim' ou 'não':")
+            return
+    elif step == 'group_name':
+        group_name = update.message.text.strip()
+        context.user_data['adding_plan']['group_name'] = group_name
+        context.user_data['adding_plan']['step'] = 'group_id'
+        await update.message.reply_text(
+            "Digite o ID do grupo no Telegram (número negativo, ex: -1001234567890):\n\n"
+            "Para obter o ID do grupo:\n"
+            "1. Adicione o bot ao grupo\n"
+            "2. Envie /id no grupo\n"
+            "3. Copie o ID que aparecer"
+        )
+        return
+    elif step == 'group_id':
+        try:
+            group_id = int(update.message.text.strip())
+            if group_id >= 0:
+                await update.message.reply_text("ID do grupo deve ser negativo. Tente novamente:")
+                return
+
+            context.user_data['adding_plan']['group_id'] = group_id
+            data = context.user_data['adding_plan']
+
+            # Inserir o plano e o grupo
+            db = Database()
+            try:
+                db.connect()
+
+                # Inserir o plano
+                db.execute_query(
+                    "INSERT INTO vip_plans (name, price, duration_days, description, is_active) VALUES (%s, %s, %s, %s, 1)",
+                    (data['name'], data['price'], data['duration'], data['description']),
+                    commit=True
                 )
-        elif editing_type == "cnpay_webhook_url":
-            if save_config_to_db('cnpay_webhook_url', novo_texto):
-                success_message = "✅ Webhook URL do CNPay atualizada com sucesso!"
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text=success_message,
-                    reply_markup=reply_markup
+
+                # Pegar o ID do plano inserido
+                plan_result = db.execute_fetch_one("SELECT LAST_INSERT_ID() as plan_id")
+                plan_id = plan_result['plan_id']
+
+                # Inserir o grupo VIP
+                db.execute_query(
+                    "INSERT INTO vip_groups (group_id, group_name, is_active) VALUES (%s, %s, TRUE)",
+                    (group_id, data['group_name']),
+                    commit=True
                 )
-            else:
-                error_message = "❌ Erro ao atualizar o Webhook URL do CNPay!"
-                await context.bot.send_message(
-                    chat_id=update.effective_user.id,
-                    text=error_message,
-                    reply_markup=reply_markup
+
+                # Pegar o ID do grupo inserido
+                group_result = db.execute_fetch_one("SELECT LAST_INSERT_ID() as group_id")
+                vip_group_id = group_result['group_id']
+
+                # Associar o plano ao grupo
+                db.execute_query(
+                    "INSERT INTO plan_groups (plan_id, group_id) VALUES (%s, %s)",
+                    (plan_id, vip_group_id),
+                    commit=True
                 )
 
-        
+            finally:
+                db.close()
+
+            await update.message.reply_text(
+                f"Plano '{data['name']}' e grupo '{data['group_name']}' criados com sucesso!\n\n"
+                f"ID do grupo: {group_id}\n"
+                f"Nome do grupo: {data['group_name']}"
+            )
+            del context.user_data['adding_plan']
+            await handle_admin_callback(update, context)
+            return
+
+        except ValueError:
+            await update.message.reply_text("ID inválido. Digite apenas números (ex: -1001234567890):")
+            return
+
+async def admin_text_edit_setting(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Edição de mensagens e configurações"""
+    editing_type = context.user_data['editing']
+    novo_texto = update.message.text.strip()
+    logger.debug(f"Tipo de edição recebido: {editing_type}")
+    keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="admin_messages")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Apagar a mensagem de edição (se existir)
+    if 'editing_message_id' in context.user_data:
+        try:
+            await context.bot.delete_message(
+                chat_id=update.effective_user.id,
+                message_id=context.user_data['editing_message_id']
+            )
+            logger.debug("Mensagem de edição apagada com sucesso")
+        except Exception as e:
+            logger.warning(f"[DEBUG] Não foi possível apagar a mensagem de edição: {e}")
+        del context.user_data['editing_message_id']
+
+    # Salvar e confirmar a edição
+    if editing_type == 'start_message':
+        if save_message_to_db('start_message', novo_texto):
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text="✅ Mensagem de boas-vindas atualizada com sucesso!",
+                reply_markup=reply_markup
+            )
+        else:
+            await update.message.reply_text("❌ Erro ao salvar a mensagem de boas-vindas!")
+        del context.user_data['editing']
+        return
+    elif editing_type == 'payment_instructions':
+        if save_message_to_db('payment_instructions', novo_texto):
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text="✅ Mensagem de pagamento atualizada com sucesso!",
+                reply_markup=reply_markup
+            )
+        else:
+            await update.message.reply_text("❌ Erro ao salvar a mensagem de pagamento!")
+        del context.user_data['editing']
+        return
+    elif editing_type == 'payment_success':
+        if save_message_to_db('payment_success', novo_texto):
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text="✅ Mensagem de sucesso atualizada com sucesso!",
+                reply_markup=reply_markup
+            )
+        else:
+            await update.message.reply_text("❌ Erro ao salvar a mensagem de sucesso!")
+        del context.user_data['editing']
+        return
+    elif editing_type == 'payment_error':
+        if save_message_to_db('payment_error', novo_texto):
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text="✅ Mensagem de erro atualizada com sucesso!",
+                reply_markup=reply_markup
+            )
+        else:
+            await update.message.reply_text("❌ Erro ao salvar a mensagem de erro!")
+        del context.user_data['editing']
+        return
+    elif editing_type == 'pix_automatico_instructions':
+        if save_message_to_db('pix_automatico_instructions', novo_texto):
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text="✅ Instruções PIX atualizadas com sucesso!",
+                reply_markup=reply_markup
+            )
+        else:
+            await update.message.reply_text("❌ Erro ao salvar as instruções PIX!")
+        del context.user_data['editing']
+        return
+
+    elif editing_type == 'welcome_caption':
+        if save_message_to_db('welcome_message', novo_texto):
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text="✅ Legenda do arquivo de boas-vindas atualizada com sucesso!",
+                reply_markup=reply_markup
+            )
+        else:
+            await update.message.reply_text("❌ Erro ao salvar a legenda do arquivo de boas-vindas!")
+        del context.user_data['editing']
+        return
+    elif editing_type == 'welcome_message':
+        if save_message_to_db('welcome_message', novo_texto):
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text="✅ Mensagem de boas-vindas atualizada com sucesso!",
+                reply_markup=reply_markup
+            )
+        else:
+            await update.message.reply_text("❌ Erro ao salvar a mensagem de boas-vindas!")
+        del context.user_data['editing']
+        return
+    elif editing_type == "cnpay_api_key":
+        if save_config_to_db('cnpay_api_key', novo_texto):
+            success_message = "✅ API Key do CNPay atualizada com sucesso!"
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text=success_message,
+                reply_markup=reply_markup
+            )
+        else:
+            error_message = "❌ Erro ao atualizar a API Key do CNPay!"
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text=error_message,
+                reply_markup=reply_markup
+            )
+    elif editing_type == "cnpay_api_secret":
+        if save_config_to_db('cnpay_api_secret', novo_texto):
+            success_message = "✅ API Secret do CNPay atualizada com sucesso!"
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text=success_message,
+                reply_markup=reply_markup
+            )
+        else:
+            error_message = "❌ Erro ao atualizar a API Secret do CNPay!"
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text=error_message,
+                reply_markup=reply_markup
+            )
+    elif editing_type == "cnpay_environment":
+        if save_config_to_db('cnpay_environment', novo_texto):
+            success_message = "✅ Ambiente do CNPay atualizado com sucesso!"
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text=success_message,
+                reply_markup=reply_markup
+            )
+        else:
+            error_message = "❌ Erro ao atualizar o ambiente do CNPay!"
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text=error_message,
+                reply_markup=reply_markup
+            )
+    elif editing_type == "cnpay_webhook_url":
+        if save_config_to_db('cnpay_webhook_url', novo_texto):
+            success_message = "✅ Webhook URL do CNPay atualizada com sucesso!"
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text=success_message,
+                reply_markup=reply_markup
+            )
+        else:
+            error_message = "❌ Erro ao atualizar o Webhook URL do CNPay!"
+            await context.bot.send_message(
+                chat_id=update.effective_user.id,
+                text=error_message,
+                reply_markup=reply_markup
+            )
+
+async def admin_text_editing(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Edição: planos primeiro; criação de plano em andamento tem prioridade sobre as configurações"""
+    if context.user_data['editing'].startswith(('plan_price_', 'plan_name_', 'plan_duration_')):
+        await admin_text_edit_plan(update, context)
+    elif context.user_data.get('adding_plan'):
+        await admin_text_adding_plan(update, context)
+    else:
+        await admin_text_edit_setting(update, context)
+
+# (chave em user_data, valor esperado ou None para qualquer valor, handler)
+ADMIN_TEXT_ROUTES = [
+    ('scheduling_step', 'message_text', admin_text_schedule_message),
+    ('scheduling_step', 'specific_users', admin_text_schedule_specific_users),
+    ('scheduling_step', 'scheduled_date', admin_text_schedule_date),
+    ('waiting_for_admin_id', None, admin_text_admin_id),
+    ('waiting_for_admin_username', None, admin_text_admin_username),
+    ('adding_admin', None, admin_text_adding_admin),
+    ('waiting_for_button_choice', None, admin_text_button_choice),
+    ('waiting_for_button_text', None, admin_text_button_text),
+    ('waiting_for_button_url', None, admin_text_button_url),
+    ('broadcast_type', None, admin_text_broadcast_message),
+    ('editing', None, admin_text_editing),
+    ('adding_plan', None, admin_text_adding_plan),
+]
+
+def resolve_admin_text(user_data):
+    for key, expected, handler in ADMIN_TEXT_ROUTES:
+        value = user_data.get(key)
+        if value and (expected is None or value == expected):
+            return handler
+    return None
+
+async def handle_admin_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    handler = resolve_admin_text(context.user_data)
+    if handler is None:
+        return
+
+    if not is_admin(update.effective_user.id):
+        logger.warning(f"[handle_admin_text] Usuário {update.effective_user.id} não é admin! Ignorando mensagem.")
+        return
+
+    logger.debug(f"[handle_admin_text] {handler.__name__}: {getattr(update.message, 'text', None)}")
+    with track_handler(handler.__name__):
+        await handler(update, context)
+
 # Função auxiliar para enviar o broadcast usando os dados do contexto
+# Atualiza a mensagem de progresso a cada N destinatários
+BROADCAST_PROGRESS_EVERY = 10
+
+def build_broadcast_sender(message_text, button_text=None, button_url=None, video_file_id=None, is_videonote=False):
+    """Corrotina que envia o broadcast (texto, vídeo ou vídeo circular) para um chat"""
+    # Teclado montado uma vez para todos os destinatários
+    reply_markup = None
+    if button_text and button_url:
+        reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton(button_text, url=button_url)]])
+
+    async def send(bot, chat_id):
+        if video_file_id is None:
+            await bot.send_message(chat_id=chat_id, text=message_text, reply_markup=reply_markup)
+        elif is_videonote:
+            await bot.send_video_note(chat_id=chat_id, video_note=video_file_id)
+            if message_text.strip() or button_text:
+                if reply_markup:
+                    await bot.send_message(
+                        chat_id=chat_id,
+                        text=message_text if message_text.strip() else button_text,
+                        reply_markup=reply_markup
+                    )
+                else:
+                    await bot.send_message(chat_id=chat_id, text=message_text)
+        else:
+            await bot.send_video(chat_id=chat_id, video=video_file_id, caption=message_text, reply_markup=reply_markup)
+    return send
+
+async def run_broadcast(bot, recipients, send, on_progress=None, label="mensagem"):
+    """Envia para cada destinatário em sequência; retorna (enviados, erros)"""
+    success_count = 0
+    error_count = 0
+    for user_id in recipients:
+        try:
+            await send(bot, user_id)
+            success_count += 1
+        except Exception as e:
+            logger.error(f"❌ Erro ao enviar {label} para {user_id}: {e}")
+            error_count += 1
+        if on_progress and (success_count + error_count) % BROADCAST_PROGRESS_EVERY == 0:
+            await on_progress(success_count, error_count)
+    return success_count, error_count
+
 async def enviar_broadcast(update, context):
     broadcast_type = context.user_data.get('broadcast_type')
     message_text = context.user_data.get('broadcast_message_text', '')
@@ -4971,8 +5407,6 @@ async def enviar_broadcast(update, context):
         else:
             recipients = [user['id'] for user in vip_users]
         is_video_broadcast = broadcast_type.startswith('video_') or broadcast_type.startswith('videonote_')
-        success_count = 0
-        error_count = 0
         if is_video_broadcast and 'broadcast_video' in context.user_data:
             video_info = context.user_data['broadcast_video']
             video_file_id = video_info['file_id']
@@ -4983,51 +5417,14 @@ async def enviar_broadcast(update, context):
                 f"✅ Enviados: 0\n"
                 f"❌ Erros: 0"
             )
-            for user_id in recipients:
-                try:
-                    if is_videonote:
-                        await context.bot.send_video_note(
-                            chat_id=user_id,
-                            video_note=video_file_id
-                        )
-                        if message_text.strip() or button_text:
-                            if button_text and button_url:
-                                reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton(button_text, url=button_url)]])
-                                await context.bot.send_message(
-                                    chat_id=user_id,
-                                    text=message_text if message_text.strip() else button_text,
-                                    reply_markup=reply_markup
-                                )
-                            else:
-                                await context.bot.send_message(
-                                    chat_id=user_id,
-                                    text=message_text
-                                )
-                    else:
-                        if button_text and button_url:
-                            reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton(button_text, url=button_url)]])
-                            await context.bot.send_video(
-                                chat_id=user_id,
-                                video=video_file_id,
-                                caption=message_text,
-                                reply_markup=reply_markup
-                            )
-                        else:
-                            await context.bot.send_video(
-                                chat_id=user_id,
-                                video=video_file_id,
-                                caption=message_text
-                            )
-                    success_count += 1
-                except Exception as e:
-                    logger.error(f"   ❌ Erro ao enviar {video_type_text} para {user_id}: {e}")
-                    error_count += 1
-                if (success_count + error_count) % 10 == 0:
-                    await progress_message.edit_text(
-                        f"📹 Enviando {video_type_text} + mensagem para {len(recipients)} usuários...\n"
-                        f"✅ Enviados: {success_count}\n"
-                        f"❌ Erros: {error_count}"
-                    )
+            async def report_progress(success_count, error_count):
+                await progress_message.edit_text(
+                    f"📹 Enviando {video_type_text} + mensagem para {len(recipients)} usuários...\n"
+                    f"✅ Enviados: {success_count}\n"
+                    f"❌ Erros: {error_count}"
+                )
+            send = build_broadcast_sender(message_text, button_text, button_url, video_file_id, is_videonote)
+            success_count, error_count = await run_broadcast(context.bot, recipients, send, report_progress, video_type_text)
             await progress_message.edit_text(
                 f"📹 Broadcast com {video_type_text} concluído!\n\n"
                 f"✅ {video_type_text.title()}s enviados: {success_count}\n"
@@ -5044,30 +5441,14 @@ async def enviar_broadcast(update, context):
                 f"✅ Enviados: 0\n"
                 f"❌ Erros: 0"
             )
-            for user_id in recipients:
-                try:
-                    if button_text and button_url:
-                        reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton(button_text, url=button_url)]])
-                        await context.bot.send_message(
-                            chat_id=user_id,
-                            text=message_text,
-                            reply_markup=reply_markup
-                        )
-                    else:
-                        await context.bot.send_message(
-                            chat_id=user_id,
-                            text=message_text
-                        )
-                    success_count += 1
-                except Exception as e:
-                    logger.error(f"Erro ao enviar mensagem para {user_id}: {e}")
-                    error_count += 1
-                if (success_count + error_count) % 10 == 0:
-                    await progress_message.edit_text(
-                        f"📢 Enviando mensagem para {len(recipients)} usuários...\n"
-                        f"✅ Enviados: {success_count}\n"
-                        f"❌ Erros: {error_count}"
-                    )
+            async def report_progress(success_count, error_count):
+                await progress_message.edit_text(
+                    f"📢 Enviando mensagem para {len(recipients)} usuários...\n"
+                    f"✅ Enviados: {success_count}\n"
+                    f"❌ Erros: {error_count}"
+                )
+            send = build_broadcast_sender(message_text, button_text, button_url)
+            success_count, error_count = await run_broadcast(context.bot, recipients, send, report_progress)
             await progress_message.edit_text(
                 f"📢 Broadcast concluído!\n\n"
                 f"✅ Mensagens enviadas: {success_count}\n"
@@ -5393,6 +5774,7 @@ async def handle_admin_files(update: Update, context: ContextTypes.DEFAULT_TYPE)
             if 'waiting_for_broadcast_text' in context.user_data:
                 del context.user_data['waiting_for_broadcast_text']
 
+@admin_callback("admin_toggle_welcome_file", answer=False)
 async def handle_welcome_file_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -5473,6 +5855,7 @@ async def handle_welcome_file_toggle(update: Update, context: ContextTypes.DEFAU
     else:
         await query.answer("❌ Erro ao salvar configuração")
 
+@admin_callback("admin_toggle_maintenance", answer=False)
 async def handle_maintenance_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -5522,6 +5905,7 @@ async def handle_maintenance_toggle(update: Update, context: ContextTypes.DEFAUL
     else:
         await query.message.reply_text("❌ Erro ao salvar configuração. Tente novamente.")
   
+@admin_callback(prefix="admin_toggle_pix_", answer=False)
 async def handle_payment_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -5602,33 +5986,16 @@ async def handle_payment_toggle(update: Update, context: ContextTypes.DEFAULT_TY
         await query.message.reply_text("❌ Erro ao alternar método de pagamento. Tente novamente.")
 
 
-async def process_access_delivery_queue(context):
-    """Processa a fila de entrega de acesso VIP"""
-    try:
-        logger.info(f"🔄 Job process_access_delivery_queue executado - Fila vazia: {access_delivery_queue.empty()}")
-        
-        while not access_delivery_queue.empty():
-            event = access_delivery_queue.get()
-            user_id = event['user_id']
-            plan_id = event['plan_id']
-            
-            logger.info(f"🎯 Processando entrega de acesso VIP para usuário {user_id} (plano {plan_id})")
-            
-            try:
-                await add_user_to_vip_groups(context.bot, user_id, plan_id)
-                logger.info(f"✅ Entrega de acesso VIP concluída para usuário {user_id} (plano {plan_id})")
-            except Exception as e:
-                logger.error(f"❌ Erro ao entregar acesso VIP para usuário {user_id}: {e}")
-                import traceback
-                logger.error(f"Traceback: {traceback.format_exc()}")
-        
-        if access_delivery_queue.empty():
-            logger.info("📭 Fila vazia - nenhum item para processar")
-            
-    except Exception as e:
-        logger.error(f"❌ Erro ao processar fila de entrega de acesso: {e}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+async def deliver_vip_access(bot, event):
+    """Entrega o acesso VIP de uma linha do outbox (user_id, plan_id); False = tentar de novo"""
+    user_id = event['user_id']
+    plan_id = event['plan_id']
+    logger.info(f"🎯 Processando entrega de acesso VIP para usuário {user_id} (plano {plan_id})")
+    
+    delivered = await add_user_to_vip_groups(bot, user_id, plan_id, delivery_id=event.get('id'))
+    if delivered:
+        logger.info(f"✅ Entrega de acesso VIP concluída para usuário {user_id} (plano {plan_id})")
+    return delivered
 
 async def check_expired_subscriptions(context: ContextTypes.DEFAULT_TYPE):
     db = Database()
@@ -5649,19 +6016,18 @@ async def check_expired_subscriptions(context: ContextTypes.DEFAULT_TYPE):
         
         for sub in expired_subs:
             try:
-                # Desativar assinatura
-                db.execute_query(
-                    "UPDATE subscriptions SET is_active = FALSE WHERE id = %s",
-                    (sub['id'],),
-                    commit=True
-                )
-                
-                # Atualizar status do usuário
-                db.execute_query(
-                    "UPDATE users SET is_vip = FALSE WHERE id = %s",
-                    (sub['user_id'],),
-                    commit=True
-                )
+                # Desativar assinatura e atualizar status do usuário (e contador) juntos
+                with db.transaction() as cursor:
+                    cursor.execute(
+                        "UPDATE subscriptions SET is_active = FALSE WHERE id = %s",
+                        (sub['id'],)
+                    )
+                    cursor.execute(
+                        "UPDATE users SET is_vip = FALSE WHERE id = %s AND is_vip = TRUE",
+                        (sub['user_id'],)
+                    )
+                    if cursor.rowcount == 1:
+                        bump_counter(cursor, COUNTER_VIP_USERS, -1)
                 
                 # Remover usuário dos grupos VIP
                 await remove_user_from_vip_groups(context.bot, sub['user_id'], sub['plan_id'])
@@ -5888,7 +6254,7 @@ async def handle_back_to_plans(update: Update, context: ContextTypes.DEFAULT_TYP
         for plan in plans:
             keyboard.append([InlineKeyboardButton(
                 f"{plan['name']} - R${plan['price']:.2f}",
-                callback_data=f"plan_{plan['id']}"
+                callback_data=encode_callback('plan', plan['id'])
             )])
     finally:
         db.close()
@@ -5898,83 +6264,309 @@ async def handle_back_to_plans(update: Update, context: ContextTypes.DEFAULT_TYP
         reply_markup=reply_markup
     )
 
-async def check_bot_initialization(bot, config):
-    """Verifica a inicialização do bot e envia relatório ao admin."""
+# =====================================================
+# VERIFICAÇÕES DE PRONTIDÃO
+# =====================================================
+
+READINESS_REFRESH_INTERVAL = 5 * 60  # segundos
+READINESS_REPORT_MAX_LENGTH = 4000  # limite de uma mensagem do Telegram, com folga
+REQUIRED_CONFIG_KEYS = (
+    ('bot_token', "Token do bot não encontrado"),
+    ('admin_id', "ID do admin não encontrado"),
+    ('payment_methods', "Configurações de pagamento não encontradas"),
+)
+
+def ping_database():
+    """Abre uma conexão e consulta a versão do MySQL; levanta CheckFailed sem conexão"""
+    db = Database()
     try:
-        # Verificar se o token é válido
+        db.connect()
+        if not db.connection:
+            raise CheckFailed("sem conexão com o MySQL")
+        row = db.execute_fetch_one("SELECT VERSION() as version")
+        return f"MySQL {row['version']}"
+    finally:
+        db.close()
+
+def build_readiness_graph(bot):
+    """Monta o grafo de verificações de prontidão.
+
+    Banco, getMe e configuração são críticos; banco e getMe rodam em paralelo e
+    configuração, grupos VIP e provedores PIX dependem do banco. Cada grupo VIP ativo e cada provedor
+    habilitado vira uma verificação própria. Retorna (grafo, problemas dos
+    grupos), preenchido durante a execução.
+    """
+    graph = CheckGraph()
+    group_problems = {}
+
+    async def database():
+        return await asyncio.to_thread(ping_database)
+
+    async def telegram_api():
         bot_info = await bot.get_me()
-        logger.info(f"Bot iniciado com sucesso: @{bot_info.username}")
-        
-        # Verificar dependências
-        missing_deps = []
-        try:
-            import qrcode
-        except ImportError:
-            missing_deps.append("qrcode")
-        try:
-            import mercadopago
-        except ImportError:
-            missing_deps.append("mercadopago")
-        try:
-            from PIL import Image
-        except ImportError:
-            missing_deps.append("Pillow")
-            
-        # Verificar arquivos de configuração
-        missing_files = []
-        if not os.path.exists('config.json'):
-            missing_files.append("config.json")
-        if not os.path.exists('messages.txt'):
-            missing_files.append("messages.txt")
-            
-        # Verificar estrutura do config.json
-        config_errors = []
-        if 'bot_token' not in config:
-            config_errors.append("Token do bot não encontrado")
-        if 'admin_id' not in config:
-            config_errors.append("ID do admin não encontrado")
-        if 'payment_methods' not in config:
-            config_errors.append("Configurações de pagamento não encontradas")
-        # Removida verificação de vip_plans pois agora está no banco de dados
-            
-        # Preparar mensagem de status
-        status_message = f"🤖 *Status de Inicialização do Bot*\n\n"
-        status_message += f"✅ Bot iniciado: @{bot_info.username}\n"
-        
-        if missing_deps:
-            status_message += f"\n❌ Dependências faltando:\n"
-            for dep in missing_deps:
-                status_message += f"• {dep}\n"
-                
-        if missing_files:
-            status_message += f"\n❌ Arquivos faltando:\n"
-            for file in missing_files:
-                status_message += f"• {file}\n"
-                
-        if config_errors:
-            status_message += f"\n❌ Erros de configuração:\n"
-            for error in config_errors:
-                status_message += f"• {error}\n"
-                
-        if not (missing_deps or missing_files or config_errors):
-            status_message += "\n✅ Todas as verificações passaram com sucesso!"
-            
-        # Enviar mensagem ao admin
+        return f"@{bot_info.username}"
+
+    async def configuration():
+        config = await asyncio.to_thread(load_config)
+        if config is None:
+            raise CheckFailed("não foi possível carregar bot_config")
+        # vip_plans não é verificado: fica no banco de dados
+        errors = [message for key, message in REQUIRED_CONFIG_KEYS if key not in config]
+        if errors:
+            raise CheckFailed("; ".join(errors))
+        return f"{len(config)} chaves"
+
+    async def dependencies():
+        # find_spec não importa o módulo: qrcode/PIL/mercadopago só carregam no primeiro uso
+        missing = [
+            package for module, package in (("qrcode", "qrcode"), ("mercadopago", "mercadopago"), ("PIL", "Pillow"))
+            if importlib.util.find_spec(module) is None
+        ]
+        if missing:
+            raise CheckFailed(f"faltando: {', '.join(missing)}")
+        return "qrcode, mercadopago, Pillow"
+
+    async def files():
+        missing = [name for name in ('config.json', 'messages.txt') if not os.path.exists(name)]
+        if missing:
+            raise CheckFailed(f"faltando: {', '.join(missing)}")
+        return "config.json, messages.txt"
+
+    async def vip_group(group_id):
         try:
-            for admin_id in get_all_admin_ids():
-                await bot.send_message(chat_id=admin_id, text=status_message, parse_mode='Markdown')
-            Logger.info("Relatório de inicialização enviado ao admin")
+            info = await vip_group_cache.get(bot, group_id)
         except Exception as e:
-            logger.error(f"Erro ao enviar relatório ao admin: {e}")
-            
+            vip_group_cache.invalidate(group_id)
+            group_problems[str(group_id)] = f"Erro ao acessar grupo: {e}"
+            raise CheckFailed(group_problems[str(group_id)]) from e
+        problem = describe_vip_group_problem(info)
+        if problem:
+            group_problems[str(group_id)] = problem
+            raise CheckFailed(problem)
+        return info['title']
+
+    async def vip_groups():
+        group_ids = await asyncio.to_thread(get_active_vip_group_ids)
+        for group_id in group_ids:
+            graph.add(f"grupo {group_id}", lambda group_id=group_id: vip_group(group_id), after=('telegram',), critical=False)
+        return f"{len(group_ids)} grupo(s) ativo(s)"
+
+    async def pix_providers():
+        manager = await asyncio.to_thread(get_pix_provider_manager)
+        for name, provider in manager.providers.items():
+            graph.add(f"pix {name}", provider.probe, critical=False)
+        if not manager.providers:
+            raise CheckFailed("nenhum provedor PIX habilitado")
+        return ", ".join(manager.providers)
+
+    graph.add('database', database)
+    graph.add('telegram', telegram_api)
+    graph.add('config', configuration, after=('database',))
+    graph.add('dependencies', dependencies, critical=False)
+    graph.add('files', files, critical=False)
+    graph.add('vip_groups', vip_groups, after=('database',), critical=False)
+    graph.add('pix_providers', pix_providers, after=('database',), critical=False)
+    return graph, group_problems
+
+def format_readiness_report(report):
+    """Relatório de prontidão em texto para os admins"""
+    ok_count = len(report.results) - len(report.problems)
+    lines = [
+        "🤖 Status de Inicialização do Bot",
+        "",
+        f"{'✅ Pronto para atender' if report.ready else '❌ Não está pronto'} "
+        f"({ok_count}/{len(report.results)} verificações ok em {report.duration * 1000:.0f} ms)",
+        "",
+    ]
+    icons = {'ok': '✅', 'failed': '❌', 'skipped': '⏭️', 'timeout': '⏱️'}
+    for result in report.results:
+        lines.append(f"{icons.get(result.status, '•')} {result.name}: {result.detail or result.status}")
+    if not report.problems:
+        lines.extend(["", "✅ Todas as verificações passaram com sucesso!"])
+    text = "\n".join(lines)
+    if len(text) > READINESS_REPORT_MAX_LENGTH:
+        text = text[:READINESS_REPORT_MAX_LENGTH] + "\n…"
+    return text
+
+async def check_bot_initialization(bot, notify=True):
+    """Roda as verificações de prontidão, publica o relatório em /ready e, se `notify`, o envia aos admins."""
+    try:
+        graph, group_problems = build_readiness_graph(bot)
+        report = await graph.run()
+        readiness_state.update(report)
+        if notify:
+            # Problemas já avisados aqui não são repetidos por refresh_vip_group_cache
+            vip_group_cache.reported_problems = set(group_problems)
+            await notify_admins(bot, format_readiness_report(report))
+            logger.info("Relatório de inicialização enviado aos admins")
+        return report
     except Exception as e:
         logger.error(f"Erro ao verificar inicialização: {e}")
-        try:
-            for admin_id in get_all_admin_ids():
-                await bot.send_message(chat_id=admin_id, text=f"❌ *Erro na inicialização do bot*\n\nErro: {str(e)}", parse_mode="Markdown")
-        except:
-            logger.error("Não foi possível enviar mensagem de erro ao admin")
+        if notify:
+            await notify_admins(bot, f"❌ Erro na inicialização do bot\n\nErro: {e}")
+        return None
+
+
+async def startup_report(context: ContextTypes.DEFAULT_TYPE):
+    """Executa as verificações de inicialização (aquecendo o cache dos grupos VIP).
+
+    Publica a prontidão em /ready; o relatório só vai aos admins enquanto a
+    liderança estiver confirmada.
+    """
+    await check_bot_initialization(context.bot, notify=leader_election.is_leader)
+
+async def refresh_readiness(context: ContextTypes.DEFAULT_TYPE):
+    """Job periódico: mantém o /ready atualizado"""
+    await check_bot_initialization(context.bot, notify=False)
+
+# =====================================================
+# ELEIÇÃO DE LÍDER ENTRE RÉPLICAS
+# =====================================================
+
+# Um único lock decide qual réplica processa os updates do Telegram e roda as
+# varreduras (expiração, avisos, agendamentos...). user_data (wizards de
+# admin), bot_data['pending_payment_checks'], os tokens de callback_data e o
+# cache dos grupos VIP ficam na memória do processo, e o MySQLPersistence só é
+# lido na inicialização (e grava a cada poucos segundos). As demais réplicas
+# esperam em wait_for_leadership e assumem (recarregando o estado persistido)
+# quando a líder cair. O nome do lock é o mesmo que já guardava os updates,
+# para que réplicas antigas e novas se excluam durante um deploy.
+leader_election = LeaderElection('telegram_updates')
+sweep = leader_only(leader_election)
+_leadership_lost = False
+
+def wait_for_leadership():
+    """Bloqueia até esta réplica ser a líder (updates do Telegram e varreduras)"""
+    if leader_election.refresh():
+        return
+    if leader_election.held_elsewhere:
+        logger.warning(
+            "⏳ Outra réplica já processa os updates do Telegram - aguardando como reserva. "
+            "No modo webhook, apenas uma réplica deve receber tráfego de /telegram/webhook."
+        )
+    while not leader_election.refresh():
+        time.sleep(LEADER_REFRESH_INTERVAL)
+
+async def refresh_leadership(context: ContextTypes.DEFAULT_TYPE):
+    """Job periódico: renova a liderança e, se outra réplica a assumiu, para de processar updates.
+
+    Erros de conexão não bastam: sem confirmação de que o lock está em outra
+    conexão, os updates continuam sendo processados (as varreduras param) e
+    refresh() tenta de novo com espera.
+    """
+    global _leadership_lost
+    if await asyncio.to_thread(leader_election.refresh):
+        return
+    if leader_election.held_elsewhere:
+        logger.error("❌ Outra réplica assumiu a liderança - encerrando esta")
+        _leadership_lost = True
+        stop_update_processing(context.application)
+
+async def release_leadership(application):
+    """post_shutdown: libera o lock para outra réplica assumir imediatamente"""
+    await asyncio.to_thread(leader_election.release)
+
+async def on_startup(application):
+    """post_init: recupera tokens de callback e verificações de pagamento e inicia o relay do outbox de entregas"""
+    tokens = callback_tokens.bind(application.bot_data)
+    if tokens:
+        logger.info(f"🔁 {tokens} token(s) de callback_data recuperado(s) de bot_data")
+    await restore_payment_checks(application)
+    await access_delivery_relay.start(lambda row: deliver_vip_access(application.bot, row))
+    await access_delivery_queue.start(access_delivery_relay.accept)
+
+async def on_shutdown(application):
+    """post_shutdown: para a entrega de acesso e libera a liderança"""
+    await access_delivery_queue.stop()
+    await access_delivery_relay.stop()
+    await release_leadership(application)
+
+async def prune_access_delivery_outbox(context: ContextTypes.DEFAULT_TYPE):
+    """Remove do outbox as entregas concluídas há mais tempo que a retenção"""
+    removed = await asyncio.to_thread(prune_access_deliveries)
+    if removed:
+        logger.info(f"🧹 {removed} entrega(s) antigas removidas do outbox")
+
+async def backfill_access_delivery_outbox(context: ContextTypes.DEFAULT_TYPE):
+    """Recupera entregas de aprovações cujo evento do webhook não chegou ao outbox"""
+    added = await asyncio.to_thread(backfill_access_deliveries)
+    if added:
+        logger.warning(f"⚠️ {added} entrega(s) de acesso sem registro no outbox recuperada(s)")
+        access_delivery_relay.wake()
+
+# =====================================================
+# MODO WEBHOOK (UPDATES DO TELEGRAM)
+# =====================================================
+
+# Com TELEGRAM_WEBHOOK_URL (env ou bot_config) o bot recebe updates por webhook
+# no mesmo servidor Flask do CNPay; só a réplica dona do lock 'telegram_updates'
+# atende (as reservas respondem 503 aqui e em /ready)
+TELEGRAM_WEBHOOK_PATH = '/telegram/webhook'
+
+def get_webhook_settings(config):
+    """Retorna (url, secret_token) do webhook do Telegram, ou (None, None) para polling"""
+    base_url = os.getenv('TELEGRAM_WEBHOOK_URL') or config.get('telegram_webhook_url')
+    if not base_url:
+        return None, None
+    secret = (
+        os.getenv('TELEGRAM_WEBHOOK_SECRET')
+        or config.get('telegram_webhook_secret')
+        or hashlib.sha256(config['bot_token'].encode()).hexdigest()[:32]
+    )
+    return base_url.rstrip('/') + TELEGRAM_WEBHOOK_PATH, secret
+
+def get_max_concurrent_updates(config):
+    """Limite global de updates processados ao mesmo tempo (env ou bot_config)"""
+    return int(os.getenv('MAX_CONCURRENT_UPDATES') or config.get('max_concurrent_updates') or DEFAULT_MAX_CONCURRENT_UPDATES)
+
+def build_bot(config):
+    """Bot instrumentado; TELEGRAM_API_BASE_URL (env ou bot_config) troca o servidor da Bot API (ex.: benchmarks/loadtest)"""
+    urls = {}
+    api_base_url = os.getenv('TELEGRAM_API_BASE_URL') or config.get('telegram_api_base_url')
+    if api_base_url:
+        api_base_url = api_base_url.rstrip('/')
+        urls = {'base_url': f"{api_base_url}/bot", 'base_file_url': f"{api_base_url}/file/bot"}
+        logger.info(f"🧪 Usando servidor da Bot API em {api_base_url}")
+    return InstrumentedBot(config['bot_token'], **urls)
+
+def check_database_version(db_config):
+    """Conecta ao MySQL e registra a versão do servidor (diagnóstico de inicialização)"""
+    db = Database()
+    try:
+        connection = db.connect()
+        if connection and connection.is_connected():
+            cursor = connection.cursor()
+            cursor.execute("SELECT VERSION()")
+            version = cursor.fetchone()
+            cursor.close()
+            logger.info(f"✅ Conectado ao MySQL versão: {version[0]}")
+            logger.info(f"✅ Banco de dados configurado corretamente na porta {db_config.get('port', 'Não definida')}")
+        else:
+            logger.error("❌ Falha na conexão com o banco de dados")
+            logger.error("💡 Verifique se a porta está correta e o MySQL está rodando")
+    except Exception as e:
+        logger.error(f"❌ Erro ao conectar ao banco de dados: {e}")
+        logger.error("💡 Execute 'python setup_database.py' para reconfigurar")
+    finally:
+        db.close()
 
+def run_startup_checks(db_config):
+    """Executa em paralelo as etapas de inicialização que só dependem do banco.
+
+    Cada etapa abre a própria conexão, então o tempo total é o da mais lenta e
+    não a soma das idas ao MySQL. Retorna a configuração (ou None, como load_config).
+    """
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup") as pool:
+        version_check = pool.submit(check_database_version, db_config)
+        # Garantir chaves e tabelas usadas pelo bot
+        schema = pool.submit(ensure_schema)
+        config = pool.submit(load_config)
+        version_check.result()
+        schema.result()
+        config = config.result()
+    logger.info(f"⏱️ Verificações de inicialização concluídas em {(time.perf_counter() - started) * 1000:.0f} ms")
+    return config
 
 def main():
     try:
@@ -6005,36 +6597,33 @@ def main():
         logger.info(f"   Usuário: {DB_CONFIG.get('user', 'Não definido')}")
         logger.info(f"   Banco: {DB_CONFIG.get('database', 'Não definido')}")
         
-        db = Database()
-        try:
-            connection = db.connect()
-            if connection and connection.is_connected():
-                cursor = connection.cursor()
-                cursor.execute("SELECT VERSION()")
-                version = cursor.fetchone()
-                cursor.close()
-                logger.info(f"✅ Conectado ao MySQL versão: {version[0]}")
-                logger.info(f"✅ Banco de dados configurado corretamente na porta {DB_CONFIG.get('port', 'Não definida')}")
-            else:
-                logger.error("❌ Falha na conexão com o banco de dados")
-                logger.error("💡 Verifique se a porta está correta e o MySQL está rodando")
-        except Exception as e:
-            logger.error(f"❌ Erro ao conectar ao banco de dados: {e}")
-            logger.error("💡 Execute 'python setup_database.py' para reconfigurar")
-        finally:
-            db.close()
+        # Réplicas extras ficam aqui como reserva, sem liderança nem Application
+        wait_for_leadership()
 
-        # Carregar configurações
-        config = load_config()
+        # Versão do MySQL, migrações, configuração e liderança em paralelo
+        config = run_startup_checks(DB_CONFIG)
         if config is None:
             logger.error("Falha ao carregar as configurações.")
             return  # ou lidar de forma apropriada
         if not config or 'bot_token' not in config:
             logger.error("Token do bot não encontrado na configuração.")
             return
+        register_secret(config['bot_token'])
+
+        webhook_url, webhook_secret = get_webhook_settings(config)
 
         # Inicializar o bot
-        application = Application.builder().token(config['bot_token']).build()
+        # Updates em paralelo entre chats; em ordem dentro de cada chat
+        application = (
+            Application.builder()
+            .concurrent_updates(KeyedUpdateProcessor(get_max_concurrent_updates(config)))
+            .job_queue(InstrumentedJobQueue())
+            .bot(build_bot(config))
+            .persistence(MySQLPersistence('bot'))
+            .post_init(on_startup)
+            .post_shutdown(on_shutdown)
+            .build()
+        )
         
         # Definir as instâncias globais
         set_application_instance(application)
@@ -6054,19 +6643,15 @@ def main():
         application.add_handler(CommandHandler("vip", vip))
         application.add_handler(CommandHandler("admin", admin))
         application.add_handler(CommandHandler("test_users", test_users))  # Comando temporário para debug
-        application.add_handler(CallbackQueryHandler(handle_plan_selection, pattern="^plan_"))
-        application.add_handler(CallbackQueryHandler(handle_plan_selection, pattern="^renew_"))
-        application.add_handler(CallbackQueryHandler(handle_renewal_confirmation, pattern="^confirm_renew_"))
-        application.add_handler(CallbackQueryHandler(handle_payment_method, pattern="^pix_"))
-        application.add_handler(CallbackQueryHandler(check_payment_manual, pattern="^check_"))
-        application.add_handler(CallbackQueryHandler(check_payment_manual, pattern="^copy_pix_"))
+        application.add_handler(CommandHandler("perf", perf))
+        application.add_handler(CallbackQueryHandler(handle_plan_selection, pattern=callback_pattern('plan', 'renew')))
+        application.add_handler(CallbackQueryHandler(handle_renewal_confirmation, pattern=callback_pattern('confirm_renew', 'cancel_renew')))
+        application.add_handler(CallbackQueryHandler(handle_payment_method, pattern=callback_pattern('pix_auto')))
+        application.add_handler(CallbackQueryHandler(check_payment_manual, pattern=callback_pattern('check', 'copy_pix')))
         application.add_handler(CallbackQueryHandler(handle_back_to_plans, pattern="^back_to_plans$"))
         application.add_handler(CallbackQueryHandler(handle_show_plans, pattern="^show_plans$"))
-        application.add_handler(CallbackQueryHandler(handle_admin_edit, pattern="^admin_edit_"))
-        application.add_handler(CallbackQueryHandler(handle_admin_callback, pattern="^admin_(?!edit_)"))
-        application.add_handler(CallbackQueryHandler(handle_maintenance_toggle, pattern="^admin_toggle_maintenance$"))
-        application.add_handler(CallbackQueryHandler(handle_payment_toggle, pattern="^admin_toggle_pix_"))
-        application.add_handler(CallbackQueryHandler(handle_welcome_file_toggle, pattern="^admin_toggle_welcome_file$"))
+        # Todos os callbacks admin_* passam pela tabela de rotas (ADMIN_CALLBACK_ROUTES)
+        application.add_handler(CallbackQueryHandler(handle_admin_callback, pattern="^admin_"))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_admin_text))
         application.add_handler(MessageHandler(filters.PHOTO | filters.VIDEO, handle_admin_files))
 
@@ -6074,11 +6659,19 @@ def main():
         job_queue = application.job_queue
         if job_queue is not None:
             try:
-                job_queue.run_repeating(check_expired_subscriptions, interval=3*60, first=10)
-                job_queue.run_repeating(check_expiring_subscriptions, interval=60*60, first=20)
-                job_queue.run_repeating(process_access_delivery_queue, interval=5, first=5)
-                job_queue.run_repeating(process_scheduled_messages, interval=60, first=30)  # Verificar mensagens agendadas a cada minuto
-                job_queue.run_once(initial_check, when=5)
+                # Liderança já obtida em wait_for_leadership; renovada periodicamente
+                job_queue.run_repeating(refresh_leadership, interval=LEADER_REFRESH_INTERVAL, first=LEADER_REFRESH_INTERVAL)
+                job_queue.run_repeating(sweep(check_expired_subscriptions), interval=3*60, first=10)
+                job_queue.run_repeating(sweep(check_expiring_subscriptions), interval=60*60, first=20)
+                job_queue.run_repeating(sweep(refill_invite_link_pool), interval=10*60, first=15)
+                job_queue.run_repeating(refresh_vip_group_cache, interval=VIP_GROUP_CACHE_REFRESH_INTERVAL, first=VIP_GROUP_CACHE_REFRESH_INTERVAL)
+                job_queue.run_repeating(sweep(reconcile_bot_counters), interval=60*60, first=3)
+                job_queue.run_repeating(sweep(prune_access_delivery_outbox), interval=6*60*60, first=60)
+                job_queue.run_repeating(sweep(backfill_access_delivery_outbox), interval=60, first=45)
+                job_queue.run_once(startup_report, when=1)
+                job_queue.run_repeating(refresh_readiness, interval=READINESS_REFRESH_INTERVAL, first=READINESS_REFRESH_INTERVAL)
+                job_queue.run_repeating(sweep(process_scheduled_messages), interval=60, first=30)  # Verificar mensagens agendadas a cada minuto
+                job_queue.run_once(sweep(initial_check), when=5)
                 logger.info("✅ Jobs periódicos configurados com sucesso")
             except Exception as e:
                 logger.warning(f"⚠️ Erro ao configurar jobs periódicos: {e}")
@@ -6090,8 +6683,18 @@ def main():
         # Handler de erros
         application.add_error_handler(error_handler)
 
+        # Latência, erros e concorrência de cada handler (expostos em /metrics)
+        instrument_handlers(application)
+        register_query_profiler(query_profiler)
+
         # Iniciar o bot
-        application.run_polling()
+        if webhook_url:
+            asyncio.run(serve_webhook(application, webhook_url, webhook_secret))
+        else:
+            application.run_polling()
+        if _leadership_lost:
+            # Código de erro: a plataforma reinicia o processo, que volta como reserva
+            sys.exit(1)
 
     except Exception as e:
         logger.error(f"Erro ao iniciar o bot: {e}")
@@ -6115,11 +6718,6 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 # Remover usuário dos grupos VIP
 async def remove_user_from_vip_groups(bot, user_id, plan_id):
     """Remove usuário dos grupos VIP quando a assinatura expira"""
-    config = load_config()
-    if config is None:
-        logger.error("Falha ao carregar as configurações.")
-        return  # ou lidar de forma apropriada
-    
     # Buscar o plano no banco de dados
     db = Database()
     try:
@@ -6141,66 +6739,44 @@ async def remove_user_from_vip_groups(bot, user_id, plan_id):
             logger.info(f"Nenhum grupo encontrado para o plano {plan_id}")
             return True  # Retorna True mesmo sem grupos
         
-        # Remover usuário dos grupos
-        for group in groups:
-            group_id = group['group_id']
-            group_name = group['group_name']
-            
+        async def _remove_from_group(group_id):
+            await get_vip_group_info(bot, group_id, 'can_restrict_members')
+            await telegram_rate_limiter.acquire()
             try:
-                # Verificar se o grupo é um supergrupo
-                chat = await bot.get_chat(group_id)
-                if chat.type in ['group', 'supergroup', 'channel']:
-                    try:
-                        # Remover usuário do grupo
-                        await bot.ban_chat_member(
-                            chat_id=group_id,
-                            user_id=user_id,
-                            until_date=datetime.now() + timedelta(seconds=30)  # Ban temporário de 30 segundos
-                        )
-                        
-                        logger.info(f"Usuário {user_id} removido do grupo {group_id} ({group_name})")
-                        
-                        # Notificar admin sobre a remoção
-                        if config and 'admin_id' in config:
-                            if not is_admin(int(update.effective_user.id)):
-                                return
-                            await bot.send_message(
-                                chat_id=admin_id,
-                                text=f"🚫 Usuário removido do grupo VIP\n\n"
-                                     f"👤 Usuário: {user_id}\n"
-                                     f"📱 Grupo: {group_name}\n"
-                                     f"💎 Plano: {plan_id}\n"
-                                     f"⏰ Motivo: Assinatura expirada"
-                            )
-                        
-                    except Exception as e:
-                        logger.error(f"Erro ao remover usuário {user_id} do grupo {group_id}: {e}")
-                        # Se falhar, notifica o admin
-                        if config and 'admin_id' in config:
-                            if not is_admin(int(update.effective_user.id)):
-                                return
-                            await bot.send_message(
-                                chat_id=admin_id,
-                                text=f"⚠️ Erro ao remover usuário do grupo VIP\n\n"
-                                     f"👤 Usuário: {user_id}\n"
-                                     f"📱 Grupo: {group_name}\n"
-                                     f"💎 Plano: {plan_id}\n"
-                                     f"❌ Erro: {e}\n\n"
-                                     f"Verifique se o bot tem permissões de administrador no grupo."
-                            )
-                else:
-                    logger.error(f"Grupo {group_id} não é um grupo ou supergrupo válido")
-                    
-            except Exception as e:
-                logger.error(f"Erro ao processar grupo {group_id} para remoção do usuário {user_id}: {e}")
-                # Notifica o admin
-                if config and 'admin_id' in config:
-                    if not is_admin(int(update.effective_user.id)):
-                        return
-                    await bot.send_message(
-                        chat_id=admin_id,
-                        text=f"⚠️ Erro ao processar grupo {group_id} para remoção do usuário {user_id}.\nErro: {e}"
-                    )
+                await bot.ban_chat_member(
+                    chat_id=group_id,
+                    user_id=user_id,
+                    until_date=datetime.now() + timedelta(seconds=30)  # Ban temporário de 30 segundos
+                )
+            except TelegramError:
+                vip_group_cache.invalidate(group_id)
+                raise
+        
+        # Remover usuário de todos os grupos em paralelo
+        results = await gather_limited([_remove_from_group(group['group_id']) for group in groups])
+        
+        removed = []
+        failures = []
+        for group, result in zip(groups, results):
+            if isinstance(result, Exception):
+                logger.error(f"Erro ao remover usuário {user_id} do grupo {group['group_id']}: {result}")
+                failures.append(f"📱 {group['group_name']}: {result}")
+            else:
+                logger.info(f"Usuário {user_id} removido do grupo {group['group_id']} ({group['group_name']})")
+                removed.append(f"📱 {group['group_name']}")
+        
+        # Notificar admins com o resumo da remoção
+        text = (
+            f"🚫 Usuário removido dos grupos VIP\n\n"
+            f"👤 Usuário: {user_id}\n"
+            f"💎 Plano: {plan_id}\n"
+            f"⏰ Motivo: Assinatura expirada\n"
+        )
+        if removed:
+            text += "\n✅ Removido de:\n" + "\n".join(removed) + "\n"
+        if failures:
+            text += "\n❌ Erros:\n" + "\n".join(failures) + "\n\nVerifique se o bot tem permissões de administrador no grupo."
+        await notify_admins(bot, text)
         
         return True
         
@@ -6227,10 +6803,29 @@ class PixProvider:
     async def check_payment(self, payment_id):
         """Verifica pagamento - deve ser implementado pelos provedores"""
         raise NotImplementedError
+    
+    async def probe(self):
+        """Verifica credenciais e conectividade para o relatório de prontidão.
+
+        Retorna um detalhe curto ou levanta CheckFailed; não cria cobranças.
+        """
+        raise NotImplementedError
 
 class MercadoPagoProvider(PixProvider):
     """Provedor MercadoPago"""
     
+    async def probe(self):
+        """Consulta o usuário dono do token (/users/me)"""
+        if not self.config.get('mercadopago_access_token'):
+            raise CheckFailed("token do MercadoPago não configurado")
+        import mercadopago
+        
+        sdk = mercadopago.SDK(self.config['mercadopago_access_token'])
+        response = await asyncio.to_thread(sdk.user().get)
+        if response.get("status") != 200:
+            raise CheckFailed(f"token recusado (HTTP {response.get('status')})")
+        return f"conta {response['response'].get('id')}"
+    
     async def generate_pix(self, amount, description, external_reference):
         """Gera PIX usando MercadoPago"""
         try:
@@ -6238,6 +6833,8 @@ class MercadoPagoProvider(PixProvider):
                 logger.error("Token do MercadoPago não configurado")
                 return None
             
+            import mercadopago
+
             sdk = mercadopago.SDK(self.config['mercadopago_access_token'])
             
             payment_data = {
@@ -6309,6 +6906,8 @@ class MercadoPagoProvider(PixProvider):
                 logger.error("Token do MercadoPago não configurado")
                 return None
             
+            import mercadopago
+
             sdk = mercadopago.SDK(self.config['mercadopago_access_token'])
             payment_response = sdk.payment().get(payment_id)
             payment = payment_response["response"]
@@ -6325,10 +6924,15 @@ class CNPayProvider(PixProvider):
         super().__init__(config)
         self.api_key = config.get('cnpay_api_key', '')
         self.api_secret = config.get('cnpay_api_secret', '')
+        register_secret(self.api_key)
+        register_secret(self.api_secret)
         self.environment = config.get('cnpay_environment', 'sandbox')
         
-        # Configurar URL baseada no ambiente
-        if self.environment == 'sandbox':
+        # Configurar URL baseada no ambiente (CNPAY_API_URL sobrescreve, ex.: benchmarks/loadtest)
+        override_url = os.getenv('CNPAY_API_URL') or config.get('cnpay_api_url')
+        if override_url:
+            self.base_url = override_url
+        elif self.environment == 'sandbox':
             self.base_url = 'https://sandbox.appcnpay.com/api/v1/gateway/pix/receive'
         else:
             self.base_url = 'https://painel.appcnpay.com/api/v1/gateway/pix/receive'
@@ -6341,6 +6945,21 @@ class CNPayProvider(PixProvider):
         logger.info(f"🔧 API Key configurada: {'✅' if self.api_key else '❌'}")
         logger.info(f"🔧 API Secret configurado: {'✅' if self.api_secret else '❌'}")
     
+    async def probe(self):
+        """GET autenticado no endpoint de cobrança: só 401/403 ou 5xx contam como falha"""
+        if not (self.api_key and self.api_secret):
+            raise CheckFailed("api_key/api_secret do CNPay não configurados")
+        import httpx
+        
+        headers = {'x-public-key': self.api_key, 'x-secret-key': self.api_secret}
+        async with httpx.AsyncClient() as client:
+            response = await client.get(self.base_url, headers=headers, timeout=5)
+        if response.status_code in (401, 403):
+            raise CheckFailed(f"credenciais recusadas (HTTP {response.status_code})")
+        if response.status_code >= 500:
+            raise CheckFailed(f"CNPay indisponível (HTTP {response.status_code})")
+        return f"{self.environment}, HTTP {response.status_code}"
+    
     async def generate_pix(self, amount, description, external_reference, splits=None):
         """Gera PIX usando CNPay Gateway com validação de split e taxas"""
         try:
@@ -6456,12 +7075,10 @@ class CNPayProvider(PixProvider):
                 'x-secret-key': self.api_secret
             }
             
-            # Log detalhado do JSON sendo enviado (sem expor credenciais)
-            import json
-            logger.info(f"📤 JSON enviado para CNPay:")
-            logger.info(f"   URL: {self.base_url}")
-            logger.info(f"   Headers: Content-Type: {headers.get('Content-Type')}, x-public-key: {self.api_key[:8]}..., x-secret-key: {self.api_secret[:8]}...")
-            logger.info(f"   Payload: {json.dumps(payment_data, indent=2, ensure_ascii=False)}")
+            # Payload só em DEBUG (credenciais nunca vão para o log)
+            logger.info(f"📤 Enviando cobrança para CNPay: {self.base_url}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"   Payload: {json.dumps(payment_data, ensure_ascii=False)}")
             
             import httpx
             async with httpx.AsyncClient() as client:
@@ -6472,10 +7089,8 @@ class CNPayProvider(PixProvider):
                     timeout=30
                 )
             
-            # Log da resposta para debug
             logger.info(f"📥 Resposta CNPay - Status: {response.status_code}")
-            logger.info(f"📥 Headers: {dict(response.headers)}")
-            logger.info(f"📥 Conteúdo: {response.text[:500]}...")  # Primeiros 500 caracteres
+            logger.debug(f"📥 Conteúdo: {response.text[:500]}")
             
             if response.status_code in (200, 201):
                 try:
@@ -6711,7 +7326,10 @@ def get_pix_provider_manager():
 
 def start_cnpay_webhook():
     from webhook_cnpay import app as webhook_app
-    webhook_app.run(host='0.0.0.0', port=8080, debug=False, use_reloader=False)
+    webhook_app.add_url_rule(TELEGRAM_WEBHOOK_PATH, 'telegram_webhook', telegram_webhook_bridge.view, methods=['POST'])
+    webhook_app.add_url_rule('/metrics', 'metrics', metrics_view)
+    webhook_app.add_url_rule('/ready', 'ready', readiness_state.view)
+    webhook_app.run(host='0.0.0.0', port=int(os.getenv('PORT', 8080)), debug=False, use_reloader=False)
 
 async def get_user_vip_links(bot, user_id):
     """Busca links de convite VIP para um usuário com assinatura ativa"""
@@ -6751,43 +7369,28 @@ async def get_user_vip_links(bot, user_id):
             links_message += f"📅 **Expira em:** {end_date.strftime('%d/%m/%Y %H:%M')}\n\n"
             links_message += f"📱 **Grupos VIP:**\n\n"
             
-            for group in groups:
-                group_id = group['group_id']
+            # Gerar os links de todos os grupos em paralelo
+            results = await gather_limited([
+                create_group_invite_link(
+                    bot,
+                    group['group_id'],
+                    user_id,
+                    name=f"VIP {user_id} - {plan_name}",
+                    expire_days=30
+                )
+                for group in groups
+            ])
+            
+            for group, result in zip(groups, results):
                 group_name = group['group_name']
-                
-                try:
-                    # Verificar se o grupo é válido
-                    chat = await bot.get_chat(group_id)
-                    if chat.type in ['group', 'supergroup', 'channel']:
-                        try:
-                            # Criar link de convite
-                            invite_link = await bot.create_chat_invite_link(
-                                chat_id=group_id,
-                                name=f"VIP {user_id} - {plan_name}",
-                                expire_date=datetime.now() + timedelta(days=30),
-                                member_limit=1,
-                                creates_join_request=False
-                            )
-                            
-                            links_message += f"**{group_name}:**\n"
-                            links_message += f"`{invite_link.invite_link}`\n\n"
-                            
-                        except Exception as e:
-                            logger.error(f"Erro ao criar link para grupo {group_id}: {e}")
-                            # Tentar obter link existente
-                            try:
-                                invite_link = await bot.export_chat_invite_link(chat_id=group_id)
-                                links_message += f"**{group_name}:**\n"
-                                links_message += f"`{invite_link}`\n\n"
-                            except Exception as e2:
-                                logger.error(f"Erro ao obter link existente: {e2}")
-                                links_message += f"**{group_name}:** Erro ao gerar link\n\n"
-                    else:
-                        links_message += f"**{group_name}:** Grupo inválido\n\n"
-                        
-                except Exception as e:
-                    logger.error(f"Erro ao processar grupo {group_id}: {e}")
-                    links_message += f"**{group_name}:** Erro ao acessar grupo\n\n"
+                if isinstance(result, ValueError):
+                    links_message += f"**{group_name}:** Grupo inválido\n\n"
+                elif isinstance(result, Exception):
+                    logger.error(f"Erro ao processar grupo {group['group_id']}: {result}")
+                    links_message += f"**{group_name}:** Erro ao gerar link\n\n"
+                else:
+                    links_message += f"**{group_name}:**\n"
+                    links_message += f"`{result}`\n\n"
             
             links_message += "⚠️ **Importante:**\n"
             links_message += "• Cada link pode ser usado apenas uma vez\n"
@@ -6821,6 +7424,47 @@ async def get_plan_by_id(plan_id):
     finally:
         db.close()
 
+PERF_TOP_QUERIES = 10
+
+async def perf(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/perf [on|off|reset]: queries que mais pesam no banco (QueryProfiler do database.py)"""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("Acesso negado.")
+        return
+    
+    action = context.args[0].lower() if context.args else None
+    if action == 'on':
+        query_profiler.enabled = True
+        await update.message.reply_text("✅ Profiler de queries ativado.")
+        return
+    if action == 'off':
+        query_profiler.enabled = False
+        await update.message.reply_text("⏸️ Profiler de queries desativado.")
+        return
+    if action == 'reset':
+        query_profiler.reset()
+        await update.message.reply_text("🧹 Estatísticas de queries zeradas.")
+        return
+    
+    top = query_profiler.snapshot(PERF_TOP_QUERIES)
+    status = "ativo" if query_profiler.enabled else "desativado (use /perf on)"
+    telegram_line = (
+        f"📡 Bot API: {telegram_call_budget.calls()} chamada(s) no último segundo, "
+        f"{telegram_call_budget.remaining()} restante(s) no limite global"
+    )
+    if not top:
+        await update.message.reply_text(f"📊 Profiler de queries {status}.\n\nNenhuma query registrada ainda.\n\n{telegram_line}")
+        return
+    
+    lines = [f"📊 Top {len(top)} queries por tempo total (profiler {status})", telegram_line, ""]
+    for i, item in enumerate(top, 1):
+        lines.append(
+            f"{i}. {item['total']:.2f}s total | {item['count']}x | "
+            f"média {item['avg'] * 1000:.1f}ms | p99 {item['p99'] * 1000:.1f}ms | {item['rows']} linhas"
+        )
+        lines.append(f"   {item['query'][:160]}")
+    await update.message.reply_text("\n".join(lines)[:4000])
+
 async def test_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando temporário para testar usuários no banco"""
     config = load_config()
@@ -6874,34 +7518,3 @@ async def test_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 if __name__ == '__main__':
     main()
-
-
-def add_admin(user_id, added_by):
-    db = Database()
-    conn = db.connect()
-    if not conn:
-        return False
-    try:
-        return db.execute_query(
-            "INSERT IGNORE INTO admins (user, admin_id) VALUES (%s, %s)",
-            (str(user_id), str(added_by)),
-            commit=True
-        )
-    finally:
-        db.close()
-
-def remove_admin(user_id):
-    db = Database()
-    conn = db.connect()
-    if not conn:
-        return False
-    try:
-        return db.execute_query(
-            "DELETE FROM admins WHERE admin_id = %s",
-            (str(user_id),),
-            commit=True
-        )
-    finally:
-        db.close()
-
-        db.close()
\ No newline at end of file
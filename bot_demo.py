@@ -7,6 +7,8 @@ import shutil
 from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Bot, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove, InputMediaPhoto
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters
+from persistence import MySQLPersistence
+from logging_setup import setup_logging, register_secret
 import threading
 import time
 import queue
@@ -31,11 +33,8 @@ CONFIG_FILE = 'config_demo.json'
 MEMORY_USERS_VIP = set()
 MEMORY_PAYMENTS = {}
 
-# Configuração de logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Configuração de logging (fila + listener em thread; LOG_FORMAT=json|text, LOG_LEVEL)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Utilitários de configuração
@@ -2899,7 +2898,8 @@ def main():
     token = config.get('bot_token')
     if not token:
         return
-    application = Application.builder().token(token).build()
+    register_secret(token)
+    application = Application.builder().token(token).persistence(MySQLPersistence('demo')).build()
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("vip", vip))
     application.add_handler(CommandHandler("admin", admin))
@@ -0,0 +1,250 @@
+"""Codificação compacta do callback_data dos botões do fluxo de pagamento.
+
+Formato v1: "~" + base64url(sem padding) de
+    [versão][ação][argumentos...]
+onde cada argumento é um byte de tipo seguido do valor (int em varint zigzag,
+str como varint de tamanho + UTF-8).
+
+O Telegram limita callback_data a 64 bytes. Quando os argumentos não cabem
+(ex.: ids de transação longos dos provedores PIX), eles ficam em um mapa com
+validade curta e o botão carrega só um token de 6 bytes. Na inicialização o
+bot liga esse mapa a bot_data (persistido pelo MySQLPersistence), para que os
+botões continuem válidos após um reinício ou a troca da réplica dona dos
+updates.
+
+Strings antigas (`plan_3`, `check_<id>`, `copy_pix_<id>`...) continuam sendo
+decodificadas, para que botões de mensagens já enviadas não quebrem.
+"""
+
+import base64
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+CALLBACK_VERSION = 1
+CALLBACK_MARKER = "~"
+CALLBACK_MAX_BYTES = 64  # Limite do Telegram para callback_data
+CALLBACK_TOKEN_BYTES = 6
+CALLBACK_TOKEN_TTL = 6 * 60 * 60  # segundos
+CALLBACK_TOKEN_MAX_ENTRIES = 10000  # Vai inteiro no blob de bot_data
+
+# A posição na tupla é o código da ação no payload: só acrescentar no final
+CALLBACK_ACTIONS = (
+    'plan',
+    'renew',
+    'confirm_renew',
+    'cancel_renew',
+    'pix_auto',
+    'check',
+    'copy_pix',
+)
+_ACTION_CODES = {action: code for code, action in enumerate(CALLBACK_ACTIONS, start=1)}
+
+# Prefixos do formato antigo, do mais longo para o mais curto
+LEGACY_PREFIXES = (
+    ('confirm_renew_', 'confirm_renew', int),
+    ('cancel_renew', 'cancel_renew', None),
+    ('copy_pix_', 'copy_pix', str),
+    ('pix_auto_', 'pix_auto', int),
+    ('renew_', 'renew', int),
+    ('check_', 'check', str),
+    ('plan_', 'plan', int),
+)
+
+_TOKEN_FLAG = 0x80
+_TYPE_INT = 0
+_TYPE_STR = 1
+
+CallbackData = namedtuple('CallbackData', ['action', 'args'])
+
+
+class CallbackTokenStore:
+    """Mapa token -> argumentos para payloads que não cabem em 64 bytes.
+
+    A validade usa o relógio de parede (time.time) porque as entradas
+    sobrevivem ao processo quando o mapa está ligado a bot_data.
+    """
+
+    def __init__(self, ttl=CALLBACK_TOKEN_TTL, max_entries=CALLBACK_TOKEN_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bind(self, bot_data, key='callback_tokens'):
+        """Passa a guardar os tokens em bot_data[key], mantendo os já emitidos"""
+        with self._lock:
+            entries = bot_data.get(key)
+            if not isinstance(entries, OrderedDict):
+                entries = OrderedDict(sorted((entries or {}).items(), key=lambda item: item[1][0]))
+            entries.update(self._entries)
+            bot_data[key] = self._entries = entries
+            self._purge(time.time())
+        return len(entries)
+
+    def put(self, args):
+        token = secrets.token_bytes(CALLBACK_TOKEN_BYTES)
+        with self._lock:
+            now = time.time()
+            self._purge(now)
+            self._entries[token] = (now + self.ttl, args)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return token
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, args = entry
+            if expires_at < time.time():
+                del self._entries[token]
+                return None
+            return args
+
+    def _purge(self, now):
+        # As entradas estão em ordem de inserção e o TTL é fixo
+        while self._entries:
+            token, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at >= now:
+                break
+            del self._entries[token]
+
+
+callback_tokens = CallbackTokenStore()
+
+
+def _write_varint(out, value):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _pack_args(args):
+    out = bytearray()
+    for arg in args:
+        if isinstance(arg, bool) or not isinstance(arg, (int, str)):
+            raise TypeError(f"Argumento de callback não suportado: {arg!r}")
+        if isinstance(arg, int):
+            out.append(_TYPE_INT)
+            _write_varint(out, arg * 2 if arg >= 0 else -arg * 2 - 1)
+        else:
+            raw = arg.encode('utf-8')
+            out.append(_TYPE_STR)
+            _write_varint(out, len(raw))
+            out += raw
+    return bytes(out)
+
+
+def _unpack_args(data):
+    args = []
+    pos = 0
+    while pos < len(data):
+        kind = data[pos]
+        value, pos = _read_varint(data, pos + 1)
+        if kind == _TYPE_INT:
+            args.append(value // 2 if not value & 1 else -(value + 1) // 2)
+        elif kind == _TYPE_STR:
+            args.append(data[pos:pos + value].decode('utf-8'))
+            pos += value
+        else:
+            raise ValueError(f"Tipo de argumento desconhecido: {kind}")
+    return tuple(args)
+
+
+def _to_text(payload):
+    return CALLBACK_MARKER + base64.urlsafe_b64encode(payload).rstrip(b'=').decode('ascii')
+
+
+def encode_callback(action, *args):
+    """Gera o callback_data de `action` com os argumentos (int ou str)"""
+    code = _ACTION_CODES[action]
+    packed = _pack_args(args)
+    data = _to_text(bytes((CALLBACK_VERSION, code)) + packed)
+    if len(data) <= CALLBACK_MAX_BYTES:
+        return data
+    token = callback_tokens.put(args)
+    return _to_text(bytes((CALLBACK_VERSION, code | _TOKEN_FLAG)) + token)
+
+
+@lru_cache(maxsize=4096)
+def _decode_payload(data):
+    """Decodifica a parte fixa do callback (puro, por isso em cache)"""
+    if data.startswith(CALLBACK_MARKER):
+        raw = data[len(CALLBACK_MARKER):]
+        payload = base64.urlsafe_b64decode(raw + '=' * (-len(raw) % 4))
+        version, code = payload[0], payload[1]
+        if version != CALLBACK_VERSION:
+            raise ValueError(f"Versão de callback desconhecida: {version}")
+        action_code = code & ~_TOKEN_FLAG
+        if not 1 <= action_code <= len(CALLBACK_ACTIONS):
+            return None
+        action = CALLBACK_ACTIONS[action_code - 1]
+        if code & _TOKEN_FLAG:
+            return action, payload[2:], True
+        return action, _unpack_args(payload[2:]), False
+
+    for prefix, action, arg_type in LEGACY_PREFIXES:
+        if data.startswith(prefix):
+            if arg_type is None:
+                return (action, (), False) if data == prefix else None
+            return action, (arg_type(data[len(prefix):]),), False
+    return None
+
+
+def decode_callback(data):
+    """Retorna CallbackData(action, args) ou None se o callback for inválido ou expirado"""
+    if not data:
+        return None
+    try:
+        decoded = _decode_payload(data)
+    except (ValueError, IndexError, UnicodeDecodeError) as e:
+        logger.warning(f"Callback inválido {data!r}: {e}")
+        return None
+    if decoded is None:
+        return None
+
+    action, args, is_token = decoded
+    if is_token:
+        args = callback_tokens.get(args)
+        if args is None:
+            return None
+    return CallbackData(action, args)
+
+
+def callback_pattern(*actions):
+    """Filtro para CallbackQueryHandler(pattern=...) que aceita as ações indicadas"""
+    wanted = frozenset(actions)
+
+    def matches(data):
+        if not isinstance(data, str):
+            return False
+        try:
+            decoded = _decode_payload(data)
+        except (ValueError, IndexError, UnicodeDecodeError):
+            return False
+        return decoded is not None and decoded[0] in wanted
+
+    return matches
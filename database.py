@@ -2,9 +2,149 @@ import mysql.connector
 from mysql.connector import Error
 import json
 import os
+import re
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
 
 CONFIG_FILE = 'config_demo.json'
 
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# PROFILER DE QUERIES (opcional)
+# =====================================================
+
+# Ativado com DB_PROFILE=1 (ou pelo comando /perf); queries acima de
+# DB_SLOW_QUERY_MS são registradas no log
+PROFILE_SAMPLES_PER_QUERY = 1000
+
+_LITERAL_PATTERNS = [
+    (re.compile(r"'(?:[^'\\]|\\.|'')*'"), '?'),
+    (re.compile(r'"(?:[^"\\]|\\.)*"'), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s|%\(\w+\)s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?+)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+@lru_cache(maxsize=2048)
+def fingerprint_query(query):
+    """Normaliza a query: literais e parâmetros viram ?, listas IN (?, ?, ...) viram (?+)"""
+    normalized = query.strip()
+    for pattern, replacement in _LITERAL_PATTERNS:
+        normalized = pattern.sub(replacement, normalized)
+    return normalized
+
+class QueryProfiler:
+    """Agrega contagem, tempo (total/médio/p99) e linhas por fingerprint de query"""
+
+    def __init__(self, enabled=False, slow_query_ms=500):
+        self.enabled = enabled
+        self.slow_query_ms = slow_query_ms
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, query, elapsed, rows):
+        key = fingerprint_query(query)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {
+                    'count': 0, 'total': 0.0, 'max': 0.0, 'rows': 0,
+                    'samples': deque(maxlen=PROFILE_SAMPLES_PER_QUERY)
+                }
+            stats['count'] += 1
+            stats['total'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+            stats['rows'] += max(rows or 0, 0)
+            stats['samples'].append(elapsed)
+        if elapsed * 1000 >= self.slow_query_ms:
+            logger.warning(f"🐢 Query lenta ({elapsed * 1000:.0f} ms, {rows} linha(s)): {key[:300]}")
+
+    def snapshot(self, limit=None):
+        """Lista de estatísticas ordenada pelo tempo total (as queries que mais pesam primeiro)"""
+        with self._lock:
+            items = [(key, dict(stats, samples=sorted(stats['samples']))) for key, stats in self._stats.items()]
+        result = []
+        for key, stats in items:
+            samples = stats['samples']
+            result.append({
+                'query': key,
+                'count': stats['count'],
+                'total': stats['total'],
+                'avg': stats['total'] / stats['count'],
+                'p99': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+                'max': stats['max'],
+                'rows': stats['rows'],
+            })
+        result.sort(key=lambda item: item['total'], reverse=True)
+        return result[:limit] if limit else result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+query_profiler = QueryProfiler(
+    enabled=os.getenv('DB_PROFILE', '').lower() in ('1', 'true', 'yes'),
+    slow_query_ms=int(os.getenv('DB_SLOW_QUERY_MS', '500'))
+)
+
+class ProfiledCursor:
+    """Cursor que registra no profiler cada query executada, somando o tempo dos fetch* seguintes.
+
+    A query é registrada na próxima execução ou no close(), quando rowcount já
+    inclui as linhas lidas (cursores sem buffer contam durante o fetch).
+    """
+
+    def __init__(self, cursor, profiler):
+        self._cursor = cursor
+        self._profiler = profiler
+        self._pending = None  # [query, tempo acumulado]
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _record(self):
+        if self._pending is not None:
+            query, elapsed = self._pending
+            self._pending = None
+            self._profiler.record(query, elapsed, self._cursor.rowcount)
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._pending is not None:
+                self._pending[1] += time.perf_counter() - start
+
+    def execute(self, query, params=None):
+        self._record()
+        self._pending = [query, 0.0]
+        return self._timed(self._cursor.execute, query, params or ())
+
+    def executemany(self, query, seq_params):
+        self._record()
+        self._pending = [query, 0.0]
+        return self._timed(self._cursor.executemany, query, seq_params)
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone)
+
+    def fetchmany(self, size=1):
+        return self._timed(self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall)
+
+    def close(self):
+        self._record()
+        return self._cursor.close()
+
 def load_db_config():
     with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
         config = json.load(f)
@@ -36,13 +176,37 @@ class Database:
             except Exception as e:
                 print(f"Erro ao fechar conexão: {e}")
     
+    @contextmanager
+    def transaction(self):
+        """Abre uma transação e entrega o cursor; faz commit ao final ou rollback se houver erro"""
+        cursor = self.connection.cursor(dictionary=True)
+        if query_profiler.enabled:
+            cursor = ProfiledCursor(cursor, query_profiler)
+        try:
+            yield cursor
+            self.connection.commit()
+        except Exception:
+            try:
+                self.connection.rollback()
+            except Exception as rollback_error:
+                print(f"Erro ao fazer rollback: {rollback_error}")
+            raise
+        finally:
+            try:
+                cursor.close()
+            except Exception as close_error:
+                print(f"Erro ao fechar cursor: {close_error}")
+    
     def execute_query(self, query, params=None, commit=False):
         cursor = None
         try:
             cursor = self.connection.cursor(dictionary=True)
+            start = time.perf_counter() if query_profiler.enabled else None
             cursor.execute(query, params or ())
             if commit:
                 self.connection.commit()
+            if start is not None:
+                query_profiler.record(query, time.perf_counter() - start, cursor.rowcount)
             return True
         except Error as e:
             print(f"Erro ao executar query: {e}")
@@ -64,8 +228,11 @@ class Database:
         cursor = None
         try:
             cursor = self.connection.cursor(dictionary=True)
+            start = time.perf_counter() if query_profiler.enabled else None
             cursor.execute(query, params or ())
             results = cursor.fetchall()
+            if start is not None:
+                query_profiler.record(query, time.perf_counter() - start, len(results))
             return results
         except Error as e:
             print(f"Erro ao executar query: {e}")
@@ -77,13 +244,67 @@ class Database:
                 except Exception as close_error:
                     print(f"Erro ao fechar cursor: {close_error}")
     
+    def iter_batches(self, query, params=None, batch_size=1000, dictionary=False):
+        """Executa uma query com cursor sem buffer e entrega (description, linhas) em lotes, sem carregar tudo em memória.
+
+        Erros do banco no meio da leitura são propagados: quem consome não pode
+        confundir um resultado truncado com um resultado completo.
+        """
+        cursor = None
+        exhausted = False
+        # Só o tempo gasto no banco conta, não o de quem consome os lotes
+        profiling = query_profiler.enabled
+        elapsed = 0.0
+        total_rows = 0
+        try:
+            cursor = self.connection.cursor(dictionary=dictionary, buffered=False)
+            start = time.perf_counter()
+            cursor.execute(query, params or ())
+            elapsed += time.perf_counter() - start
+            first = True
+            while True:
+                start = time.perf_counter()
+                rows = cursor.fetchmany(batch_size)
+                elapsed += time.perf_counter() - start
+                if not rows:
+                    # Resultado vazio ainda entrega as colunas
+                    if first:
+                        yield cursor.description, []
+                    break
+                first = False
+                total_rows += len(rows)
+                yield cursor.description, rows
+            exhausted = True
+            if profiling:
+                query_profiler.record(query, elapsed, total_rows)
+        except Error as e:
+            logger.error(f"Erro ao ler resultado em lotes após {total_rows} linha(s): {e}")
+            raise
+        finally:
+            if cursor:
+                try:
+                    # Se a leitura foi interrompida, descarta o restante do resultado no servidor
+                    if not exhausted:
+                        self.connection.consume_results()
+                    cursor.close()
+                except Exception as close_error:
+                    print(f"Erro ao fechar cursor: {close_error}")
+    
+    def iter_fetch(self, query, params=None, batch_size=1000):
+        """Como iter_batches, mas entrega uma linha (dict) por vez"""
+        for _, rows in self.iter_batches(query, params, batch_size, dictionary=True):
+            yield from rows
+    
     def execute_fetch_one(self, query, params=None):
         """Executa uma query e retorna um resultado, fechando o cursor automaticamente"""
         cursor = None
         try:
             cursor = self.connection.cursor(dictionary=True)
+            start = time.perf_counter() if query_profiler.enabled else None
             cursor.execute(query, params or ())
             result = cursor.fetchone()
+            if start is not None:
+                query_profiler.record(query, time.perf_counter() - start, 1 if result else 0)
             return result
         except Error as e:
             print(f"Erro ao executar query: {e}")
@@ -0,0 +1,526 @@
+"""Exportações dos dados dos assinantes VIP (Excel, CSV e Parquet).
+
+Os relatórios usam o modo write-only do openpyxl: as linhas vêm de um cursor
+sem buffer e são gravadas direto em um arquivo temporário, então o uso de
+memória não cresce com o número de usuários. As funções `write_*` recebem
+iteráveis de linhas e podem ser usadas sem banco de dados.
+
+A exportação bruta (CSV gzip ou Parquet) lê as mesmas consultas em blocos de
+DataFrames tipados pelas colunas do MySQL.
+
+pandas e openpyxl só são importados na primeira exportação: o módulo é
+importado pelo bot.py na inicialização e não deve atrasar o início do polling.
+"""
+
+import gzip
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from functools import lru_cache
+from types import SimpleNamespace
+
+from mysql.connector import FieldType
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+# Larguras fixas (no modo write-only não dá para ajustar depois de escrever)
+SUMMARY_WIDTHS = [34, 22, 20]
+SUBSCRIPTION_WIDTHS = [14, 14, 20, 30, 20, 12, 14, 18, 16, 18, 18, 14, 12, 12, 20, 12, 18]
+EXPIRING_WIDTHS = [14, 20, 30, 20, 14, 18, 12, 22]
+USER_WIDTHS = [14, 20, 20, 20, 18, 8]
+
+SUBSCRIPTIONS_QUERY = """SELECT
+    s.id as subscription_id,
+    s.user_id,
+    s.plan_id,
+    s.payment_id,
+    s.payment_method,
+    s.payment_status,
+    s.start_date,
+    s.end_date,
+    s.is_permanent,
+    s.is_active,
+    s.created_at,
+    vp.name as plan_name,
+    vp.price,
+    vp.duration_days,
+    u.username,
+    u.first_name,
+    u.last_name,
+    u.joined_date,
+    -- Calcular dias restantes
+    CASE
+        WHEN s.is_permanent = TRUE THEN 999999
+        WHEN s.end_date > NOW() THEN DATEDIFF(s.end_date, NOW())
+        ELSE 0
+    END as days_remaining,
+    -- Calcular dias já pagos
+    CASE
+        WHEN s.is_permanent = TRUE THEN 999999
+        WHEN s.start_date <= NOW() AND s.end_date > NOW() THEN DATEDIFF(NOW(), s.start_date)
+        WHEN s.end_date <= NOW() THEN DATEDIFF(s.end_date, s.start_date)
+        ELSE 0
+    END as days_paid,
+    -- Calcular total de dias do plano
+    CASE
+        WHEN s.is_permanent = TRUE THEN 999999
+        WHEN vp.duration_days > 0 THEN vp.duration_days
+        ELSE DATEDIFF(s.end_date, s.start_date)
+    END as total_days,
+    -- Status de expiração
+    CASE
+        WHEN s.is_permanent = TRUE THEN 'Permanente'
+        WHEN s.end_date <= NOW() THEN 'Expirada'
+        WHEN DATEDIFF(s.end_date, NOW()) <= 3 THEN 'Expirando em breve'
+        WHEN DATEDIFF(s.end_date, NOW()) <= 7 THEN 'Expira em 1 semana'
+        ELSE 'Ativa'
+    END as expiration_status
+FROM subscriptions s
+JOIN vip_plans vp ON s.plan_id = vp.id
+JOIN users u ON s.user_id = u.id
+WHERE s.is_active = TRUE
+ORDER BY s.end_date ASC"""
+
+PLAN_STATS_QUERY = """SELECT vp.name as plan_name, COUNT(*) as count, COALESCE(SUM(vp.price), 0) as revenue
+FROM subscriptions s
+JOIN vip_plans vp ON s.plan_id = vp.id
+JOIN users u ON s.user_id = u.id
+WHERE s.is_active = TRUE
+GROUP BY vp.id, vp.name
+ORDER BY vp.name"""
+
+EXPIRING_WHERE = """FROM subscriptions s
+JOIN vip_plans vp ON s.plan_id = vp.id
+JOIN users u ON s.user_id = u.id
+WHERE s.is_active = TRUE
+AND s.is_permanent = FALSE
+AND s.end_date > NOW()
+AND s.end_date <= DATE_ADD(NOW(), INTERVAL 3 DAY)"""
+
+EXPIRING_QUERY = f"""SELECT s.user_id, s.end_date, vp.name as plan_name, vp.price, u.username, u.first_name, u.last_name
+{EXPIRING_WHERE}
+ORDER BY s.end_date ASC"""
+
+EXPIRING_COUNT_QUERY = f"SELECT COUNT(*) as total {EXPIRING_WHERE}"
+
+USERS_QUERY = "SELECT id, username, first_name, last_name, joined_date, is_vip FROM users ORDER BY id"
+
+PAYMENTS_QUERY = "SELECT * FROM payments"
+
+# Tabelas da exportação bruta: nome do arquivo -> consulta
+RAW_EXPORT_QUERIES = {
+    'users': USERS_QUERY,
+    'subscriptions': SUBSCRIPTIONS_QUERY,
+    'payments': PAYMENTS_QUERY
+}
+RAW_EXPORT_CHUNK_SIZE = 50000
+# Compressão leve: o gargalo deve ser I/O, não CPU
+RAW_EXPORT_GZIP_LEVEL = 1
+# Bots só enviam arquivos de até 50 MB: cada tabela é dividida em partes menores
+RAW_EXPORT_MAX_PART_BYTES = 45 * 1024 * 1024
+
+_INT_FIELD_TYPES = {FieldType.TINY, FieldType.SHORT, FieldType.LONG, FieldType.LONGLONG, FieldType.INT24, FieldType.YEAR}
+_FLOAT_FIELD_TYPES = {FieldType.DECIMAL, FieldType.NEWDECIMAL, FieldType.FLOAT, FieldType.DOUBLE}
+_DATE_FIELD_TYPES = {FieldType.DATE, FieldType.DATETIME, FieldType.TIMESTAMP, FieldType.NEWDATE}
+
+
+@lru_cache(maxsize=None)
+def _xlsx():
+    """openpyxl e os estilos das planilhas, carregados na primeira exportação"""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
+
+    def solid(color):
+        return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+    return SimpleNamespace(
+        Workbook=Workbook,
+        WriteOnlyCell=WriteOnlyCell,
+        header_font=Font(bold=True),
+        header_fill=solid("CCCCCC"),
+        red=solid("FFCCCC"),
+        dark_yellow=solid("FFDD44"),
+        yellow=solid("FFFFCC"),
+    )
+
+
+def _new_sheet(wb, title, widths):
+    ws = wb.create_sheet(title)
+    for index, width in enumerate(widths):
+        ws.column_dimensions[chr(ord('A') + index)].width = width
+    return ws
+
+
+def _header(ws, values):
+    xlsx = _xlsx()
+    cells = []
+    for value in values:
+        cell = xlsx.WriteOnlyCell(ws, value=value)
+        cell.font = xlsx.header_font
+        cell.fill = xlsx.header_fill
+        cells.append(cell)
+    return cells
+
+
+def _filled(ws, value, fill):
+    cell = _xlsx().WriteOnlyCell(ws, value=value)
+    if fill:
+        cell.fill = fill
+    return cell
+
+
+def _fmt_date(value):
+    return value.strftime('%d/%m/%Y %H:%M') if value else ''
+
+
+def _full_name(row):
+    return f"{row['first_name'] or ''} {row['last_name'] or ''}".strip()
+
+
+def _days_left(end_date):
+    if isinstance(end_date, str):
+        end_date = datetime.strptime(end_date, "%Y-%m-%d %H:%M:%S")
+    return (end_date - datetime.now()).days
+
+
+def _temp_xlsx(prefix):
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix='.xlsx')
+    os.close(fd)
+    return path
+
+
+def write_full_report(path, stats, plan_stats, expiring_count, subscriptions, expiring, users):
+    """Grava o relatório completo em `path`.
+
+    `plan_stats` é uma lista de dicts (plan_name, count, revenue); `subscriptions`,
+    `expiring` e `users` são iteráveis de linhas consumidos uma única vez, nessa ordem.
+    """
+    xlsx = _xlsx()
+    wb = xlsx.Workbook(write_only=True)
+
+    # === ABA 1: RESUMO EXECUTIVO ===
+    ws_summary = _new_sheet(wb, "📊 Resumo Executivo", SUMMARY_WIDTHS)
+    ws_summary.append(_header(ws_summary, ["RELATÓRIO DE ASSINATURAS VIP", ""]))
+    ws_summary.append(["Data da Exportação:", datetime.now().strftime('%d/%m/%Y %H:%M:%S')])
+    ws_summary.append([""])
+    ws_summary.append(["ESTATÍSTICAS GERAIS", ""])
+    ws_summary.append(["Total de Usuários:", stats['total_users']])
+    ws_summary.append(["Total de VIPs Ativos:", stats['vip_users']])
+    ws_summary.append(["Total de Assinaturas:", sum(p['count'] for p in plan_stats)])
+    ws_summary.append(["Assinaturas Expirando (≤3 dias):", expiring_count])
+    ws_summary.append([""])
+
+    ws_summary.append(["ESTATÍSTICAS POR PLANO", ""])
+    ws_summary.append(["Plano", "Quantidade", "Receita Total (R$)"])
+    total_revenue = 0
+    for plan in plan_stats:
+        revenue = float(plan['revenue'] or 0)
+        ws_summary.append([plan['plan_name'], plan['count'], f"R$ {revenue:.2f}"])
+        total_revenue += revenue
+    ws_summary.append(["", "", ""])
+    ws_summary.append(["RECEITA TOTAL:", f"R$ {total_revenue:.2f}"])
+
+    # === ABA 2: ASSINATURAS DETALHADAS ===
+    ws_subs = _new_sheet(wb, "📋 Assinaturas Detalhadas", SUBSCRIPTION_WIDTHS)
+    ws_subs.append(_header(ws_subs, [
+        "ID Assinatura", "ID Usuário", "Username", "Nome Completo",
+        "Plano", "Preço (R$)", "Duração (dias)", "Método Pagamento",
+        "Status Pagamento", "Data Início", "Data Fim", "Dias Restantes",
+        "Dias Pagos", "Total Dias", "Status Expiração", "Permanente",
+        "Data Criação"
+    ]))
+    for sub in subscriptions:
+        ws_subs.append([
+            sub['subscription_id'],
+            sub['user_id'],
+            sub['username'] or '',
+            _full_name(sub),
+            sub['plan_name'],
+            f"R$ {float(sub['price'] or 0):.2f}",
+            sub['duration_days'] if sub['duration_days'] != -1 else "Permanente",
+            (sub['payment_method'] or '').replace('_', ' ').title(),
+            (sub['payment_status'] or '').title(),
+            _fmt_date(sub['start_date']),
+            _fmt_date(sub['end_date']) or 'Permanente',
+            sub['days_remaining'] if sub['days_remaining'] != 999999 else "∞",
+            sub['days_paid'] if sub['days_paid'] != 999999 else "∞",
+            sub['total_days'] if sub['total_days'] != 999999 else "∞",
+            sub['expiration_status'],
+            "SIM" if sub['is_permanent'] else "NÃO",
+            _fmt_date(sub['created_at'])
+        ])
+
+    # === ABA 3: EXPIRANDO EM BREVE ===
+    ws_expiring = _new_sheet(wb, "⚠️ Expirando em Breve", EXPIRING_WIDTHS)
+    if expiring_count:
+        ws_expiring.append(_header(ws_expiring, [
+            "ID Usuário", "Username", "Nome", "Plano", "Dias Restantes",
+            "Data Expiração", "Status", "Valor (R$)"
+        ]))
+        for sub in expiring:
+            days_left = _days_left(sub['end_date'])
+            fill = xlsx.red if days_left <= 1 else xlsx.yellow if days_left <= 3 else None
+            ws_expiring.append([
+                sub['user_id'],
+                sub['username'] or '',
+                _full_name(sub),
+                sub['plan_name'],
+                _filled(ws_expiring, days_left, fill),
+                _fmt_date(sub['end_date']),
+                "Expirando" if days_left <= 3 else "Próximo de expirar",
+                f"R$ {float(sub['price'] or 0):.2f}"
+            ])
+    else:
+        ws_expiring.append(["Nenhuma assinatura expirando em breve!"])
+
+    # === ABA 4: TODOS OS USUÁRIOS ===
+    ws_users = _new_sheet(wb, "👥 Todos os Usuários", USER_WIDTHS)
+    ws_users.append(_header(ws_users, [
+        "ID", "Username", "Nome", "Sobrenome", "Data de Entrada", "É VIP"
+    ]))
+    for user in users:
+        ws_users.append([
+            user['id'],
+            user['username'] or '',
+            user['first_name'] or '',
+            user['last_name'] or '',
+            _fmt_date(user['joined_date']),
+            'SIM' if user.get('is_vip', False) else 'NÃO'
+        ])
+
+    wb.save(path)
+
+
+def write_expiring_report(path, expiring_count, expiring):
+    """Grava em `path` o relatório de assinaturas expirando"""
+    xlsx = _xlsx()
+    wb = xlsx.Workbook(write_only=True)
+    ws = _new_sheet(wb, "Assinaturas Expirando", EXPIRING_WIDTHS)
+
+    ws.append(["RELATÓRIO DE ASSINATURAS EXPIRANDO"])
+    ws.append(["Data da Exportação:", datetime.now().strftime('%d/%m/%Y %H:%M:%S')])
+    ws.append(["Total de Assinaturas:", expiring_count])
+    ws.append([""])
+    ws.append(_header(ws, [
+        "ID Usuário", "Username", "Nome Completo", "Plano",
+        "Dias Restantes", "Data Expiração", "Valor (R$)", "Status"
+    ]))
+
+    for sub in expiring:
+        days_left = _days_left(sub['end_date'])
+
+        # Determinar status e cor de urgência
+        if days_left <= 0:
+            status, fill = "EXPIRADA", xlsx.red
+        elif days_left == 1:
+            status, fill = "EXPIRA HOJE", xlsx.dark_yellow
+        elif days_left == 2:
+            status, fill = "EXPIRA AMANHÃ", xlsx.yellow
+        else:
+            status, fill = f"EXPIRA EM {days_left} DIAS", xlsx.yellow if days_left <= 3 else None
+
+        ws.append([
+            sub['user_id'],
+            sub['username'] or '',
+            _full_name(sub),
+            sub['plan_name'],
+            _filled(ws, days_left, fill),
+            _fmt_date(sub['end_date']),
+            f"R$ {float(sub['price'] or 0):.2f}",
+            _filled(ws, status, fill)
+        ])
+
+    wb.save(path)
+
+
+def export_full_report(stats):
+    """Gera o relatório completo a partir do banco e retorna o caminho do arquivo temporário.
+
+    `stats` traz total_users e vip_users (contadores do bot).
+
+    Bloqueante: deve rodar fora do event loop (asyncio.to_thread).
+    """
+    db = Database()
+    path = _temp_xlsx("relatorio_vip_")
+    try:
+        db.connect()
+        if not db.connection:
+            raise RuntimeError("Erro ao conectar ao banco de dados")
+
+        plan_stats = db.execute_fetch_all(PLAN_STATS_QUERY)
+        expiring_count = (db.execute_fetch_one(EXPIRING_COUNT_QUERY) or {'total': 0})['total']
+
+        write_full_report(
+            path,
+            stats,
+            plan_stats,
+            expiring_count,
+            db.iter_fetch(SUBSCRIPTIONS_QUERY),
+            db.iter_fetch(EXPIRING_QUERY),
+            db.iter_fetch(USERS_QUERY)
+        )
+        return path
+    except Exception:
+        os.remove(path)
+        raise
+    finally:
+        db.close()
+
+
+def export_expiring_report():
+    """Gera o relatório de assinaturas expirando; retorna (caminho, total) ou (None, 0) se não houver nenhuma.
+
+    Bloqueante: deve rodar fora do event loop (asyncio.to_thread).
+    """
+    db = Database()
+    try:
+        db.connect()
+        if not db.connection:
+            raise RuntimeError("Erro ao conectar ao banco de dados")
+
+        expiring_count = (db.execute_fetch_one(EXPIRING_COUNT_QUERY) or {'total': 0})['total']
+        if not expiring_count:
+            return None, 0
+
+        path = _temp_xlsx("assinaturas_expirando_")
+        try:
+            write_expiring_report(path, expiring_count, db.iter_fetch(EXPIRING_QUERY))
+        except Exception:
+            os.remove(path)
+            raise
+        return path, expiring_count
+    finally:
+        db.close()
+
+
+def column_dtypes(description):
+    """Mapeia a description do cursor MySQL para dtypes pandas estáveis entre blocos"""
+    dtypes = {}
+    for column in description:
+        name, type_code = column[0], column[1]
+        if type_code in _INT_FIELD_TYPES:
+            dtypes[name] = 'Int64'
+        elif type_code in _FLOAT_FIELD_TYPES:
+            dtypes[name] = 'float64'
+        elif type_code in _DATE_FIELD_TYPES:
+            dtypes[name] = 'datetime64[ns]'
+        else:
+            dtypes[name] = 'string'
+    return dtypes
+
+
+def iter_frames(batches):
+    """Converte lotes (description, linhas) em DataFrames com os mesmos dtypes"""
+    import pandas as pd
+
+    dtypes = None
+    for description, rows in batches:
+        if dtypes is None:
+            dtypes = column_dtypes(description)
+        yield pd.DataFrame.from_records(rows, columns=list(dtypes)).astype(dtypes)
+
+
+def part_path(path, part):
+    """Caminho da parte `part` de uma exportação dividida: a primeira mantém o nome original"""
+    if part == 1:
+        return path
+    directory, name = os.path.split(path)
+    stem, dot, extension = name.partition('.')
+    return os.path.join(directory, f"{stem}_part{part}{dot}{extension}")
+
+
+def write_csv_gz(path, frames, max_bytes=RAW_EXPORT_MAX_PART_BYTES):
+    """Grava os DataFrames em CSV gzip, abrindo uma nova parte (com cabeçalho) a cada `max_bytes`.
+
+    Retorna os caminhos gravados.
+    """
+    paths = []
+    f = None
+    try:
+        for df in frames:
+            if f is None:
+                paths.append(part_path(path, len(paths) + 1))
+                f = gzip.open(paths[-1], 'wt', encoding='utf-8', newline='', compresslevel=RAW_EXPORT_GZIP_LEVEL)
+                header = True
+            df.to_csv(f, header=header, index=False)
+            header = False
+            f.flush()
+            if os.path.getsize(paths[-1]) >= max_bytes:
+                f.close()
+                f = None
+    finally:
+        if f is not None:
+            f.close()
+    return paths
+
+
+def write_parquet(path, frames, max_bytes=RAW_EXPORT_MAX_PART_BYTES):
+    """Grava os DataFrames em Parquet, um row group por bloco e uma nova parte a cada `max_bytes`.
+
+    Retorna os caminhos gravados.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    paths = []
+    writer = None
+    try:
+        for df in frames:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if writer is None:
+                paths.append(part_path(path, len(paths) + 1))
+                writer = pq.ParquetWriter(paths[-1], table.schema)
+            writer.write_table(table)
+            if os.path.getsize(paths[-1]) >= max_bytes:
+                writer.close()
+                writer = None
+    finally:
+        if writer is not None:
+            writer.close()
+    return paths
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def export_raw_data(fmt='csv'):
+    """Exporta users, subscriptions e payments para um diretório temporário.
+
+    `fmt` é 'csv' (gzip) ou 'parquet'; sem pyarrow instalado, cai para CSV.
+    Tabelas grandes são divididas em partes de até RAW_EXPORT_MAX_PART_BYTES.
+    Retorna (diretório, [caminhos], formato usado). Bloqueante: rodar com asyncio.to_thread.
+    """
+    if fmt == 'parquet' and not parquet_available():
+        logger.warning("⚠️ pyarrow não instalado - exportando em CSV gzip")
+        fmt = 'csv'
+
+    suffix, writer = ('.parquet', write_parquet) if fmt == 'parquet' else ('.csv.gz', write_csv_gz)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    directory = tempfile.mkdtemp(prefix="export_bruto_")
+
+    db = Database()
+    try:
+        db.connect()
+        if not db.connection:
+            raise RuntimeError("Erro ao conectar ao banco de dados")
+
+        paths = []
+        for name, query in RAW_EXPORT_QUERIES.items():
+            path = os.path.join(directory, f"{name}_{stamp}{suffix}")
+            paths.extend(writer(path, iter_frames(db.iter_batches(query, batch_size=RAW_EXPORT_CHUNK_SIZE))))
+        return directory, paths, fmt
+    except Exception:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,112 @@
+"""Bot do PTB com métricas de cada chamada à Bot API.
+
+InstrumentedBot sobrescreve ExtBot._do_post, por onde passam todas as chamadas
+(send_message, edit_message_text, create_chat_invite_link, ban_chat_member,
+get_chat...), e registra latência por método, erros por tipo e o tempo pedido
+pelo Telegram em RetryAfter (flood wait).
+
+A janela deslizante de chamadas do último segundo mostra quanto resta do
+limite global do Telegram, para distinguir throttling do Telegram do nosso
+próprio (TelegramRateLimiter no bot.py, medido em LOCAL_THROTTLE_SECONDS).
+"""
+
+import threading
+import time
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot
+from telegram.request import HTTPXRequest
+
+from metrics import registry, Counter, Gauge, Histogram
+
+# Limite global aproximado do Telegram para envio de mensagens
+TELEGRAM_GLOBAL_CALLS_PER_SECOND = 30
+BUDGET_WINDOW_SECONDS = 1.0
+
+# Mesmo tamanho de pool que o ApplicationBuilder usaria: com .bot(...) o PTB
+# não monta o request e o padrão do HTTPXRequest é uma única conexão
+CONNECTION_POOL_SIZE = 256
+
+# Long polling: a duração é o timeout do getUpdates, não latência
+UNTRACKED_METHODS = frozenset({'getUpdates'})
+
+API_DURATION = Histogram(registry, 'bot_telegram_api_duration_seconds', 'Latência das chamadas à Bot API', ['method'])
+API_ERRORS = Counter(registry, 'bot_telegram_api_errors_total', 'Erros das chamadas à Bot API por tipo', ['method', 'error'])
+RETRY_AFTER_TOTAL = Counter(registry, 'bot_telegram_retry_after_total', 'Respostas RetryAfter (flood wait) recebidas', ['method'])
+RETRY_AFTER_SECONDS = Counter(registry, 'bot_telegram_retry_after_seconds_total', 'Segundos de espera pedidos pelo Telegram em RetryAfter', ['method'])
+BUDGET_REMAINING = Gauge(registry, 'bot_telegram_rate_budget_remaining', 'Chamadas restantes na janela de 1s do limite global do Telegram')
+CALLS_IN_WINDOW = Gauge(registry, 'bot_telegram_calls_last_second', 'Chamadas à Bot API no último segundo')
+LOCAL_THROTTLE_SECONDS = Counter(registry, 'bot_telegram_local_throttle_seconds_total', 'Tempo esperando o limitador local antes de chamar a API')
+
+
+class CallBudget:
+    """Janela deslizante das chamadas feitas no último `window` segundos"""
+
+    def __init__(self, limit=TELEGRAM_GLOBAL_CALLS_PER_SECOND, window=BUDGET_WINDOW_SECONDS):
+        self.limit = limit
+        self.window = window
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        while self._calls and now - self._calls[0] > self.window:
+            self._calls.popleft()
+
+    def record(self):
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            self._calls.append(now)
+
+    def calls(self):
+        with self._lock:
+            self._prune(time.monotonic())
+            return len(self._calls)
+
+    def remaining(self):
+        return max(self.limit - self.calls(), 0)
+
+
+telegram_call_budget = CallBudget()
+
+
+def _collect_budget():
+    calls = telegram_call_budget.calls()
+    CALLS_IN_WINDOW.set(calls)
+    BUDGET_REMAINING.set(max(telegram_call_budget.limit - calls, 0))
+
+
+registry.add_collector(_collect_budget)
+
+
+class InstrumentedBot(ExtBot):
+    """ExtBot que mede cada chamada à Bot API (instalar com Application.builder().bot(...))"""
+
+    def __init__(self, token, request=None, get_updates_request=None, **kwargs):
+        super().__init__(
+            token,
+            request=request or HTTPXRequest(connection_pool_size=CONNECTION_POOL_SIZE),
+            get_updates_request=get_updates_request or HTTPXRequest(),
+            **kwargs
+        )
+
+    async def _do_post(self, endpoint, data, *args, **kwargs):
+        if endpoint in UNTRACKED_METHODS:
+            return await super()._do_post(endpoint, data, *args, **kwargs)
+
+        telegram_call_budget.record()
+        start = time.perf_counter()
+        try:
+            return await super()._do_post(endpoint, data, *args, **kwargs)
+        except RetryAfter as e:
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+            RETRY_AFTER_TOTAL.inc(method=endpoint)
+            RETRY_AFTER_SECONDS.inc(retry_after, method=endpoint)
+            API_ERRORS.inc(method=endpoint, error='RetryAfter')
+            raise
+        except Exception as e:
+            API_ERRORS.inc(method=endpoint, error=type(e).__name__)
+            raise
+        finally:
+            API_DURATION.observe(time.perf_counter() - start, method=endpoint)
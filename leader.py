@@ -0,0 +1,118 @@
+"""Eleição de líder entre réplicas do bot usando GET_LOCK do MySQL.
+
+O lock nomeado pertence à sessão que o obteve: enquanto a conexão dedicada
+estiver aberta, nenhuma outra réplica consegue obtê-lo. Se o processo cair ou
+a conexão for perdida, o MySQL libera o lock e outra réplica assume na
+próxima chamada de refresh().
+
+Um erro de conexão não diz quem tem o lock: `is_leader` fica False (jobs de
+líder não rodam), mas `held_elsewhere` só passa a True quando IS_USED_LOCK
+mostra o lock em outra conexão. Enquanto isso, refresh() tenta reconectar
+com espera exponencial.
+"""
+
+import functools
+import logging
+import threading
+import time
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+LEADER_REFRESH_INTERVAL = 15  # segundos
+LEADER_RETRY_BASE_DELAY = 5  # segundos após o primeiro erro de conexão
+LEADER_RETRY_MAX_DELAY = 60
+
+
+class LeaderElection:
+    """Mantém (ou tenta obter) o lock de líder em uma conexão própria"""
+
+    def __init__(self, name):
+        self._db = None
+        self._lock = threading.Lock()
+        self.is_leader = False
+        self.held_elsewhere = False  # Confirmado por IS_USED_LOCK; inalterado após erros
+        self._failures = 0
+        self._retry_at = 0.0
+        database = Database().db_cfg.get('database', 'bot_demo')
+        # GET_LOCK vale para o servidor inteiro; o nome do banco evita colisão entre bots
+        self.lock_name = f"{database}:{name}"[:64]
+
+    def _query_one(self, query, params):
+        cursor = self._db.connection.cursor()
+        try:
+            cursor.execute(query, params)
+            row = cursor.fetchone()
+            return row[0] if row else None
+        finally:
+            cursor.close()
+
+    def _drop_connection(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def refresh(self):
+        """Confirma a liderança ou tenta assumi-la. Bloqueante; retorna is_leader."""
+        with self._lock:
+            was_leader = self.is_leader
+            if self._failures and time.monotonic() < self._retry_at:
+                return self.is_leader
+            try:
+                if self._db is None or not self._db.connection or not self._db.connection.is_connected():
+                    # Conexão perdida = lock perdido
+                    self._drop_connection()
+                    self.is_leader = False
+                    self._db = Database()
+                    if self._db.connect() is None:
+                        self._db = None
+                        raise ConnectionError("sem conexão com o banco")
+
+                if self.is_leader:
+                    self.is_leader = self._query_one(
+                        "SELECT IS_USED_LOCK(%s) = CONNECTION_ID()", (self.lock_name,)
+                    ) == 1
+                if not self.is_leader:
+                    self.is_leader = self._query_one("SELECT GET_LOCK(%s, 0)", (self.lock_name,)) == 1
+                self.held_elsewhere = not self.is_leader and self._query_one(
+                    "SELECT IS_USED_LOCK(%s)", (self.lock_name,)
+                ) is not None
+                self._failures = 0
+            except Exception as e:
+                self._failures += 1
+                delay = min(LEADER_RETRY_BASE_DELAY * 2 ** (self._failures - 1), LEADER_RETRY_MAX_DELAY)
+                self._retry_at = time.monotonic() + delay
+                logger.error(f"❌ Erro na eleição de líder ({self.lock_name}): {e} - nova tentativa em {delay}s")
+                self._drop_connection()
+                self.is_leader = False
+
+            if self.is_leader != was_leader:
+                if self.is_leader:
+                    logger.info(f"👑 Esta réplica assumiu a liderança ({self.lock_name})")
+                else:
+                    logger.warning(f"⚠️ Esta réplica perdeu a liderança ({self.lock_name})")
+            return self.is_leader
+
+    def release(self):
+        with self._lock:
+            if self.is_leader and self._db is not None:
+                try:
+                    self._query_one("SELECT RELEASE_LOCK(%s)", (self.lock_name,))
+                except Exception as e:
+                    logger.warning(f"⚠️ Erro ao liberar liderança: {e}")
+            self.is_leader = False
+            self.held_elsewhere = False
+            self._drop_connection()
+
+
+def leader_only(election):
+    """Decorator para jobs do JobQueue que só devem rodar na réplica líder"""
+    def decorator(callback):
+        @functools.wraps(callback)
+        async def wrapper(context):
+            if not election.is_leader:
+                return None
+            return await callback(context)
+        return wrapper
+    return decorator
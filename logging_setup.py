@@ -0,0 +1,159 @@
+"""Configuração de logging assíncrona, com JSON, amostragem e redação de segredos.
+
+Quem loga (event loop do bot, threads do Flask) só coloca o registro numa
+fila; formatação, redação e escrita no stderr acontecem na thread do
+QueueListener.
+
+Linhas DEBUG repetidas são amostradas por ponto de chamada (arquivo e
+linha): no máximo LOG_SAMPLE_LIMIT por janela de LOG_SAMPLE_WINDOW segundos,
+com um aviso de quantas foram descartadas. INFO e acima nunca são
+descartados: é onde ficam as linhas de auditoria (aprovações, acessos
+liberados, ações de admin).
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+
+LOG_SAMPLE_LIMIT = 20
+LOG_SAMPLE_WINDOW = 60  # segundos
+REDACTED = '***'
+
+# Bibliotecas que logam cada requisição HTTP (a URL da Bot API contém o token)
+NOISY_LOGGERS = ('httpx', 'httpcore', 'apscheduler', 'werkzeug')
+
+_SECRET_PATTERNS = [
+    # Token de bot do Telegram (inclusive dentro de URLs da Bot API)
+    re.compile(r'\d{6,}:[A-Za-z0-9_-]{30,}'),
+    # Cabeçalhos e campos com nome de segredo: x-secret-key: ..., "api_secret": "..."
+    re.compile(r'''(?i)((?:x-secret-key|x-public-key|api[_-]?secret|api[_-]?key|secret[_-]?key|access[_-]?token|bot[_-]?token|password|authorization)["']?\s*[:=]\s*["']?)([^\s"',}]+)'''),
+]
+
+_known_secrets = set()
+_known_secrets_lock = threading.Lock()
+
+
+def register_secret(value):
+    """Passa a ocultar este valor exato nos logs (ex.: token do bot, chave do CNPay)"""
+    if value and len(str(value)) >= 6:
+        with _known_secrets_lock:
+            _known_secrets.add(str(value))
+
+
+def redact(text):
+    with _known_secrets_lock:
+        secrets = sorted(_known_secrets, key=len, reverse=True)
+    for secret in secrets:
+        if secret in text:
+            text = text.replace(secret, REDACTED)
+    text = _SECRET_PATTERNS[0].sub(REDACTED, text)
+    return _SECRET_PATTERNS[1].sub(lambda m: m.group(1) + REDACTED, text)
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro, com segredos ocultados"""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': redact(record.getMessage()),
+        }
+        if record.exc_info:
+            entry['exc'] = redact(self.formatException(record.exc_info))
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RedactingFormatter(logging.Formatter):
+    """Formato texto tradicional, com segredos ocultados"""
+
+    def format(self, record):
+        return redact(super().format(record))
+
+
+class SamplingFilter(logging.Filter):
+    """Limita DEBUG a `limit` registros por ponto de chamada a cada `window` segundos; INFO e acima passam sempre"""
+
+    def __init__(self, limit=LOG_SAMPLE_LIMIT, window=LOG_SAMPLE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._sites = {}  # (arquivo, linha) -> [início da janela, emitidos, descartados]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.INFO:
+            return True
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            state = self._sites.get(site)
+            if state is None or now - state[0] >= self.window:
+                dropped = state[2] if state else 0
+                self._sites[site] = [now, 1, 0]
+                if dropped:
+                    record.msg = f"{record.getMessage()} [+{dropped} linha(s) semelhante(s) suprimida(s) em {self.window}s]"
+                    record.args = None
+                return True
+            if state[1] < self.limit:
+                state[1] += 1
+                return True
+            state[2] += 1
+            return False
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que não formata no chamador: a fila é do mesmo processo"""
+
+    def prepare(self, record):
+        # Congela a mensagem (os args podem mudar depois); traceback fica para o listener
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener = None
+
+
+def setup_logging(level=None, fmt=None):
+    """Substitui os handlers do root logger pelo pipeline fila -> listener -> stderr.
+
+    LOG_LEVEL (padrão INFO) e LOG_FORMAT (json ou text, padrão json) vêm do ambiente.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    level = level or os.getenv('LOG_LEVEL', 'INFO').upper()
+    fmt = fmt or os.getenv('LOG_FORMAT', 'json').lower()
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if fmt == 'text':
+        stream_handler.setFormatter(RedactingFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _InProcessQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    for name in NOISY_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,277 @@
+"""Métricas do bot no formato texto do Prometheus.
+
+Implementação mínima (sem prometheus_client): contadores, gauges e
+histogramas com labels, protegidos por lock porque são lidos pela thread do
+Flask (/metrics) e escritos pelo event loop do bot.
+
+/metrics fica no mesmo app Flask público do webhook de pagamentos: sem
+METRICS_TOKEN só responde a requisições locais; com ele, exige o header
+`Authorization: Bearer <token>` (bearer_token_file no scrape do Prometheus).
+
+`instrument_handlers` envolve os callbacks de todos os handlers registrados no
+Application e `InstrumentedJobQueue` faz o mesmo com cada job agendado.
+"""
+
+import functools
+import hmac
+import ipaddress
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from telegram.ext import ApplicationHandlerStop, JobQueue
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = registry.lock
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_items(items))
+        return lines
+
+    def _render_items(self, items):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in items]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        super().__init__(registry, name, documentation, labelnames)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_items(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def add_collector(self, collector):
+        """Função chamada antes de cada render (para gauges calculados sob demanda)"""
+        self._collectors.append(collector)
+
+    def render(self):
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+HANDLER_DURATION = Histogram(registry, 'bot_handler_duration_seconds', 'Duração dos handlers de update', ['handler'])
+HANDLER_ERRORS = Counter(registry, 'bot_handler_errors_total', 'Exceções não tratadas nos handlers', ['handler'])
+HANDLER_IN_FLIGHT = Gauge(registry, 'bot_handler_in_flight', 'Handlers em execução', ['handler'])
+JOB_DURATION = Histogram(registry, 'bot_job_duration_seconds', 'Duração dos jobs do JobQueue', ['job'])
+JOB_ERRORS = Counter(registry, 'bot_job_errors_total', 'Exceções não tratadas nos jobs', ['job'])
+JOB_IN_FLIGHT = Gauge(registry, 'bot_job_in_flight', 'Jobs em execução', ['job'])
+
+
+@contextmanager
+def track(duration, errors, in_flight, label, name):
+    """Mede duração, exceções e concorrência de um bloco"""
+    labels = {label: name}
+    in_flight.inc(**labels)
+    start = time.perf_counter()
+    try:
+        yield
+    except ApplicationHandlerStop:
+        raise
+    except Exception:
+        errors.inc(**labels)
+        raise
+    finally:
+        duration.observe(time.perf_counter() - start, **labels)
+        in_flight.dec(**labels)
+
+
+def track_handler(name):
+    return track(HANDLER_DURATION, HANDLER_ERRORS, HANDLER_IN_FLIGHT, 'handler', name)
+
+
+def instrument_callback(callback, tracker):
+    name = getattr(callback, '__name__', repr(callback))
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        with tracker(name):
+            return await callback(*args, **kwargs)
+    return wrapper
+
+
+def instrument_handlers(application):
+    """Envolve o callback de cada handler já registrado no Application"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = instrument_callback(handler.callback, track_handler)
+
+
+def track_job(name):
+    return track(JOB_DURATION, JOB_ERRORS, JOB_IN_FLIGHT, 'job', name)
+
+
+class InstrumentedJobQueue(JobQueue):
+    """JobQueue que mede todos os jobs agendados (inclusive os criados em handlers)"""
+
+    def run_once(self, callback, *args, **kwargs):
+        return super().run_once(instrument_callback(callback, track_job), *args, **kwargs)
+
+    def run_repeating(self, callback, *args, **kwargs):
+        return super().run_repeating(instrument_callback(callback, track_job), *args, **kwargs)
+
+    def run_daily(self, callback, *args, **kwargs):
+        return super().run_daily(instrument_callback(callback, track_job), *args, **kwargs)
+
+    def run_monthly(self, callback, *args, **kwargs):
+        return super().run_monthly(instrument_callback(callback, track_job), *args, **kwargs)
+
+    def run_custom(self, callback, *args, **kwargs):
+        return super().run_custom(instrument_callback(callback, track_job), *args, **kwargs)
+
+
+def _scrape_allowed(request):
+    token = os.getenv('METRICS_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    try:
+        return ipaddress.ip_address(request.remote_addr or '').is_loopback
+    except ValueError:
+        return False
+
+
+def metrics_view():
+    """View Flask para /metrics"""
+    # Só a thread do Flask chama a view: o import fica fora da inicialização do bot
+    from flask import request
+
+    if not _scrape_allowed(request):
+        return 'forbidden', 403
+    return registry.render(), 200, {'Content-Type': CONTENT_TYPE}
+
+
+DB_QUERY_CALLS = Gauge(registry, 'bot_db_query_calls', 'Execuções por fingerprint de query (desde o último reset)', ['query'])
+DB_QUERY_SECONDS = Gauge(registry, 'bot_db_query_seconds', 'Tempo total no banco por fingerprint de query', ['query'])
+DB_QUERY_P99 = Gauge(registry, 'bot_db_query_p99_seconds', 'p99 do tempo por fingerprint de query', ['query'])
+DB_QUERY_ROWS = Gauge(registry, 'bot_db_query_rows', 'Linhas retornadas/afetadas por fingerprint de query', ['query'])
+DB_QUERY_LABEL_LENGTH = 200
+
+
+def register_query_profiler(profiler):
+    """Publica as estatísticas do QueryProfiler do database.py em /metrics"""
+    def collect():
+        for gauge in (DB_QUERY_CALLS, DB_QUERY_SECONDS, DB_QUERY_P99, DB_QUERY_ROWS):
+            gauge.clear()
+        for item in profiler.snapshot():
+            query = item['query'][:DB_QUERY_LABEL_LENGTH]
+            DB_QUERY_CALLS.set(item['count'], query=query)
+            DB_QUERY_SECONDS.set(item['total'], query=query)
+            DB_QUERY_P99.set(item['p99'], query=query)
+            DB_QUERY_ROWS.set(item['rows'], query=query)
+    registry.add_collector(collect)
@@ -0,0 +1,218 @@
+"""Persistência do estado do PTB (user_data, chat_data, bot_data...) no MySQL.
+
+O Application chama os métodos update_* a cada `update_interval` segundos só
+para as chaves que mudaram, já com cópias (deepcopy) dos dados. Aqui essas
+chamadas apenas marcam a chave como suja; logo depois da rodada, um único
+lote é serializado com pickle e gravado em uma transação, pulando as chaves
+cujo conteúdo não mudou desde a última gravação. No encerramento, flush()
+grava o que sobrou.
+"""
+
+import asyncio
+import logging
+import pickle
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+PERSISTENCE_FLUSH_INTERVAL = 5  # segundos
+
+USER_DATA = 'user_data'
+CHAT_DATA = 'chat_data'
+BOT_DATA = 'bot_data'
+CALLBACK_DATA = 'callback_data'
+CONVERSATIONS = 'conversations'
+
+CREATE_PERSISTENCE_TABLE = """CREATE TABLE IF NOT EXISTS bot_persistence (
+    namespace varchar(32) NOT NULL,
+    kind varchar(32) NOT NULL,
+    item_key varchar(191) NOT NULL,
+    data longblob NOT NULL,
+    updated_at datetime DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (namespace, kind, item_key)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"""
+
+UPSERT_QUERY = """INSERT INTO bot_persistence (namespace, kind, item_key, data)
+VALUES (%s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE data = VALUES(data)"""
+
+DELETE_QUERY = "DELETE FROM bot_persistence WHERE namespace = %s AND kind = %s AND item_key = %s"
+
+
+class MySQLPersistence(BasePersistence):
+    """BasePersistence do PTB gravando em lote na tabela bot_persistence.
+
+    `namespace` separa o estado de bots diferentes que usam o mesmo banco.
+    """
+
+    def __init__(self, namespace, store_data=None, update_interval=PERSISTENCE_FLUSH_INTERVAL):
+        super().__init__(store_data=store_data or PersistenceInput(), update_interval=update_interval)
+        self.namespace = namespace
+        self._dirty = {}  # (kind, key) -> dado, ou None para apagar
+        self._written = {}  # (kind, key) -> último blob gravado
+        self._flush_task = None
+        self._write_lock = asyncio.Lock()
+        self._table_ready = False
+
+    # === Leitura (uma vez, na inicialização do Application) ===
+
+    def _ensure_table(self, db):
+        if self._table_ready:
+            return
+        db.execute_query(CREATE_PERSISTENCE_TABLE, commit=True)
+        self._table_ready = True
+
+    def _load_kind(self, kind):
+        db = Database()
+        try:
+            if db.connect() is None:
+                logger.error(f"❌ Persistência: sem conexão para carregar {kind}")
+                return {}
+            self._ensure_table(db)
+            rows = db.execute_fetch_all(
+                "SELECT item_key, data FROM bot_persistence WHERE namespace = %s AND kind = %s",
+                (self.namespace, kind)
+            ) or []
+        finally:
+            db.close()
+
+        loaded = {}
+        for row in rows:
+            blob = bytes(row['data'])
+            try:
+                loaded[row['item_key']] = pickle.loads(blob)
+            except Exception as e:
+                logger.warning(f"⚠️ Persistência: {kind}/{row['item_key']} ignorado ({e})")
+                continue
+            self._written[(kind, row['item_key'])] = blob
+        return loaded
+
+    async def _load(self, kind):
+        return await asyncio.to_thread(self._load_kind, kind)
+
+    async def get_user_data(self):
+        return {int(key): data for key, data in (await self._load(USER_DATA)).items()}
+
+    async def get_chat_data(self):
+        return {int(key): data for key, data in (await self._load(CHAT_DATA)).items()}
+
+    async def get_bot_data(self):
+        return (await self._load(BOT_DATA)).get('', {})
+
+    async def get_callback_data(self):
+        return (await self._load(CALLBACK_DATA)).get('')
+
+    async def get_conversations(self, name):
+        return (await self._load(CONVERSATIONS)).get(name, {})
+
+    # === Escrita (marca como suja; grava em lote) ===
+
+    def _mark_dirty(self, kind, key, data):
+        self._dirty[(kind, str(key))] = data
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_dirty())
+
+    async def update_user_data(self, user_id, data):
+        self._mark_dirty(USER_DATA, user_id, data)
+
+    async def update_chat_data(self, chat_id, data):
+        self._mark_dirty(CHAT_DATA, chat_id, data)
+
+    async def update_bot_data(self, data):
+        self._mark_dirty(BOT_DATA, '', data)
+
+    async def update_callback_data(self, data):
+        self._mark_dirty(CALLBACK_DATA, '', data)
+
+    async def update_conversation(self, name, key, new_state):
+        # As conversas de um handler ficam num único blob; é preciso ler o
+        # estado atual pendente (ou gravado) para aplicar a mudança
+        conversations = self._dirty.get((CONVERSATIONS, name))
+        if conversations is None:
+            blob = self._written.get((CONVERSATIONS, name))
+            conversations = pickle.loads(blob) if blob else {}
+        if new_state is None:
+            conversations.pop(key, None)
+        else:
+            conversations[key] = new_state
+        self._mark_dirty(CONVERSATIONS, name, conversations)
+
+    async def drop_user_data(self, user_id):
+        self._mark_dirty(USER_DATA, user_id, None)
+
+    async def drop_chat_data(self, chat_id):
+        self._mark_dirty(CHAT_DATA, chat_id, None)
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def _flush_dirty(self):
+        # Deixa o resto da rodada de update_persistence marcar suas chaves
+        await asyncio.sleep(0)
+        async with self._write_lock:
+            dirty, self._dirty = self._dirty, {}
+            if not dirty:
+                return
+            try:
+                await asyncio.to_thread(self._write, dirty)
+            except Exception as e:
+                logger.error(f"❌ Persistência: erro ao gravar {len(dirty)} chave(s): {e}")
+                # Mantém para a próxima rodada o que não foi sobrescrito nesse meio-tempo
+                for item, data in dirty.items():
+                    self._dirty.setdefault(item, data)
+
+    def _write(self, dirty):
+        upserts = []
+        deletes = []
+        blobs = {}
+        for (kind, key), data in dirty.items():
+            if data is None:
+                if (kind, key) in self._written:
+                    deletes.append((self.namespace, kind, key))
+                continue
+            try:
+                blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                logger.warning(f"⚠️ Persistência: {kind}/{key} não serializável ({e})")
+                continue
+            if self._written.get((kind, key)) != blob:
+                upserts.append((self.namespace, kind, key, blob))
+                blobs[(kind, key)] = blob
+
+        if not upserts and not deletes:
+            return
+
+        db = Database()
+        try:
+            if db.connect() is None:
+                raise ConnectionError("sem conexão com o banco de dados")
+            self._ensure_table(db)
+            with db.transaction() as cursor:
+                if upserts:
+                    cursor.executemany(UPSERT_QUERY, upserts)
+                if deletes:
+                    cursor.executemany(DELETE_QUERY, deletes)
+        finally:
+            db.close()
+
+        self._written.update(blobs)
+        for _, kind, key in deletes:
+            self._written.pop((kind, key), None)
+        logger.debug(f"Persistência: {len(upserts)} chave(s) gravada(s), {len(deletes)} removida(s)")
+
+    async def flush(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+        async with self._write_lock:
+            dirty, self._dirty = self._dirty, {}
+            if dirty:
+                await asyncio.to_thread(self._write, dirty)
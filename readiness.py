@@ -0,0 +1,192 @@
+"""Verificações de prontidão do bot como um grafo de tarefas concorrentes.
+
+Cada verificação é uma corrotina que retorna um detalhe (texto) ou levanta uma
+exceção. Verificações declaram dependências (`after`) e só rodam se elas
+passarem; as demais rodam em paralelo. Uma verificação pode registrar outras
+durante a execução (ex.: uma por grupo VIP lido do banco). O grafo inteiro
+tem um orçamento de tempo: o que não terminar nele é cancelado e aparece como
+timeout no relatório.
+
+O último relatório fica em `readiness_state`, servido em /ready pelo Flask
+(200 se pronto, 503 caso contrário).
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+READINESS_TIMEOUT = 10.0  # segundos para o grafo inteiro
+
+OK = 'ok'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+TIMEOUT = 'timeout'
+
+
+class CheckFailed(Exception):
+    """Falha esperada de uma verificação; a mensagem vai para o relatório"""
+
+
+class CheckResult:
+    def __init__(self, name, status, detail, duration, critical):
+        self.name = name
+        self.status = status
+        self.detail = detail
+        self.duration = duration
+        self.critical = critical
+
+    @property
+    def ok(self):
+        return self.status == OK
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'status': self.status,
+            'detail': self.detail,
+            'duration_ms': round(self.duration * 1000, 1),
+            'critical': self.critical,
+        }
+
+
+class ReadinessReport:
+    def __init__(self, results, duration, checked_at=None):
+        self.results = results
+        self.duration = duration
+        self.checked_at = checked_at or datetime.now()
+
+    @property
+    def ready(self):
+        """Pronto quando todas as verificações críticas passaram"""
+        return all(result.ok for result in self.results if result.critical)
+
+    @property
+    def problems(self):
+        return [result for result in self.results if not result.ok]
+
+    def to_dict(self):
+        return {
+            'ready': self.ready,
+            'checked_at': self.checked_at.isoformat(timespec='seconds'),
+            'duration_ms': round(self.duration * 1000, 1),
+            'checks': [result.to_dict() for result in self.results],
+        }
+
+
+class CheckGraph:
+    """Executa verificações concorrentes respeitando dependências e um orçamento de tempo"""
+
+    def __init__(self, timeout=READINESS_TIMEOUT):
+        self.timeout = timeout
+        self._pending = []  # (nome, função, dependências, crítica) antes de run()
+        self._tasks = {}
+        self._results = {}
+        self._critical = {}
+        self._started = None
+
+    def add(self, name, func, after=(), critical=True):
+        """Registra `func` (corrotina sem argumentos); pode ser chamada durante run()"""
+        if name in self._critical:
+            raise ValueError(f"Verificação duplicada: {name}")
+        self._critical[name] = critical
+        if self._started is None:
+            self._pending.append((name, func, tuple(after), critical))
+        else:
+            self._start(name, func, tuple(after), critical)
+
+    def _start(self, name, func, after, critical):
+        self._tasks[name] = asyncio.create_task(self._run_check(name, func, after, critical), name=f"check:{name}")
+
+    async def _run_check(self, name, func, after, critical):
+        for dependency in after:
+            task = self._tasks.get(dependency)
+            if task is None:
+                # Dependência inexistente ou registrada depois desta verificação
+                self._results[name] = CheckResult(name, FAILED, f"dependência desconhecida: {dependency}", 0.0, critical)
+                return
+            await asyncio.wait([task])
+            dependency_result = self._results.get(dependency)
+            if dependency_result is None or not dependency_result.ok:
+                self._results[name] = CheckResult(name, SKIPPED, f"depende de {dependency}", 0.0, critical)
+                return
+
+        started = time.perf_counter()
+        try:
+            detail = await func()
+            status = OK
+        except CheckFailed as e:
+            status, detail = FAILED, str(e)
+        except asyncio.CancelledError:
+            self._results[name] = CheckResult(name, TIMEOUT, f"sem resposta em {self.timeout:g}s", time.perf_counter() - started, critical)
+            raise
+        except Exception as e:
+            status, detail = FAILED, f"{type(e).__name__}: {e}"
+        self._results[name] = CheckResult(name, status, detail, time.perf_counter() - started, critical)
+
+    async def run(self):
+        """Roda o grafo e retorna um ReadinessReport com uma linha por verificação"""
+        self._started = time.perf_counter()
+        for check in self._pending:
+            self._start(*check)
+        self._pending = []
+
+        deadline = self._started + self.timeout
+        # Verificações podem registrar outras enquanto rodam: espera até não sobrar nenhuma
+        while True:
+            pending = [task for task in self._tasks.values() if not task.done()]
+            remaining = deadline - time.perf_counter()
+            if not pending or remaining <= 0:
+                break
+            await asyncio.wait(pending, timeout=remaining)
+
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+        results = [
+            self._results.get(name) or CheckResult(name, TIMEOUT, "não iniciada dentro do orçamento", 0.0, critical)
+            for name, critical in self._critical.items()
+        ]
+        return ReadinessReport(results, time.perf_counter() - self._started)
+
+
+class ReadinessState:
+    """Último relatório de prontidão, lido pela thread do Flask"""
+
+    def __init__(self):
+        self._report = None
+        self._lock = threading.Lock()
+
+    @property
+    def report(self):
+        with self._lock:
+            return self._report
+
+    def update(self, report):
+        with self._lock:
+            self._report = report
+        level = logging.INFO if report.ready else logging.WARNING
+        logger.log(
+            level,
+            f"{'✅' if report.ready else '❌'} Prontidão: {len(report.results) - len(report.problems)}/{len(report.results)} "
+            f"verificações ok em {report.duration * 1000:.0f} ms"
+        )
+        for result in report.problems:
+            logger.warning(f"   {result.name}: {result.status} - {result.detail}")
+
+    def view(self):
+        """View Flask para /ready"""
+        report = self.report
+        if report is None:
+            body, status = {'ready': False, 'status': 'starting'}, 503
+        else:
+            body, status = report.to_dict(), 200 if report.ready else 503
+        return json.dumps(body, ensure_ascii=False), status, {'Content-Type': 'application/json'}
+
+
+readiness_state = ReadinessState()
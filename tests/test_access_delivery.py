@@ -0,0 +1,103 @@
+import asyncio
+from contextlib import contextmanager
+
+import access_delivery
+from access_delivery import (
+    GROUP_DONE, GROUP_FAILED, AccessDeliveryRelay, access_delivery_group_status, record_access_delivery_groups
+)
+
+
+class FakeGroupTable:
+    """access_delivery_groups em memória: (delivery_id, group_id) -> (status, erro)"""
+
+    def __init__(self):
+        self.rows = {}
+        self.result = []
+
+    def execute(self, query, params):
+        delivery_id, = params
+        self.result = [
+            {'group_id': group_id, 'status': status}
+            for (row_delivery_id, group_id), (status, _) in self.rows.items()
+            if row_delivery_id == delivery_id
+        ]
+
+    def executemany(self, query, rows):
+        for delivery_id, group_id, status, error in rows:
+            self.rows[(delivery_id, group_id)] = (status, error)
+
+    def fetchall(self):
+        return self.result
+
+
+class FakeDatabase:
+    def __init__(self, table):
+        self.table = table
+
+    @contextmanager
+    def transaction(self):
+        yield self.table
+
+
+def test_group_outcomes_round_trip():
+    table = FakeGroupTable()
+    db = FakeDatabase(table)
+
+    record_access_delivery_groups(db, 7, [(-100, GROUP_DONE, None), (-200, GROUP_FAILED, RuntimeError('sem permissão'))])
+    record_access_delivery_groups(db, 8, [(-100, GROUP_FAILED, 'x')])
+
+    assert access_delivery_group_status(db, 7) == {-100: GROUP_DONE, -200: GROUP_FAILED}
+    assert table.rows[(7, -200)] == (GROUP_FAILED, 'sem permissão')
+
+    # Grupo que falhou e depois foi entregue
+    record_access_delivery_groups(db, 7, [(-200, GROUP_DONE, None)])
+    assert access_delivery_group_status(db, 7) == {-100: GROUP_DONE, -200: GROUP_DONE}
+
+
+def test_record_without_outcomes_does_not_touch_database():
+    record_access_delivery_groups(None, 7, [])
+
+
+def run_batch(monkeypatch, batch, deliver, max_attempts=3):
+    completed = {}
+
+    def complete(done, retry, failed):
+        completed.update(done=done, retry=retry, failed=failed)
+
+    monkeypatch.setattr(access_delivery, 'complete_access_deliveries', complete)
+    relay = AccessDeliveryRelay(max_attempts=max_attempts)
+    relay._deliver = deliver
+
+    async def main():
+        await relay._deliver_batch(batch)
+
+    asyncio.run(main())
+    return completed
+
+
+def row(row_id, attempts=1):
+    return {'id': row_id, 'user_id': 100 + row_id, 'plan_id': 1, 'attempts': attempts, 'age': 0.5}
+
+
+def test_relay_sorts_outcomes(monkeypatch):
+    async def deliver(event):
+        if event['id'] == 2:
+            raise RuntimeError('Telegram fora do ar')
+        return event['id'] == 1
+
+    completed = run_batch(monkeypatch, [row(1), row(2), row(3, attempts=3)], deliver)
+
+    assert completed['done'] == [1]
+    assert [(row_id, error) for row_id, _, error in completed['retry']] == [(2, 'Telegram fora do ar')]
+    assert completed['failed'] == [(3, 'entrega não concluída')]
+
+
+def test_relay_backoff_grows_with_attempts(monkeypatch):
+    async def deliver(event):
+        return False
+
+    completed = run_batch(monkeypatch, [row(1, attempts=1), row(2, attempts=4)], deliver, max_attempts=8)
+    delays = {row_id: delay for row_id, delay, _ in completed['retry']}
+
+    assert access_delivery.ACCESS_DELIVERY_BASE_DELAY <= delays[1] <= access_delivery.ACCESS_DELIVERY_BASE_DELAY * 1.5
+    assert delays[2] >= access_delivery.ACCESS_DELIVERY_BASE_DELAY * 8
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from analytics import compute_metrics, empty_metrics
+
+NOW = datetime(2026, 1, 31, 12, 0)
+
+
+def subscription(id, user_id, start_days_ago, duration_days, price=30.0, plan_name='Mensal', is_permanent=False):
+    start = NOW - timedelta(days=start_days_ago)
+    return {
+        'id': id,
+        'user_id': user_id,
+        'plan_id': 1,
+        'plan_name': plan_name,
+        'price': price,
+        'duration_days': duration_days,
+        'is_permanent': is_permanent,
+        'start_date': start,
+        'end_date': start + timedelta(days=duration_days),
+    }
+
+
+def frame(*rows):
+    return pd.DataFrame(list(rows))
+
+
+def test_empty_frame_returns_empty_metrics():
+    assert compute_metrics(pd.DataFrame(), NOW) == empty_metrics()
+    assert compute_metrics(None, NOW) == empty_metrics()
+
+
+def test_active_users_and_mrr_count_latest_subscription_per_user():
+    df = frame(
+        subscription(1, 10, start_days_ago=40, duration_days=60, price=60.0),
+        subscription(2, 10, start_days_ago=5, duration_days=30, price=30.0),
+        subscription(3, 20, start_days_ago=50, duration_days=30),
+    )
+
+    metrics = compute_metrics(df, NOW)
+
+    assert metrics['active_users'] == 1
+    assert metrics['mrr'] == 30.0
+
+
+def test_deactivated_subscription_is_not_active():
+    df = frame(
+        subscription(1, 10, start_days_ago=5, duration_days=30),
+        subscription(2, 20, start_days_ago=5, duration_days=30),
+    )
+    df['is_active'] = [True, False]
+
+    metrics = compute_metrics(df, NOW)
+
+    assert metrics['active_users'] == 1
+    assert metrics['mrr'] == 30.0
+
+
+def test_churn_and_renewal_in_window():
+    df = frame(
+        # Usuário 10 venceu na janela e renovou dentro da carência
+        subscription(1, 10, start_days_ago=50, duration_days=30),
+        subscription(2, 10, start_days_ago=18, duration_days=30),
+        # Usuário 20 estava ativo no início da janela e não renovou
+        subscription(3, 20, start_days_ago=45, duration_days=30),
+    )
+
+    metrics = compute_metrics(df, NOW)
+
+    assert metrics['churned_users'] == 1
+    assert metrics['churn_rate'] == 0.5
+    assert metrics['ended_subscriptions'] == 2
+    assert metrics['renewal_rate'] == 0.5
+
+
+def test_permanent_plan_is_active_without_mrr():
+    df = frame(subscription(1, 10, start_days_ago=100, duration_days=0, price=500.0, plan_name='Vitalício', is_permanent=True))
+    df.loc[0, 'end_date'] = pd.NaT
+
+    metrics = compute_metrics(df, NOW)
+
+    assert metrics['active_users'] == 1
+    assert metrics['mrr'] == 0.0
+    assert metrics['ltv_by_plan'] == [{'plan_name': 'Vitalício', 'ltv': 500.0, 'users': 1}]
@@ -0,0 +1,96 @@
+import base64
+
+import pytest
+
+import callback_codec
+from callback_codec import (
+    CALLBACK_ACTIONS, CALLBACK_MAX_BYTES, CALLBACK_VERSION, CallbackData, CallbackTokenStore,
+    callback_pattern, decode_callback, encode_callback
+)
+
+
+def raw_callback(payload):
+    return '~' + base64.urlsafe_b64encode(bytes(payload)).rstrip(b'=').decode('ascii')
+
+
+@pytest.fixture(autouse=True)
+def fresh_token_store(monkeypatch):
+    monkeypatch.setattr(callback_codec, 'callback_tokens', CallbackTokenStore())
+
+
+@pytest.mark.parametrize('action, args', [
+    ('plan', (3,)),
+    ('renew', (-7,)),
+    ('cancel_renew', ()),
+    ('check', ('pix_123abc',)),
+    ('copy_pix', ('ação-ç',)),
+])
+def test_round_trip(action, args):
+    data = encode_callback(action, *args)
+
+    assert len(data) <= CALLBACK_MAX_BYTES
+    assert decode_callback(data) == CallbackData(action, args)
+
+
+def test_long_arguments_use_token():
+    long_id = 'x' * 120
+    data = encode_callback('check', long_id)
+
+    assert len(data) <= CALLBACK_MAX_BYTES
+    assert decode_callback(data) == CallbackData('check', (long_id,))
+
+
+@pytest.mark.parametrize('data, expected', [
+    ('plan_3', CallbackData('plan', (3,))),
+    ('confirm_renew_5', CallbackData('confirm_renew', (5,))),
+    ('cancel_renew', CallbackData('cancel_renew', ())),
+    ('copy_pix_abc', CallbackData('copy_pix', ('abc',))),
+])
+def test_legacy_strings(data, expected):
+    assert decode_callback(data) == expected
+
+
+@pytest.mark.parametrize('code', [0, len(CALLBACK_ACTIONS) + 1, 0x80, 0x7F, 0xFF])
+def test_invalid_action_code(code):
+    data = raw_callback([CALLBACK_VERSION, code])
+
+    assert decode_callback(data) is None
+    assert callback_pattern(*CALLBACK_ACTIONS)(data) is False
+
+
+@pytest.mark.parametrize('data', ['', '~', '~AA', 'unknown_1', raw_callback([CALLBACK_VERSION + 1, 1])])
+def test_invalid_data(data):
+    assert decode_callback(data) is None
+
+
+def test_expired_token(monkeypatch):
+    store = CallbackTokenStore(ttl=10)
+    monkeypatch.setattr(callback_codec, 'callback_tokens', store)
+    data = encode_callback('check', 'y' * 120)
+
+    now = callback_codec.time.time()
+    monkeypatch.setattr(callback_codec.time, 'time', lambda: now + 11)
+
+    assert decode_callback(data) is None
+
+
+def test_bound_tokens_survive_new_store(monkeypatch):
+    bot_data = {}
+    callback_codec.callback_tokens.bind(bot_data)
+    data = encode_callback('copy_pix', 'z' * 120)
+
+    # Outro processo carregando o mesmo bot_data (ex.: após reinício)
+    restarted = CallbackTokenStore()
+    monkeypatch.setattr(callback_codec, 'callback_tokens', restarted)
+    assert restarted.bind(bot_data) == 1
+
+    assert decode_callback(data) == CallbackData('copy_pix', ('z' * 120,))
+
+
+def test_pattern_filters_actions():
+    matches = callback_pattern('plan', 'renew')
+
+    assert matches(encode_callback('plan', 1))
+    assert matches('renew_2')
+    assert not matches(encode_callback('check', 'a'))
+    assert not matches(None)
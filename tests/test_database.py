@@ -0,0 +1,76 @@
+import pytest
+from mysql.connector import Error
+
+from database import Database
+
+
+class FakeCursor:
+    description = (('id', 3), ('name', 253))
+
+    def __init__(self, batches, fail_after=None):
+        self.batches = list(batches)
+        self.fail_after = fail_after
+        self.fetches = 0
+        self.closed = False
+
+    def execute(self, query, params=()):
+        pass
+
+    def fetchmany(self, size):
+        if self.fail_after is not None and self.fetches == self.fail_after:
+            raise Error(msg="Lost connection to MySQL server during query")
+        self.fetches += 1
+        return self.batches.pop(0) if self.batches else []
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.consumed = False
+
+    def cursor(self, dictionary=False, buffered=False):
+        return self._cursor
+
+    def consume_results(self):
+        self.consumed = True
+
+
+def make_db(cursor):
+    db = Database.__new__(Database)
+    db.connection = FakeConnection(cursor)
+    return db
+
+
+def test_iter_batches_yields_all_batches():
+    cursor = FakeCursor([[(1, 'a'), (2, 'b')], [(3, 'c')]])
+    batches = list(make_db(cursor).iter_batches("SELECT id, name FROM users", batch_size=2))
+    assert [rows for _, rows in batches] == [[(1, 'a'), (2, 'b')], [(3, 'c')]]
+    assert cursor.closed
+
+
+def test_iter_batches_empty_result_still_yields_columns():
+    cursor = FakeCursor([])
+    batches = list(make_db(cursor).iter_batches("SELECT id, name FROM users"))
+    assert batches == [(FakeCursor.description, [])]
+
+
+def test_iter_batches_propagates_mid_stream_errors():
+    cursor = FakeCursor([[(1, 'a')], [(2, 'b')]], fail_after=1)
+    db = make_db(cursor)
+    received = []
+    with pytest.raises(Error):
+        for _, rows in db.iter_batches("SELECT id, name FROM users", batch_size=1):
+            received.extend(rows)
+    # O que já foi lido chegou, mas o erro não é confundido com fim do resultado
+    assert received == [(1, 'a')]
+    assert db.connection.consumed
+    assert cursor.closed
+
+
+def test_iter_fetch_propagates_errors():
+    cursor = FakeCursor([[{'id': 1}]], fail_after=1)
+    with pytest.raises(Error):
+        list(make_db(cursor).iter_fetch("SELECT id FROM users"))
@@ -0,0 +1,71 @@
+import gzip
+import os
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from mysql.connector import FieldType
+
+from exports import column_dtypes, iter_frames, part_path, write_csv_gz, write_parquet
+
+DESCRIPTION = (
+    ('id', FieldType.LONGLONG),
+    ('price', FieldType.NEWDECIMAL),
+    ('start_date', FieldType.DATETIME),
+    ('username', FieldType.VAR_STRING),
+)
+
+
+def batches(count, rows_per_batch=200):
+    for batch in range(count):
+        yield DESCRIPTION, [
+            (batch * rows_per_batch + row, 9.9, datetime(2026, 1, 1), f"usuario_{batch}_{row}")
+            for row in range(rows_per_batch)
+        ]
+
+
+def test_part_path_keeps_first_name():
+    assert part_path('/tmp/users.csv.gz', 1) == '/tmp/users.csv.gz'
+    assert part_path('/tmp/users.csv.gz', 3) == '/tmp/users_part3.csv.gz'
+
+
+def test_frames_keep_dtypes_across_batches():
+    first, empty_batch = iter_frames([(DESCRIPTION, [(1, None, None, None)]), (DESCRIPTION, [])])
+
+    assert column_dtypes(DESCRIPTION) == {
+        'id': 'Int64', 'price': 'float64', 'start_date': 'datetime64[ns]', 'username': 'string'
+    }
+    assert list(first.dtypes) == list(empty_batch.dtypes)
+
+
+def test_csv_export_splits_into_parts_with_header(tmp_path):
+    path = str(tmp_path / 'users.csv.gz')
+
+    paths = write_csv_gz(path, iter_frames(batches(6)), max_bytes=1024)
+
+    assert len(paths) > 1
+    assert paths[0] == path
+    parts = [pd.read_csv(part) for part in paths]
+    assert all(list(part.columns) == [name for name, _ in DESCRIPTION] for part in parts)
+    assert sum(len(part) for part in parts) == 6 * 200
+
+
+def test_csv_export_single_part_under_limit(tmp_path):
+    path = str(tmp_path / 'users.csv.gz')
+
+    paths = write_csv_gz(path, iter_frames(batches(2)))
+
+    assert paths == [path]
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        assert f.readline().strip() == 'id,price,start_date,username'
+
+
+def test_parquet_export_splits_into_parts(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'users.parquet')
+
+    paths = write_parquet(path, iter_frames(batches(4)), max_bytes=1024)
+
+    assert len(paths) == 4
+    assert all(os.path.exists(part) for part in paths)
+    assert sum(len(pd.read_parquet(part)) for part in paths) == 4 * 200
@@ -0,0 +1,139 @@
+import pytest
+
+import leader
+from leader import LeaderElection
+
+
+class FakeLockServer:
+    """Locks nomeados do MySQL: nome -> id da conexão dona"""
+
+    def __init__(self):
+        self.locks = {}
+        self.up = True
+        self.next_id = 1
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.row = None
+
+    def execute(self, query, params):
+        server = self.connection.server
+        if not server.up or not self.connection.open:
+            self.connection.open = False
+            raise OSError("Lost connection to MySQL server")
+        name = params[0]
+        holder = server.locks.get(name)
+        if query.startswith("SELECT GET_LOCK"):
+            if holder is None:
+                server.locks[name] = holder = self.connection.id
+            self.row = (1 if holder == self.connection.id else 0,)
+        elif query.startswith("SELECT IS_USED_LOCK(%s) = CONNECTION_ID()"):
+            self.row = (1 if holder == self.connection.id else 0,)
+        elif query.startswith("SELECT IS_USED_LOCK"):
+            self.row = (holder,)
+        elif query.startswith("SELECT RELEASE_LOCK"):
+            if holder == self.connection.id:
+                del server.locks[name]
+            self.row = (1,)
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.id = server.next_id
+        server.next_id += 1
+        self.open = True
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def is_connected(self):
+        return self.open and self.server.up
+
+
+def fake_database(server):
+    class FakeDatabase:
+        db_cfg = {'database': 'teste'}
+
+        def __init__(self):
+            self.connection = None
+
+        def connect(self):
+            if not server.up:
+                return None
+            self.connection = FakeConnection(server)
+            return self.connection
+
+        def close(self):
+            if self.connection is not None:
+                self.connection.open = False
+                # O MySQL libera os locks da sessão encerrada
+                for name, holder in list(server.locks.items()):
+                    if holder == self.connection.id:
+                        del server.locks[name]
+            self.connection = None
+
+    return FakeDatabase
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeLockServer()
+    monkeypatch.setattr(leader, 'Database', fake_database(server))
+    return server
+
+
+def test_only_one_replica_leads(server):
+    first, second = LeaderElection('updates'), LeaderElection('updates')
+
+    assert first.refresh()
+    assert not second.refresh()
+    assert second.held_elsewhere
+    assert not first.held_elsewhere
+
+
+def test_connection_error_is_not_a_confirmed_loss(server, monkeypatch):
+    election = LeaderElection('updates')
+    assert election.refresh()
+
+    server.up = False
+    assert not election.refresh()
+    assert not election.held_elsewhere
+
+    # Ainda dentro da espera: não tenta reconectar
+    server.up = True
+    assert not election.refresh()
+
+    monkeypatch.setattr(leader.time, 'monotonic', lambda: election._retry_at + 1)
+    assert election.refresh()
+
+
+def test_other_replica_taking_over_is_confirmed(server, monkeypatch):
+    first, second = LeaderElection('updates'), LeaderElection('updates')
+    assert first.refresh()
+
+    server.up = False
+    first.refresh()
+    server.up = True
+    assert second.refresh()
+
+    monkeypatch.setattr(leader.time, 'monotonic', lambda: first._retry_at + 1)
+    assert not first.refresh()
+    assert first.held_elsewhere
+
+
+def test_release_lets_other_replica_lead(server):
+    first, second = LeaderElection('updates'), LeaderElection('updates')
+    assert first.refresh()
+
+    first.release()
+
+    assert second.refresh()
@@ -0,0 +1,46 @@
+import logging
+
+from logging_setup import SamplingFilter, redact, register_secret
+
+
+def make_record(level, msg='linha', lineno=10):
+    return logging.LogRecord('bot', level, 'bot.py', lineno, msg, None, None)
+
+
+def test_info_and_above_are_never_sampled():
+    sampling = SamplingFilter(limit=1, window=60)
+
+    for level in (logging.INFO, logging.WARNING, logging.ERROR):
+        assert all(sampling.filter(make_record(level)) for _ in range(10))
+
+
+def test_debug_is_sampled_per_call_site():
+    sampling = SamplingFilter(limit=2, window=60)
+
+    kept = [sampling.filter(make_record(logging.DEBUG)) for _ in range(5)]
+    other_site = sampling.filter(make_record(logging.DEBUG, lineno=20))
+
+    assert kept == [True, True, False, False, False]
+    assert other_site
+
+
+def test_next_window_reports_dropped_lines(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('logging_setup.time.monotonic', lambda: now[0])
+    sampling = SamplingFilter(limit=1, window=60)
+    for _ in range(4):
+        sampling.filter(make_record(logging.DEBUG))
+
+    now[0] += 60
+    record = make_record(logging.DEBUG, msg='consulta lenta')
+
+    assert sampling.filter(record)
+    assert record.getMessage() == 'consulta lenta [+3 linha(s) semelhante(s) suprimida(s) em 60s]'
+
+
+def test_redact_hides_tokens_and_registered_secrets():
+    register_secret('segredo-do-cnpay')
+    text = redact('url=https://api.telegram.org/bot123456789:AAHdqTcvCH1vGWJxfSeofSAs0K5PALDsaw/getMe key segredo-do-cnpay')
+
+    assert '123456789:AAH' not in text
+    assert 'segredo-do-cnpay' not in text
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import pytest
+
+from metrics import Counter, Gauge, Histogram, Registry, _scrape_allowed
+
+
+def test_render_prometheus_text():
+    registry = Registry()
+    calls = Counter(registry, 'bot_calls_total', 'Chamadas', ['method'])
+    in_flight = Gauge(registry, 'bot_in_flight', 'Em execução')
+    latency = Histogram(registry, 'bot_latency_seconds', 'Latência', buckets=(0.1, 1))
+
+    calls.inc(method='sendMessage')
+    calls.inc(2, method='sendMessage')
+    in_flight.inc()
+    latency.observe(0.05)
+    latency.observe(0.5)
+    text = registry.render()
+
+    assert 'bot_calls_total{method="sendMessage"} 3' in text
+    assert 'bot_in_flight 1' in text
+    assert 'bot_latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'bot_latency_seconds_bucket{le="1"} 2' in text
+    assert 'bot_latency_seconds_bucket{le="+Inf"} 2' in text
+    assert 'bot_latency_seconds_count 2' in text
+
+
+def request(remote_addr, authorization=None):
+    headers = {'Authorization': authorization} if authorization else {}
+    return SimpleNamespace(remote_addr=remote_addr, headers=headers)
+
+
+@pytest.mark.parametrize('remote_addr, allowed', [
+    ('127.0.0.1', True),
+    ('::1', True),
+    ('10.0.0.5', False),
+    (None, False),
+])
+def test_scrape_without_token_is_local_only(monkeypatch, remote_addr, allowed):
+    monkeypatch.delenv('METRICS_TOKEN', raising=False)
+
+    assert _scrape_allowed(request(remote_addr)) is allowed
+
+
+def test_scrape_with_token_requires_bearer(monkeypatch):
+    monkeypatch.setenv('METRICS_TOKEN', 's3cr3t')
+
+    assert _scrape_allowed(request('10.0.0.5', 'Bearer s3cr3t'))
+    assert not _scrape_allowed(request('127.0.0.1'))
+    assert not _scrape_allowed(request('10.0.0.5', 'Bearer errado'))
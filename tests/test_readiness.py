@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import pytest
+
+from readiness import FAILED, OK, SKIPPED, TIMEOUT, CheckFailed, CheckGraph, ReadinessState
+
+
+def run(graph):
+    return asyncio.run(graph.run())
+
+
+def statuses(report):
+    return {result.name: result.status for result in report.results}
+
+
+async def ok():
+    return 'ok'
+
+
+async def fail():
+    raise CheckFailed('sem conexão')
+
+
+def test_dependencies_run_in_order_and_failures_skip_dependents():
+    order = []
+
+    async def record(name):
+        order.append(name)
+        return name
+
+    graph = CheckGraph()
+    graph.add('db', lambda: record('db'))
+    graph.add('schema', lambda: record('schema'), after=('db',))
+    graph.add('telegram', fail)
+    graph.add('groups', ok, after=('telegram',), critical=False)
+    report = run(graph)
+
+    assert order == ['db', 'schema']
+    assert statuses(report) == {'db': OK, 'schema': OK, 'telegram': FAILED, 'groups': SKIPPED}
+    assert not report.ready
+    assert [result.name for result in report.problems] == ['telegram', 'groups']
+
+
+def test_non_critical_failure_keeps_ready():
+    graph = CheckGraph()
+    graph.add('db', ok)
+    graph.add('cnpay', fail, critical=False)
+    report = run(graph)
+
+    assert report.ready
+
+
+def test_unexpected_exception_is_reported():
+    async def broken():
+        raise RuntimeError('boom')
+
+    graph = CheckGraph()
+    graph.add('db', broken)
+    result = run(graph).results[0]
+
+    assert result.status == FAILED
+    assert result.detail == 'RuntimeError: boom'
+
+
+def test_unknown_dependency_fails():
+    graph = CheckGraph()
+    graph.add('schema', ok, after=('db',))
+    result = run(graph).results[0]
+
+    assert result.status == FAILED
+    assert result.detail == 'dependência desconhecida: db'
+
+
+def test_checks_registered_during_run():
+    graph = CheckGraph()
+
+    async def groups():
+        for group_id in (1, 2):
+            graph.add(f'group:{group_id}', ok, after=('groups',), critical=False)
+        return '2 grupos'
+
+    graph.add('groups', groups)
+    report = run(graph)
+
+    assert statuses(report) == {'groups': OK, 'group:1': OK, 'group:2': OK}
+
+
+def test_timeout_cancels_slow_checks():
+    async def slow():
+        await asyncio.sleep(5)
+
+    graph = CheckGraph(timeout=0.05)
+    graph.add('fast', ok)
+    graph.add('slow', slow)
+    graph.add('after_slow', ok, after=('slow',))
+    report = run(graph)
+
+    assert statuses(report)['fast'] == OK
+    assert statuses(report)['slow'] == TIMEOUT
+    assert statuses(report)['after_slow'] in (TIMEOUT, SKIPPED)
+    assert report.duration < 1
+
+
+def test_duplicate_check_is_rejected():
+    graph = CheckGraph()
+    graph.add('db', ok)
+
+    with pytest.raises(ValueError):
+        graph.add('db', ok)
+
+
+def test_ready_view_reports_status():
+    state = ReadinessState()
+    body, status, _ = state.view()
+    assert status == 503 and json.loads(body)['status'] == 'starting'
+
+    graph = CheckGraph()
+    graph.add('db', ok)
+    state.update(run(graph))
+    body, status, _ = state.view()
+
+    assert status == 200
+    assert json.loads(body)['checks'][0]['name'] == 'db'
@@ -0,0 +1,93 @@
+from contextlib import contextmanager
+
+import pytest
+
+bot_module = pytest.importorskip('bot')
+
+
+class SchemaError(Exception):
+    def __init__(self, errno):
+        super().__init__(f"errno {errno}")
+        self.errno = errno
+
+
+class FakeServer:
+    """Banco em que todas as tabelas e chaves já existem, exceto as indicadas"""
+
+    def __init__(self, duplicates=()):
+        self.duplicates = set(duplicates)
+        self.markers = set()
+        self.statements = []
+
+
+class FakeCursor:
+    def __init__(self, server):
+        self.server = server
+        self.rowcount = 0
+        self.rows = []
+
+    def execute(self, statement, params=()):
+        self.server.statements.append(statement)
+        if statement.startswith("INSERT IGNORE INTO bot_schema_markers"):
+            self.rowcount = 0 if params[0] in self.server.markers else 1
+            self.server.markers.add(params[0])
+        elif statement.lstrip().startswith("SELECT payment_id"):
+            self.rows = [('pix_1', '3,9')]
+        elif any(table in statement for table in self.server.duplicates):
+            raise SchemaError(1062)
+        else:
+            raise SchemaError(1050 if statement.startswith("CREATE") else 1061)
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.server)
+
+    def commit(self):
+        pass
+
+
+def fake_database(server):
+    class FakeDatabase:
+        def connect(self):
+            self.connection = FakeConnection(server)
+            return self.connection
+
+        @contextmanager
+        def transaction(self):
+            yield FakeCursor(server)
+
+        def close(self):
+            pass
+
+    return FakeDatabase
+
+
+def test_existing_schema_writes_marker_once(monkeypatch, caplog):
+    server = FakeServer()
+    monkeypatch.setattr(bot_module, 'Database', fake_database(server))
+
+    with caplog.at_level('INFO'):
+        assert bot_module.ensure_schema()
+        assert bot_module.ensure_schema()
+
+    assert server.markers == {bot_module.ACCESS_DELIVERY_MARKER}
+    assert sum('Marcador gravado' in message for message in caplog.messages) == 1
+
+
+def test_duplicate_payment_ids_fail_without_touching_data(monkeypatch, caplog):
+    server = FakeServer(duplicates={'uq_subscriptions_payment_id'})
+    monkeypatch.setattr(bot_module, 'Database', fake_database(server))
+
+    assert not bot_module.ensure_schema()
+    assert not any(statement.lstrip().startswith('UPDATE') for statement in server.statements)
+    assert any('payment_id pix_1: ids 3,9' in message for message in caplog.messages)
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+bot_module = pytest.importorskip('bot')
+
+from access_delivery import GROUP_DONE, GROUP_FAILED  # noqa: E402
+
+PLAN = {'id': 1, 'name': 'Mensal', 'duration_days': 30}
+GROUPS = [
+    {'group_id': -100, 'group_name': 'VIP A'},
+    {'group_id': -200, 'group_name': 'VIP B'},
+]
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.connection = object()
+
+    def connect(self):
+        return self.connection
+
+    def execute_fetch_one(self, query, params=None):
+        return PLAN
+
+    def execute_fetch_all(self, query, params=None):
+        return list(GROUPS)
+
+    def close(self):
+        pass
+
+
+class FakeBot:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, chat_id, text):
+        self.messages.append((chat_id, text))
+
+
+@pytest.fixture
+def delivery(monkeypatch):
+    """Entrega com grupos que falham conforme `broken` e registro por grupo em memória"""
+    state = {'broken': set(), 'groups': {}, 'alerts': [], 'links': 0}
+
+    async def create_link(bot, group_id, user_id, name, expire_days):
+        if group_id in state['broken']:
+            raise RuntimeError('bot sem permissão')
+        state['links'] += 1
+        return f"https://t.me/+link{state['links']}"
+
+    async def notify_admins(bot, text):
+        state['alerts'].append(text)
+
+    async def acquire():
+        pass
+
+    def group_status(db, delivery_id):
+        return {group_id: status for (row_id, group_id), status in state['groups'].items() if row_id == delivery_id}
+
+    def record_groups(db, delivery_id, outcomes):
+        for group_id, status, _ in outcomes:
+            state['groups'][(delivery_id, group_id)] = status
+
+    monkeypatch.setattr(bot_module, 'Database', FakeDatabase)
+    monkeypatch.setattr(bot_module, 'create_group_invite_link', create_link)
+    monkeypatch.setattr(bot_module, 'notify_admins', notify_admins)
+    monkeypatch.setattr(bot_module.telegram_rate_limiter, 'acquire', acquire)
+    monkeypatch.setattr(bot_module, 'access_delivery_group_status', group_status)
+    monkeypatch.setattr(bot_module, 'record_access_delivery_groups', record_groups)
+    return state
+
+
+def attempt(bot, delivery_id=7):
+    return asyncio.run(bot_module.add_user_to_vip_groups(bot, 42, 1, delivery_id=delivery_id))
+
+
+def test_all_groups_delivered_in_one_message(delivery):
+    bot = FakeBot()
+
+    assert attempt(bot)
+    assert len(bot.messages) == 1
+    assert 'VIP A' in bot.messages[0][1] and 'VIP B' in bot.messages[0][1]
+    assert delivery['groups'] == {(7, -100): GROUP_DONE, (7, -200): GROUP_DONE}
+
+
+def test_retry_only_sends_failed_groups_and_alerts_once(delivery):
+    bot = FakeBot()
+    delivery['broken'] = {-200}
+
+    assert not attempt(bot)
+    assert not attempt(bot)
+    assert len(bot.messages) == 1
+    assert 'VIP A' in bot.messages[0][1] and 'VIP B' not in bot.messages[0][1]
+    assert len(delivery['alerts']) == 1
+    assert delivery['links'] == 1
+    assert delivery['groups'][(7, -200)] == GROUP_FAILED
+
+    delivery['broken'] = set()
+    assert attempt(bot)
+    assert len(bot.messages) == 2
+    assert 'VIP B' in bot.messages[1][1] and 'VIP A' not in bot.messages[1][1]
+    assert len(delivery['alerts']) == 1
+
+
+def test_nothing_left_to_deliver(delivery):
+    bot = FakeBot()
+    assert attempt(bot)
+
+    assert attempt(bot)
+    assert len(bot.messages) == 1
+
+
+def test_without_delivery_id_nothing_is_recorded(delivery):
+    bot = FakeBot()
+    delivery['broken'] = {-100}
+
+    assert not attempt(bot, delivery_id=None)
+    assert delivery['groups'] == {}
+    assert len(delivery['alerts']) == 1
@@ -0,0 +1,165 @@
+"""Recebimento de updates do Telegram via webhook e processamento concorrente.
+
+No modo webhook o endpoint registrado no app Flask (o mesmo do webhook do
+CNPay) só desserializa o update e o entrega na update_queue do Application, no
+event loop do bot.
+
+Polling ou webhook, apenas uma réplica processa updates (lock
+'telegram_updates' no bot.py): parte do estado das conversas fica na memória do
+processo, então a ordem e o estado por usuário só valem dentro dela. Não há
+divisão dos updates entre réplicas: réplicas extras servem só de reserva
+(alta disponibilidade), não aumentam a vazão. No modo webhook só a réplica
+dona deve receber o tráfego de /telegram/webhook (uma réplica no
+railway.json), pois uma reserva responde 503 e o Telegram reenvia o update
+mais tarde.
+
+Com KeyedUpdateProcessor (polling ou webhook) o Application processa updates
+em paralelo, limitado por um semáforo global, mas os updates de um mesmo chat
+passam por um lock próprio e são tratados um de cada vez, em ordem.
+"""
+
+import asyncio
+import hmac
+import logging
+import signal
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENT_UPDATES = 64
+WEBHOOK_MAX_CONNECTIONS = 40
+
+
+def update_order_key(update):
+    """Chave de ordenação do update: chat, senão usuário, senão o próprio update"""
+    if isinstance(update, Update):
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return update.effective_user.id
+        return update.update_id
+    return None
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """Updates de chats diferentes em paralelo; do mesmo chat, em ordem de chegada.
+
+    O lock do chat é obtido antes da vaga no semáforo global, para que um
+    usuário com muitos updates na fila não ocupe as vagas dos demais.
+    """
+
+    def __init__(self, max_concurrent_updates=DEFAULT_MAX_CONCURRENT_UPDATES):
+        super().__init__(max_concurrent_updates=max_concurrent_updates)
+        self._locks = {}  # chave -> [asyncio.Lock, updates aguardando ou em execução]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_update(self, update, coroutine):
+        key = update_order_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            # asyncio.Lock libera os que esperam em ordem FIFO
+            async with entry[0]:
+                await super().process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+
+class TelegramWebhookBridge:
+    """View Flask que entrega os updates recebidos ao Application do bot"""
+
+    def __init__(self):
+        self.application = None
+        self.loop = None
+        self.secret_token = None
+        self.stop_event = None
+
+    def attach(self, application, loop, secret_token):
+        self.application = application
+        self.loop = loop
+        self.secret_token = secret_token
+
+    def detach(self):
+        self.application = None
+        self.loop = None
+
+    def view(self):
+        # Só a thread do Flask chama a view: o import fica fora da inicialização do bot
+        from flask import request
+
+        if self.application is None:
+            # Bot ainda iniciando (ou parando): o Telegram reenvia depois
+            return 'not ready', 503
+        received = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        if self.secret_token and not hmac.compare_digest(received, self.secret_token):
+            logger.warning("⚠️ Update do Telegram com secret token inválido")
+            return 'forbidden', 403
+        payload = request.get_json(force=True, silent=True)
+        if not payload:
+            return 'bad request', 400
+        update = Update.de_json(payload, self.application.bot)
+        asyncio.run_coroutine_threadsafe(self.application.update_queue.put(update), self.loop)
+        return '', 200
+
+
+telegram_webhook_bridge = TelegramWebhookBridge()
+
+
+def stop_update_processing(application):
+    """Encerra run_polling ou serve_webhook de dentro de um job ou handler do bot"""
+    if telegram_webhook_bridge.stop_event is not None:
+        telegram_webhook_bridge.stop_event.set()
+    else:
+        application.stop_running()
+
+
+async def serve_webhook(application, url, secret_token):
+    """Equivalente a run_polling para o modo webhook, usando o servidor Flask já existente"""
+    loop = asyncio.get_running_loop()
+    stop = telegram_webhook_bridge.stop_event = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        telegram_webhook_bridge.attach(application, loop, secret_token)
+        await application.bot.set_webhook(
+            url=url,
+            secret_token=secret_token,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        )
+        logger.info(f"🌐 Recebendo updates via webhook em {url}")
+        try:
+            await stop.wait()
+        finally:
+            telegram_webhook_bridge.detach()
+            telegram_webhook_bridge.stop_event = None
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    if application.post_shutdown:
+        await application.post_shutdown(application)